@@ -58,6 +58,8 @@ setup(
             'st-pool-scrub = scripts.scheduled_tasks.pool_scrub:main',
             'st-snapshot = scripts.scheduled_tasks.snapshot:main',
             'st-system-power = scripts.scheduled_tasks.reboot_shutdown:main',
+            'task-scheduler = smart_manager.scheduler.task_scheduler:main',
+            'job-runner = smart_manager.jobs.job_runner:main',
         ],
     },
 
@@ -21,8 +21,8 @@ import time
 import json
 import base64
 from storageadmin.exceptions import RockStorAPIException
-from storageadmin.models import OauthApp
 from django.conf import settings
+from transport import (get_session, TokenCache)
 
 
 class APIWrapper(object):
@@ -35,12 +35,38 @@ class APIWrapper(object):
         # directly connect to gunicorn, bypassing nginx as we are on the same
         # host.
         self.url = 'http://127.0.0.1:8000'
+        socket_path = settings.API_SOCKET
         if (url is not None):
             # for remote urls.
             self.url = url
+            socket_path = None
+        # keep-alive session shared by all APIWrappers of this process.
+        self.session = get_session(self.url, socket_path)
+        self.token_cache = TokenCache(settings.API_TOKEN_CACHE)
 
-    def set_token(self):
+    def _cache_id(self):
+        # the internal app is cached under its name so a cache hit needs no
+        # db lookup of its credentials.
+        if (self.client_id is None):
+            return settings.OAUTH_INTERNAL_APP
+        return self.client_id
+
+    def set_token(self, force=False):
+        if (force):
+            self.token_cache.invalidate(self.url, self._cache_id())
+        else:
+            token, expiration = self.token_cache.get(self.url,
+                                                     self._cache_id())
+            if (token is not None):
+                self.access_token = token
+                self.expiration = expiration
+                return
+
+        cache_id = self._cache_id()
         if (self.client_id is None or self.client_secret is None):
+            # imported here as loading the models is only needed when the
+            # cached token has expired.
+            from storageadmin.models import OauthApp
             app = OauthApp.objects.get(name=settings.OAUTH_INTERNAL_APP)
             self.client_id = app.application.client_id
             self.client_secret = app.application.client_secret
@@ -57,12 +83,14 @@ class APIWrapper(object):
                         'Basic ' + auth_string.decode("utf-8"), }
         content = None
         try:
-            response = requests.post('%s/o/token/' % self.url,
-                                     data=token_request_data,
-                                     headers=auth_headers, verify=False)
+            response = self.session.post('%s/o/token/' % self.url,
+                                         data=token_request_data,
+                                         headers=auth_headers, verify=False)
             content = json.loads(response.content.decode("utf-8"))
             self.access_token = content['access_token']
             self.expiration = int(time.time()) + content['expires_in'] - 600
+            self.token_cache.set(self.url, cache_id, self.access_token,
+                                 self.expiration)
         except Exception as e:
             msg = ('Exception while setting access_token for url(%s): %s. '
                    'content: %s' % (self.url, e.__str__(), content))
@@ -75,25 +103,26 @@ class APIWrapper(object):
             self.set_token()
 
         api_auth_header = {'Authorization': 'Bearer ' + self.access_token, }
-        call = getattr(requests, calltype)
-        url = ('%s/api/%s' % (self.url, url))
+        call = getattr(self.session, calltype)
+        api_url = ('%s/api/%s' % (self.url, url))
         try:
             if (headers is not None):
                 headers.update(api_auth_header)
                 if (headers['content-type'] == 'application/json'):
-                    r = call(url, verify=False, data=json.dumps(data),
+                    r = call(api_url, verify=False, data=json.dumps(data),
                              headers=headers)
                 else:
-                    r = call(url, verify=False, data=data,
+                    r = call(api_url, verify=False, data=data,
                              headers=headers)
             else:
-                r = call(url, verify=False, headers=api_auth_header, data=data)
+                r = call(api_url, verify=False, headers=api_auth_header,
+                         data=data)
         except requests.exceptions.ConnectionError:
             print('Error connecting to Rockstor. Is it running?')
             raise
 
         if (r.status_code == 404):
-            msg = ('Invalid api end point: %s' % url)
+            msg = ('Invalid api end point: %s' % api_url)
             raise RockStorAPIException(detail=msg)
 
         if (r.status_code != 200):
@@ -108,7 +137,7 @@ class APIWrapper(object):
                         print('Error detail is saved at %s' % err_file)
                 if ('detail' in error_d):
                     if (error_d['detail'] == 'Authentication credentials were not provided.'):  # noqa E501
-                        self.set_token()
+                        self.set_token(force=True)
                         return self.api_call(url, data=data, calltype=calltype,
                                              headers=headers,
                                              save_error=save_error)
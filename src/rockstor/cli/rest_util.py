@@ -24,19 +24,35 @@ import base64
 from storageadmin.exceptions import RockStorAPIException
 from functools import wraps
 from base_console import BaseConsole
-from storageadmin.models import OauthApp
 from django.conf import settings
+from transport import (get_session, TokenCache)
 
 API_TOKEN = None
+LOCAL_URL = 'https://localhost'
 
 
-def set_token(client_id=None, client_secret=None, url=None, logger=None):
+def set_token(client_id=None, client_secret=None, url=None, logger=None,
+              force=False):
+    global API_TOKEN
+    token_cache = None
     if (client_id is None or client_secret is None or url is None):
+        # only the internal app token is shared through the cache.
+        token_cache = TokenCache(settings.API_TOKEN_CACHE)
+        if (force):
+            token_cache.invalidate(LOCAL_URL, settings.OAUTH_INTERNAL_APP)
+        else:
+            API_TOKEN = token_cache.get(LOCAL_URL,
+                                        settings.OAUTH_INTERNAL_APP)[0]
+            if (API_TOKEN is not None):
+                return API_TOKEN
         os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+        # imported here as loading the models is only needed when the cached
+        # token has expired.
+        from storageadmin.models import OauthApp
         app = OauthApp.objects.get(name=settings.OAUTH_INTERNAL_APP)
         client_id = app.client_id()
         client_secret = app.client_secret()
-        url = 'https://localhost'
+        url = LOCAL_URL
 
     token_request_data = {
         'grant_type': 'client_credentials',
@@ -47,13 +63,16 @@ def set_token(client_id=None, client_secret=None, url=None, logger=None):
     auth_string = base64.b64encode(user_pass.encode('utf-8'))
     auth_headers = {'HTTP_AUTHORIZATION':
                     'Basic ' + auth_string.decode("utf-8"), }
-    response = requests.post('%s/o/token/' % url,
-                             data=token_request_data, headers=auth_headers,
-                             verify=False)
+    session = get_session(url)
+    response = session.post('%s/o/token/' % url, data=token_request_data,
+                            headers=auth_headers, verify=False)
     try:
         content = json.loads(response.content.decode("utf-8"))
-        global API_TOKEN
         API_TOKEN = content['access_token']
+        if (token_cache is not None):
+            token_cache.set(LOCAL_URL, settings.OAUTH_INTERNAL_APP,
+                            API_TOKEN,
+                            int(time.time()) + content['expires_in'] - 600)
         return API_TOKEN
     except Exception as e:
         if (logger is not None):
@@ -82,7 +101,7 @@ def api_call(url, data=None, calltype='get', headers=None, save_error=True):
     if (API_TOKEN is None):
         set_token()
     api_auth_header = {'Authorization': 'Bearer ' + API_TOKEN, }
-    call = getattr(requests, calltype)
+    call = getattr(get_session(LOCAL_URL), calltype)
     try:
         if (headers is not None):
             headers.update(api_auth_header)
@@ -114,7 +133,7 @@ def api_call(url, data=None, calltype='get', headers=None, save_error=True):
                     print('Error detail is saved at %s' % err_file)
             if ('detail' in error_d):
                 if (error_d['detail'] == 'Authentication credentials were not provided.'):  # noqa E501
-                    set_token()
+                    set_token(force=True)
                     return api_call(url, data=data, calltype=calltype,
                                     headers=headers, save_error=save_error)
                 raise RockStorAPIException(detail=error_d['detail'])
@@ -0,0 +1,183 @@
+"""
+Copyright (c) 2012-2013 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import fcntl
+import hashlib
+import httplib
+import json
+import os
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool
+
+# Connection reuse and token caching for internal REST API clients. Every
+# APIWrapper in a process shares one keep-alive requests.Session per base url,
+# optionally talking to gunicorn over a unix socket, and OAuth tokens are
+# cached in a root only file so new processes can skip the client_credentials
+# round trip.
+#
+# gunicorn runs sync workers, which close the connection after every
+# response, so calls to the local API open a new connection each time
+# whatever the session keeps. Against it the unix socket saves the tcp
+# setup and the token cache saves the token request; connections are only
+# reused by servers that keep them alive, ie remote appliances behind nginx.
+
+# Number of keep-alive connections held open per base url.
+POOL_SIZE = 10
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+
+    def __init__(self, socket_path, *args, **kwargs):
+        self.socket_path = socket_path
+        httplib.HTTPConnection.__init__(self, *args, **kwargs)
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if (self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT):
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class UnixHTTPConnectionPool(HTTPConnectionPool):
+
+    def __init__(self, socket_path, host, **kwargs):
+        self.socket_path = socket_path
+        HTTPConnectionPool.__init__(self, host, **kwargs)
+
+    def _new_conn(self):
+        self.num_connections += 1
+        return UnixHTTPConnection(self.socket_path, host=self.host,
+                                  port=self.port)
+
+
+class UnixHTTPAdapter(HTTPAdapter):
+    """
+    Transport adapter sending every request over the unix socket at
+    socket_path, whatever host the url names.
+    """
+
+    def __init__(self, socket_path, pool_maxsize=POOL_SIZE):
+        self.socket_path = socket_path
+        self.unix_pool = UnixHTTPConnectionPool(socket_path, 'localhost',
+                                                maxsize=pool_maxsize)
+        super(UnixHTTPAdapter, self).__init__()
+
+    def get_connection(self, url, proxies=None):
+        return self.unix_pool
+
+    def close(self):
+        self.unix_pool.close()
+        super(UnixHTTPAdapter, self).close()
+
+
+def get_session(url, socket_path=None):
+    """
+    Return the process wide keep-alive session for the given base url,
+    creating it on first use. When socket_path is given and exists, requests
+    are sent over that unix socket instead of tcp.
+    """
+    key = (url, socket_path)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if (session is None):
+            session = requests.Session()
+            if (socket_path is not None and os.path.exists(socket_path)):
+                adapter = UnixHTTPAdapter(socket_path)
+            else:
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return session
+
+
+class TokenCache(object):
+    """
+    File backed cache of OAuth access tokens shared by all processes on the
+    box. Entries are keyed on a hash of the api url and client id and hold
+    the token with its expiry time. The file is only readable by its owner
+    as it holds bearer tokens.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _key(url, client_id):
+        return hashlib.sha1('%s|%s' % (url, client_id)).hexdigest()
+
+    def _read(self):
+        # writers replace the file atomically so no lock is needed here.
+        try:
+            with open(self.path) as cfo:
+                return json.load(cfo)
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, url, client_id):
+        """
+        Returns (access_token, expiration) or (None, None) if there is no
+        valid cached token.
+        """
+        entry = self._read().get(self._key(url, client_id))
+        if (entry is None or time.time() > entry['expiration']):
+            return None, None
+        return entry['access_token'], entry['expiration']
+
+    def set(self, url, client_id, access_token, expiration):
+        self._update(self._key(url, client_id),
+                     {'access_token': access_token,
+                      'expiration': expiration, })
+
+    def invalidate(self, url, client_id):
+        self._update(self._key(url, client_id), None)
+
+    def _update(self, key, entry):
+        lock_path = '%s.lock' % self.path
+        try:
+            fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT, 0o600)
+        except OSError:
+            # no writable cache location, tokens simply won't be shared.
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            entries = dict((k, v) for k, v in self._read().items()
+                           if (v['expiration'] > now))
+            if (entry is None):
+                entries.pop(key, None)
+            else:
+                entries[key] = entry
+            tmp_path = '%s.%d' % (self.path, os.getpid())
+            tfd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                          0o600)
+            with os.fdopen(tfd, 'w') as tfo:
+                json.dump(entries, tfo)
+            os.rename(tmp_path, self.path)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
@@ -25,7 +25,6 @@ from system.osi import run_command, create_tmp_dir, is_share_mounted, \
     get_device_path
 from system.exceptions import (CommandException)
 from pool_scrub import PoolScrub
-from django_ztask.decorators import task
 from django.conf import settings
 import logging
 
@@ -45,6 +44,8 @@ RMDIR = '/bin/rmdir'
 QID = '2015'
 # The following model/db default setting is also used when quotas are disabled.
 PQGROUP_DEFAULT = settings.MODEL_DEFS['pqgroup']
+# Max number of subvolumes passed to a single btrfs subvolume delete.
+SUBVOL_DELETE_CHUNK = 100
 
 
 def add_pool(pool, disks):
@@ -404,7 +405,11 @@ def subvol_list_helper(mnt_pt):
 
 
 def snapshot_list(mnt_pt):
-    o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-s', mnt_pt])
+    # cached per process, see system/command_cache.py: a snapshot taken by
+    # another process, eg: a scheduled snapshot task, is listed within the
+    # ttl.
+    o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-s', mnt_pt],
+                           cache=True)
     snaps = []
     for s in o:
         snaps.append(s.split()[-1])
@@ -434,14 +439,19 @@ def shares_info(pool):
             # recovered, state gets reconstructed anyway.
             return {}
         raise
-    o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-s', mnt_pt])
+    # both listings are cached per process, so subvolumes created or deleted
+    # by other processes (scheduled snapshots, replication) show within their
+    # ttl.
+    o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-s', mnt_pt],
+                           cache=True)
     snap_idmap = {}
     for l in o:
         if (re.match('ID ', l) is not None):
             fields = l.strip().split()
             snap_idmap[fields[1]] = fields[-1]
 
-    o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-p', mnt_pt])
+    o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-p', mnt_pt],
+                           cache=True)
     shares_d = {}
     share_ids = []
     for l in o:
@@ -497,8 +507,10 @@ def parse_snap_details(mnt_pt, fields):
 
 
 def snaps_info(mnt_pt, share_name):
+    # cached per process, as is the snapshot listing below, so both may miss
+    # the changes of other processes for their ttl.
     o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-u', '-p', '-q',
-                            mnt_pt])
+                            mnt_pt], cache=True)
     share_id = share_uuid = None
     for l in o:
         if (re.match('ID ', l) is not None):
@@ -510,7 +522,7 @@ def snaps_info(mnt_pt, share_name):
         return {}
 
     o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-s', '-p', '-q',
-                            '-u', mnt_pt])
+                            '-u', mnt_pt], cache=True)
     snaps_d = {}
     snap_uuids = []
     for l in o:
@@ -557,7 +569,7 @@ def share_id(pool, share_name):
     raise Exception('subvolume id for share: %s not found.' % share_name)
 
 
-def remove_share(pool, share_name, pqgroup, force=False):
+def remove_share(pool, share_name, pqgroup, force=False, progress=None):
     """
     umount share if its mounted.
     unsures given pool is mounted.
@@ -568,6 +580,8 @@ def remove_share(pool, share_name, pqgroup, force=False):
     :param share_name: Share name as in share.name
     :param pqgroup: Pqgroup to be removed
     :param force: Flag used to also remove all subvolumes of the given share.
+    :param progress: called with (subvolumes deleted, subvolumes to delete)
+    before each subvolume delete. Whatever it raises stops the removal.
     """
     if (is_share_mounted(share_name)):
         mnt_pt = ('%s%s' % (DEFAULT_MNT_DIR, share_name))
@@ -583,14 +597,19 @@ def remove_share(pool, share_name, pqgroup, force=False):
     # bug being resolved we might consider promoting to force=True calls only.
     chattr_cmd = [CHATTR, '-i', subvol_mnt_pt]
     run_command(chattr_cmd, log=True)
+    subvols = []
     if (force):
         o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-o',
                                 subvol_mnt_pt])
-        for l in o:
-            if (re.match('ID ', l) is not None):
-                subvol = root_pool_mnt + '/' + l.split()[-1]
-                # TODO: consider recursive immutable flag removal.
-                run_command([BTRFS, 'subvolume', 'delete', subvol], log=True)
+        subvols = [root_pool_mnt + '/' + l.split()[-1] for l in o
+                   if (re.match('ID ', l) is not None)]
+    for i, subvol in enumerate(subvols):
+        if (progress is not None):
+            progress(i, len(subvols) + 1)
+        # TODO: consider recursive immutable flag removal.
+        run_command([BTRFS, 'subvolume', 'delete', subvol], log=True)
+    if (progress is not None):
+        progress(len(subvols), len(subvols) + 1)
     qgroup = ('0/%s' % share_id(pool, share_name))
     delete_cmd = [BTRFS, 'subvolume', 'delete', subvol_mnt_pt]
     run_command(delete_cmd, log=True)
@@ -618,6 +637,84 @@ def remove_snap(pool, share_name, snap_name):
                                    log=True)
 
 
+def remove_snaps(pool, share_name, snap_names):
+    """
+    Bulk counterpart to remove_snap(). Deletes many snapshots of a share with
+    one subvolume list, one "btrfs subvolume delete -c" per chunk of
+    SUBVOL_DELETE_CHUNK subvolumes (so a single transaction commit each) and
+    one qgroup listing for the associated qgroup cleanup.
+    :param pool: pool object the share lives on.
+    :param share_name: name of the share the snapshots belong to.
+    :param snap_names: list of snapshot names to delete.
+    :return: list of snapshot names that were found and deleted on disk.
+    """
+    root_mnt = mount_root(pool)
+    o, e, rc = subvol_list_helper(root_mnt)
+    subvol_ids = {}
+    for l in o:
+        fields = l.split()
+        if (len(fields) > 0):
+            subvol_ids[fields[-1]] = fields[1]
+    removed = []
+    snap_paths = []
+    qgroups = []
+    by_name = None
+    for snap_name in snap_names:
+        rel_path = ('.snapshots/%s/%s' % (share_name, snap_name))
+        if (rel_path not in subvol_ids):
+            # not where snapshots are made, eg: a replicated snapshot turned
+            # into a share. As remove_snap() does, look for it by name among
+            # the pool's snapshots, with a single listing for all of them.
+            if (by_name is None):
+                by_name = {}
+                o, e, rc = run_command([BTRFS, 'subvolume', 'list', '-s',
+                                        root_mnt])
+                for l in o:
+                    fields = l.split()
+                    if (len(fields) > 0):
+                        by_name.setdefault(fields[-1].split('/')[-1],
+                                           (fields[-1], fields[1]))
+            if (snap_name not in by_name):
+                # already gone from disk, nothing to do but drop the db entry.
+                continue
+            rel_path, subvol_id = by_name[snap_name]
+        else:
+            subvol_id = subvol_ids[rel_path]
+        snap_path = ('%s/%s' % (root_mnt, rel_path))
+        if (is_mounted(snap_path)):
+            umount_root(snap_path)
+        removed.append(snap_name)
+        snap_paths.append(snap_path)
+        qgroups.append('0/%s' % subvol_id)
+    for i in range(0, len(snap_paths), SUBVOL_DELETE_CHUNK):
+        run_command([BTRFS, 'subvolume', 'delete', '-c'] +
+                    snap_paths[i:i + SUBVOL_DELETE_CHUNK], log=True)
+    if (len(qgroups) > 0):
+        qgroups_destroy(qgroups, root_mnt)
+    return removed
+
+
+def qgroups_destroy(qids, mnt_pt):
+    """
+    Destroy the given qgroups that exist on the pool at mnt_pt, using a
+    single qgroup listing rather than one per qgroup as in qgroup_destroy().
+    """
+    cmd = [BTRFS, 'qgroup', 'show', mnt_pt]
+    try:
+        o, e, rc = run_command(cmd, log=True)
+    except CommandException as e:
+        # we may have quotas disabled so catch and deal.
+        emsg = "ERROR: can't list qgroups: quotas not enabled"
+        if e.err[0] == emsg:
+            return False
+        raise e
+    existing = set([l.split()[0] for l in o if (len(l.split()) > 0)])
+    for qid in qids:
+        if (qid in existing):
+            run_command([BTRFS, 'qgroup', 'destroy', qid, mnt_pt], log=True)
+    return True
+
+
 def add_snap_helper(orig, snap, writable):
     cmd = [BTRFS, 'subvolume', 'snapshot', orig, snap]
     if (not writable):
@@ -730,7 +827,10 @@ def qgroup_exists(mnt_pt, qgroup):
     :param qgroup: qgroup of the form 2015/n (intended for use with pqgroup)
     :return: True is given qgroup exists in command output, False otherwise.
     """
-    o, e, rc = run_command([BTRFS, 'qgroup', 'show', '--raw', mnt_pt])
+    # cached per process: a qgroup just created by another process may read
+    # as missing for the ttl.
+    o, e, rc = run_command([BTRFS, 'qgroup', 'show', '--raw', mnt_pt],
+                           cache=True)
     # example output:
     # 'qgroupid         rfer         excl '
     # '-------         ----         ---- '
@@ -1000,8 +1100,10 @@ def volume_usage(pool, volume_id, pvolume_id=None):
     # Obtain path to share in pool, this preserved because
     # granting pool exists
     root_pool_mnt = mount_root(pool)
+    # this and the qgroup listing below are cached per process, usage is as
+    # fresh as their ttl whichever process changed it.
     cmd = [BTRFS, 'subvolume', 'list', root_pool_mnt]
-    out, err, rc = run_command(cmd, log=True)
+    out, err, rc = run_command(cmd, log=True, cache=True)
     short_id = volume_id.split('/')[1]
     volume_dir = ''
 
@@ -1024,7 +1126,7 @@ def volume_usage(pool, volume_id, pvolume_id=None):
     current real size we can indistinctly use one of them.
     """
     cmd = [BTRFS, 'qgroup', 'show', volume_dir]
-    out, err, rc = run_command(cmd, log=True, throw=False)
+    out, err, rc = run_command(cmd, log=True, throw=False, cache=True)
     volume_id_sizes = [0, 0]
     pvolume_id_sizes = [0, 0]
     for line in out:
@@ -1056,8 +1158,9 @@ def shares_usage(pool, share_map, snap_map):
             break
     if (mnt_pt is None):
         mnt_pt = mount_root(pool)
+    # cached per process, see volume_usage().
     cmd = [BTRFS, 'qgroup', 'show', mnt_pt]
-    out, err, rc = run_command(cmd, log=True)
+    out, err, rc = run_command(cmd, log=True, cache=True)
     combined_map = dict(share_map, **snap_map)
     for line in out:
         fields = line.split()
@@ -1222,7 +1325,6 @@ def scrub_status(pool):
     return stats
 
 
-@task()
 def start_balance(mnt_pt, force=False, convert=None):
     cmd = ['btrfs', 'balance', 'start', mnt_pt]
     # TODO: Confirm -f is doing what is intended, man states for reducing
@@ -1323,7 +1425,7 @@ def device_scan(dev_byid_list=['all']):
 def btrfs_uuid(disk):
     """return uuid of a btrfs filesystem"""
     o, e, rc = run_command(
-        [BTRFS, 'filesystem', 'show', get_device_path(disk)])
+        [BTRFS, 'filesystem', 'show', get_device_path(disk)], cache=True)
     return o[0].split()[3]
 
 
@@ -15,7 +15,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
 from fs.btrfs import (pool_raid, is_subvol, volume_usage, balance_status,
-                      share_id, device_scan, scrub_status)
+                      share_id, device_scan, scrub_status, remove_snaps)
 from mock import patch
 
 
@@ -681,3 +681,39 @@ class BTRFSTests(unittest.TestCase):
         self.mock_run_command.return_value = (out, err, rc)
         self.assertEqual(device_scan(['virtio-serial-1']), (out, err, rc),
                          msg='Failed to return results from non btrfs device.')
+
+    @patch('fs.btrfs.is_mounted', return_value=False)
+    def test_remove_snaps(self, mock_is_mounted):
+        """
+        Snapshots not under .snapshots/<share>, eg: replicated ones turned
+        into shares, are found by name among the pool's snapshots.
+        """
+        pool = Pool(raid='single', name='pool1')
+        self.mock_mount_root.return_value = '/mnt2/pool1'
+        subvol_list = ['ID 257 gen 10 top level 5 path share1',
+                       'ID 260 gen 12 top level 5 path .snapshots/share1/s1',
+                       'ID 261 gen 13 top level 5 path s2', '']
+        snap_list = ['ID 260 gen 12 cgen 12 top level 5 otime 2017-01-01 '
+                     '10:00:00 path .snapshots/share1/s1',
+                     'ID 261 gen 13 cgen 13 top level 5 otime 2017-01-01 '
+                     '10:00:00 path s2', '']
+
+        def run_command(cmd, **kwargs):
+            if (cmd[1:4] == ['subvolume', 'list', '-s']):
+                return snap_list, [''], 0
+            if (cmd[1:3] == ['subvolume', 'list']):
+                return subvol_list, [''], 0
+            if (cmd[1:3] == ['qgroup', 'show']):
+                return ['qgroupid rfer excl', '0/260 16384 16384',
+                        '0/261 16384 16384', ''], [''], 0
+            return [''], [''], 0
+        self.mock_run_command.side_effect = run_command
+
+        self.assertEqual(remove_snaps(pool, 'share1', ['s1', 's2', 'gone']),
+                         ['s1', 's2'])
+        cmds = [c[0][0] for c in self.mock_run_command.call_args_list]
+        self.assertIn(['/sbin/btrfs', 'subvolume', 'delete', '-c',
+                       '/mnt2/pool1/.snapshots/share1/s1',
+                       '/mnt2/pool1/s2'], cmds)
+        self.assertIn(['/sbin/btrfs', 'qgroup', 'destroy', '0/261',
+                       '/mnt2/pool1'], cmds)
@@ -16,8 +16,185 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import base64
+import json
+import re
+from collections import OrderedDict
+from decimal import Decimal
+from django.db import connections
+from django.db.models import Q
+from django.db.models.query import QuerySet
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _json_default(value):
+    if (hasattr(value, 'isoformat')):
+        # full precision, unlike DjangoJSONEncoder.
+        return value.isoformat()
+    if (isinstance(value, Decimal)):
+        return str(value)
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def estimated_count(queryset):
+    """
+    Row count of queryset as estimated by the postgresql planner, which
+    unlike COUNT(*) doesn't scan the table. Exact count on other databases.
+    """
+    connection = connections[queryset.db]
+    if (connection.vendor != 'postgresql'):
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN %s' % sql, params)
+        plan = cursor.fetchone()[0]
+    match = re.search(r'rows=(\d+)', plan)
+    return int(match.group(1)) if match else None
 
 
 class CustomPagination(pagination.PageNumberPagination):
+    """
+    Page number pagination or, with ?cursor= (empty for the first page),
+    keyset pagination on the queryset's (first ordering column, id): a page
+    is fetched with a WHERE on the last row of the previous one instead of
+    an OFFSET, so deep pages cost the same as the first one. The count, a
+    COUNT(*), is then only given with ?count=exact, or ?count=estimate for
+    the database's estimate.
+    """
     page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (self.cursor_query_param in request.query_params and
+                            isinstance(queryset, QuerySet) and
+                            queryset.query.low_mark == 0 and
+                            queryset.query.high_mark is None)
+        if (not self.cursor_mode):
+            return super(CustomPagination, self).paginate_queryset(
+                queryset, request, view=view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        if (not page_size):
+            return None
+
+        self.column, self.descending = self._ordering(queryset)
+        direction = '-' if self.descending else ''
+        if (self.column == 'id'):
+            queryset = queryset.order_by('%sid' % direction)
+        else:
+            queryset = queryset.order_by('%s%s' % (direction, self.column),
+                                         '%sid' % direction)
+        self.count = None
+        count = request.query_params.get(self.count_query_param, None)
+        if (count == 'exact'):
+            self.count = queryset.count()
+        elif (count == 'estimate'):
+            self.count = estimated_count(queryset)
+
+        cursor = self._decode_cursor(
+            queryset.model, request.query_params[self.cursor_query_param])
+        backwards = False
+        if (cursor is not None):
+            value, pk, backwards = cursor
+            queryset = queryset.filter(self._beyond(
+                queryset.model, value, pk, self.descending != backwards))
+            if (backwards):
+                queryset = queryset.reverse()
+        rows = list(queryset[:page_size + 1])
+        more = (len(rows) > page_size)
+        rows = rows[:page_size]
+        if (backwards):
+            rows.reverse()
+            self.has_next, self.has_previous = True, more
+        else:
+            self.has_next, self.has_previous = more, (cursor is not None)
+        self.rows = rows
+        return rows
+
+    def _ordering(self, queryset):
+        ordering = list(queryset.query.order_by)
+        if (len(ordering) == 0):
+            ordering = list(queryset.model._meta.ordering) or ['-id']
+        column = ordering[0]
+        descending = column.startswith('-')
+        column = column.lstrip('-')
+        if (column == 'pk'):
+            column = 'id'
+        return column, descending
+
+    def _field(self, model):
+        field = None
+        for name in self.column.split('__'):
+            if (field is not None):
+                model = field.related_model
+            field = model._meta.get_field(name)
+        return field
+
+    def _value(self, obj):
+        for name in self.column.split('__'):
+            obj = getattr(obj, name) if obj is not None else None
+        return obj
+
+    def _encode_cursor(self, obj, backwards):
+        position = json.dumps([self._value(obj), obj.id, backwards],
+                              default=_json_default)
+        return base64.urlsafe_b64encode(position)
+
+    def _decode_cursor(self, model, cursor):
+        if (cursor == ''):
+            return None
+        try:
+            value, pk, backwards = json.loads(
+                base64.urlsafe_b64decode(str(cursor)))
+            if (value is not None):
+                value = self._field(model).to_python(value)
+            return value, int(pk), bool(backwards)
+        except Exception:
+            raise NotFound('Invalid cursor.')
+
+    def _beyond(self, model, value, pk, descending):
+        """
+        Filter for the rows after (value, pk) in (column, id) order. As with
+        postgresql, NULLs sort after any value.
+        """
+        op = 'lt' if descending else 'gt'
+        if (self.column == 'id'):
+            return Q(**{'id__%s' % op: pk})
+        column = self.column
+        nullable = self._field(model).null
+        if (value is None):
+            after = Q(**{'%s__isnull' % column: True, 'id__%s' % op: pk})
+            if (descending):
+                after |= Q(**{'%s__isnull' % column: False})
+            return after
+        after = (Q(**{'%s__%s' % (column, op): value}) |
+                 Q(**{column: value, 'id__%s' % op: pk}))
+        if (nullable and not descending):
+            after |= Q(**{'%s__isnull' % column: True})
+        return after
+
+    def get_paginated_response(self, data):
+        if (not self.cursor_mode):
+            return super(CustomPagination, self).get_paginated_response(data)
+        url = self.request.build_absolute_uri()
+        next_link = previous_link = None
+        if (len(self.rows) > 0):
+            if (self.has_next):
+                next_link = replace_query_param(
+                    url, self.cursor_query_param,
+                    self._encode_cursor(self.rows[-1], False))
+            if (self.has_previous):
+                previous_link = replace_query_param(
+                    url, self.cursor_query_param,
+                    self._encode_cursor(self.rows[0], True))
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', next_link),
+            ('previous', previous_link),
+            ('results', data),
+        ]))
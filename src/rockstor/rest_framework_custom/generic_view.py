@@ -16,7 +16,15 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework import status
 from rest_framework.generics import ListCreateAPIView
+from rest_framework.response import Response
 from rest_framework.authentication import (BasicAuthentication,
                                            SessionAuthentication,)
 from storageadmin.auth import DigestAuthentication
@@ -43,3 +51,85 @@ class GenericView(ListCreateAPIView):
             raise
         except Exception as e:
             handle_exception(e, request, msg)
+
+    # Resource families, see storageadmin.models.ResourceVersion, the GET
+    # listing depends on. When set the listing carries an ETag derived from
+    # their versions, is answered with 304 Not Modified if the client has it
+    # (If-None-Match) and its data is reused for RESPONSE_CACHE['ttl']
+    # seconds.
+    etag_families = ()
+    # Whether the listing depends on what's mounted, ie mount_status.
+    etag_mounts = False
+    # Seconds an ETag is valid for at most, for listings with values computed
+    # on the fly, eg: pool free space.
+    etag_max_age = None
+
+    def etag_extra(self):
+        """
+        State, other than the etag_families' models, the listing depends on.
+        """
+        return ''
+
+    def _etag(self, request):
+        from storageadmin.models import resource_versions
+        extra = self.etag_extra()
+        if (self.etag_mounts):
+            with open('/proc/mounts') as mfo:
+                extra = [extra, mfo.read()]
+        if (self.etag_max_age is not None):
+            extra = [extra, int(time.time() // self.etag_max_age)]
+        key = json.dumps([request.get_full_path(),
+                          request.META.get('HTTP_ACCEPT', ''),
+                          sorted(resource_versions(
+                              self.etag_families).items()), extra])
+        return '"%s"' % hashlib.sha1(key).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        if (len(self.etag_families) == 0):
+            return super(GenericView, self).list(request, *args, **kwargs)
+        etag = self._etag(request)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if (etag in [t.strip() for t in if_none_match.split(',')]):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag, })
+        data = response_cache.get(etag)
+        if (data is not None):
+            return Response(data, headers={'ETag': etag, })
+        response = super(GenericView, self).list(request, *args, **kwargs)
+        if (response.status_code == status.HTTP_200_OK):
+            response['ETag'] = etag
+            response_cache.put(etag, response.data)
+        return response
+
+
+class ResponseCache(object):
+    """
+    Per process cache of listing data by ETag. As the ETag changes with the
+    data this only bounds how long data that depends on other than the
+    database, eg: pool usage, is reused for.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # etag -> (expires, data)
+
+    def get(self, etag):
+        with self.lock:
+            entry = self.entries.get(etag)
+            if (entry is None or entry[0] < time.time()):
+                return None
+            return entry[1]
+
+    def put(self, etag, data):
+        config = getattr(settings, 'RESPONSE_CACHE', {})
+        ttl = config.get('ttl', 0)
+        if (ttl <= 0):
+            return
+        with self.lock:
+            self.entries.pop(etag, None)
+            self.entries[etag] = (time.time() + ttl, data)
+            while (len(self.entries) > config.get('max_entries', 64)):
+                self.entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
@@ -17,11 +17,14 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
+import sys
 os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
 from system.config_backup import backup_config
 
 def main():
-    cbo = backup_config()
+    # -i: only back up what changed since the previous backup.
+    incremental = (len(sys.argv) > 1 and sys.argv[1] == '-i')
+    cbo = backup_config(incremental=incremental)
     print('config exported to: "%s"' % cbo.full_path())
 
 
@@ -19,11 +19,17 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 import os
 import shutil
 from system.osi import (run_command, md5sum)
+from system.parallel import run_parallel
 from system import services
 import logging
 import sys
 import re
 import json
+import glob
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from tempfile import mkstemp
 from django.conf import settings
 
@@ -35,6 +41,9 @@ BASE_DIR = settings.ROOT_DIR
 BASE_BIN = '%sbin' % BASE_DIR
 DJANGO = '%s/django' % BASE_BIN
 STAMP = '%s/.initrock' % BASE_DIR
+# fingerprints of the steps as last run.
+STEPS_STAMP = '%s/.initrock-steps' % BASE_DIR
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
 FLASH_OPTIMIZE = '%s/flash-optimize' % BASE_BIN
 PREP_DB = '%s/prep_db' % BASE_BIN
 SUPERCTL = '%s/supervisorctl' % BASE_BIN
@@ -45,6 +54,199 @@ YUM = '/usr/bin/yum'
 IP = '/usr/sbin/ip'
 
 
+def script_source(name):
+    return os.path.join(SCRIPTS_DIR, '%s.py' % name)
+
+
+class StepRunner(object):
+    """
+    Runs initrock steps, skipping those whose fingerprint, eg: hashes of the
+    files and the state they depend on, is unchanged since they last
+    succeeded. Steps can be run from several threads.
+    """
+
+    def __init__(self, force=False):
+        self.force = force
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+        # step name -> (seconds, skipped)
+        self.timings = OrderedDict()
+        if (os.path.isfile(STEPS_STAMP)):
+            try:
+                with open(STEPS_STAMP) as sfo:
+                    self.fingerprints = json.load(sfo)
+            except Exception as e:
+                logging.error('Ignoring unreadable %s: %s' %
+                              (STEPS_STAMP, e.__str__()))
+
+    @staticmethod
+    def fingerprint(files, values):
+        sha = hashlib.sha1()
+        # any change to initrock itself re-runs every step.
+        for f in [script_source('initrock'), ] + list(files):
+            sha.update('%s:%s\n' % (f, md5sum(f)))
+        sha.update(json.dumps(values, sort_keys=True))
+        return sha.hexdigest()
+
+    def _current(self, name, inputs):
+        # None if the inputs can't be read, the step then runs and no
+        # fingerprint is recorded for it.
+        try:
+            return self.fingerprint(*inputs())
+        except Exception as e:
+            logging.error('%s: failed to read the step inputs: %s' %
+                          (name, e.__str__()))
+            return None
+
+    def run(self, name, func, inputs=None):
+        """
+        :param inputs: callable returning (files, values) the step depends
+        on. The step always runs if None. It's called again after the step
+        so the recorded fingerprint is that of the state the step left.
+        """
+        start = time.time()
+        if (inputs is not None and not self.force):
+            current = self._current(name, inputs)
+            if (current is not None and
+                    self.fingerprints.get(name) == current):
+                logging.info('%s: unchanged, skipping.' % name)
+                with self.lock:
+                    self.timings[name] = (time.time() - start, True)
+                return
+        with self.lock:
+            # a failing step must run again next time.
+            self.fingerprints.pop(name, None)
+        func()
+        current = None if (inputs is None) else self._current(name, inputs)
+        with self.lock:
+            if (current is not None):
+                self.fingerprints[name] = current
+            self.timings[name] = (time.time() - start, False)
+
+    def save(self):
+        with self.lock:
+            tmp_stamp = '%s.tmp' % STEPS_STAMP
+            with open(tmp_stamp, 'w') as tfo:
+                json.dump(self.fingerprints, tfo)
+            os.rename(tmp_stamp, STEPS_STAMP)
+
+    def report(self, total):
+        logging.info('initrock finished in %.2f seconds. Step timings:' %
+                     total)
+        for name, (seconds, skipped) in self.timings.items():
+            logging.info('  %s: %.2fs%s' % (name, seconds,
+                                            ' (skipped)' if skipped else ''))
+
+
+def kernel_inputs():
+    return ([], [settings.SUPPORTED_KERNEL_VERSION, os.uname()[2],
+                 sorted(glob.glob('/boot/vmlinuz-*'))])
+
+
+def flash_inputs():
+    rotational = {}
+    for f in glob.glob('/sys/block/*/queue/rotational'):
+        with open(f) as rfo:
+            rotational[f] = rfo.read().strip()
+    return ([script_source('flash_optimize'), '/etc/fstab',
+             '/etc/sysctl.d/99-rockstor.conf'], [rotational])
+
+
+def migration_heads():
+    """
+    :return: the migrations of every app initrock migrates.
+    """
+    import django
+    import django.contrib.auth
+    heads = {'django': django.get_version(), }
+    app_dirs = {'storageadmin': '%s/src/rockstor/storageadmin' % BASE_DIR,
+                'smart_manager': '%s/src/rockstor/smart_manager' % BASE_DIR,
+                'auth': os.path.dirname(django.contrib.auth.__file__), }
+    try:
+        import django_ztask
+        app_dirs['django_ztask'] = os.path.dirname(django_ztask.__file__)
+    except ImportError:
+        pass
+    for app, app_dir in app_dirs.items():
+        heads[app] = sorted([os.path.basename(m) for m in
+                             glob.glob('%s/migrations/*.py' % app_dir)])
+    return heads
+
+
+def applied_migrations():
+    """
+    :return: the migrations recorded in django_migrations of each database,
+    so a database recreated or restored behind initrock's back is migrated
+    again whatever the mtime of STAMP.
+    """
+    from django.db import connections
+    applied = {}
+    for alias in ('default', 'smart_manager'):
+        connection = connections[alias]
+        try:
+            if ('django_migrations' not in
+                    connection.introspection.table_names()):
+                applied[alias] = []
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT app, name FROM django_migrations')
+                applied[alias] = sorted('%s.%s' % row
+                                        for row in cursor.fetchall())
+        finally:
+            connection.close()
+    return applied
+
+
+def db_inputs(*files):
+    # the db is recreated when STAMP is.
+    stamp_time = os.stat(STAMP).st_mtime if os.path.isfile(STAMP) else None
+    return (list(files), [migration_heads(), applied_migrations(),
+                          stamp_time])
+
+
+def firewalld_inputs():
+    # re-run if firewalld was enabled or started since.
+    state = []
+    for action in ('is-enabled', 'is-active'):
+        o, e, rc = run_command([SYSCTL, action, 'firewalld'], throw=False)
+        state.append([o, rc])
+    return ([], state)
+
+
+def migrate(logging):
+    migration_cmd = [DJANGO, 'migrate', '--noinput', ]
+    fake_migration_cmd = migration_cmd + ['--fake']
+
+    def fake_initial(app, db):
+        o, e, rc = run_command([DJANGO, 'migrate', '--list',
+                                '--database=%s' % db, app])
+        initial_faked = False
+        for l in o:
+            if l.strip() == '[X] 0001_initial':
+                initial_faked = True
+                break
+        if not initial_faked:
+            db_arg = '--database=%s' % db
+            run_command(fake_migration_cmd + [db_arg, app, '0001_initial'])
+
+    def migrate_default():
+        fake_initial('storageadmin', 'default')
+        run_command(migration_cmd + ['storageadmin'])
+        run_command(migration_cmd + ['auth'])
+        run_command(migration_cmd + ['django_ztask'])
+
+    def migrate_smartdb():
+        fake_initial('smart_manager', 'smart_manager')
+        run_command(migration_cmd + ['--database=smart_manager',
+                                     'smart_manager'])
+
+    # the two databases are migrated concurrently.
+    failures = run_parallel(lambda f: f(), [migrate_default, migrate_smartdb],
+                            workers=2)
+    if (len(failures) > 0):
+        raise failures[0][1]
+
+
 def delete_old_kernels(logging, num_retain=5):
     # Don't keep more than num_retain kernels
     o, e, rc = run_command([RPM, '-q', 'kernel-ml'])
@@ -302,16 +504,12 @@ def cleanup_rclocal(logging):
 
 def main():
     loglevel = logging.INFO
-    if (len(sys.argv) > 1 and sys.argv[1] == '-x'):
+    if ('-x' in sys.argv[1:]):
         loglevel = logging.DEBUG
     logging.basicConfig(format='%(asctime)s: %(message)s', level=loglevel)
-    set_def_kernel(logging)
-    try:
-        delete_old_kernels(logging)
-    except Exception as e:
-        logging.debug('Exception while deleting old kernels. Soft error. '
-                      'Moving on.')
-        logging.exception(e)
+    start = time.time()
+    # -f: run every step, even if unchanged since its last run.
+    runner = StepRunner(force=('-f' in sys.argv[1:]))
 
     cert_loc = '%s/certs/' % BASE_DIR
     if (os.path.isdir(cert_loc)):
@@ -341,9 +539,6 @@ def main():
         run_command([SUPERCTL, 'restart', 'nginx'])
 
     cleanup_rclocal(logging)
-    logging.info('Checking for flash and Running flash optimizations if '
-                 'appropriate.')
-    run_command([FLASH_OPTIMIZE, '-x'], throw=False)
     try:
         logging.info('Updating the timezone from the system')
         update_tz(logging)
@@ -400,39 +595,51 @@ def main():
         require_postgres(logging)
         logging.info('Done')
 
-    logging.info('Running app database migrations...')
-    migration_cmd = [DJANGO, 'migrate', '--noinput', ]
-    fake_migration_cmd = migration_cmd + ['--fake']
-    smartdb_opts = ['--database=smart_manager', 'smart_manager']
+    def kernel_steps():
+        runner.run('set_def_kernel', lambda: set_def_kernel(logging),
+                   kernel_inputs)
+        try:
+            runner.run('delete_old_kernels',
+                       lambda: delete_old_kernels(logging), kernel_inputs)
+        except Exception as e:
+            logging.debug('Exception while deleting old kernels. Soft error. '
+                          'Moving on.')
+            logging.exception(e)
+
+    def flash_steps():
+        logging.info('Checking for flash and Running flash optimizations if '
+                     'appropriate.')
+        runner.run('flash_optimize',
+                   lambda: run_command([FLASH_OPTIMIZE, '-x'], throw=False),
+                   flash_inputs)
+
+    def db_steps():
+        logging.info('Running app database migrations...')
+        runner.run('migrate', lambda: migrate(logging), db_inputs)
+        logging.info('Done')
+        logging.info('Running prepdb...')
+        runner.run('prep_db', lambda: run_command([PREP_DB, ]),
+                   lambda: db_inputs(script_source('prep_db')))
+        logging.info('Done')
 
-    for app in ('storageadmin', 'smart_manager'):
-        db = 'default'
-        if app == 'smart_manager':
-            db = app
-        o, e, rc = run_command([DJANGO, 'migrate', '--list',
-                                '--database=%s' % db, app])
-        initial_faked = False
-        for l in o:
-            if l.strip() == '[X] 0001_initial':
-                initial_faked = True
-                break
-        if not initial_faked:
-            db_arg = '--database=%s' % db
-            run_command(fake_migration_cmd + [db_arg, app, '0001_initial'])
+    def firewalld_steps():
+        def stop_firewalld():
+            logging.info('stopping firewalld...')
+            run_command([SYSCTL, 'stop', 'firewalld'])
+            run_command([SYSCTL, 'disable', 'firewalld'])
+            logging.info('firewalld stopped and disabled')
+        runner.run('firewalld', stop_firewalld, firewalld_inputs)
+
+    # these don't depend on each other.
+    try:
+        failures = run_parallel(lambda f: f(), [kernel_steps, flash_steps,
+                                                db_steps, firewalld_steps],
+                                workers=4)
+    finally:
+        runner.save()
+    if (len(failures) > 0):
+        raise failures[0][1]
 
-    run_command(migration_cmd + ['storageadmin'])
-    run_command(migration_cmd + smartdb_opts)
-    run_command(migration_cmd + ['auth'])
-    run_command(migration_cmd + ['django_ztask'])
-    logging.info('Done')
-    logging.info('Running prepdb...')
-    run_command([PREP_DB, ])
-    logging.info('Done')
-
-    logging.info('stopping firewalld...')
-    run_command([SYSCTL, 'stop', 'firewalld'])
-    run_command([SYSCTL, 'disable', 'firewalld'])
-    logging.info('firewalld stopped and disabled')
     update_nginx(logging)
 
     shutil.copyfile('/etc/issue', '/etc/issue.rockstor')
@@ -440,6 +647,7 @@ def main():
 
     enable_rockstor_service(logging)
     enable_bootstrap_service(logging)
+    runner.report(time.time() - start)
 
 
 if __name__ == '__main__':
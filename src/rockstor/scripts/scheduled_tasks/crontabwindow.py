@@ -22,14 +22,17 @@ from datetime import datetime, time
 # snapshots and scrubs tasks
 
 
-def crontab_range(range):
+def crontab_range(range, now=None):
+    # now is an optional local datetime to evaluate the window against. The
+    # resident task scheduler passes in its tick time, cron scripts leave it
+    # to default to the current time.
     inrange = False
     # logger.debug('Crontab window is %s' % range)
     if (range == '*-*-*-*-*-*'):
         # on range value equal to always (*-*-*-*-*-*), always exec tasks
         inrange = True
     else:
-        today = datetime.today()
+        today = now if now is not None else datetime.today()
         today_time = today.time()
         today_weekday = today.weekday()
         range_windows = range.split('-')
@@ -46,6 +46,57 @@ def update_state(t, pool, aw):
     return t.state
 
 
+def run_task(tdo, aw, record=None):
+    """
+    Start a scrub for the given TaskDefinition and follow it to a terminal
+    state. Shared by the st-pool-scrub cron script and the resident task
+    scheduler. The Task row is saved as the scrub progresses so record is
+    accepted for interface parity only.
+    :param tdo: TaskDefinition object of task_type scrub.
+    :param aw: APIWrapper instance to talk to the REST API with.
+    """
+    if (tdo.task_type != 'scrub'):
+        return logger.error('task_type(%s) is not scrub.' % tdo.task_type)
+    meta = json.loads(tdo.json_meta)
+
+    if (Task.objects.filter(task_def=tdo).exists()):
+        ll = Task.objects.filter(task_def=tdo).order_by('-id')[0]
+        if ll.state not in TERMINAL_SCRUB_STATES:
+            logger.debug('Non terminal state(%s) for task(%d). Checking '
+                         'again.' % (ll.state, tdo.id))
+            cur_state = update_state(ll, meta['pool'], aw)
+            if cur_state not in TERMINAL_SCRUB_STATES:
+                return logger.debug('Non terminal state(%s) for task(%d). '
+                                    'A new task will not be run.' %
+                                    (cur_state, tdo.id))
+
+    now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=utc)
+    t = Task(task_def=tdo, state='started', start=now)
+    url = ('pools/%s/scrub' % meta['pool'])
+    try:
+        aw.api_call(url, data=None, calltype='post', save_error=False)
+        logger.debug('Started scrub at %s' % url)
+        t.state = 'running'
+    except Exception as e:
+        logger.error('Failed to start scrub at %s' % url)
+        t.state = 'error'
+        logger.exception(e)
+    finally:
+        t.save()
+
+    while True:
+        cur_state = update_state(t, meta['pool'], aw)
+        if cur_state in TERMINAL_SCRUB_STATES:
+            logger.debug('task(%d) finished with state(%s).' %
+                         (tdo.id, cur_state))
+            t.end = datetime.utcnow().replace(tzinfo=utc)
+            t.save()
+            break
+        logger.debug('pending state(%s) for scrub task(%d). Will check '
+                     'again in 60 seconds.' % (cur_state, tdo.id))
+        time.sleep(60)
+
+
 def main():
     tid = int(sys.argv[1])
     cwindow = sys.argv[2] if len(sys.argv) > 2 else '*-*-*-*-*-*'
@@ -53,47 +104,7 @@ def main():
         # Performance note: immediately check task execution time/day window
         # range to avoid other calls
         tdo = TaskDefinition.objects.get(id=tid)
-        if (tdo.task_type != 'scrub'):
-            return logger.error('task_type(%s) is not scrub.' % tdo.task_type)
-        meta = json.loads(tdo.json_meta)
-        aw = APIWrapper()
-
-        if (Task.objects.filter(task_def=tdo).exists()):
-            ll = Task.objects.filter(task_def=tdo).order_by('-id')[0]
-            if ll.state not in TERMINAL_SCRUB_STATES:
-                logger.debug('Non terminal state(%s) for task(%d). Checking '
-                             'again.' % (ll.state, tid))
-                cur_state = update_state(ll, meta['pool'], aw)
-                if cur_state not in TERMINAL_SCRUB_STATES:
-                    return logger.debug('Non terminal state(%s) for task(%d). '
-                                        'A new task will not be run.' %
-                                        (cur_state, tid))
-
-        now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=utc)
-        t = Task(task_def=tdo, state='started', start=now)
-        url = ('pools/%s/scrub' % meta['pool'])
-        try:
-            aw.api_call(url, data=None, calltype='post', save_error=False)
-            logger.debug('Started scrub at %s' % url)
-            t.state = 'running'
-        except Exception as e:
-            logger.error('Failed to start scrub at %s' % url)
-            t.state = 'error'
-            logger.exception(e)
-        finally:
-            t.save()
-
-        while True:
-            cur_state = update_state(t, meta['pool'], aw)
-            if cur_state in TERMINAL_SCRUB_STATES:
-                logger.debug('task(%d) finished with state(%s).' %
-                             (tid, cur_state))
-                t.end = datetime.utcnow().replace(tzinfo=utc)
-                t.save()
-                break
-            logger.debug('pending state(%s) for scrub task(%d). Will check '
-                         'again in 60 seconds.' % (cur_state, tid))
-            time.sleep(60)
+        run_task(tdo, APIWrapper())
     else:
         logger.debug('Cron scheduled task not executed because outside '
                      'time/day window ranges')
@@ -33,6 +33,73 @@ def validate_shutdown_meta(meta):
     return meta
 
 
+def run_task(tdo, aw, record=None):
+    """
+    Schedule a system reboot, shutdown or suspend for the given
+    TaskDefinition. Shared by the st-system-power cron script and the
+    resident task scheduler.
+    :param tdo: TaskDefinition object of task_type reboot, shutdown or
+    suspend.
+    :param aw: APIWrapper instance to talk to the REST API with.
+    :param record: optional callable that persists the resulting Task. The
+    Task is saved directly when it is None.
+    """
+    if (tdo.task_type not in ['reboot', 'shutdown', 'suspend']):
+        logger.error('task_type(%s) is not a system reboot, '
+                     'shutdown or suspend.' % tdo.task_type)
+        return
+    meta = json.loads(tdo.json_meta)
+    validate_shutdown_meta(meta)
+
+    now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=utc)
+    schedule = now + timedelta(minutes=3)
+    t = Task(task_def=tdo, state='scheduled', start=now, end=schedule)
+
+    try:
+        # set default command url before checking if it's a shutdown
+        # and if we have an rtc wake up
+        url = ('commands/%s' % tdo.task_type)
+
+        # if task_type is shutdown and rtc wake up true
+        # parse crontab hour & minute vs rtc hour & minute to state
+        # if wake will occur same day or next day, finally update
+        # command url adding wake up epoch time
+        if (tdo.task_type in ['shutdown', 'suspend'] and meta['wakeup']):
+            crontab_fields = tdo.crontab.split()
+            crontab_time = (int(crontab_fields[1]) * 60 +
+                            int(crontab_fields[0]))
+            wakeup_time = meta['rtc_hour'] * 60 + meta['rtc_minute']
+            # rtc wake up requires UTC epoch, but users on WebUI set time
+            # thinking to localtime, so first we set wake up time,
+            # update it if wake up is on next day, finally move it to UTC
+            # and get its epoch
+            epoch = datetime.now().replace(hour=int(meta['rtc_hour']),
+                                           minute=int(meta['rtc_minute']),
+                                           second=0, microsecond=0)
+            # if wake up < crontab time wake up will run next day
+            if (crontab_time > wakeup_time):
+                epoch += timedelta(days=1)
+
+            epoch = epoch.strftime('%s')
+            url = ('%s/%s' % (url, epoch))
+
+        aw.api_call(url, data=None, calltype='post', save_error=False)
+        logger.debug('System %s scheduled' % tdo.task_type)
+        t.state = 'finished'
+
+    except Exception as e:
+        t.state = 'failed'
+        logger.error('Failed to schedule system %s' % tdo.task_type)
+        logger.exception(e)
+
+    finally:
+        # t.end = datetime.utcnow().replace(tzinfo=utc)
+        if (record is None):
+            t.save()
+        else:
+            record(t)
+
+
 def main():
     tid = int(sys.argv[1])
     cwindow = sys.argv[2] if len(sys.argv) > 2 else '*-*-*-*-*-*'
@@ -40,59 +107,7 @@ def main():
         # Performance note: immediately check task execution time/day window
         # range to avoid other calls
         tdo = TaskDefinition.objects.get(id=tid)
-        aw = APIWrapper()
-        if (tdo.task_type not in ['reboot', 'shutdown', 'suspend']):
-            logger.error('task_type(%s) is not a system reboot, '
-                         'shutdown or suspend.' % tdo.task_type)
-            return
-        meta = json.loads(tdo.json_meta)
-        validate_shutdown_meta(meta)
-
-        now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=utc)
-        schedule = now + timedelta(minutes=3)
-        t = Task(task_def=tdo, state='scheduled', start=now, end=schedule)
-
-        try:
-            # set default command url before checking if it's a shutdown
-            # and if we have an rtc wake up
-            url = ('commands/%s' % tdo.task_type)
-
-            # if task_type is shutdown and rtc wake up true
-            # parse crontab hour & minute vs rtc hour & minute to state
-            # if wake will occur same day or next day, finally update
-            # command url adding wake up epoch time
-            if (tdo.task_type in ['shutdown', 'suspend'] and meta['wakeup']):
-                crontab_fields = tdo.crontab.split()
-                crontab_time = (int(crontab_fields[1]) * 60 +
-                                int(crontab_fields[0]))
-                wakeup_time = meta['rtc_hour'] * 60 + meta['rtc_minute']
-                # rtc wake up requires UTC epoch, but users on WebUI set time
-                # thinking to localtime, so first we set wake up time,
-                # update it if wake up is on next day, finally move it to UTC
-                # and get its epoch
-                epoch = datetime.now().replace(hour=int(meta['rtc_hour']),
-                                               minute=int(meta['rtc_minute']),
-                                               second=0, microsecond=0)
-                # if wake up < crontab time wake up will run next day
-                if (crontab_time > wakeup_time):
-                    epoch += timedelta(days=1)
-
-                epoch = epoch.strftime('%s')
-                url = ('%s/%s' % (url, epoch))
-
-            aw.api_call(url, data=None, calltype='post', save_error=False)
-            logger.debug('System %s scheduled' % tdo.task_type)
-            t.state = 'finished'
-
-        except Exception as e:
-            t.state = 'failed'
-            logger.error('Failed to schedule system %s' % tdo.task_type)
-            logger.exception(e)
-
-        finally:
-            # t.end = datetime.utcnow().replace(tzinfo=utc)
-            t.save()
-
+        run_task(tdo, APIWrapper())
     else:
         logger.debug('Cron scheduled task not executed because outside '
                      'time/day window ranges')
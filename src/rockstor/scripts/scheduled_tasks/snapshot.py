@@ -18,9 +18,10 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import sys
 import json
+import urllib
 from datetime import datetime
 import crontabwindow  # load crontabwindow module
-from storageadmin.models import (Share, Snapshot)
+from storageadmin.models import Share
 from smart_manager.models import (Task, TaskDefinition)
 from cli.api_wrapper import APIWrapper
 from django.utils.timezone import utc
@@ -61,24 +62,90 @@ def validate_snap_meta(meta):
 
 
 # Deletes overflowing snapshots beyond max_count sorted by their id(implicitly
-# create time). stop on first failure. Can be called safely with < max_count
-# snapshots, just returns true in that case.
+# create time) with a single bulk delete call. Can be called safely with <
+# max_count snapshots, just returns true in that case.
 def delete(aw, share, snap_type, prefix, max_count):
-    snapshots = Snapshot.objects.filter(
-        share=share, snap_type=snap_type,
-        name__startswith=prefix).order_by('-id')
-    for snap in snapshots[max_count:]:
-        try:
-            url = ('shares/{}/snapshots/{}'.format(share.id, snap.name))
-            aw.api_call(url, data=None, calltype='delete', save_error=False)
-        except Exception as e:
-            logger.error('Failed to delete old snapshots exceeding the '
-                         'maximum count(%d)' % max_count)
-            logger.exception(e)
-            return False
+    try:
+        url = ('shares/{}/snapshots?{}'.format(share.id, urllib.urlencode(
+            [('snap_type', snap_type), ('prefix', prefix),
+             ('keep', max_count), ])))
+        aw.api_call(url, data=None, calltype='delete', save_error=False)
+    except Exception as e:
+        logger.error('Failed to delete old snapshots exceeding the '
+                     'maximum count(%d)' % max_count)
+        logger.exception(e)
+        return False
     return True
 
 
+def run_task(tdo, aw, record=None):
+    """
+    Run one snapshot task for the given TaskDefinition. Shared by the
+    st-snapshot cron script and the resident task scheduler.
+    :param tdo: TaskDefinition object of task_type snapshot.
+    :param aw: APIWrapper instance to talk to the REST API with.
+    :param record: optional callable that persists the resulting Task. The
+    Task is saved directly when it is None.
+    """
+    if (tdo.task_type != 'snapshot'):
+        logger.error('task_type(%s) is not snapshot.' % tdo.task_type)
+        return
+    stype = 'task_scheduler'
+    meta = json.loads(tdo.json_meta)
+    validate_snap_meta(meta)
+
+    # to keep backwards compatibility, allow for share to be either
+    # name or id and migrate the metadata. To be removed in #1854
+    try:
+        share = Share.objects.get(id=meta['share'])
+    except ValueError:
+        share = Share.objects.get(name=meta['share'])
+        meta['share'] = share.id
+        tdo.json_meta = json.dumps(meta)
+        tdo.save()
+
+    max_count = int(float(meta['max_count']))
+    prefix = ('%s_' % meta['prefix'])
+
+    now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=utc)
+    t = Task(task_def=tdo, state='started', start=now)
+
+    snap_created = False
+    t.state = 'error'
+    try:
+        name = ('%s_%s'
+                % (meta['prefix'],
+                   datetime.now().strftime(settings.SNAP_TS_FORMAT)))
+        url = ('shares/{}/snapshots/{}'.format(share.id, name))
+        # only create a new snap if there's no overflow situation. This
+        # prevents runaway snapshot creation beyond max_count+1.
+        if(delete(aw, share, stype, prefix, max_count)):
+            data = {'snap_type': stype,
+                    'uvisible': meta['visible'],
+                    'writable': meta['writable'], }
+            headers = {'content-type': 'application/json'}
+            aw.api_call(url, data=data, calltype='post', headers=headers,
+                        save_error=False)
+            logger.debug('created snapshot at %s' % url)
+            t.state = 'finished'
+            snap_created = True
+    except Exception as e:
+        logger.error('Failed to create snapshot at %s' % url)
+        logger.exception(e)
+    finally:
+        t.end = datetime.utcnow().replace(tzinfo=utc)
+        if (record is None):
+            t.save()
+        else:
+            record(t)
+
+    # best effort pruning without erroring out. If deletion fails, we'll
+    # have max_count+1 number of snapshots and it would be dealt with on
+    # the next round.
+    if (snap_created):
+        delete(aw, share, stype, prefix, max_count)
+
+
 def main():
     tid = int(sys.argv[1])
     cwindow = sys.argv[2] if len(sys.argv) > 2 else '*-*-*-*-*-*'
@@ -86,61 +153,7 @@ def main():
         # Performance note: immediately check task execution time/day window
         # range to avoid other calls
         tdo = TaskDefinition.objects.get(id=tid)
-        stype = 'task_scheduler'
-        aw = APIWrapper()
-        if (tdo.task_type != 'snapshot'):
-            logger.error('task_type(%s) is not snapshot.' % tdo.task_type)
-            return
-        meta = json.loads(tdo.json_meta)
-        validate_snap_meta(meta)
-
-        # to keep backwards compatibility, allow for share to be either
-        # name or id and migrate the metadata. To be removed in #1854
-        try:
-            share = Share.objects.get(id=meta['share'])
-        except ValueError:
-            share = Share.objects.get(name=meta['share'])
-            meta['share'] = share.id
-            tdo.json_meta = json.dumps(meta)
-            tdo.save()
-
-        max_count = int(float(meta['max_count']))
-        prefix = ('%s_' % meta['prefix'])
-
-        now = datetime.utcnow().replace(second=0, microsecond=0, tzinfo=utc)
-        t = Task(task_def=tdo, state='started', start=now)
-
-        snap_created = False
-        t.state = 'error'
-        try:
-            name = ('%s_%s'
-                    % (meta['prefix'],
-                       datetime.now().strftime(settings.SNAP_TS_FORMAT)))
-            url = ('shares/{}/snapshots/{}'.format(share.id, name))
-            # only create a new snap if there's no overflow situation. This
-            # prevents runaway snapshot creation beyond max_count+1.
-            if(delete(aw, share, stype, prefix, max_count)):
-                data = {'snap_type': stype,
-                        'uvisible': meta['visible'],
-                        'writable': meta['writable'], }
-                headers = {'content-type': 'application/json'}
-                aw.api_call(url, data=data, calltype='post', headers=headers,
-                            save_error=False)
-                logger.debug('created snapshot at %s' % url)
-                t.state = 'finished'
-                snap_created = True
-        except Exception as e:
-            logger.error('Failed to create snapshot at %s' % url)
-            logger.exception(e)
-        finally:
-            t.end = datetime.utcnow().replace(tzinfo=utc)
-            t.save()
-
-        # best effort pruning without erroring out. If deletion fails, we'll
-        # have max_count+1 number of snapshots and it would be dealt with on
-        # the next round.
-        if (snap_created):
-            delete(aw, share, stype, prefix, max_count)
+        run_task(tdo, APIWrapper())
     else:
         logger.debug('Cron scheduled task not executed because outside '
                      'time/day window ranges')
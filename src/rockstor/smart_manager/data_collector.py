@@ -31,23 +31,22 @@ from geventwebsocket.handler import WebSocketHandler  # noqa E402
 
 from gevent.subprocess import Popen, PIPE  # noqa E402
 from os import path  # noqa E402
-from sys import getsizeof  # noqa E402
+from system.log_reader import (read_page, format_page)  # noqa E402
+from system.disk_attributes import poll_disks  # noqa E402
+from system.network import NMMonitor  # noqa E402
 from glob import glob  # noqa E402
 
-from system.pinmanager import (has_pincard, username_to_uid,  # noqa E402
-                               email_notification_enabled, reset_random_pins,
-                               generate_otp)
-
 from django.conf import settings  # noqa E402
 from system.osi import uptime, kernel_info, get_byid_name_map  # noqa E402
 from datetime import (datetime, timedelta)  # noqa E402
 import time  # noqa E402
 from django.utils.timezone import utc  # noqa E402
-from storageadmin.models import Disk  # noqa E402
+from django.db.models import Q  # noqa E402
+from storageadmin.models import (Disk, Job)  # noqa E402
 from smart_manager.models import Service  # noqa E402
-from system.services import service_status  # noqa E402
+from system.services import (service_status,  # noqa E402
+                             service_statuses)
 from cli.api_wrapper import APIWrapper  # noqa E402
-from system.pkg_mgmt import (update_check, yum_check)  # noqa E402
 import logging  # noqa E402
 logger = logging.getLogger(__name__)
 
@@ -115,6 +114,11 @@ class PincardManagerNamespace(RockstorIO):
     def on_haspincard(self, sid, user):
 
         def check_has_pincard(user):
+            # imported on first use to keep the data collector's startup
+            # light, as for pkg_mgmt below.
+            from system.pinmanager import (has_pincard, username_to_uid,
+                                           email_notification_enabled,
+                                           reset_random_pins, generate_otp)
 
             pins = []
             otp = False
@@ -219,19 +223,8 @@ class LogManagerNamespace(RockstorIO):
     samba_subd_logs = '%ssamba/' % system_logs
     nginx_subd_logs = '%snginx/' % system_logs
 
+    # Commands of the live readers, the others are paged by on_readlog.
     readers = {
-        'cat': {
-            'command': '/usr/bin/cat',
-            'args': '-n'
-        },
-        'tail200': {
-            'command': '/usr/bin/tail',
-            'args': '-n 200'
-        },
-        'tail30': {
-            'command': '/usr/bin/tail',
-            'args': '-n 30'
-        },
         'tailf': {
             'command': '/usr/bin/tail',
             'args': '-f'
@@ -417,13 +410,32 @@ class LogManagerNamespace(RockstorIO):
 
         self.spawn(logs_downloader, sid, logs_queued, recipient)
 
-    def on_readlog(self, sid, reader, logfile):
+    def on_readlog(self, sid, reader, logfile, options=None):
+        """
+        Serve logfile with reader. Logs are paged from disk, never read
+        whole: tail readers send the last page only and cat streams pages
+        from the start. Optional options dict from the client:
+        offset: byte offset to page from, as returned with each page.
+        line: line number to page from (forward only).
+        reverse: page backwards from offset (default EOF), like tail does.
+        lines: max number of lines (window) to serve.
+        filter: only serve lines containing this, or matching it as a
+        regex when regex is true.
+        """
 
         logs_loader = {
             'slow': {'lines': 200, 'sleep': 0.50},
             'fast': {'lines': 1, 'sleep': 0.05},
         }
 
+        # paging options of the static readers, see self.readers for the
+        # live one.
+        page_readers = {
+            'cat': {'reverse': False, 'lines': None},
+            'tail200': {'reverse': True, 'lines': 200},
+            'tail30': {'reverse': True, 'lines': 30},
+        }
+
         def valid_log(logfile):
             # If file exist and size greater than 0 return true
             # else false and avoid processing
@@ -443,58 +455,87 @@ class LogManagerNamespace(RockstorIO):
             command.append(log_path)
             return command
 
-        def static_reader(reader, log_path):
-            if (valid_log(log_path)):
-                # Log file exist and greater than 0, perform data collecting
-
-                # Build reader command
-                read_command = build_reader_command(reader)
-
-                # Define popen process and once completed split stdout by lines
-                reader_process = Popen(read_command, bufsize=1, stdout=PIPE)
-                log_content = reader_process.communicate()[0]
-                log_contentsize = getsizeof(log_content)
-                log_content = log_content.splitlines(True)
-
-                # Starting from content num of lines decide if serve it 1
-                # line/time or in 200 lines chunks
-                reader_type = 'fast' if (len(log_content) <= 200) else 'slow'
-                chunk_size = logs_loader[reader_type]['lines']
-                reader_sleep = logs_loader[reader_type]['sleep']
-                log_content_chunks = [log_content[x:x+chunk_size] for x in
-                                      xrange(0, len(log_content), chunk_size)]  # noqa F821
-                total_rows = len(log_content)
-
-            else:  # Log file missing or size 0, gently inform user
+        def emit_content(current_rows, total_rows, chunk_content,
+                         content_size, page=None):
+            data = {
+                'current_rows': current_rows,
+                'total_rows': total_rows,
+                'chunk_content': chunk_content,
+                'content_size': content_size,
+            }
+            if (page is not None):
+                # let the client page on from where we stopped.
+                data.update({'offset': page['offset'],
+                             'next_offset': page['next_offset'],
+                             'eof': page['eof'], })
+            self.emit('logcontent',
+                      {
+                          'key': 'logManager:logcontent',
+                          'data': data,
+                      })
 
+        def static_reader(reader, log_path, options):
+            if (not valid_log(log_path)):
                 # Log not exist or empty so we send fake values for rows,
                 # chunks, etc to uniform data on existing functions and avoid
                 # client side extra checks
                 log_content = 'Selected log file is empty or doesn\'t exist'
-                log_content = log_content.splitlines(True)
-                total_rows = 1
-                log_contentsize = getsizeof(log_content)
-                log_content_chunks = []
-                log_content_chunks.append(log_content)
-                reader_sleep = 0
-
-            # Serve each chunk with emit and sleep before next one to avoid
-            # client side browser overload
-            current_rows = 0
-
-            for data_chunks in log_content_chunks:
-                chunk_content = ''.join(data_chunks)
-                current_rows += len(data_chunks)
-                self.emit('logcontent',
-                          {
-                              'key': 'logManager:logcontent',
-                              'data': {
-                                  'current_rows': current_rows,
-                                  'total_rows': total_rows,
-                                  'chunk_content': chunk_content,
-                                  'content_size': log_contentsize
-                              }
-                          })
+                return emit_content(1, 1, log_content, len(log_content))
+
+            opts = dict(page_readers[reader])
+            opts.update(options or {})
+            reverse = opts.get('reverse', False)
+            window = opts.get('lines')
+            content_size = path.getsize(log_path)
+            page_args = {
+                'offset': opts.get('offset'),
+                'line': opts.get('line'),
+                'reverse': reverse,
+                'pattern': opts.get('filter'),
+                'regex': opts.get('regex', False),
+            }
+            if (reverse or (window is not None and
+                            window <= logs_loader['slow']['lines'])):
+                # A single page, served at once.
+                try:
+                    page = read_page(log_path, lines=window or 200,
+                                     **page_args)
+                except Exception as e:
+                    return emit_content(1, 1, e.__str__(), 0)
+                return emit_content(1, 1, format_page(page), content_size,
+                                    page)
+
+            # Stream the window, or the whole log, a page at a time so only
+            # a page is held in memory. Progress is in bytes as the number of
+            # rows isn't known without reading the whole log first.
+            chunk_size = logs_loader['slow']['lines']
+            reader_sleep = logs_loader['slow']['sleep']
+            if (content_size <= 200 * 80):
+                # small log, serve it 1 line/time like before.
+                chunk_size = logs_loader['fast']['lines']
+                reader_sleep = logs_loader['fast']['sleep']
+            served = 0
+            while True:
+                lines = chunk_size
+                if (window is not None):
+                    lines = min(lines, window - served)
+                try:
+                    page = read_page(log_path, lines=lines, **page_args)
+                except Exception as e:
+                    return emit_content(1, 1, e.__str__(), 0)
+                served += len(page['lines'])
+                done = (page['eof'] or
+                        (window is not None and served >= window))
+                current = (content_size if done else
+                           min(page['next_offset'], content_size - 1))
+                emit_content(current, content_size, format_page(page),
+                             content_size, page)
+                if (done):
+                    break
+                # next page by byte offset, keeping cat -n line numbers.
+                page_args.update({'offset': page['next_offset'],
+                                  'line': None,
+                                  'lineno': page['next_line'], })
                 gevent.sleep(reader_sleep)
 
         def live_reader(log_path):
@@ -525,7 +566,7 @@ class LogManagerNamespace(RockstorIO):
         if (reader == 'tailf'):
             self.spawn(live_reader, sid, log_path)
         else:
-            self.spawn(static_reader, sid, reader, log_path)
+            self.spawn(static_reader, sid, reader, log_path, options)
 
     def on_getfilesize(self, sid, logfile):
 
@@ -807,7 +848,7 @@ class ServicesNamespace(RockstorIO):
 
         while self.start:
 
-            data = {}
+            services = []
             for service in Service.objects.all():
                 config = None
                 if (service.config is not None):
@@ -817,10 +858,18 @@ class ServicesNamespace(RockstorIO):
                         logger.error('Exception while loading config of '
                                      'Service(%s): %s' %
                                      (service.name, e.__str__()))
-                data[service.name] = {}
-                output, error, return_code = service_status(service.name,
-                                                            config=config)
-                data[service.name]['running'] = return_code
+                services.append((service.name, config))
+            # one batched query shared by all connected clients.
+            try:
+                statuses = service_statuses(services)
+            except Exception as e:
+                logger.error('Exception while querying service statuses: '
+                             '%s' % e.__str__())
+                gevent.sleep(15)
+                continue
+            data = {}
+            for name, return_code in statuses.items():
+                data[name] = {'running': return_code}
 
             self.emit('get_services', {
                 'data': data, 'key': 'services:get_services'
@@ -828,6 +877,49 @@ class ServicesNamespace(RockstorIO):
             gevent.sleep(15)
 
 
+class JobsNamespace(RockstorIO):
+
+    start = False
+
+    def on_connect(self, sid, environ):
+
+        self.emit('connected', {
+            'key': 'jobs:connected', 'data': 'connected'
+        })
+        self.start = True
+        self.spawn(self.send_job_progress, sid)
+
+    def on_disconnect(self, sid):
+
+        self.cleanup(sid)
+        self.start = False
+
+    def send_job_progress(self):
+
+        # Stream progress of pending and running jobs, and their outcome
+        # once they are done, emitting only when something changed.
+        fields = ('id', 'name', 'pool_id', 'status', 'percent_done',
+                  'message', 'cancel_requested')
+        # Polled every second while jobs are pending or running, backing
+        # off to every 10 seconds while there are none.
+        watched = set()
+        last = None
+        interval = 1
+        while self.start:
+            jobs = list(Job.objects.filter(
+                Q(status__in=('pending', 'running')) |
+                Q(id__in=watched)).order_by('id').values(*fields))
+            watched = set(j['id'] for j in jobs if
+                          j['status'] in ('pending', 'running'))
+            if (jobs != last):
+                self.emit('job_progress', {
+                    'key': 'jobs:job_progress', 'data': {'jobs': jobs}
+                })
+                last = jobs
+            interval = 1 if (len(watched) > 0) else min(interval * 2, 10)
+            gevent.sleep(interval)
+
+
 class SysinfoNamespace(RockstorIO):
 
     start = False
@@ -927,6 +1019,7 @@ class SysinfoNamespace(RockstorIO):
             gevent.sleep(60)
 
     def update_check(self):
+        from system.pkg_mgmt import update_check
 
         uinfo = update_check()
         self.emit('software_update',
@@ -936,6 +1029,7 @@ class SysinfoNamespace(RockstorIO):
                   })
 
     def yum_updates(self):
+        from system.pkg_mgmt import yum_check
 
         while self.start:
             rc, packages = yum_check()
@@ -996,6 +1090,20 @@ class SysinfoNamespace(RockstorIO):
             gevent.sleep(30)
 
 
+def poll_disk_attributes():
+    """
+    Keep the cached hdparm related attributes of the attached disks, see
+    system/disk_attributes.py, up to date. Runs regardless of clients.
+    """
+    while True:
+        try:
+            poll_disks([d.name for d in Disk.objects.attached()])
+        except Exception as e:
+            logger.error('Failed to poll disk attributes. exception: %s'
+                         % e.__str__())
+        gevent.sleep(settings.DISK_POLLER['tick'])
+
+
 def main():
 
     # Reference to new python-socket-io lib:
@@ -1005,6 +1113,7 @@ def main():
     # on github repo
     sio_namespaces = [
         ServicesNamespace('/services'),
+        JobsNamespace('/jobs'),
         SysinfoNamespace('/sysinfo'),
         CPUWidgetNamespace('/cpu_widget'),
         MemoryWidgetNamespace('/memory_widget'),
@@ -1017,6 +1126,13 @@ def main():
     for namespace in sio_namespaces:
         sio_server.register_namespace(namespace)
     app = socketio.Middleware(sio_server)
+    gevent.spawn(poll_disk_attributes)
+    # the one nmcli monitor, see system/network.py connections().
+    nm_monitor = NMMonitor(settings.NM_MONITOR['state_file'])
+    gevent.spawn(nm_monitor.run)
     logger.debug('Python-socketio listening on port http://127.0.0.1:8001')
-    pywsgi.WSGIServer(('', 8001), app,
-                      handler_class=WebSocketHandler).serve_forever()
+    try:
+        pywsgi.WSGIServer(('', 8001), app,
+                          handler_class=WebSocketHandler).serve_forever()
+    finally:
+        nm_monitor.stop()
@@ -0,0 +1,169 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import signal
+import threading
+import time
+from datetime import datetime
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.timezone import utc
+from storageadmin.models import Job
+# importing the views registers their job handlers.
+import storageadmin.views  # noqa F401
+from storageadmin.views.job_helpers import (execute_job, JobCancelled)
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    return datetime.utcnow().replace(tzinfo=utc)
+
+
+class JobRunner(object):
+    """
+    Runs the Jobs submitted by the API (see storageadmin.views.job_helpers)
+    on a bounded pool of worker threads. Jobs sharing a serial key, ie of
+    the same pool, run one at a time in submission order while jobs of
+    different pools run in parallel.
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'JOB_RUNNER', {})
+        self.num_workers = config.get('workers', 4)
+        self.poll_interval = config.get('poll_interval', 1)
+        self.cv = threading.Condition()
+        self.queue = []  # claimed jobs not yet picked up by a worker.
+        self.busy = set()  # serial keys of claimed or running jobs.
+        self.workers = []
+        self.stopping = False
+
+    @staticmethod
+    def recover():
+        """
+        Jobs left running by a previous instance can't be resumed, we have
+        no way of knowing how far they got.
+        """
+        n = Job.objects.filter(status='running').update(
+            status='failed', end_time=_now(),
+            message='Interrupted by a restart of the job-runner service.')
+        if (n > 0):
+            logger.error('Marked %d interrupted job(s) as failed.' % n)
+
+    def claim(self):
+        """
+        Claim the oldest pending job of every idle serial key, up to the
+        number of idle workers.
+        """
+        with self.cv:
+            free = self.num_workers - len(self.busy)
+            busy = set(self.busy)
+        if (free <= 0):
+            return
+        claimed = []
+        for job in Job.objects.filter(status='pending').order_by('id'):
+            if (len(claimed) == free):
+                break
+            if (job.serial_key in busy):
+                continue
+            busy.add(job.serial_key)
+            # conditional so a concurrent cancel of a pending job wins.
+            if (Job.objects.filter(id=job.id, status='pending').update(
+                    status='running', start_time=_now()) == 1):
+                claimed.append(job)
+        if (len(claimed) > 0):
+            with self.cv:
+                for job in claimed:
+                    self.busy.add(job.serial_key)
+                    self.queue.append(job)
+                self.cv.notify_all()
+
+    def _next(self):
+        with self.cv:
+            while (not self.stopping):
+                if (len(self.queue) > 0):
+                    return self.queue.pop(0)
+                self.cv.wait(1)
+        return None
+
+    def _done(self, job):
+        with self.cv:
+            self.busy.discard(job.serial_key)
+            self.cv.notify_all()
+
+    @staticmethod
+    def _finish(job, status, message=None):
+        fields = {'status': status, 'end_time': _now(), }
+        if (status == 'finished'):
+            fields['percent_done'] = 100
+        if (message is not None):
+            fields['message'] = message[:1024]
+        Job.objects.filter(id=job.id).update(**fields)
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if (job is None):
+                return
+            try:
+                logger.debug('Running job(%d) %s.' % (job.id, job.name))
+                execute_job(job)
+                self._finish(job, 'finished')
+            except JobCancelled as e:
+                logger.debug(e.__str__())
+                self._finish(job, 'cancelled', e.__str__())
+            except Exception as e:
+                logger.error('Job(%d) %s failed. Exception: %s' %
+                             (job.id, job.name, e.__str__()))
+                logger.exception(e)
+                self._finish(job, 'failed', e.__str__())
+            finally:
+                self._done(job)
+                close_old_connections()
+
+    def stop(self, *args):
+        logger.debug('Stopping the job runner.')
+        with self.cv:
+            self.stopping = True
+            self.cv.notify_all()
+
+    def run(self):
+        self.recover()
+        for i in range(self.num_workers):
+            w = threading.Thread(target=self._work, name='job-worker-%d' % i)
+            w.daemon = True
+            w.start()
+            self.workers.append(w)
+        logger.debug('Job runner started with %d workers.' %
+                     self.num_workers)
+        while (not self.stopping):
+            try:
+                self.claim()
+            except Exception as e:
+                logger.error('Failed to claim pending jobs. Exception: %s' %
+                             e.__str__())
+            finally:
+                close_old_connections()
+            time.sleep(self.poll_interval)
+
+
+def main():
+    jr = JobRunner()
+    signal.signal(signal.SIGTERM, jr.stop)
+    signal.signal(signal.SIGINT, jr.stop)
+    jr.run()
@@ -27,7 +27,7 @@ import time
 from django.conf import settings
 from contextlib import contextmanager
 from util import ReplicationMixin
-from fs.btrfs import (get_oldest_snap, is_subvol)
+from fs.btrfs import is_subvol
 from smart_manager.models import ReplicaTrail
 from cli import APIWrapper
 from django import db
@@ -123,16 +123,14 @@ class Sender(ReplicationMixin, Process):
                           command, rcommand))
         return rcommand, rmsg
 
-    def _delete_old_snaps(self, share_path):
-        oldest_snap = get_oldest_snap(share_path, self.max_snap_retain,
-                                      regex='_replication_')
-        if (oldest_snap is not None):
-            logger.debug('Id: %s. Deleting old snapshot: %s'
-                         % (self.identity, oldest_snap))
-            self.msg = ('Failed to delete snapshot: %s. Aborting.' %
-                        oldest_snap)
-            if (self.delete_snapshot(self.replica.share, oldest_snap)):
-                return self._delete_old_snaps(share_path)
+    def _delete_old_snaps(self):
+        prefix = ('%s_%d_replication_' % (self.replica.share,
+                                          self.replica.id))
+        deleted = self.prune_snapshots(self.replica.share, prefix,
+                                       'replication', self.max_snap_retain)
+        if (len(deleted.get('deleted', [])) > 0):
+            logger.debug('Id: %s. Deleted old snapshots: %s' %
+                         (self.identity, deleted['deleted']))
 
     def _refresh_rt(self):
         # for incremental sends, the receiver tells us the latest successful
@@ -213,10 +211,7 @@ class Sender(ReplicationMixin, Process):
             # prune old snapshots.
             self.update_trail = True
             self.msg = ('Failed to prune old snapshots')
-            share_path = ('%s%s/.snapshots/%s'
-                          % (settings.MNT_PT, self.replica.pool,
-                             self.replica.share))
-            self._delete_old_snaps(share_path)
+            self._delete_old_snaps()
 
             # Refresh replica trail.
             if (self.rt is not None):
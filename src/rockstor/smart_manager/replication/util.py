@@ -17,6 +17,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 import time
+import urllib
 from storageadmin.exceptions import RockStorAPIException
 from storageadmin.models import Appliance, Share
 from cli import APIWrapper
@@ -157,6 +158,17 @@ class ReplicationMixin(object):
                 return False
             raise e
 
+    def prune_snapshots(self, sname, prefix, snap_type, num_retain):
+        """
+        Delete all but the newest num_retain snapshots of the given share
+        whose name starts with prefix, in a single bulk delete call.
+        """
+        share = Share.objects.get(name=sname)
+        url = ('shares/%s/snapshots?%s' % (share.id, urllib.urlencode(
+            [('prefix', prefix), ('snap_type', snap_type),
+             ('keep', num_retain), ])))
+        return self.law.api_call(url, calltype='delete', save_error=False)
+
     def create_share(self, sname, pool):
         try:
             url = 'shares'
@@ -173,16 +185,18 @@ class ReplicationMixin(object):
 
     def refresh_snapshot_state(self):
         try:
-            return self.law.api_call('commands/refresh-snapshot-state',
-                                     data=None, calltype='post',
-                                     save_error=False)
+            # forced so we don't get a refresh from before our changes.
+            return self.law.api_call('commands/refresh-snapshot-state'
+                                     '?force=true', data=None,
+                                     calltype='post', save_error=False)
         except Exception as e:
             logger.error('Exception while refreshing Snapshot state: %s'
                          % e.__str__())
 
     def refresh_share_state(self):
         try:
-            return self.law.api_call('commands/refresh-share-state', data=None,
+            return self.law.api_call('commands/refresh-share-state'
+                                     '?force=true', data=None,
                                      calltype='post', save_error=False)
         except Exception as e:
             logger.error('Exception while refreshing Share state: %s'
@@ -0,0 +1,82 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Minimal evaluator for the 5 field crontab strings stored in
+# TaskDefinition.crontab so the resident task scheduler can decide in-process
+# which tasks are due instead of delegating to cron.
+
+FIELD_RANGES = ((0, 59),  # minute
+                (0, 23),  # hour
+                (1, 31),  # day of month
+                (1, 12),  # month
+                (0, 7),)  # day of week, 0 and 7 are both Sunday
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if ('/' in part):
+            part, step = part.split('/', 1)
+            step = int(step)
+            if (step < 1):
+                raise ValueError('Invalid step(%d) in crontab field(%s)' %
+                                 (step, field))
+        if (part == '*'):
+            start, stop = low, high
+        elif ('-' in part):
+            start, stop = [int(v) for v in part.split('-', 1)]
+        else:
+            start = int(part)
+            # a lone value with a step, eg 5/15, runs to the end of range.
+            stop = high if (step > 1) else start
+        if (start < low or stop > high or start > stop):
+            raise ValueError('Value out of range(%d-%d) in crontab field(%s)'
+                             % (low, high, field))
+        values.update(range(start, stop + 1, step))
+    return values
+
+
+class CronTab(object):
+
+    def __init__(self, crontab):
+        fields = crontab.split()
+        if (len(fields) != 5):
+            raise ValueError('crontab(%s) must have 5 fields' % crontab)
+        self.crontab = crontab
+        (self.minutes, self.hours, self.days, self.months,
+         self.weekdays) = [_parse_field(f, *FIELD_RANGES[i])
+                           for i, f in enumerate(fields)]
+        if (7 in self.weekdays):
+            self.weekdays.add(0)
+        # Per cron(5), when both day of month and day of week are restricted
+        # a match on either one is enough.
+        self.day_restricted = (fields[2] != '*')
+        self.weekday_restricted = (fields[4] != '*')
+
+    def match(self, dt):
+        if (dt.minute not in self.minutes or dt.hour not in self.hours or
+                dt.month not in self.months):
+            return False
+        # datetime weekday() is Monday based, cron is Sunday based.
+        weekday = (dt.weekday() + 1) % 7
+        day_match = dt.day in self.days
+        weekday_match = weekday in self.weekdays
+        if (self.day_restricted and self.weekday_restricted):
+            return day_match or weekday_match
+        return day_match and weekday_match
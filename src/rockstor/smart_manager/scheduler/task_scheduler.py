@@ -0,0 +1,331 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import signal
+import threading
+import time
+from collections import deque
+from datetime import (datetime, timedelta)
+from django.conf import settings
+from django.db import close_old_connections
+from smart_manager.models import (Task, TaskDefinition)
+from storageadmin.models import (EmailClient, Share)
+from scripts.scheduled_tasks import (crontabwindow, snapshot, pool_scrub,
+                                     reboot_shutdown)
+from cli import APIWrapper
+from system.email_util import email_root
+from cron import CronTab
+import logging
+logger = logging.getLogger(__name__)
+
+TASK_RUNNERS = {
+    'snapshot': snapshot.run_task,
+    'scrub': pool_scrub.run_task,
+    'reboot': reboot_shutdown.run_task,
+    'shutdown': reboot_shutdown.run_task,
+    'suspend': reboot_shutdown.run_task,
+}
+
+# Concurrency key for tasks that are not tied to a pool, ie system power.
+SYSTEM_KEY = 'system'
+
+# Task types that are followed to completion for a long time (a scrub polls
+# its pool every minute until it's done). They run on their own thread
+# instead of holding a worker.
+DEDICATED_TASK_TYPES = ('scrub', )
+
+# Max number of missed minutes evaluated after a slow tick or a clock jump,
+# so a resume from suspend doesn't fire a day's worth of tasks.
+MAX_CATCH_UP = 60
+
+
+class TaskLog(object):
+    """
+    Buffers finished Task rows and writes them with a single bulk_create
+    instead of one INSERT per task run.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.tasks = []
+
+    def __len__(self):
+        with self.lock:
+            return len(self.tasks)
+
+    def add(self, task):
+        with self.lock:
+            self.tasks.append(task)
+            full = len(self.tasks) >= self.batch_size
+        if (full):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            tasks, self.tasks = self.tasks, []
+        if (len(tasks) == 0):
+            return
+        try:
+            Task.objects.bulk_create(tasks)
+            logger.debug('Recorded %d task(s).' % len(tasks))
+        except Exception as e:
+            logger.error('Failed to record %d task(s). Exception: %s' %
+                         (len(tasks), e.__str__()))
+
+
+class TaskScheduler(object):
+    """
+    Resident replacement for the per task cron entries. Every minute the
+    enabled TaskDefinitions are evaluated against their crontab and
+    crontabwindow and the due ones are handed to a bounded pool of worker
+    threads. Tasks touching the same pool are limited to
+    TASK_SCHEDULER['pool_concurrency'] at a time and a TaskDefinition never
+    runs concurrently with itself. Scrubs, which are followed until they
+    finish, run on their own threads outside of the worker pool.
+
+    Finished Task rows are batched in a TaskLog that is flushed before new
+    tasks are dispatched and as soon as the last running task finishes, so
+    a burst of tasks is written with one insert without delaying the rows
+    of a lone task.
+    """
+
+    def __init__(self):
+        config = settings.TASK_SCHEDULER
+        self.num_workers = config.get('workers', 4)
+        self.pool_concurrency = config.get('pool_concurrency', 1)
+        self.flush_interval = config.get('task_flush_interval', 10)
+        self.task_log = TaskLog(config.get('task_batch_size', 50))
+        self.cv = threading.Condition()
+        self.pending = {}  # concurrency key -> deque of TaskDefinitions.
+        self.active = {}  # concurrency key -> number of running tasks.
+        self.running = set()  # ids of queued or running TaskDefinitions.
+        self.crontabs = {}  # TaskDefinition id -> CronTab.
+        self.workers = []
+        self.stopping = False
+        self.aw = None
+
+    def _crontab(self, td):
+        ct = self.crontabs.get(td.id)
+        if (ct is None or ct.crontab != td.crontab):
+            ct = CronTab(td.crontab)
+            self.crontabs[td.id] = ct
+        return ct
+
+    @staticmethod
+    def _concurrency_key(td, share_pools):
+        """
+        Return the key of the pool td works on, SYSTEM_KEY for tasks not
+        tied to a pool or None when its json_meta can't be parsed.
+        """
+        try:
+            meta = json.loads(td.json_meta)
+        except (TypeError, ValueError) as e:
+            logger.error('Ignoring task(%d) with invalid json_meta: %s' %
+                         (td.id, e.__str__()))
+            return None
+        if (not isinstance(meta, dict)):
+            logger.error('Ignoring task(%d) with invalid json_meta: %s' %
+                         (td.id, td.json_meta))
+            return None
+        if (td.task_type == 'scrub'):
+            return 'pool-%s' % meta.get('pool')
+        if (td.task_type == 'snapshot'):
+            share = meta.get('share')
+            pid = share_pools.get(int(share)) if (
+                '%s' % share).isdigit() else None
+            # unresolved shares fail validation in the runner, keep them
+            # apart from real pools.
+            return 'pool-%s' % pid
+        return SYSTEM_KEY
+
+    def due_tasks(self, now):
+        due = []
+        for td in TaskDefinition.objects.filter(enabled=True):
+            if (td.task_type not in TASK_RUNNERS):
+                continue
+            if (td.crontab is None or td.crontabwindow is None):
+                continue
+            try:
+                if (not self._crontab(td).match(now)):
+                    continue
+            except ValueError as e:
+                logger.error('Ignoring task(%d) with invalid crontab: %s' %
+                             (td.id, e.__str__()))
+                continue
+            if (not crontabwindow.crontab_range(td.crontabwindow, now)):
+                logger.debug('Task(%d) not executed because outside '
+                             'time/day window ranges' % td.id)
+                continue
+            due.append(td)
+        return due
+
+    def tick(self, now):
+        due = self.due_tasks(now)
+        if (len(due) == 0):
+            return
+        # rows of earlier runs go out before new tasks start.
+        self.task_log.flush()
+        share_pools = dict(Share.objects.values_list('id', 'pool_id'))
+        with self.cv:
+            for td in due:
+                if (td.id in self.running):
+                    logger.debug('Task(%d) is still running from a previous '
+                                 'schedule. Skipping this run.' % td.id)
+                    continue
+                key = self._concurrency_key(td, share_pools)
+                if (key is None):
+                    continue
+                self.running.add(td.id)
+                if (td.task_type in DEDICATED_TASK_TYPES):
+                    self._start_dedicated(td)
+                    continue
+                self.pending.setdefault(key, deque()).append(td)
+            self.cv.notify_all()
+
+    def catch_up(self, last_minute, now):
+        """
+        Tick every minute after last_minute up to and including now, so the
+        tasks due in minutes a slow tick overran still run. At most
+        MAX_CATCH_UP minutes are evaluated.
+        """
+        minute = timedelta(minutes=1)
+        if (last_minute is None or now <= last_minute):
+            minutes = [now]
+        else:
+            first = max(last_minute + minute,
+                        now - (MAX_CATCH_UP - 1) * minute)
+            if (first > last_minute + minute):
+                logger.error('Task scheduler fell behind by more than %d '
+                             'minutes. Skipping tasks due before %s.' %
+                             (MAX_CATCH_UP, first))
+            minutes = []
+            while (first <= now):
+                minutes.append(first)
+                first += minute
+        for m in minutes:
+            try:
+                self.tick(m)
+            except Exception as e:
+                logger.error('Failed to evaluate scheduled tasks for %s. '
+                             'Exception: %s' % (m, e.__str__()))
+            finally:
+                close_old_connections()
+
+    def _next(self):
+        with self.cv:
+            while (not self.stopping):
+                for key, tasks in self.pending.items():
+                    active = self.active.get(key, 0)
+                    if (len(tasks) > 0 and active < self.pool_concurrency):
+                        self.active[key] = active + 1
+                        return key, tasks.popleft()
+                self.cv.wait(1)
+        return None, None
+
+    def _done(self, key, td):
+        with self.cv:
+            if (key is not None):
+                self.active[key] -= 1
+            self.running.discard(td.id)
+            idle = (len(self.running) == 0)
+            self.cv.notify_all()
+        if (idle):
+            self.task_log.flush()
+
+    def _run(self, key, td):
+        try:
+            logger.debug('Running task(%d) of type %s.' %
+                         (td.id, td.task_type))
+            TASK_RUNNERS[td.task_type](td, self.aw, record=self.task_log.add)
+        except Exception as e:
+            logger.error('Task(%d) failed. Exception: %s' %
+                         (td.id, e.__str__()))
+            logger.exception(e)
+            self._notify_failure(td, e)
+        finally:
+            self._done(key, td)
+            close_old_connections()
+
+    @staticmethod
+    def _notify_failure(td, e):
+        """
+        Mail root, forwarded to the EmailClient's receiver, about a task that
+        failed, as cron did with the output of the task scripts it ran.
+        """
+        try:
+            if (not EmailClient.objects.exists()):
+                return
+            email_root('Scheduled task(%s) failed' % td.name,
+                       'Scheduled %s task(%s) with id %d failed. '
+                       'Exception: %s' % (td.task_type, td.name, td.id,
+                                          e.__str__()))
+        except Exception as me:
+            logger.error('Failed to notify the failure of task(%d). '
+                         'Exception: %s' % (td.id, me.__str__()))
+
+    def _start_dedicated(self, td):
+        t = threading.Thread(target=self._run, args=(None, td),
+                             name='task-%s-%d' % (td.task_type, td.id))
+        # long running scrubs should not hold up a restart.
+        t.daemon = True
+        t.start()
+
+    def _work(self):
+        while True:
+            key, td = self._next()
+            if (td is None):
+                return
+            self._run(key, td)
+
+    def stop(self, *args):
+        logger.debug('Stopping the task scheduler.')
+        with self.cv:
+            self.stopping = True
+            self.cv.notify_all()
+
+    def run(self):
+        self.aw = APIWrapper()
+        for i in range(self.num_workers):
+            w = threading.Thread(target=self._work,
+                                 name='task-worker-%d' % i)
+            w.daemon = True
+            w.start()
+            self.workers.append(w)
+        logger.debug('Task scheduler started with %d workers.' %
+                     self.num_workers)
+        last_minute = None
+        last_flush = time.time()
+        while (not self.stopping):
+            now = datetime.now().replace(second=0, microsecond=0)
+            if (now != last_minute):
+                self.catch_up(last_minute, now)
+                last_minute = now
+            if ((time.time() - last_flush) >= self.flush_interval):
+                self.task_log.flush()
+                last_flush = time.time()
+            time.sleep(1)
+        self.task_log.flush()
+
+
+def main():
+    ts = TaskScheduler()
+    signal.signal(signal.SIGTERM, ts.stop)
+    signal.signal(signal.SIGINT, ts.stop)
+    ts.run()
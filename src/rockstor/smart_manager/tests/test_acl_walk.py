@@ -0,0 +1,151 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from mock import patch
+from system.acl import apply_acl
+
+
+class Interrupted(Exception):
+    pass
+
+
+@unittest.skipUnless(os.geteuid() == 0, 'chown needs root')
+class ACLWalkTests(unittest.TestCase):
+    """
+    apply_acl over a scratch tree of 20 directories of 5 files each, a
+    symlink out of the tree and a directory with a name that isn't utf-8.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.root = os.path.join(self.tmp, 'share')
+        self.outside = os.path.join(self.tmp, 'outside')
+        open(self.outside, 'w').close()
+        for i in range(20):
+            d = os.path.join(self.root, 'd%d' % (i % 4), 'e%d' % i)
+            os.makedirs(d)
+            for j in range(5):
+                open(os.path.join(d, 'f%d' % j), 'w').close()
+        os.mkdir(os.path.join(self.root, 'caf\xe9'))
+        os.symlink(self.outside, os.path.join(self.root, 'link'))
+        self.checkpoint = os.path.join(self.tmp, 'checkpoint')
+
+    def _entries(self):
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            entries.extend([os.path.join(dirpath, n) for n in
+                            dirnames + filenames])
+        return [os.lstat(e) for e in entries]
+
+    def test_apply(self):
+        p = apply_acl(self.root, '1234', '4321', '750', workers=3)
+        # 4 + 20 + 100 + 1 + 1 entries below root, and root.
+        self.assertEqual(p['entries'], 126)
+        self.assertEqual(p['changed'], 127)
+        self.assertEqual(p['errors'], 0)
+        self.assertEqual(p['pending'], 0)
+        for st in self._entries():
+            self.assertEqual((st.st_uid, st.st_gid), (1234, 4321))
+            if (not stat.S_ISLNK(st.st_mode)):
+                self.assertEqual(stat.S_IMODE(st.st_mode), 0o750)
+        # the symlink is changed, not what it points to.
+        self.assertEqual(os.stat(self.outside).st_uid, 0)
+
+        # entries already as asked are left alone.
+        p = apply_acl(self.root, '1234', '4321', '750', workers=3)
+        self.assertEqual(p['changed'], 0)
+
+    def test_not_recursive(self):
+        apply_acl(self.root, '1234', perms='700', owner_recursive=False)
+        self.assertEqual(os.stat(self.root).st_uid, 1234)
+        for st in self._entries():
+            self.assertEqual(st.st_uid, 0)
+            if (not stat.S_ISLNK(st.st_mode)):
+                self.assertEqual(stat.S_IMODE(st.st_mode), 0o700)
+
+    def test_setid(self):
+        d0 = os.path.join(self.root, 'd0')
+        f0 = os.path.join(d0, 'e0', 'f0')
+        os.chmod(d0, 0o2775)
+        os.chmod(f0, 0o4755)
+        # directories keep their setgid and setuid bits, as with chmod 750.
+        apply_acl(self.root, perms='750')
+        self.assertEqual(stat.S_IMODE(os.stat(d0).st_mode), 0o2750)
+        self.assertEqual(stat.S_IMODE(os.stat(f0).st_mode), 0o750)
+        # unless the mode has 4 digits.
+        apply_acl(self.root, perms='0750')
+        self.assertEqual(stat.S_IMODE(os.stat(d0).st_mode), 0o750)
+        apply_acl(self.root, perms='2750')
+        self.assertEqual(stat.S_IMODE(os.stat(d0).st_mode), 0o2750)
+
+    def test_failed_dir(self):
+        d0 = os.path.join(self.root, 'd0')
+        real_lchown = os.lchown
+
+        def lchown(path, uid, gid):
+            if (path == d0):
+                raise OSError(1, 'Operation not permitted')
+            return real_lchown(path, uid, gid)
+
+        with patch('system.acl.os.lchown', side_effect=lchown):
+            p = apply_acl(self.root, '1234', workers=2)
+        self.assertEqual(p['errors'], 1)
+        self.assertEqual(p['entries'], 126)
+        # what's below it is still changed.
+        self.assertEqual(os.lstat(d0).st_uid, 0)
+        self.assertEqual(os.lstat(os.path.join(d0, 'e0', 'f0')).st_uid, 1234)
+
+    def _interrupt(self):
+        def report(p):
+            raise Interrupted()
+
+        # throttled so the walk is far from done at its first report.
+        with self.assertRaises(Interrupted):
+            apply_acl(self.root, '1234', perms='750', workers=1,
+                      max_rate=20, checkpoint=self.checkpoint,
+                      report=report, report_interval=0)
+        self.assertTrue(os.path.isfile(self.checkpoint))
+        left = [st for st in self._entries() if st.st_uid != 1234]
+        self.assertTrue(len(left) > 0)
+
+    def test_resume(self):
+        self._interrupt()
+        p = apply_acl(self.root, '1234', perms='750', workers=2,
+                      checkpoint=self.checkpoint)
+        self.assertFalse(os.path.isfile(self.checkpoint))
+        self.assertEqual(p['pending'], 0)
+        # counts carry over from the interrupted run.
+        self.assertTrue(p['entries'] >= 126)
+        for st in self._entries():
+            self.assertEqual(st.st_uid, 1234)
+            if (not stat.S_ISLNK(st.st_mode)):
+                self.assertEqual(stat.S_IMODE(st.st_mode), 0o750)
+
+    def test_other_changes(self):
+        # a walk of other changes starts over.
+        self._interrupt()
+        p = apply_acl(self.root, '1234', perms='700', workers=2,
+                      checkpoint=self.checkpoint)
+        self.assertEqual(p['entries'], 126)
+        self.assertFalse(os.path.isfile(self.checkpoint))
@@ -0,0 +1,195 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import SocketServer
+from BaseHTTPServer import BaseHTTPRequestHandler
+from django.test import (SimpleTestCase, override_settings)
+from requests.adapters import HTTPAdapter
+from cli import transport
+from cli.api_wrapper import APIWrapper
+from cli.transport import (get_session, TokenCache, UnixHTTPAdapter)
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for gunicorn on its unix socket. Hands out numbered tokens on
+    /o/token/ and echoes the bearer token on /api/ urls, answering 401 for
+    revoked tokens.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def address_string(self):
+        return 'unix'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, content):
+        body = json.dumps(content)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.token_requests += 1
+        self._reply(200, {'access_token': 'tok-%d' %
+                          self.server.token_requests,
+                          'expires_in': 36000, })
+
+    def do_GET(self):
+        token = self.headers.get('Authorization', '').replace('Bearer ', '')
+        if (token in self.server.revoked):
+            return self._reply(401, {'detail': 'Authentication credentials '
+                                     'were not provided.', })
+        self._reply(200, {'path': self.path, 'token': token, })
+
+
+class APIServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        SocketServer.UnixStreamServer.__init__(self, path, APIHandler)
+        self.connections = 0
+        self.token_requests = 0
+        self.revoked = set()
+
+
+class TransportTests(SimpleTestCase):
+    """
+    get_session, UnixHTTPAdapter and TokenCache against a local unix socket
+    stand-in for gunicorn.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.socket_path = os.path.join(self.tmp, 'api.sock')
+        self.cache_path = os.path.join(self.tmp, 'token.json')
+        self.server = APIServer(self.socket_path)
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        transport._sessions.clear()
+        self.addCleanup(transport._sessions.clear)
+
+    def test_get_session(self):
+        url = 'http://127.0.0.1:8000'
+        session = get_session(url, self.socket_path)
+        self.assertIs(get_session(url, self.socket_path), session)
+        self.assertIsInstance(session.adapters['http://'], UnixHTTPAdapter)
+        # no socket, tcp.
+        tcp = get_session(url, os.path.join(self.tmp, 'missing.sock'))
+        self.assertIsNot(tcp, session)
+        self.assertIsInstance(tcp.adapters['http://'], HTTPAdapter)
+        self.assertNotIsInstance(tcp.adapters['http://'], UnixHTTPAdapter)
+
+    def test_unix_adapter(self):
+        session = get_session('http://127.0.0.1:8000', self.socket_path)
+        for i in range(3):
+            r = session.get('http://127.0.0.1:8000/api/pools?page=%d' % i)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json()['path'], '/api/pools?page=%d' % i)
+        # whatever host the url names, over the same kept alive connection.
+        r = session.get('http://example.com/api/shares')
+        self.assertEqual(r.json()['path'], '/api/shares')
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(session.adapters['http://'].unix_pool.
+                         num_connections, 1)
+
+    def test_token_cache(self):
+        cache = TokenCache(self.cache_path)
+        url = 'http://127.0.0.1:8000'
+        self.assertEqual(cache.get(url, 'cliapp'), (None, None))
+        expiration = time.time() + 600
+        cache.set(url, 'cliapp', 'tok', expiration)
+        cache.set(url, 'other', 'tok2', time.time() - 1)
+        self.assertEqual(cache.get(url, 'cliapp'), ('tok', expiration))
+        # expired entries are missed, and dropped on the next write.
+        self.assertEqual(cache.get(url, 'other'), (None, None))
+        cache.set('http://remote', 'cliapp', 'tok3', expiration)
+        with open(self.cache_path) as cfo:
+            self.assertEqual(len(json.load(cfo)), 2)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_path).st_mode),
+                         0o600)
+        cache.invalidate(url, 'cliapp')
+        self.assertEqual(cache.get(url, 'cliapp'), (None, None))
+        self.assertEqual(cache.get('http://remote', 'cliapp'),
+                         ('tok3', expiration))
+
+    def test_token_cache_concurrent_writers(self):
+        # writers serialize on the lock file and replace the cache with a
+        # rename, so no entry is lost and readers never see a partial file.
+        caches = [TokenCache(self.cache_path) for i in range(8)]
+        expiration = time.time() + 600
+        errors = []
+
+        def write(i):
+            for j in range(10):
+                caches[i].set('http://%d' % i, 'app-%d' % j, 'tok', expiration)
+                try:
+                    with open(self.cache_path) as cfo:
+                        json.load(cfo)
+                except ValueError as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i, ))
+                   for i in range(len(caches))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        with open(self.cache_path) as cfo:
+            self.assertEqual(len(json.load(cfo)), 80)
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         ['api.sock', 'token.json', 'token.json.lock'])
+
+    def test_api_wrapper_token_refresh(self):
+        with override_settings(API_SOCKET=self.socket_path,
+                               API_TOKEN_CACHE=self.cache_path):
+            aw = APIWrapper(client_id='id', client_secret='secret')
+            self.assertEqual(aw.api_call('pools')['token'], 'tok-1')
+            # a new process reuses the cached token.
+            aw = APIWrapper(client_id='id', client_secret='secret')
+            self.assertEqual(aw.api_call('pools')['token'], 'tok-1')
+            self.assertEqual(self.server.token_requests, 1)
+
+            # a revoked token is dropped from the cache and refetched.
+            self.server.revoked.add('tok-1')
+            self.assertEqual(aw.api_call('shares')['token'], 'tok-2')
+            self.assertEqual(TokenCache(self.cache_path).get(
+                'http://127.0.0.1:8000', 'id')[0], 'tok-2')
+            aw = APIWrapper(client_id='id', client_secret='secret')
+            self.assertEqual(aw.api_call('pools')['token'], 'tok-2')
+            self.assertEqual(self.server.token_requests, 2)
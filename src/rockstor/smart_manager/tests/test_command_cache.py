@@ -0,0 +1,107 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from mock import patch
+from system.command_cache import CommandCache
+
+
+class CommandCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = CommandCache()
+        self.patch_mounts = patch('system.command_cache._mounts',
+                                  return_value=[
+                                      ('/mnt2/share1', '/dev/sdb'),
+                                      ('/mnt2/pool1', '/dev/sdb'),
+                                      ('/mnt2/pool2', '/dev/sdc'),
+                                      ('/', '/dev/sda3'), ])
+        self.patch_mounts.start()
+
+    def tearDown(self):
+        self.patch_mounts.stop()
+
+    def _fill(self, cmd):
+        cached, generation = self.cache.get(cmd)
+        self.assertIsNone(cached)
+        self.cache.put(cmd, ['out', ''], [''], 0, generation)
+
+    def _cached(self, cmd):
+        return (self.cache.get(cmd)[0] is not None)
+
+    def test_hit_miss(self):
+        cmd = ['/sbin/btrfs', 'qgroup', 'show', '/mnt2/pool1']
+        self._fill(cmd)
+        self.assertEqual(self.cache.get(cmd)[0], (['out', ''], [''], 0))
+        report = self.cache.report()
+        self.assertEqual(report['hits'], 1)
+        self.assertEqual(report['misses'], 1)
+        self.assertEqual(report['executables']['btrfs'],
+                         {'hits': 1, 'misses': 1, })
+
+    @patch('system.command_cache.time')
+    def test_ttl(self, mock_time):
+        mock_time.time.return_value = 1000
+        cmd = ['/usr/bin/docker', 'ps', '-a']
+        self._fill(cmd)
+        mock_time.time.return_value = 1001
+        self.assertTrue(self._cached(cmd))
+        mock_time.time.return_value = 1003
+        self.assertFalse(self._cached(cmd))
+
+    def test_scoped_invalidation(self):
+        pool1 = ['/sbin/btrfs', 'subvolume', 'list', '/mnt2/pool1']
+        share1 = ['/sbin/btrfs', 'qgroup', 'show', '/mnt2/share1']
+        pool2 = ['/sbin/btrfs', 'subvolume', 'list', '/mnt2/pool2']
+        lsblk = ['/usr/bin/lsblk']
+        for cmd in (pool1, share1, pool2, lsblk):
+            self._fill(cmd)
+        # read only commands don't invalidate anything.
+        self.cache.invalidate_for(['/sbin/btrfs', 'qgroup', 'show',
+                                   '/mnt2/pool1'])
+        self.assertEqual(self.cache.report()['invalidations'], 0)
+        # a subvolume of pool1 affects pool1's and its shares' entries only.
+        self.cache.invalidate_for(['/sbin/btrfs', 'subvolume', 'create',
+                                   '/mnt2/pool1/share2'])
+        self.assertFalse(self._cached(pool1))
+        self.assertFalse(self._cached(share1))
+        self.assertTrue(self._cached(pool2))
+        self.assertTrue(self._cached(lsblk))
+
+    def test_unscoped_invalidation(self):
+        pool2 = ['/sbin/btrfs', 'subvolume', 'list', '/mnt2/pool2']
+        lsblk = ['/usr/bin/lsblk']
+        spin = ['/usr/sbin/hdparm', '-C', '-q', '/dev/sdb']
+        for cmd in (pool2, lsblk, spin):
+            self._fill(cmd)
+        self.cache.invalidate_for(['/usr/bin/umount', '/mnt2/pool1'])
+        self.assertFalse(self._cached(pool2))
+        self.assertFalse(self._cached(lsblk))
+        self.assertTrue(self._cached(spin))
+        self.cache.invalidate_for(['/usr/sbin/hdparm', '-q', '-y',
+                                   '/dev/sdb'])
+        self.assertFalse(self._cached(spin))
+
+    def test_put_after_invalidation(self):
+        cmd = ['/sbin/btrfs', 'subvolume', 'list', '/mnt2/pool1']
+        cached, generation = self.cache.get(cmd)
+        # a mutation completing while cmd runs makes its output stale.
+        self.cache.invalidate_for(['/sbin/btrfs', 'subvolume', 'delete',
+                                   '/mnt2/pool1/share1'])
+        self.cache.put(cmd, ['out'], [''], 0, generation)
+        self.assertFalse(self._cached(cmd))
@@ -0,0 +1,100 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+import time
+import unittest
+from mock import patch
+from system.command_guard import (command_guard, command_targets,
+                                  command_timeout, guarded_args, SETSID)
+from system.exceptions import (CircuitOpenException, CommandTimeoutException)
+from system.osi import run_command
+
+
+class CommandGuardTests(unittest.TestCase):
+
+    def tearDown(self):
+        command_guard.circuits = {}
+
+    def test_timeouts(self):
+        self.assertEqual(command_timeout(['/usr/sbin/hdparm', '-C', '-q',
+                                          '/dev/sda']), 30)
+        self.assertEqual(command_timeout(['/sbin/btrfs', 'subvolume', 'list',
+                                          '/mnt2/pool1']), 120)
+        self.assertIsNone(command_timeout(['/sbin/btrfs', 'balance', 'start',
+                                           '/mnt2/pool1']))
+
+    def test_targets(self):
+        self.assertEqual(command_targets(['/sbin/btrfs', 'qgroup', 'show',
+                                          '/mnt2/pool1/.snapshots/s1']),
+                         set(['/mnt2/pool1']))
+        self.assertEqual(command_targets(['/usr/bin/udevadm', 'info',
+                                          '--name=/dev/sdb']),
+                         set(['/dev/sdb']))
+
+    def test_timeout_kills_group(self):
+        # the shell's child sleep must be killed too or the output pipes
+        # stay open.
+        t0 = time.time()
+        with self.assertRaises(CommandTimeoutException):
+            run_command(['/bin/sh', '-c', 'sleep 30; echo done',
+                         '/dev/fake-sdx'], timeout=1)
+        self.assertTrue(time.time() - t0 < 5)
+        self.assertEqual(command_guard.running_commands(), [])
+        o, e, rc = run_command(['/bin/sh', '-c', 'sleep 30', '/dev/sdy'],
+                               timeout=1, throw=False)
+        self.assertEqual(rc, -9)
+
+    def test_guarded_args(self):
+        self.assertEqual(guarded_args(['/bin/true', '-x']),
+                         ([SETSID, '/bin/true', '-x'], False))
+        self.assertEqual(guarded_args(['echo $HOME'], shell=True),
+                         ([SETSID, '/bin/sh', '-c', 'echo $HOME'], False))
+        # for Popen to raise OSError, as without a deadline.
+        self.assertEqual(guarded_args(['/nonexistent/cmd']),
+                         (['/nonexistent/cmd'], False))
+        with self.assertRaises(Exception):
+            run_command(['/nonexistent/cmd'], timeout=5)
+
+    def test_own_process_group(self):
+        # started in a session and process group of its own, same pid.
+        o, e, rc = run_command([sys.executable, '-c',
+                                'import os; print(os.getpid() == '
+                                'os.getpgrp() == os.getsid(0))'], timeout=5)
+        self.assertEqual(o[0], 'True')
+        o, e, rc = run_command(['echo $0'], shell=True, timeout=5)
+        self.assertEqual(o[0], '/bin/sh')
+
+    @patch('system.command_guard.time')
+    def test_circuit_breaker(self, mock_time):
+        mock_time.time.return_value = 1000
+        cmd = ['/usr/sbin/hdparm', '-C', '-q', '/dev/sdb']
+        command_guard._trip(cmd)
+        # commands against the hung device fail fast, others run.
+        with self.assertRaises(CircuitOpenException):
+            command_guard.check(['/usr/sbin/smartctl', '--info', '/dev/sdb'])
+        self.assertEqual(command_guard.check(['/usr/sbin/smartctl',
+                                              '--info', '/dev/sdc']), [])
+        # after the cooldown a single call probes the device.
+        mock_time.time.return_value = 1061
+        probes = command_guard.check(cmd)
+        self.assertEqual(probes, ['/dev/sdb'])
+        with self.assertRaises(CircuitOpenException):
+            command_guard.check(cmd)
+        command_guard.release(probes)
+        self.assertEqual(command_guard.check(cmd), [])
@@ -0,0 +1,69 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from system.command_stats import (CommandStats, command_label, SLOWEST_MAX)
+
+
+class CommandStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = CommandStats()
+
+    def test_label(self):
+        self.assertEqual(command_label(['/sbin/btrfs', 'subvolume', 'list',
+                                        '/mnt2/pool']), 'btrfs subvolume list')
+        self.assertEqual(command_label(['/usr/bin/net', 'ads', 'join', '-U',
+                                        'admin%secret']), 'net ads join')
+        self.assertEqual(command_label(['/usr/bin/chpasswd', '-e']),
+                         'chpasswd')
+
+    def test_record(self):
+        self.stats.record(['/sbin/btrfs', 'fi', 'show'], 0.02, 100, 0, 0)
+        self.stats.record(['/sbin/btrfs', 'qgroup', 'show'], 3, 50, 10, 1)
+        self.stats.record(['/usr/bin/lsblk', '-P'], 0.001, 10, 0, 0)
+        report = self.stats.report()
+        btrfs = report['executables']['btrfs']
+        self.assertEqual(btrfs['count'], 2)
+        self.assertEqual(btrfs['errors'], 1)
+        self.assertEqual(btrfs['out_bytes'], 150)
+        self.assertEqual(btrfs['err_bytes'], 10)
+        self.assertEqual(btrfs['max_time'], 3)
+        self.assertEqual(btrfs['histogram']['le_0.05'], 1)
+        self.assertEqual(btrfs['histogram']['le_5'], 1)
+        self.assertEqual(report['executables']['lsblk']['histogram']
+                         ['le_0.01'], 1)
+        self.assertEqual([s['command'] for s in report['slowest']],
+                         ['btrfs qgroup show', 'btrfs fi show', 'lsblk'])
+
+    def test_slowest_bounded(self):
+        for i in range(SLOWEST_MAX + 10):
+            self.stats.record(['/bin/true'], i, 0, 0, 0)
+        report = self.stats.report(limit=SLOWEST_MAX * 2)
+        self.assertEqual(len(report['slowest']), SLOWEST_MAX)
+        self.assertEqual(report['slowest'][0]['seconds'], SLOWEST_MAX + 9)
+        self.assertEqual(report['slowest'][-1]['seconds'], 10)
+
+    def test_accounting(self):
+        self.stats.record(['/bin/true'], 1, 0, 0, 0)
+        self.stats.start_accounting()
+        self.stats.record(['/bin/true'], 0.5, 0, 0, 0)
+        self.stats.record(['/bin/true'], 0.25, 0, 0, 0)
+        self.assertEqual(self.stats.stop_accounting(),
+                         {'count': 2, 'time': 0.75, })
+        self.assertIsNone(self.stats.stop_accounting())
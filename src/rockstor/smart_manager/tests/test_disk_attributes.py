@@ -0,0 +1,111 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from django.test.utils import override_settings
+from mock import patch
+from system.disk_attributes import (disk_attributes, poll_disks,
+                                    update_attributes)
+
+
+class DiskAttributesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings = override_settings(DISK_POLLER={
+            'cache_file': os.path.join(self.tmp_dir, 'attributes.json'),
+            'tick': 5, 'interval': 60, 'max_interval': 600,
+            'apm_interval': 600, })
+        self.settings.enable()
+        self.power_states = {'disk1': 'active/idle', 'disk2': 'standby',
+                             'disk3': 'unknown', }
+        self.io = {'sda': 100, 'sdb': 10, 'sdc': None, }
+        patches = {
+            'get_dev_temp_name': lambda n: {'disk1': 'sda', 'disk2': 'sdb',
+                                            'disk3': 'sdc'}[n],
+            'read_hdparm_setting': lambda n: None,
+            'get_disk_power_status': lambda n: self.power_states[n],
+            'get_disk_APM_level': lambda n: 127,
+            'io_count': lambda t: self.io[t],
+        }
+        self.mocks = {}
+        self.patches = []
+        for name, func in patches.items():
+            p = patch('system.disk_attributes.%s' % name, side_effect=func)
+            self.mocks[name] = p.start()
+            self.patches.append(p)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.settings.disable()
+        shutil.rmtree(self.tmp_dir)
+
+    def _queried(self, func):
+        queried = [c[0][0] for c in self.mocks[func].call_args_list]
+        self.mocks[func].reset_mock()
+        return sorted(queried)
+
+    def test_poll(self):
+        names = ['disk1', 'disk2', 'disk3']
+        poll_disks(names, now=1000)
+        self.assertEqual(disk_attributes('disk1')['power_state'],
+                         'active/idle')
+        self.assertEqual(disk_attributes('disk1')['apm_level'], 127)
+        self.assertEqual(disk_attributes('disk2')['temp_name'], 'sdb')
+        # the APM level of a drive in standby isn't queried.
+        self.assertNotIn('apm_level', disk_attributes('disk2'))
+        self.assertEqual(self._queried('get_disk_APM_level'),
+                         ['disk1', 'disk3'])
+        self.assertEqual(self._queried('get_disk_power_status'), names)
+
+        # nothing is due yet.
+        poll_disks(names, now=1030)
+        self.assertEqual(self._queried('get_disk_power_status'), [])
+
+        # disk2 did no I/O since it was seen in standby so isn't queried
+        # and disk3, without power state support, is polled less often.
+        poll_disks(names, now=1060)
+        self.assertEqual(self._queried('get_disk_power_status'), ['disk1'])
+        self.assertEqual(self._queried('get_disk_APM_level'), [])
+        self.assertEqual(disk_attributes('disk3')['next_poll'], 1000 + 120)
+
+        # I/O woke disk2 up.
+        self.io['sdb'] = 20
+        self.power_states['disk2'] = 'active/idle'
+        poll_disks(names, now=1120)
+        self.assertEqual(self._queried('get_disk_power_status'), names)
+        self.assertEqual(self._queried('get_disk_APM_level'), ['disk2'])
+        self.assertEqual(disk_attributes('disk3')['next_poll'], 1120 + 240)
+
+        # detached disks are dropped.
+        poll_disks(['disk1'], now=1180)
+        self.assertEqual(disk_attributes('disk2'), {})
+
+    def test_update(self):
+        poll_disks(['disk1'], now=1000)
+        update_attributes('disk1', power_state='standby', io=None,
+                          next_poll=0)
+        self.assertEqual(disk_attributes('disk1')['power_state'], 'standby')
+        self.power_states['disk1'] = 'standby'
+        poll_disks(['disk1'], now=1010)
+        self.assertEqual(self._queried('get_disk_power_status'),
+                         ['disk1', 'disk1'])
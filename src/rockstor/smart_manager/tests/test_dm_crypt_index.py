@@ -0,0 +1,109 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+from system import luks
+from system.luks import (dm_crypt_index, get_unlocked_luks_containers_uuids,
+                         get_open_luks_volume_status)
+
+UUID1 = 'a47f4950-3296-4504-b9a4-2dc75681a6ad'
+UUID2 = '3efb3830-fee1-4a9e-a5c6-ea456bfc269e'
+STATUS = ['/dev/mapper/luks-%s is active.' % UUID1,
+          '  type:    LUKS1',
+          '  cipher:  aes-xts-plain64',
+          '  keysize: 256 bits',
+          '  device:  /dev/sdb',
+          '  offset:  4096 sectors',
+          '  size:    4190192 sectors',
+          '  mode:    read/write',
+          '']
+
+
+class DMCryptIndexTests(unittest.TestCase):
+    """
+    dm_crypt_index() and its users against a fake sysfs and /dev.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        paths = {}
+        for name in ('SYS_BLOCK', 'SYS_FS_BTRFS', 'DEV_MAPPER',
+                     'DEV_BY_UUID'):
+            paths[name] = os.path.join(self.root, name.lower())
+            os.makedirs(paths[name])
+            patcher = patch.object(luks, name, paths[name])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.paths = paths
+        luks._index['signature'] = None
+        luks._status_cache.clear()
+        # a LUKS volume named by convention, a renamed one and a non crypt
+        # dm device.
+        self._add_dm('dm-0', 'luks-%s' % UUID1,
+                     'CRYPT-LUKS1-%s-luks-%s' % (UUID1.replace('-', ''),
+                                                 UUID1), 'sdb')
+        self._add_dm('dm-1', 'backup', 'CRYPT-PLAIN-backup', 'sdc')
+        self._add_dm('dm-2', 'vg-lv', 'LVM-abc', 'sdd')
+        os.symlink('../../sdc', os.path.join(paths['DEV_BY_UUID'], UUID2))
+
+    def _add_dm(self, dm, name, dm_uuid, slave):
+        dm_dir = os.path.join(self.paths['SYS_BLOCK'], dm)
+        for d in ('dm', 'slaves', 'holders'):
+            os.makedirs(os.path.join(dm_dir, d))
+        for f, content in (('dm/name', name), ('dm/uuid', dm_uuid),
+                           ('dev', '253:%s' % dm[3:])):
+            with open(os.path.join(dm_dir, f), 'w') as fo:
+                fo.write('%s\n' % content)
+        os.symlink('../../%s' % slave, os.path.join(dm_dir, 'slaves', slave))
+
+    @patch('system.luks.run_command')
+    def test_index(self, mock_run_command):
+        index = dm_crypt_index()
+        self.assertEqual(sorted(index.keys()), ['backup', 'luks-%s' % UUID1])
+        self.assertEqual(index['luks-%s' % UUID1],
+                         {'dm': 'dm-0', 'dev': '253:0', 'uuid': UUID1,
+                          'device': 'sdb', 'type': 'LUKS1', })
+        self.assertEqual(index['backup']['uuid'], UUID2)
+        self.assertEqual(sorted(get_unlocked_luks_containers_uuids()),
+                         sorted([UUID1, UUID2]))
+        self.assertEqual(mock_run_command.call_count, 0)
+
+        # rebuilt once a mapping goes.
+        shutil.rmtree(os.path.join(self.paths['SYS_BLOCK'], 'dm-1'))
+        self.assertEqual(list(dm_crypt_index().keys()), ['luks-%s' % UUID1])
+
+    @patch('system.luks.run_command', return_value=(STATUS, [''], 0))
+    def test_volume_status(self, mock_run_command):
+        byid_name_map = {'sdb': 'ata-disk-b', }
+        name = 'luks-%s' % UUID1
+        status = get_open_luks_volume_status(name, byid_name_map)
+        self.assertEqual(status['status'], 'active.')
+        self.assertEqual(status['device'], 'ata-disk-b')
+        self.assertEqual(status['cipher'], 'aes-xts-plain64')
+
+        # the volume becomes a btrfs member, without running cryptsetup.
+        os.makedirs(os.path.join(self.paths['SYS_FS_BTRFS'], 'fsid',
+                                 'devices', 'dm-0'))
+        status = get_open_luks_volume_status(name, byid_name_map)
+        self.assertEqual(status['status'], 'active and is in use.')
+        self.assertEqual(mock_run_command.call_count, 1)
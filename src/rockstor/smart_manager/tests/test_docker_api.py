@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+from SocketServer import ThreadingUnixStreamServer
+from mock import patch
+from system import docker
+from system.docker import container_states
+
+CONTAINERS = [
+    {'Names': ['/plex'], 'State': 'running', 'Status': 'Up 2 hours', },
+    {'Names': ['/transmission'], 'State': 'exited',
+     'Status': 'Exited (0) 3 hours ago', },
+    {'Names': ['/sonarr'], 'State': 'exited',
+     'Status': 'Exited (137) 5 minutes ago', },
+    # API < 1.23, no State.
+    {'Names': ['/owncloud'], 'Status': 'Up 5 minutes', },
+]
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if (self.path != '/containers/json?all=1'):
+            self.send_error(404)
+            return
+        body = json.dumps(CONTAINERS)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return 'unix'
+
+    def log_message(self, *args):
+        pass
+
+
+class DockerAPITests(unittest.TestCase):
+    """
+    container_states against a fake Docker Engine on a unix socket.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp_dir, 'docker.sock')
+        self.server = ThreadingUnixStreamServer(self.socket_path,
+                                                FakeDockerHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        docker.clear_container_states()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+        docker.clear_container_states()
+
+    def test_container_states(self):
+        states = container_states(socket_path=self.socket_path)
+        self.assertEqual(states, {'plex': ('running', None),
+                                  'transmission': ('exited', 0),
+                                  'sonarr': ('exited', 137),
+                                  'owncloud': ('running', None), })
+
+    def test_cached(self):
+        container_states(socket_path=self.socket_path)
+        container_states(socket_path=self.socket_path)
+        self.assertEqual(len(self.server.requests), 1)
+        with patch('system.docker.time.time', return_value=1e12):
+            container_states(socket_path=self.socket_path)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_unavailable(self):
+        states = container_states(
+            socket_path=os.path.join(self.tmp_dir, 'none.sock'))
+        self.assertIsNone(states)
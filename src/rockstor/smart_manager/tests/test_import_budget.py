@@ -0,0 +1,122 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from django.conf import settings
+
+# Imports the given module in a fresh interpreter, timing each module's first
+# import, and prints the total, the modules loaded and the slowest imports.
+PROFILE_SCRIPT = '''
+import __builtin__
+import json
+import sys
+import time
+
+times = {}
+real_import = __builtin__.__import__
+
+
+def timed_import(name, *args, **kwargs):
+    loaded = set(sys.modules)
+    start = time.time()
+    try:
+        return real_import(name, *args, **kwargs)
+    finally:
+        if (name not in loaded and name in sys.modules):
+            times[name] = time.time() - start
+
+if (sys.argv[2] == 'setup'):
+    import django
+    django.setup()
+before = set(sys.modules)
+__builtin__.__import__ = timed_import
+start = time.time()
+__import__(sys.argv[1])
+total = time.time() - start
+__builtin__.__import__ = real_import
+print(json.dumps({
+    'total': total,
+    'modules': sorted(m for m in sys.modules if (m not in before and
+                                                sys.modules[m] is not None)),
+    'slowest': sorted(times.items(), key=lambda t: -t[1])[:10], }))
+'''
+
+# Modules that no entry point below needs at import time.
+HEAVY = ('zmq', 'django_ztask.decorators', 'gevent', 'psutil', 'socketio',
+         'system.pkg_mgmt', 'system.pinmanager', )
+
+# console script -> (module, whether it needs django.setup() first, modules
+# it mustn't import).
+ENTRY_POINTS = {
+    'rcli': ('cli.rock_cli', False, HEAVY + ('storageadmin.models', )),
+    'st-snapshot': ('scripts.scheduled_tasks.snapshot', True, HEAVY),
+    'st-pool-scrub': ('scripts.scheduled_tasks.pool_scrub', True, HEAVY),
+}
+# Import time budget of every entry point, as a multiple of the time the
+# baseline module takes to import on the same machine. Override with the
+# IMPORT_BUDGET_FACTOR environment variable, 0 to skip the timing.
+BASELINE = 'django.db.models'
+BUDGET_FACTOR = 2.0
+
+
+def import_profile(module, setup=False):
+    src_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ)
+    # the settings of this test run, as importing scripts or smart_manager
+    # packages overwrites DJANGO_SETTINGS_MODULE.
+    env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+    env['PYTHONPATH'] = os.pathsep.join([src_dir, env.get('PYTHONPATH', '')])
+    # best of 3, the first run also warms the page cache.
+    profiles = []
+    for i in range(3):
+        o = subprocess.check_output(
+            [sys.executable, '-c', PROFILE_SCRIPT, module,
+             'setup' if setup else 'nosetup'], cwd=src_dir, env=env)
+        profiles.append(json.loads(o.splitlines()[-1]))
+    return min(profiles, key=lambda p: p['total'])
+
+
+class ImportBudgetTests(unittest.TestCase):
+    """
+    Console script entry points must import without the heavy modules only
+    the web ui and the data collector need, and quickly.
+    """
+
+    def test_entry_points(self):
+        for name, (module, setup, forbidden) in ENTRY_POINTS.items():
+            profile = import_profile(module, setup=setup)
+            loaded = [m for m in forbidden if m in profile['modules']]
+            self.assertEqual(loaded, [], msg='%s imports %s' % (name, loaded))
+
+    def test_import_time(self):
+        factor = float(os.environ.get('IMPORT_BUDGET_FACTOR', BUDGET_FACTOR))
+        if (factor <= 0):
+            self.skipTest('IMPORT_BUDGET_FACTOR is 0.')
+        budget = factor * import_profile(BASELINE)['total']
+        for name, (module, setup, forbidden) in ENTRY_POINTS.items():
+            profile = import_profile(module, setup=setup)
+            self.assertTrue(profile['total'] < budget,
+                            msg='%s took %.2fs to import, over its %.2fs '
+                            'budget (%g times %s). Slowest imports: %s' %
+                            (name, profile['total'], budget, factor,
+                             BASELINE, profile['slowest']))
@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from mock import (patch, MagicMock)
+from scripts import initrock
+from scripts.initrock import (StepRunner, firewalld_inputs)
+
+
+class StepRunnerTests(unittest.TestCase):
+    """
+    Fingerprint based skipping of initrock steps, with the steps' stamp file
+    and inputs in a temporary directory.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        patcher = patch.object(initrock, 'STEPS_STAMP',
+                               os.path.join(self.tmp, '.initrock-steps'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.input_file = os.path.join(self.tmp, 'input.conf')
+        self._write('a')
+        self.values = ['v1']
+        self.func = MagicMock()
+
+    def _write(self, content):
+        with open(self.input_file, 'w') as ifo:
+            ifo.write(content)
+
+    def _inputs(self):
+        return ([self.input_file], list(self.values))
+
+    def _run(self, runner=None, func=None):
+        if (runner is None):
+            runner = StepRunner()
+        try:
+            runner.run('step', func or self.func, self._inputs)
+        finally:
+            # as initrock does, whether the steps failed or not.
+            runner.save()
+        return runner
+
+    def test_skip_unchanged(self):
+        runner = self._run()
+        self.assertEqual(runner.timings['step'][1], False)
+        # a new initrock run, with the fingerprints read back.
+        runner = self._run()
+        self.assertEqual(runner.timings['step'][1], True)
+        self.assertEqual(self.func.call_count, 1)
+
+    def test_changed_inputs(self):
+        self._run()
+        self._write('b')
+        self._run()
+        self.assertEqual(self.func.call_count, 2)
+        self.values = ['v2']
+        self._run()
+        self.assertEqual(self.func.call_count, 3)
+        self._run()
+        self.assertEqual(self.func.call_count, 3)
+
+    def test_force(self):
+        self._run()
+        self._run(runner=StepRunner(force=True))
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_fingerprint_after_step(self):
+        # the recorded fingerprint is that of the state the step left.
+        def step():
+            self.values = ['v2']
+
+        self._run(func=step)
+        self._run()
+        self.assertEqual(self.func.call_count, 0)
+
+    def test_failed_step(self):
+        self._run()
+        self._write('b')
+        self.func.side_effect = Exception('failed')
+        self.assertRaises(Exception, self._run)
+        # the step runs again next time, even with its inputs restored.
+        self._write('a')
+        self.func.side_effect = None
+        self._run()
+        self.assertEqual(self.func.call_count, 3)
+
+    def test_unreadable_inputs(self):
+        def inputs():
+            raise Exception('db is down')
+
+        for i in range(2):
+            runner = StepRunner()
+            runner.run('step', self.func, inputs)
+            runner.save()
+            self.assertNotIn('step', runner.fingerprints)
+        self.assertEqual(self.func.call_count, 2)
+
+    def test_unreadable_stamp(self):
+        with open(initrock.STEPS_STAMP, 'w') as sfo:
+            sfo.write('{')
+        self._run()
+        self.assertEqual(self.func.call_count, 1)
+
+    @patch('scripts.initrock.run_command')
+    def test_firewalld_inputs(self, mock_run_command):
+        mock_run_command.side_effect = [(['disabled'], [''], 1),
+                                        (['inactive'], [''], 3)]
+        stopped = firewalld_inputs()
+        mock_run_command.side_effect = [(['enabled'], [''], 0),
+                                        (['active'], [''], 0)]
+        self.assertNotEqual(firewalld_inputs(), stopped)
+        mock_run_command.assert_called_with(
+            [initrock.SYSCTL, 'is-active', 'firewalld'], throw=False)
@@ -0,0 +1,93 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import unittest
+from mock import patch
+from system.log_reader import (read_page, format_page)
+
+
+class LogReaderTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # small blocks so pages and lines straddle block boundaries.
+        cls.patch_block_size = patch('system.log_reader.BLOCK_SIZE', 7)
+        cls.patch_block_size.start()
+        fd, cls.log_path = tempfile.mkstemp()
+        cls.log_lines = ['line %d %s\n' % (i, 'error' if i % 10 == 0 else
+                                           'info') for i in range(1, 101)]
+        with os.fdopen(fd, 'w') as lfo:
+            lfo.write(''.join(cls.log_lines))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patch_block_size.stop()
+        os.remove(cls.log_path)
+
+    def test_forward_paging(self):
+        page = read_page(self.log_path, lines=30)
+        self.assertEqual([l for n, l in page['lines']], self.log_lines[:30])
+        self.assertEqual(page['lines'][0][0], 1)
+        self.assertFalse(page['eof'])
+        self.assertTrue(format_page(page).startswith('     1\tline 1 info'))
+        # continue from the returned offset until the end.
+        served = page['lines']
+        while (not page['eof']):
+            page = read_page(self.log_path, offset=page['next_offset'],
+                             lineno=page['next_line'], lines=30)
+            served.extend(page['lines'])
+        self.assertEqual(served, list(enumerate(self.log_lines, 1)))
+
+    def test_line_seek(self):
+        page = read_page(self.log_path, line=95, lines=30)
+        self.assertEqual(page['lines'],
+                         list(enumerate(self.log_lines, 1))[94:])
+        self.assertTrue(page['eof'])
+
+    def test_reverse_paging(self):
+        page = read_page(self.log_path, reverse=True, lines=30)
+        self.assertEqual([l for n, l in page['lines']], self.log_lines[-30:])
+        self.assertFalse(page['eof'])
+        page = read_page(self.log_path, reverse=True, lines=30,
+                         offset=page['next_offset'])
+        self.assertEqual([l for n, l in page['lines']],
+                         self.log_lines[-60:-30])
+
+    def test_filter(self):
+        page = read_page(self.log_path, lines=5, pattern='error')
+        self.assertEqual([n for n, l in page['lines']], [10, 20, 30, 40, 50])
+        page = read_page(self.log_path, reverse=True, lines=2,
+                         pattern=r'line 9\d ', regex=True)
+        self.assertEqual([l for n, l in page['lines']], self.log_lines[-3:-1])
+        self.assertRaises(Exception, read_page, self.log_path, pattern='(',
+                          regex=True)
+
+    def test_no_trailing_newline(self):
+        fd, log_path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as lfo:
+            lfo.write('first\nsecond')
+        try:
+            self.assertEqual(read_page(log_path)['lines'],
+                             [(1, 'first\n'), (2, 'second')])
+            self.assertEqual(
+                read_page(log_path, reverse=True, lines=1)['lines'],
+                [(None, 'second')])
+        finally:
+            os.remove(log_path)
@@ -0,0 +1,202 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from django.test import (SimpleTestCase, override_settings)
+from mock import patch
+from system import network
+from system.network import (NMCLI, NMMonitor, connections, devices,
+                            published_changes)
+
+UUIDS = ['u-eth0', 'u-team0', 'u-slave']
+CONNECTION_SHOW = '''connection.id:eth0
+connection.uuid:u-eth0
+connection.type:802-3-ethernet
+connection.master:
+802-3-ethernet.mac-address:52\\:54\\:00\\:12\\:34\\:56
+802-3-ethernet.cloned-mac-address:
+802-3-ethernet.mtu:auto
+ipv4.method:manual
+ipv4.dns:8.8.8.8,8.8.4.4
+ipv4.dns-search:example.com
+GENERAL.STATE:activated
+IP4.ADDRESS[1]:192.168.1.10/24
+IP4.ADDRESS[2]:192.168.1.11/24
+IP4.GATEWAY:192.168.1.1
+IP4.DNS[1]:8.8.8.8
+connection.id:team0
+connection.uuid:u-team0
+connection.type:team
+team.config:{"runner"\\: {"name"\\: "roundrobin"}}
+ipv4.method:auto
+connection.id:team0-slave-eth1
+connection.uuid:u-slave
+connection.type:802-3-ethernet
+connection.master:team0
+802-3-ethernet.mtu:auto
+ipv4.method:auto
+'''.splitlines()
+DEVICE_SHOW = '''GENERAL.DEVICE:eth0
+GENERAL.TYPE:ethernet
+GENERAL.HWADDR:52\\:54\\:00\\:12\\:34\\:56
+GENERAL.MTU:1500
+GENERAL.STATE:100 (connected)
+GENERAL.CONNECTION:eth0
+GENERAL.DEVICE:lo
+GENERAL.TYPE:loopback
+GENERAL.HWADDR:00\\:00\\:00\\:00\\:00\\:00
+GENERAL.MTU:65536
+GENERAL.STATE:10 (unmanaged)
+GENERAL.CONNECTION:--
+'''.splitlines()
+
+
+def fake_nmcli(cmd, **kwargs):
+    if (cmd == [NMCLI, '-t', '-f', 'uuid', 'c', 'show', ]):
+        return UUIDS + [''], [''], 0
+    if (cmd == [NMCLI, '-t', 'c', 'show', ] + UUIDS):
+        return CONNECTION_SHOW, [''], 0
+    if (cmd == [NMCLI, '-t', 'd', 'show', ]):
+        return DEVICE_SHOW, [''], 0
+    raise Exception('unexpected command: %s' % cmd)
+
+
+@patch('system.network.run_command', side_effect=fake_nmcli)
+class NetworkInventoryTests(SimpleTestCase):
+
+    def setUp(self):
+        network._inventory[:] = [None, 0, None]
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.state_file = os.path.join(self.tmp, 'nm-monitor.json')
+        self.settings = override_settings(NM_MONITOR={
+            'state_file': self.state_file, })
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def _publish(self, pid, changes):
+        with open(self.state_file, 'w') as sfo:
+            json.dump({'pid': pid, 'changes': changes, }, sfo)
+
+    def test_connections(self, mock_run_command):
+        cmap = connections()
+        # the list and then every connection's details at once.
+        self.assertEqual(mock_run_command.call_count, 2)
+        self.assertEqual(sorted(cmap.keys()), sorted(UUIDS))
+        eth0 = cmap['u-eth0']
+        self.assertEqual(eth0['name'], 'eth0')
+        self.assertEqual(eth0['state'], 'activated')
+        self.assertEqual(eth0['ipv4_addresses'],
+                         '192.168.1.10/24,192.168.1.11/24')
+        self.assertEqual(eth0['ipv4_gw'], '192.168.1.1')
+        self.assertEqual(eth0['ipv4_dns'], '8.8.8.8,8.8.4.4')
+        self.assertEqual(eth0['ipv4_dns_search'], 'example.com')
+        self.assertEqual(eth0['802-3-ethernet'],
+                         {'mac': '52:54:00:12:34:56', 'cloned_mac': None,
+                          'mtu': 'auto'})
+        self.assertNotIn('master', eth0)
+        self.assertEqual(cmap['u-team0']['team'],
+                         {'config': '{"runner": {"name": "roundrobin"}}'})
+        self.assertEqual(cmap['u-slave']['master'], 'team0')
+
+    def test_cached(self, mock_run_command):
+        self._publish(os.getpid(), 1)
+        cmap = connections()
+        self.assertGreater(network._inventory[1],
+                           time.time() + network.INVENTORY_TTL)
+        del cmap['u-eth0']
+        # callers may change the returned map.
+        self.assertIn('u-eth0', connections())
+        self.assertEqual(mock_run_command.call_count, 2)
+        self._publish(os.getpid(), 2)
+        connections()
+        self.assertEqual(mock_run_command.call_count, 4)
+
+    def test_unmonitored(self, mock_run_command):
+        # no data-collector, or one that died: reused for a short ttl only.
+        self.assertIsNone(published_changes())
+        connections()
+        self.assertLessEqual(network._inventory[1],
+                             time.time() + network.INVENTORY_TTL)
+        connections()
+        self.assertEqual(mock_run_command.call_count, 2)
+        with patch('system.network.os.kill', side_effect=OSError(3, '')):
+            self._publish(1234, 1)
+            self.assertIsNone(published_changes())
+
+    def test_devices(self, mock_run_command):
+        dmap = devices()
+        self.assertEqual(mock_run_command.call_count, 1)
+        self.assertEqual(dmap['eth0'], {'dtype': 'ethernet',
+                                        'mac': '52:54:00:12:34:56',
+                                        'mtu': '1500',
+                                        'state': '100 (connected)',
+                                        'connection': 'eth0'})
+        self.assertNotIn('connection', dmap['lo'])
+
+
+class NMMonitorTests(SimpleTestCase):
+    """
+    NMMonitor.run() following a stand-in for nmcli monitor.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.state_file = os.path.join(self.tmp, 'nm-monitor.json')
+        self.settings = override_settings(NM_MONITOR={
+            'state_file': self.state_file, })
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        nmcli = os.path.join(self.tmp, 'nmcli')
+        with open(nmcli, 'w') as nfo:
+            nfo.write('#!/bin/sh\n'
+                      'echo "eth0: connected"\n'
+                      'echo "Connectivity is now \'full\'"\n'
+                      'exec sleep 60\n')
+        os.chmod(nmcli, 0o755)
+        patcher = patch('system.network.NMCLI', nmcli)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _wait(self, condition):
+        deadline = time.time() + 5
+        while (not condition() and time.time() < deadline):
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_run_stop(self):
+        monitor = NMMonitor(self.state_file)
+        t = threading.Thread(target=monitor.run)
+        t.start()
+        # one for the start, one per line reported.
+        self._wait(lambda: published_changes() is not None and
+                   published_changes()[1] == 3)
+        self.assertEqual(published_changes(), (monitor.proc.pid, 3))
+        monitor.stop()
+        t.join(5)
+        self.assertFalse(t.is_alive())
+        # reaped, and no longer published.
+        self.assertIsNotNone(monitor.proc.returncode)
+        self.assertIsNone(published_changes())
+        self.assertEqual(os.listdir(self.tmp), ['nmcli'])
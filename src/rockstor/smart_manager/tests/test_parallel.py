@@ -0,0 +1,85 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+import unittest
+from system.parallel import run_parallel
+
+
+class RunParallelTests(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.calls = []  # (item, thread name)
+        self.finalized = []
+        self.active = 0
+        self.max_active = 0
+
+    def _func(self, item):
+        with self.lock:
+            self.calls.append((item, threading.current_thread().name))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # later items finish first.
+        time.sleep(0.01 * (10 - item))
+        with self.lock:
+            self.active -= 1
+        if (item % 3 == 0):
+            raise Exception('item %d failed' % item)
+
+    def _finalize(self):
+        with self.lock:
+            self.finalized.append(threading.current_thread().name)
+
+    def test_parallel(self):
+        failures = run_parallel(self._func, range(10), workers=4,
+                                finalize=self._finalize)
+        self.assertEqual(sorted(item for item, name in self.calls), range(10))
+        self.assertEqual(self.max_active, 4)
+        # failures are in the order of items, whichever finished first.
+        self.assertEqual([item for item, e in failures], [0, 3, 6, 9])
+        self.assertEqual([e.__str__() for item, e in failures],
+                         ['item %d failed' % i for i in (0, 3, 6, 9)])
+        # finalize runs once in every worker thread, not in the caller.
+        threads = set(name for item, name in self.calls)
+        self.assertEqual(len(threads), 4)
+        self.assertEqual(sorted(self.finalized), sorted(threads))
+        self.assertNotIn(threading.current_thread().name, threads)
+
+    def test_fewer_items_than_workers(self):
+        failures = run_parallel(self._func, [1, 2], workers=8,
+                                finalize=self._finalize)
+        self.assertEqual(failures, [])
+        self.assertEqual(len(self.finalized), 2)
+
+    def test_serial(self):
+        failures = run_parallel(self._func, range(4), workers=1,
+                                finalize=self._finalize)
+        self.assertEqual(self.calls, [(i, threading.current_thread().name)
+                                      for i in range(4)])
+        self.assertEqual([item for item, e in failures], [0, 3])
+        # nothing to clean up in the calling thread.
+        self.assertEqual(self.finalized, [])
+
+    def test_finalize_after_failure(self):
+        # finalize still runs when every call fails.
+        failures = run_parallel(lambda i: 1 / 0, range(6), workers=3,
+                                finalize=self._finalize)
+        self.assertEqual([item for item, e in failures], range(6))
+        self.assertEqual(len(self.finalized), 3)
@@ -0,0 +1,129 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from BaseHTTPServer import (BaseHTTPRequestHandler, HTTPServer)
+from SocketServer import ThreadingMixIn
+from system.rockon_metastore import MetastoreCache
+
+
+class FakeMetastoreHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's files dict, path -> json, with ETags.
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if (self.path not in self.server.files):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.files[self.path])
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if (self.headers.get('If-None-Match') == etag):
+            self.server.not_modified.append(self.path)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeMetastore(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetastoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeMetastore(('127.0.0.1', 0), FakeMetastoreHandler)
+        self.server.requests = []
+        self.server.not_modified = []
+        self.server.files = {'/root.json': {'a': 'a.json', 'b': 'b.json', },
+                             '/a.json': {'A': {'version': '1', }, },
+                             '/b.json': {'B': {'version': '1', }, }, }
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url_root = 'http://127.0.0.1:%d' % self.server.server_port
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, 'cache.json')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _urls(self, *names):
+        return ['%s/%s' % (self.url_root, n) for n in names]
+
+    def test_fetch_and_revalidate(self):
+        metastore = MetastoreCache(self.cache_file)
+        profiles, failures = metastore.fetch_all(
+            self._urls('a.json', 'b.json'), workers=2)
+        self.assertEqual(failures, [])
+        self.assertEqual(profiles[self._urls('a.json')[0]],
+                         {'A': {'version': '1', }, })
+        metastore.save()
+
+        # a new process revalidates from the cache file.
+        self.server.files['/b.json'] = {'B': {'version': '2', }, }
+        metastore = MetastoreCache(self.cache_file)
+        profiles, failures = metastore.fetch_all(
+            self._urls('a.json', 'b.json'), workers=2)
+        self.assertEqual(failures, [])
+        self.assertEqual(profiles[self._urls('a.json')[0]],
+                         {'A': {'version': '1', }, })
+        self.assertEqual(profiles[self._urls('b.json')[0]],
+                         {'B': {'version': '2', }, })
+        self.assertEqual(self.server.not_modified, ['/a.json'])
+
+    def test_failures(self):
+        metastore = MetastoreCache(self.cache_file)
+        profiles, failures = metastore.fetch_all(
+            self._urls('a.json', 'missing.json'), workers=2)
+        self.assertEqual([f[0] for f in failures],
+                         self._urls('missing.json'))
+        self.assertEqual(profiles.keys(), self._urls('a.json'))
+
+    def test_applied(self):
+        metastore = MetastoreCache(self.cache_file)
+        profile = {'version': '1', }
+        self.assertTrue(metastore.changed('A', profile))
+        metastore.set_applied('A', profile)
+        metastore.set_applied('B', profile)
+        metastore.prune_applied(['A'])
+        metastore.save()
+
+        metastore = MetastoreCache(self.cache_file)
+        self.assertFalse(metastore.changed('A', {'version': '1', }))
+        self.assertTrue(metastore.changed('A', {'version': '2', }))
+        self.assertTrue(metastore.changed('B', profile))
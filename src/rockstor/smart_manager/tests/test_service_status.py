@@ -0,0 +1,90 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+from mock import patch
+from system.services import (ServiceStatusCache, SYSTEMCTL_BIN,
+                             SUPERCTL_BIN, superctl)
+
+
+class ServiceStatusCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.patch_run_command = patch('system.services.run_command')
+        self.mock_run_command = self.patch_run_command.start()
+        self.mock_run_command.side_effect = self._run_command
+        self.patch_sftp_configured = patch(
+            'system.services.sftp_configured', return_value=True)
+        self.patch_sftp_configured.start()
+        self.unit_states = {'rpcbind': 'active', 'nfs': 'active',
+                            'smb': 'active', 'nmb': 'inactive',
+                            'sshd': 'active', 'ntpd': 'failed', }
+        self.program_states = {'replication': 'RUNNING',
+                               'data-collector': 'STOPPED', }
+
+    def tearDown(self):
+        patch.stopall()
+
+    def _run_command(self, cmd, throw=True):
+        if (cmd[0] == SYSTEMCTL_BIN):
+            out = []
+            for u in cmd[3:]:
+                out.extend(['ActiveState=%s' % self.unit_states[u], ''])
+            return out, [''], 0
+        if (cmd[0] == SUPERCTL_BIN and cmd[1] == 'status'):
+            out = ['%s   %s   pid 1, uptime 0:01:00' % (p, s) for p, s in
+                   self.program_states.items()]
+            return out + [''], [''], 3
+        return [''], [''], 0
+
+    def _commands(self):
+        return [c[0][0][0] for c in self.mock_run_command.call_args_list]
+
+    def test_batched_statuses(self):
+        cache = ServiceStatusCache(ttl=60)
+        services = [('nfs', None), ('smb', None), ('sftp', None),
+                    ('ntpd', None), ('replication', None),
+                    ('data-collector', None), ('service-monitor', None), ]
+        self.assertEqual(cache.statuses(services),
+                         {'nfs': 0, 'smb': 3, 'sftp': 0, 'ntpd': 3,
+                          'replication': 0, 'data-collector': 1,
+                          'service-monitor': 1, })
+        # one systemctl show for all units and one supervisorctl status.
+        self.assertEqual(self._commands(), [SYSTEMCTL_BIN, SUPERCTL_BIN])
+        cache.statuses(services)
+        self.assertEqual(self.mock_run_command.call_count, 2)
+
+    def test_ttl_and_invalidation(self):
+        cache = ServiceStatusCache(ttl=0)
+        cache.statuses([('nfs', None)])
+        cache.statuses([('nfs', None)])
+        self.assertEqual(self.mock_run_command.call_count, 2)
+
+        cache = ServiceStatusCache(ttl=60)
+        cache.statuses([('smb', None)])
+        self.unit_states['nmb'] = 'active'
+        self.assertEqual(cache.statuses([('smb', None)]), {'smb': 3})
+        cache.invalidate()
+        self.assertEqual(cache.statuses([('smb', None)]), {'smb': 0})
+
+    def test_status_read_does_not_write_config(self):
+        with patch('system.services.set_autostart') as mock_set_autostart:
+            superctl('replication', 'status')
+            self.assertFalse(mock_set_autostart.called)
+            superctl('replication', 'stop')
+            mock_set_autostart.assert_called_once_with('replication', 'stop')
@@ -0,0 +1,62 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import stat
+import unittest
+from mock import patch
+from system.users import (smbpasswds, PDBEDIT, SMBPASSWD)
+
+
+class SmbpasswdsTests(unittest.TestCase):
+
+    @patch('system.users._nt_hash', side_effect=lambda p: 'H-%s' % p)
+    @patch('system.users.run_command')
+    def test_import(self, mock_run_command, mock_nt_hash):
+        imported = {}
+
+        def pdbedit(cmd):
+            path = cmd[2].split(':', 1)[1]
+            imported['mode'] = stat.S_IMODE(os.stat(path).st_mode)
+            with open(path) as pfo:
+                imported['lines'] = pfo.read().splitlines()
+            imported['path'] = path
+            return [''], [''], 0
+
+        mock_run_command.side_effect = pdbedit
+        smbpasswds([('u1', 2001, 'p1'), ('u2', 2002, 'p2')])
+        # one import for all users, from a root only file removed after.
+        self.assertEqual(mock_run_command.call_count, 1)
+        self.assertEqual(mock_run_command.call_args[0][0][:2],
+                         [PDBEDIT, '-i'])
+        self.assertEqual(imported['mode'], 0o600)
+        self.assertFalse(os.path.exists(imported['path']))
+        self.assertEqual([l.split(':')[:4] for l in imported['lines']],
+                         [['u1', '2001', 'X' * 32, 'H-p1'],
+                          ['u2', '2002', 'X' * 32, 'H-p2']])
+        self.assertEqual(imported['lines'][0].split(':')[4],
+                         '[U          ]')
+
+    @patch('system.users._nt_hash',
+           side_effect=ValueError('unsupported hash type md4'))
+    @patch('system.users.run_command')
+    def test_no_md4(self, mock_run_command, mock_nt_hash):
+        smbpasswds([('u1', 2001, 'p1'), ('u2', 2002, 'p2')])
+        self.assertEqual([c[0][0] for c in mock_run_command.call_args_list],
+                         [[SMBPASSWD, '-s', '-a', 'u1'],
+                          [SMBPASSWD, '-s', '-a', 'u2']])
@@ -0,0 +1,290 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+import unittest
+from datetime import datetime
+from django.test import (SimpleTestCase, TestCase, override_settings)
+from mock import (patch, MagicMock)
+from smart_manager.models import (Task, TaskDefinition)
+from smart_manager.scheduler import task_scheduler
+from smart_manager.scheduler.cron import CronTab
+from smart_manager.scheduler.task_scheduler import (TaskLog, TaskScheduler)
+
+SCHEDULER = {'workers': 2, 'pool_concurrency': 1, 'task_batch_size': 3, }
+
+
+class CronTabTests(unittest.TestCase):
+    """
+    The tests in this suite can be run via the following command:
+    cd <root dir of rockstor ie /opt/rockstor>
+    ./bin/test --settings=test-settings -v 3 -p test_task_scheduler*
+    """
+
+    def test_every_quarter_hour(self):
+        ct = CronTab('*/15 * * * *')
+        self.assertTrue(ct.match(datetime(2017, 6, 5, 10, 0)))
+        self.assertTrue(ct.match(datetime(2017, 6, 5, 10, 45)))
+        self.assertFalse(ct.match(datetime(2017, 6, 5, 10, 7)))
+
+    def test_fixed_time_on_weekdays(self):
+        # 2017-06-04 is a Sunday and 2017-06-05 a Monday.
+        ct = CronTab('30 2 * * 1-5')
+        self.assertTrue(ct.match(datetime(2017, 6, 5, 2, 30)))
+        self.assertFalse(ct.match(datetime(2017, 6, 4, 2, 30)))
+        self.assertFalse(ct.match(datetime(2017, 6, 5, 3, 30)))
+
+    def test_sunday_as_seven(self):
+        ct = CronTab('0 0 * * 7')
+        self.assertTrue(ct.match(datetime(2017, 6, 4, 0, 0)))
+
+    def test_day_of_month_or_weekday(self):
+        # both restricted: either one matching is enough.
+        ct = CronTab('0 12 1 * 1')
+        self.assertTrue(ct.match(datetime(2017, 6, 1, 12, 0)))
+        self.assertTrue(ct.match(datetime(2017, 6, 5, 12, 0)))
+        self.assertFalse(ct.match(datetime(2017, 6, 6, 12, 0)))
+
+    def test_lists_and_ranges(self):
+        ct = CronTab('0,30 8-10/2 * 1,6 *')
+        self.assertTrue(ct.match(datetime(2017, 6, 9, 10, 30)))
+        self.assertFalse(ct.match(datetime(2017, 6, 9, 9, 30)))
+        self.assertFalse(ct.match(datetime(2017, 7, 9, 10, 30)))
+
+    def test_invalid_crontab(self):
+        self.assertRaises(ValueError, CronTab, '* * * *')
+        self.assertRaises(ValueError, CronTab, '61 * * * *')
+        self.assertRaises(ValueError, CronTab, '*/0 * * * *')
+
+
+def task_def(tid, task_type='snapshot', share=1, json_meta=None):
+    if (json_meta is None):
+        json_meta = ('{"pool": "%d"}' % share if (task_type == 'scrub') else
+                     '{"share": "%d"}' % share)
+    return TaskDefinition(id=tid, name='task-%d' % tid, task_type=task_type,
+                          json_meta=json_meta, crontab='* * * * *',
+                          crontabwindow='*-*-*-*-*-*')
+
+
+@override_settings(TASK_SCHEDULER=SCHEDULER)
+class TaskSchedulerTests(SimpleTestCase):
+    """
+    Dispatch of due tasks to the worker pool, with fake task runners and
+    share to pool mapping.
+    """
+
+    def setUp(self):
+        self.ts = TaskScheduler()
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.ran = []  # (TaskDefinition id, thread name) per run.
+        self.active = {}
+        self.max_active = {}
+        self.addCleanup(self._stop)
+        for target, value in (
+                ('close_old_connections', lambda: None),
+                ('TASK_RUNNERS', {'snapshot': self._runner,
+                                  'scrub': self._runner, }), ):
+            patcher = patch.object(task_scheduler, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        share = MagicMock()
+        # shares 1 and 2 are on pool 10, share 3 on pool 11.
+        share.objects.values_list.return_value = [(1, 10), (2, 10), (3, 11)]
+        patcher = patch.object(task_scheduler, 'Share', share)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ts.task_log = MagicMock()
+
+    def _stop(self):
+        self.release.set()
+        self.ts.stop()
+        for w in self.ts.workers:
+            w.join(5)
+
+    def _runner(self, td, aw, record=None):
+        key = td.json_meta
+        with self.lock:
+            self.ran.append((td.id, threading.current_thread().name))
+            self.active[key] = self.active.get(key, 0) + 1
+            self.max_active[key] = max(self.max_active.get(key, 0),
+                                       self.active[key])
+        self.release.wait(5)
+        with self.lock:
+            self.active[key] -= 1
+
+    def _start(self, *tds):
+        for i in range(self.ts.num_workers):
+            w = threading.Thread(target=self.ts._work)
+            w.daemon = True
+            w.start()
+            self.ts.workers.append(w)
+        with patch.object(self.ts, 'due_tasks', return_value=list(tds)):
+            self.ts.tick(datetime(2017, 6, 5, 10, 0))
+
+    def _wait_idle(self):
+        for i in range(500):
+            with self.ts.cv:
+                if (len(self.ts.running) == 0):
+                    return
+            time.sleep(0.01)
+        self.fail('tasks did not finish: %s' % self.ts.running)
+
+    def test_dispatch_to_workers(self):
+        self.release.set()
+        self._start(task_def(1, share=1), task_def(2, share=3))
+        self._wait_idle()
+        self.assertEqual(sorted(tid for tid, name in self.ran), [1, 2])
+        # both ran on the worker threads.
+        self.assertEqual(len(set(name for tid, name in self.ran) -
+                             set(w.name for w in self.ts.workers)), 0)
+        # the last task finishing flushes the task log.
+        self.ts.task_log.flush.assert_called_with()
+
+    def test_pool_concurrency(self):
+        # two tasks on pool 10 and one on pool 11 with 2 workers and a
+        # pool_concurrency of 1.
+        self._start(task_def(1, share=1), task_def(2, share=2),
+                    task_def(3, share=3))
+        for i in range(500):
+            with self.lock:
+                if (len(self.ran) == 2):
+                    break
+            time.sleep(0.01)
+        with self.lock:
+            self.assertEqual(sorted(tid for tid, name in self.ran), [1, 3])
+        with self.ts.cv:
+            self.assertEqual(self.ts.active, {'pool-10': 1, 'pool-11': 1})
+            self.assertEqual([td.id for td in self.ts.pending['pool-10']],
+                             [2])
+        self.release.set()
+        self._wait_idle()
+        self.assertEqual(sorted(tid for tid, name in self.ran), [1, 2, 3])
+        self.assertEqual(max(self.max_active.values()), 1)
+
+    def test_no_overlapping_runs(self):
+        self._start(task_def(1, share=1))
+        with patch.object(self.ts, 'due_tasks',
+                          return_value=[task_def(1, share=1)]):
+            self.ts.tick(datetime(2017, 6, 5, 10, 1))
+        self.release.set()
+        self._wait_idle()
+        self.assertEqual([tid for tid, name in self.ran], [1])
+
+    def test_scrub_outside_worker_pool(self):
+        # a scrub doesn't take a worker, so the snapshots of both pools run
+        # with a single worker busy on one of them.
+        self.ts.num_workers = 1
+        self._start(task_def(1, task_type='scrub', share=10),
+                    task_def(2, share=1))
+        for i in range(500):
+            with self.lock:
+                if (len(self.ran) == 2):
+                    break
+            time.sleep(0.01)
+        names = dict(self.ran)
+        self.assertEqual(names[1], 'task-scrub-1')
+        self.assertEqual(names[2], self.ts.workers[0].name)
+        self.release.set()
+        self._wait_idle()
+
+    def test_invalid_json_meta(self):
+        self.release.set()
+        self._start(task_def(1, json_meta='{"share": '), task_def(2))
+        self._wait_idle()
+        self.assertEqual([tid for tid, name in self.ran], [2])
+
+    def test_failure_notification(self):
+        self.release.set()
+
+        def failing_runner(td, aw, record=None):
+            raise Exception('pool is gone')
+
+        self.ts.num_workers = 1
+        with patch.dict(task_scheduler.TASK_RUNNERS,
+                        {'snapshot': failing_runner}), \
+                patch.object(task_scheduler, 'email_root') as mock_email, \
+                patch.object(task_scheduler, 'EmailClient') as mock_ec:
+            mock_ec.objects.exists.return_value = True
+            self._start(task_def(1))
+            self._wait_idle()
+            self.assertEqual(mock_email.call_count, 1)
+            subject, message = mock_email.call_args[0]
+            self.assertEqual(subject, 'Scheduled task(task-1) failed')
+            self.assertIn('pool is gone', message)
+            # without an email account failures are only logged.
+            mock_ec.objects.exists.return_value = False
+            self._start(task_def(2))
+            self._wait_idle()
+            self.assertEqual(mock_email.call_count, 1)
+
+    def test_catch_up(self):
+        ticks = []
+        with patch.object(self.ts, 'tick', side_effect=ticks.append):
+            self.ts.catch_up(None, datetime(2017, 6, 5, 10, 0))
+            self.ts.catch_up(datetime(2017, 6, 5, 10, 0),
+                             datetime(2017, 6, 5, 10, 3))
+        self.assertEqual([t.minute for t in ticks], [0, 1, 2, 3])
+
+        # the minutes a long tick overran are evaluated against crontabs.
+        td = task_def(1)
+        td.crontab = '2 10 * * *'
+        ticks = []
+        with patch.object(task_scheduler.TaskDefinition, 'objects') as tdo:
+            tdo.filter.return_value = [td]
+            with patch.object(self.ts, 'tick',
+                              side_effect=lambda now: ticks.append(
+                                  self.ts.due_tasks(now))):
+                self.ts.catch_up(datetime(2017, 6, 5, 10, 1),
+                                 datetime(2017, 6, 5, 10, 4))
+        self.assertEqual(ticks, [[td], [], []])
+
+    def test_catch_up_limit(self):
+        ticks = []
+        with patch.object(self.ts, 'tick', side_effect=ticks.append):
+            self.ts.catch_up(datetime(2017, 6, 5, 10, 0),
+                             datetime(2017, 6, 5, 14, 0))
+        self.assertEqual(len(ticks), task_scheduler.MAX_CATCH_UP)
+        self.assertEqual(ticks[-1], datetime(2017, 6, 5, 14, 0))
+
+
+class TaskLogTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.td = TaskDefinition.objects.create(
+            name='snap', task_type='snapshot', json_meta='{}')
+
+    def test_batching(self):
+        log = TaskLog(3)
+        for i in range(2):
+            log.add(Task(task_def=self.td, state='finished'))
+        self.assertEqual(Task.objects.count(), 0)
+        self.assertEqual(len(log), 2)
+        # the batch is written with one insert once it's full.
+        with self.assertNumQueries(1, using='smart_manager'):
+            log.add(Task(task_def=self.td, state='finished'))
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(len(log), 0)
+
+        log.add(Task(task_def=self.td, state='error'))
+        log.flush()
+        self.assertEqual(Task.objects.filter(state='error').count(), 1)
+        with self.assertNumQueries(0, using='smart_manager'):
+            log.flush()
@@ -22,7 +22,7 @@ from smart_manager.serializers import ServiceStatusSerializer
 import json
 import rest_framework_custom as rfc
 from rest_framework.response import Response
-from system.services import service_status
+from system.services import service_statuses
 from django.db import transaction
 from django.utils.timezone import utc
 from datetime import datetime
@@ -39,7 +39,7 @@ class ServiceMixin(object):
     def _get_config(self, service):
         return json.loads(service.config)
 
-    def _get_or_create_sso(self, service):
+    def _get_or_create_sso(self, service, status=None):
         ts = datetime.utcnow().replace(tzinfo=utc)
         so = None
         if (ServiceStatus.objects.filter(service=service).exists()):
@@ -47,32 +47,51 @@ class ServiceMixin(object):
                 service=service).order_by('-ts')[0]
         else:
             so = ServiceStatus(service=service, count=0)
-        so.status = self._get_status(service)
+        if (status is None):
+            status = self._get_status(service)
+        so.status = status
         so.count += 1
         so.ts = ts
         so.save()
         return so
 
     def _get_status(self, service):
-        try:
+        return self._get_statuses([service])[service.name]
+
+    def _get_statuses(self, services):
+        """
+        Running (True/False) by name for the given Services, from a single
+        batched and briefly cached status query. See
+        system.services.service_statuses
+        """
+        query = []
+        for service in services:
             config = None
-            if (service.config is not None):
-                config = self._get_config(service)
-
-            o, e, rc = service_status(service.name, config)
-            if (rc == 0):
-                return True
-            return False
+            try:
+                if (service.config is not None):
+                    config = self._get_config(service)
+            except Exception as e:
+                logger.error('Exception while loading config of '
+                             'Service(%s): %s' % (service.name, e.__str__()))
+            query.append((service.name, config))
+        try:
+            return {name: (rc == 0) for name, rc in
+                    service_statuses(query).items()}
         except Exception as e:
-            msg = ('Exception while querying status of service(%s): %s' %
-                   (service.name, e.__str__()))
+            msg = ('Exception while querying status of services(%s): %s' %
+                   ([s.name for s in services], e.__str__()))
             logger.error(msg)
             logger.exception(e)
-            return False
+            return {s.name: False for s in services}
 
 
 class BaseServiceView(ServiceMixin, rfc.GenericView):
     serializer_class = ServiceStatusSerializer
+    etag_families = ('service', )
+
+    def etag_extra(self):
+        # whether services are running isn't in the db.
+        return sorted(self._get_statuses(Service.objects.all()).items())
 
     @transaction.atomic
     def get_queryset(self, *args, **kwargs):
@@ -83,8 +102,10 @@ class BaseServiceView(ServiceMixin, rfc.GenericView):
             url_fields = self.request.path.strip('/').split('/')
             if (len(url_fields) < 4):
                 sos = []
-                for s in Service.objects.all():
-                    sos.append(self._get_or_create_sso(s))
+                services = Service.objects.all()
+                statuses = self._get_statuses(services)
+                for s in services:
+                    sos.append(self._get_or_create_sso(s, statuses[s.name]))
                 return sorted(sos, cmp=lambda x, y: cmp(x.display_name, y.display_name))  # noqa
 
 
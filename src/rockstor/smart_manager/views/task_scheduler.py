@@ -17,10 +17,9 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 from smart_manager.models import TaskDefinition
-from storageadmin.models import (Pool, Share, EmailClient)
+from storageadmin.models import (Pool, Share)
 from smart_manager.serializers import TaskDefinitionSerializer
 from django.db import transaction
-from django.conf import settings
 import json
 from rest_framework.response import Response
 from storageadmin.util import handle_exception
@@ -81,42 +80,17 @@ class TaskSchedulerMixin(object):
 
     @staticmethod
     def _refresh_crontab():
-        mail_from = None
-        if (EmailClient.objects.filter().exists()):
-            eco = EmailClient.objects.filter().order_by('-id')[0]
-            mail_from = eco.sender
+        # Scheduled tasks are run by the resident task-scheduler service
+        # which reads TaskDefinitions directly. We still rewrite the tab to
+        # drop any per task entries left behind by earlier versions, which
+        # would otherwise run every task twice.
         with open('/etc/cron.d/rockstortab', 'w') as cfo:
             cfo.write("SHELL=/bin/bash\n")
             cfo.write("PATH=/sbin:/bin:/usr/sbin:/usr/bin\n")
-            cfo.write("MAILTO=root\n")
-            if (mail_from is not None):
-                cfo.write("MAILFROM=%s\n" % mail_from)
             cfo.write("# These entries are auto generated by Rockstor. "
                       "Do not edit.\n")
-            for td in TaskDefinition.objects.filter(enabled=True):
-                if (td.crontab is not None):
-                    tab = '%s root' % td.crontab
-                    if (td.task_type == 'snapshot'):
-                        tab = ('%s %sbin/st-snapshot %d' %
-                               (tab, settings.ROOT_DIR, td.id))
-                    elif (td.task_type == 'scrub'):
-                        tab = ('%s %s/bin/st-pool-scrub %d' %
-                               (tab, settings.ROOT_DIR, td.id))
-                    elif (td.task_type in ['reboot', 'shutdown', 'suspend']):
-                        tab = ('%s %s/bin/st-system-power %d' %
-                               (tab, settings.ROOT_DIR, td.id))
-                    else:
-                        logger.error('ignoring unknown task_type: %s'
-                                     % td.task_type)
-                        continue
-                    if (td.crontabwindow is not None):
-                        # add crontabwindow as 2nd arg to task script, new line
-                        # moved here
-                        tab = ('%s \%s\n' % (tab, td.crontabwindow))
-                    else:
-                        logger.error('missing crontab window value')
-                        continue
-                    cfo.write(tab)
+            cfo.write("# Scheduled tasks are run by the task-scheduler "
+                      "service.\n")
 
 
 class TaskSchedulerListView(TaskSchedulerMixin, rfc.GenericView):
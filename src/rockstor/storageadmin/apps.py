@@ -0,0 +1,39 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.apps import AppConfig
+
+
+class StorageAdminConfig(AppConfig):
+    name = 'storageadmin'
+
+    def ready(self):
+        # Connected once every app's models are loaded, as smart_manager's
+        # models import storageadmin's and the reverse would be circular.
+        from storageadmin.models import (track_versions, Pool, Disk, Share,
+                                         NFSExport, Snapshot)
+        from smart_manager.models import Service
+        track_versions('pool', Pool)
+        track_versions('disk', Disk)
+        track_versions('share', Share, NFSExport)
+        track_versions('snapshot', Snapshot)
+        # Service lives in the smart_manager database, so its version is
+        # bumped outside of the transaction saving it. A rolled back save
+        # only costs an ETag miss. ServiceStatus, saved on every status
+        # poll, is left out on purpose.
+        track_versions('service', Service)
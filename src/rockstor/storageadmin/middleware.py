@@ -17,6 +17,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 from system.osi import run_command
+from system.command_stats import command_stats
 from django.conf import settings
 
 import logging
@@ -34,3 +35,21 @@ class ProdExceptionMiddleware(object):
         run_command(['/usr/bin/tar', '-c', '-z', '-f',
                      settings.ROOT_DIR + 'src/rockstor/logs/error.tgz',
                      settings.ROOT_DIR + 'var/log'])
+
+
+class SubprocessAccountingMiddleware(object):
+    """
+    Account the commands run, via system.osi.run_command, while serving a
+    request and report them in the X-Subprocess-Count and X-Subprocess-Time
+    (seconds) response headers.
+    """
+
+    def process_request(self, request):
+        command_stats.start_accounting()
+
+    def process_response(self, request, response):
+        acc = command_stats.stop_accounting()
+        if (acc is not None):
+            response['X-Subprocess-Count'] = '%d' % acc['count']
+            response['X-Subprocess-Time'] = '%.3f' % acc['time']
+        return response
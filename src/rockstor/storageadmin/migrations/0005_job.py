@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storageadmin', '0004_auto_20170523_1140'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=64)),
+                ('serial_key', models.CharField(default=b'system', max_length=64)),
+                ('status', models.CharField(default=b'pending', max_length=10)),
+                ('args', models.TextField(default=b'{}')),
+                ('percent_done', models.IntegerField(default=0)),
+                ('message', models.CharField(max_length=1024, null=True)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('submit_time', models.DateTimeField(auto_now_add=True)),
+                ('start_time', models.DateTimeField(null=True)),
+                ('end_time', models.DateTimeField(null=True)),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, to='storageadmin.Pool', null=True)),
+            ],
+        ),
+    ]
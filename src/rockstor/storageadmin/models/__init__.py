@@ -42,6 +42,7 @@ from adv_nfs_exports import AdvancedNFSExport  # noqa E501
 from oauth_app import OauthApp  # noqa E501
 from netatalk_share import NetatalkShare  # noqa E501
 from pool_balance import PoolBalance  # noqa E501
+from job import Job  # noqa E501
 from tls_certificate import TLSCertificate  # noqa E501
 from rockon import (RockOn, DImage, DContainer, DPort, DVolume,  # noqa E501
                     ContainerOption, DCustomConfig, DContainerLink,  # noqa E501
@@ -54,3 +55,5 @@ from email import EmailClient  # noqa E501
 from update_subscription import UpdateSubscription  # noqa E501
 from pincard import Pincard  # noqa E501
 from installed_plugin import InstalledPlugin  # noqa E501
+from resource_version import (ResourceVersion, bump_version,  # noqa E501
+                              resource_versions, track_versions)  # noqa E501
@@ -19,8 +19,8 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 import json
 from django.db import models
 from storageadmin.models import Pool
-from system.osi import get_disk_power_status, read_hdparm_setting, \
-    get_disk_APM_level, get_dev_temp_name
+from system.osi import read_hdparm_setting, get_dev_temp_name
+from system.disk_attributes import disk_attributes
 
 
 class AttachedManager(models.Manager):
@@ -80,16 +80,24 @@ class Disk(models.Model):
         except:
             return None
 
+    # The following hdparm related attributes are served from the cache kept
+    # by the data-collector's disk poller, see system/disk_attributes.py, as
+    # querying every drive on every request is slow and can wake them.
+    # power_state and apm_level read as unknown until a disk is first polled.
     @property
     def power_state(self, *args, **kwargs):
         try:
-            return get_disk_power_status(str(self.name))
+            return disk_attributes(str(self.name)).get('power_state',
+                                                       'unknown')
         except:
             return None
 
     @property
     def hdparm_setting(self, *args, **kwargs):
         try:
+            attributes = disk_attributes(str(self.name))
+            if ('hdparm_setting' in attributes):
+                return attributes['hdparm_setting']
             return read_hdparm_setting(str(self.name))
         except:
             return None
@@ -97,14 +105,16 @@ class Disk(models.Model):
     @property
     def apm_level(self, *args, **kwargs):
         try:
-            return get_disk_APM_level(str(self.name))
+            return disk_attributes(str(self.name)).get('apm_level', 0)
         except:
             return None
 
     @property
     def temp_name(self, *args, **kwargs):
         try:
-            return get_dev_temp_name(str(self.name))
+            attributes = disk_attributes(str(self.name))
+            return (attributes.get('temp_name') or
+                    get_dev_temp_name(str(self.name)))
         except:
             return None
 
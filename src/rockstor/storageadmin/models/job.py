@@ -0,0 +1,45 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.db import models
+from storageadmin.models import Pool
+
+
+class Job(models.Model):
+    """
+    A long running storage operation run in the background by the
+    job-runner service. See storageadmin.views.job_helpers
+    """
+    # name of the job handler, eg: pool-resize, share-delete
+    name = models.CharField(max_length=64)
+    pool = models.ForeignKey(Pool, null=True, on_delete=models.SET_NULL)
+    # jobs with the same serial key run one at a time, in submission order.
+    serial_key = models.CharField(max_length=64, default='system')
+    # pending, running, finished, failed, cancelled
+    status = models.CharField(max_length=10, default='pending')
+    # json encoded keyword arguments of the handler.
+    args = models.TextField(default='{}')
+    percent_done = models.IntegerField(default=0)
+    message = models.CharField(max_length=1024, null=True)
+    cancel_requested = models.BooleanField(default=False)
+    submit_time = models.DateTimeField(auto_now_add=True)
+    start_time = models.DateTimeField(null=True)
+    end_time = models.DateTimeField(null=True)
+
+    class Meta:
+        app_label = 'storageadmin'
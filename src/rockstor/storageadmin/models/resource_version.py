@@ -0,0 +1,70 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.db import (models, transaction, IntegrityError)
+from django.db.models import F
+from django.db.models.signals import (post_save, post_delete)
+
+
+class ResourceVersion(models.Model):
+    """Version counter of a family of resources, eg: 'share', bumped within
+    the transaction saving or deleting any of its models. The API's listings
+    derive their ETags from these, see rest_framework_custom.GenericView"""
+    name = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        app_label = 'storageadmin'
+
+
+def bump_version(family):
+    if (ResourceVersion.objects.filter(name=family).update(
+            version=F('version') + 1) > 0):
+        return
+    try:
+        with transaction.atomic():
+            ResourceVersion.objects.create(name=family, version=1)
+    except IntegrityError:
+        # created concurrently.
+        ResourceVersion.objects.filter(name=family).update(
+            version=F('version') + 1)
+
+
+def resource_versions(families):
+    """
+    :return: dict of family -> version, 0 for families never bumped.
+    """
+    versions = dict.fromkeys(families, 0)
+    versions.update(ResourceVersion.objects.filter(
+        name__in=families).values_list('name', 'version'))
+    return versions
+
+
+def track_versions(family, *models):
+    """
+    Bump family's version whenever any of the given models is saved or
+    deleted. N.B. QuerySet.update() sends no signals so doesn't bump it.
+    """
+    def bump(sender, **kwargs):
+        bump_version(family)
+
+    for model in models:
+        for signal in (post_save, post_delete):
+            signal.connect(bump, sender=model, weak=False,
+                           dispatch_uid='version_%s_%s_%s' % (
+                               family, model.__name__, id(signal)))
@@ -29,7 +29,7 @@ from storageadmin.models import (Disk, Pool, Share, Snapshot, NFSExport,
                                  SMARTErrorLog, SMARTErrorLogSummary,
                                  SMARTTestLog, SMARTTestLogDetail,
                                  SMARTIdentity, ConfigBackup, EmailClient,
-                                 UpdateSubscription)
+                                 UpdateSubscription, Job)
 from django.contrib.auth.models import User as DjangoUser
 
 
@@ -196,6 +196,12 @@ class PoolBalanceSerializer(serializers.ModelSerializer):
         model = PoolBalance
 
 
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        exclude = ('args',)
+
+
 class SetupSerializer(serializers.ModelSerializer):
     class Meta:
         model = Setup
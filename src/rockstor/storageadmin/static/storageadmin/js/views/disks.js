@@ -104,8 +104,9 @@ DisksView = RockstorLayoutView.extend({
 
     setupDisks: function () {
         var _this = this;
+        // a user asked rescan must see drives plugged since the last scan.
         $.ajax({
-            url: '/api/disks/scan',
+            url: '/api/disks/scan?force=true',
             type: 'POST'
         }).done(function () {
             // reset the current page
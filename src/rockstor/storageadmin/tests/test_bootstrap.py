@@ -0,0 +1,91 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+from django.contrib.auth.models import User as DjangoUser
+from django.test import override_settings
+from mock import patch
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+from storageadmin.models import (Pool, Share)
+from storageadmin.views.command import CommandView
+
+
+@override_settings(BOOTSTRAP={'pool_workers': 2, 'share_workers': 3, })
+class ParallelBootstrapTests(APITransactionTestCase):
+    """
+    Bootstrap with worker threads. A transaction test case as the workers
+    use their own DB connections.
+    """
+
+    def setUp(self):
+        DjangoUser.objects.create_user('admin', password='admin')
+        self.client.login(username='admin', password='admin')
+        for i in range(3):
+            pool = Pool.objects.create(name='pool%d' % i, raid='single')
+            for j in range(3):
+                Share.objects.create(pool=pool, name='share%d-%d' % (i, j),
+                                     qgroup='0/%d%d' % (i, j))
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.shares = []
+        for target in ('_update_disk_state', '_prune_pools',
+                       'refresh_wrapper'):
+            patcher = patch.object(CommandView, target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for target in ('systemctl', 'sftp_mount_map', 'import_shares'):
+            patcher = patch('storageadmin.views.command.%s' % target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _work(self, name):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        if (name == 'pool1'):
+            raise Exception('pool1 is gone')
+        return True
+
+    def test_bootstrap(self):
+        def bootstrap_share(share):
+            self.shares.append(share.name)
+            self._work(share.name)
+
+        with patch.object(CommandView, '_mount_pool',
+                          side_effect=lambda p: self._work(p.name)), \
+                patch.object(CommandView, '_bootstrap_share',
+                             side_effect=bootstrap_share):
+            response = self.client.post('/api/commands/bootstrap')
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+        self.assertEqual(response.data['failures'],
+                         {'pool(pool1)': 'pool1 is gone', })
+        for phase in ('disks', 'pools', 'pool(pool0)', 'shares', 'nfs'):
+            self.assertIn(phase, response.data['timings'])
+        # shares of the pools that mounted, with no more threads at a time
+        # than the larger of the two phases.
+        self.assertEqual(sorted(self.shares),
+                         ['share%d-%d' % (i, j) for i in (0, 2)
+                          for j in range(3)])
+        self.assertEqual(self.max_active, 3)
@@ -99,6 +99,9 @@ class CommandTests(APITestMixin, APITestCase):
         response = self.client.post('%s/bootstrap' % self.BASE_URL)
         self.assertEqual(response.status_code,
                          status.HTTP_200_OK, msg=response.data)
+        # per phase timings are reported.
+        for phase in ('disks', 'pools', 'sftp', 'nfs'):
+            self.assertIn(phase, response.data['timings'])
 
     def test_utcnow_command(self):
         # utcnow command
@@ -0,0 +1,152 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from django.core import serializers
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch
+from storageadmin.models import (Group, ConfigBackup, Pool, Share,
+                                 SambaShare, User)
+from system.osi import md5sum
+from system.config_backup import (backup_config, load_backup, read_header,
+                                  dependent_backups)
+
+
+class ConfigBackupChainTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.cb_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cb_dir)
+        settings_patch = override_settings(DEFAULT_CB_DIR=self.cb_dir)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        for i in range(5):
+            Group.objects.create(groupname='g%d' % i, gid=2000 + i)
+        self.count = 0
+
+    def _backup(self, incremental):
+        # backups are named by the second.
+        self.count += 1
+        with patch('system.config_backup.datetime') as mock_dt:
+            mock_dt.now.return_value.strftime.return_value = str(self.count)
+            return backup_config(incremental=incremental)
+
+    @staticmethod
+    def _lines(cbo):
+        with gzip.open(cbo.full_path()) as gfo:
+            return [json.loads(l) for l in gfo]
+
+    @staticmethod
+    def _groups(cbo):
+        sa_ml, sm_ml = load_backup(cbo.full_path())
+        return sorted([(m['fields']['groupname'], m['fields']['gid'])
+                       for m in sa_ml if m['model'] == 'storageadmin.group'])
+
+    def test_full(self):
+        cbo = self._backup(False)
+        self.assertEqual(cbo.md5sum, md5sum(cbo.full_path()))
+        self.assertEqual(cbo.size, os.stat(cbo.full_path()).st_size)
+        # header, 5 groups and the trailer.
+        self.assertEqual(len(self._lines(cbo)), 7)
+        self.assertEqual(len(self._groups(cbo)), 5)
+
+    def test_incremental_chain(self):
+        full = self._backup(True)
+        self.assertIsNone(read_header(full.full_path())['base'])
+
+        Group.objects.filter(groupname='g1').update(gid=3001)
+        Group.objects.filter(groupname='g2').delete()
+        Group.objects.create(groupname='g5', gid=2005)
+        inc1 = self._backup(True)
+        lines = self._lines(inc1)
+        self.assertEqual(lines[0]['base'], full.filename)
+        # only the updated, deleted and added rows.
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(len([l for l in lines if l.get('deleted')]), 1)
+
+        inc2 = self._backup(True)
+        self.assertEqual(len(self._lines(inc2)), 2)
+        self.assertEqual(self._groups(inc2),
+                         [('g0', 2000), ('g1', 3001), ('g3', 2003),
+                          ('g4', 2004), ('g5', 2005)])
+        self.assertEqual(len(self._groups(full)), 5)
+        self.assertEqual(dependent_backups(full.filename), [inc1.filename])
+
+        # a chain with a missing link can't be restored.
+        os.remove(inc1.full_path())
+        ConfigBackup.objects.filter(id=inc1.id).delete()
+        with self.assertRaises(Exception):
+            load_backup(inc2.full_path())
+
+    def test_incremental_size(self):
+        self._backup(True)
+        for i in range(5, 50):
+            Group.objects.create(groupname='g%d' % i, gid=2000 + i)
+        self._backup(True)
+        inc3 = self._backup(True)
+        # an unchanged incremental backup holds nothing per row, whatever
+        # the size of the tables.
+        self.assertEqual(len(self._lines(inc3)), 2)
+        self.assertEqual(self._lines(inc3)[-1].keys(), ['hashes'])
+        self.assertEqual(len(self._groups(inc3)), 50)
+
+    def test_many_to_many_order(self):
+        pool = Pool.objects.create(name='p', raid='single')
+        smb = []
+        for i in range(3):
+            share = Share.objects.create(pool=pool, name='s%d' % i,
+                                         qgroup='0/%d' % i)
+            smb.append(SambaShare.objects.create(share=share,
+                                                 path='/mnt2/s%d' % i))
+        user = User.objects.create(username='u1', uid=2001, gid=2001)
+        user.smb_shares.add(*smb)
+        self._backup(True)
+
+        # the same shares, listed by the db in another order.
+        real_serialize = serializers.serialize
+
+        def serialize(fmt, objects):
+            rows = real_serialize(fmt, objects)
+            if ('smb_shares' in rows[0]['fields']):
+                rows[0]['fields']['smb_shares'].reverse()
+            return rows
+
+        with patch('system.config_backup.serializers.serialize',
+                   side_effect=serialize):
+            inc = self._backup(True)
+        self.assertEqual(len(self._lines(inc)), 2)
+        sa_ml, sm_ml = load_backup(inc.full_path())
+        users = [m for m in sa_ml if m['model'] == 'storageadmin.user']
+        self.assertEqual(users[0]['fields']['smb_shares'],
+                         sorted(s.id for s in smb))
+
+    def test_old_format(self):
+        fp = os.path.join(self.cb_dir, 'old.json.gz')
+        with gzip.open(fp, 'wb') as gfo:
+            gfo.write('[{"model": "storageadmin.group", "pk": 1, "fields": '
+                      '{"groupname": "g", "gid": 1}}]\n[]')
+        self.assertIsNone(read_header(fp))
+        sa_ml, sm_ml = load_backup(fp)
+        self.assertEqual(len(sa_ml), 1)
+        self.assertEqual(sm_ml, [])
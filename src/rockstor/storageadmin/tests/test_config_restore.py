@@ -0,0 +1,140 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pwd
+from django.test import TestCase
+from mock import patch
+from storageadmin.models import (Pool, Share, SambaShare, NFSExportGroup,
+                                 User, resource_versions)
+from storageadmin.views.config_restore import (validate_backup,
+                                               restore_samba_exports,
+                                               restore_nfs_exports,
+                                               restore_users_groups)
+
+
+class ConfigRestoreTests(TestCase):
+
+    def setUp(self):
+        pool = Pool.objects.create(name='rpool', raid='single')
+        for i in range(10):
+            Share.objects.create(name='rshare%d' % i, pool=pool,
+                                 qgroup='0/1', subvol_name='rshare%d' % i)
+        patch('storageadmin.models.share.mount_status',
+              return_value=True).start()
+        self.addCleanup(patch.stopall)
+
+    def test_validate_backup(self):
+        sa_ml = [{'model': 'storageadmin.group', 'pk': 1,
+                  'fields': {'groupname': 'g1', 'gid': 1001, }, },
+                 {'model': 'storageadmin.user', 'pk': 1,
+                  'fields': {'username': 'u1', 'group': 1, }, },
+                 {'model': 'storageadmin.pool', 'pk': 1, 'fields': {}, }, ]
+        families = validate_backup(sa_ml, [])
+        self.assertEqual(families['storageadmin.user'],
+                         [(1, {'username': 'u1', 'group': 1, })])
+
+        # every problem is reported, before anything is restored.
+        sa_ml.append({'model': 'storageadmin.user', 'pk': 2,
+                      'fields': {'username': 'u2', 'group': 7, }, })
+        sa_ml.append({'model': 'storageadmin.sambashare', 'pk': 1,
+                      'fields': {}, })
+        with self.assertRaises(Exception) as cm:
+            validate_backup(sa_ml, [])
+        self.assertIn('unknown group(7)', str(cm.exception))
+        self.assertIn('storageadmin.sambashare(1) lacks', str(cm.exception))
+        with self.assertRaises(Exception):
+            validate_backup({}, [])
+
+    @patch('storageadmin.views.config_restore.restart_samba')
+    @patch('storageadmin.views.config_restore.samba_status',
+           return_value=('', '', 0))
+    @patch('storageadmin.views.config_restore.refresh_smb_config')
+    @patch('storageadmin.views.config_restore.mount_share')
+    def test_restore_samba_exports(self, mock_mount, mock_refresh,
+                                   mock_status, mock_restart):
+        exports = [(i, {'path': '/mnt2/rshare%d' % i, 'comment': 'c%d' % i,
+                        'browsable': 'yes', 'guest_ok': 'no',
+                        'read_only': 'no', })
+                   for i in range(10)]
+        # a missing share and an invalid option are skipped.
+        exports.append((10, {'path': '/mnt2/missing', }))
+        exports[0][1]['browsable'] = 'maybe'
+        restore_samba_exports(exports)
+
+        self.assertEqual(SambaShare.objects.count(), 9)
+        self.assertEqual(mock_refresh.call_count, 1)
+        self.assertEqual(len(mock_refresh.call_args[0][0]), 9)
+        mock_restart.assert_called_once_with(hard=True)
+
+        # already exported shares are skipped too.
+        mock_refresh.reset_mock()
+        restore_samba_exports(exports)
+        self.assertEqual(SambaShare.objects.count(), 9)
+        self.assertEqual(mock_refresh.call_count, 0)
+
+    @patch('storageadmin.views.config_restore.NFSExportMixin.'
+           'refresh_wrapper')
+    @patch('storageadmin.views.config_restore.mount_share')
+    def test_restore_nfs_exports(self, mock_mount, mock_refresh):
+        export_groups = [(1, {'host_str': '*', 'editable': 'rw', }),
+                         (2, {'host_str': 'h2', 'syncable': 'often', }),
+                         (3, {'host_str': 'h3',
+                              'mount_security': 'maybe', })]
+        exports = [(pk, {'export_group': pk,
+                         'mount': '/export/rshare%d' % pk, })
+                   for pk in (1, 2, 3)]
+        version = resource_versions(['share'])['share']
+        restore_nfs_exports(exports, export_groups, [])
+        # the shares listing's etag changes despite the bulk create.
+        self.assertEqual(resource_versions(['share'])['share'], version + 1)
+        # export groups with options the API refuses are skipped.
+        self.assertEqual(list(NFSExportGroup.objects.values_list(
+            'host_str', 'editable')), [('*', 'rw')])
+        self.assertEqual(mock_refresh.call_count, 1)
+
+    @patch('storageadmin.views.config_restore.add_ssh_key')
+    @patch('storageadmin.views.config_restore.smbpasswds')
+    @patch('storageadmin.views.config_restore.chpasswd')
+    @patch('storageadmin.views.config_restore.useradd')
+    @patch('storageadmin.views.config_restore.pwd')
+    @patch('storageadmin.views.config_restore.grp')
+    def test_restore_users(self, mock_grp, mock_pwd, mock_useradd,
+                           mock_chpasswd, mock_smbpasswds, mock_add_ssh_key):
+        mock_grp.getgrall.return_value = []
+        mock_pwd.getpwall.return_value = []
+        mock_pwd.getpwnam.side_effect = lambda u: pwd.struct_passwd(
+            (u, 'x', 2000 + int(u[1:]), 100, '', '/home/%s' % u,
+             '/bin/bash'))
+        users = [(i, {'username': 'u%d' % i, 'group': None, 'uid': 2000 + i,
+                      'admin': False, 'public_key': None, })
+                 for i in range(5)]
+        # the API's name and shell checks apply.
+        users.append((5, {'username': '5u', 'group': None, }))
+        users.append((6, {'username': 'u6', 'group': None,
+                          'shell': '/bin/false', }))
+        users[0][1]['public_key'] = 'ssh-rsa key'
+        restore_users_groups([], users)
+
+        self.assertEqual(mock_useradd.call_count, 5)
+        self.assertEqual(sorted(User.objects.values_list('username',
+                                                         flat=True)),
+                         ['u%d' % i for i in range(5)])
+        # samba passwords are set with one call.
+        mock_smbpasswds.assert_called_once_with(
+            [('u%d' % i, 2000 + i, 'rockstor') for i in range(5)])
+        mock_add_ssh_key.assert_called_once_with('u0', 'ssh-rsa key')
@@ -0,0 +1,178 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APITestCase
+from mock import patch
+from storageadmin.tests.test_api import APITestMixin
+from storageadmin.models import (Disk, Job, Pool, Share)
+from storageadmin.views.job_helpers import (execute_job, submit_job,
+                                            JobCancelled)
+from smart_manager.jobs.job_runner import JobRunner
+
+
+class JobTests(APITestMixin, APITestCase):
+    fixtures = ['fix1.json']
+    BASE_URL = '/api/jobs'
+
+    @classmethod
+    def setUpClass(cls):
+        super(JobTests, cls).setUpClass()
+
+        cls.patch_remove_share = patch('storageadmin.views.share.remove_share')
+        cls.mock_remove_share = cls.patch_remove_share.start()
+
+        cls.patch_service = patch('storageadmin.views.share.Service')
+        cls.mock_service = cls.patch_service.start()
+        cls.mock_service.objects.get.return_value.config = None
+
+    @classmethod
+    def tearDownClass(cls):
+        super(JobTests, cls).tearDownClass()
+
+    def test_async_share_delete(self):
+        # share1 (id=5) of pool1 is deleted by a job, not by the request.
+        response = self.client.delete('/api/shares/5?async=true')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED,
+                         msg=response.data)
+        self.assertEqual(response.data['name'], 'share-delete')
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(response.data['serial_key'], 'pool-2')
+        self.assertTrue(Share.objects.filter(id=5).exists())
+        self.assertFalse(self.mock_remove_share.called)
+
+        jid = response.data['id']
+        response = self.client.get('%s/%d' % (self.BASE_URL, jid))
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+
+        execute_job(Job.objects.get(id=jid))
+        self.assertTrue(self.mock_remove_share.called)
+        self.assertFalse(Share.objects.filter(id=5).exists())
+
+    def test_cancel(self):
+        job = submit_job('share-delete', pool=Pool.objects.get(id=2), sid=5)
+        response = self.client.delete('%s/%d' % (self.BASE_URL, job.id))
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+        self.assertEqual(response.data['status'], 'cancelled')
+
+        # a job that is no longer pending or running can't be cancelled.
+        response = self.client.delete('%s/%d' % (self.BASE_URL, job.id))
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR,
+                         msg=response.data)
+        e_msg = ('Job(%d) is cancelled and cannot be cancelled.' % job.id)
+        self.assertEqual(response.data['detail'], e_msg)
+
+        response = self.client.get('%s?status=cancelled' % self.BASE_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+
+    def test_runner_serializes_per_pool(self):
+        pool = Pool.objects.get(id=2)
+        j1 = submit_job('share-delete', pool=pool, sid=5)
+        j2 = submit_job('share-resize', pool=pool, sid=5, size=2048)
+        j3 = submit_job('pool-resize', pool=Pool.objects.get(id=1), pid=1,
+                        dids=[], dnames=[], raid='single', add=True)
+        jr = JobRunner()
+        jr.claim()
+        # one job per pool at a time, oldest first.
+        self.assertEqual(Job.objects.get(id=j1.id).status, 'running')
+        self.assertEqual(Job.objects.get(id=j2.id).status, 'pending')
+        self.assertEqual(Job.objects.get(id=j3.id).status, 'running')
+        self.assertEqual(jr.busy, set(['pool-2', 'pool-1']))
+
+        # the next job of a pool is claimed once its predecessor is done.
+        jr._done(j1)
+        jr.claim()
+        self.assertEqual(Job.objects.get(id=j2.id).status, 'running')
+
+
+class JobCheckpointTests(TestCase):
+    """
+    Handlers report progress, and can be cancelled, within their work.
+    """
+
+    def setUp(self):
+        self.pool = Pool.objects.create(name='pool1', raid='single')
+        self.disks = [Disk.objects.create(name='sd%s' % c, size=1024,
+                                          parted=False) for c in 'bcd']
+
+    def _cancel(self, job):
+        Job.objects.filter(id=job.id).update(cancel_requested=True)
+
+    @patch('storageadmin.views.pool.trigger_udev_update')
+    @patch('storageadmin.views.pool.PoolMixin._balance_start',
+           return_value='tid')
+    @patch('storageadmin.views.pool.resize_pool')
+    def test_pool_resize_per_disk(self, mock_resize_pool, mock_balance_start,
+                                  mock_udev):
+        job = submit_job('pool-resize', pool=self.pool, pid=self.pool.id,
+                         dids=[d.id for d in self.disks],
+                         dnames=[d.name for d in self.disks], raid='single',
+                         add=True)
+        messages = []
+
+        def resize_pool(pool, dnames, add=True):
+            messages.append(Job.objects.get(id=job.id).message)
+            if (dnames == ['sdc']):
+                self._cancel(job)
+        mock_resize_pool.side_effect = resize_pool
+
+        with self.assertRaises(JobCancelled):
+            execute_job(job)
+        # cancelled before the third disk, the two added are recorded.
+        self.assertEqual(messages, ['Adding disk sdb (1 of 3).',
+                                    'Adding disk sdc (2 of 3).'])
+        self.assertEqual(
+            sorted(Disk.objects.filter(pool=self.pool).values_list(
+                'name', flat=True)), ['sdb', 'sdc'])
+        self.assertFalse(mock_balance_start.called)
+
+    @patch('fs.btrfs.qgroup_destroy')
+    @patch('fs.btrfs.share_id', return_value='258')
+    @patch('fs.btrfs.is_subvol', return_value=True)
+    @patch('fs.btrfs.mount_root', return_value='/mnt2/pool1')
+    @patch('fs.btrfs.is_share_mounted', return_value=False)
+    @patch('fs.btrfs.run_command')
+    def test_share_delete_per_subvolume(self, mock_run_command, *mocks):
+        share = Share.objects.create(pool=self.pool, name='share1', size=1024,
+                                     subvol_name='share1')
+        job = submit_job('share-delete', pool=self.pool, sid=share.id,
+                         force=True)
+        deleted = []
+
+        def run_command(cmd, **kwargs):
+            if (cmd[1:3] == ['subvolume', 'list']):
+                return (['ID 300 gen 1 top level 258 path share1/a',
+                         'ID 301 gen 1 top level 258 path share1/b', ''],
+                        [''], 0)
+            if (cmd[1:3] == ['subvolume', 'delete']):
+                deleted.append(cmd[-1])
+                self._cancel(job)
+            return [''], [''], 0
+        mock_run_command.side_effect = run_command
+
+        with self.assertRaises(JobCancelled):
+            execute_job(job)
+        self.assertEqual(deleted, ['/mnt2/pool1/share1/a'])
+        self.assertEqual(Job.objects.get(id=job.id).message,
+                         'Deleting subvolume 2 of 2 of the share.')
+        self.assertTrue(Share.objects.filter(id=share.id).exists())
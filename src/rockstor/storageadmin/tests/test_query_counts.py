@@ -0,0 +1,120 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from mock import patch
+from storageadmin.tests.test_api import APITestMixin
+from storageadmin.models import (Pool, Disk, Share, Snapshot, NFSExportGroup,
+                                 NFSExport, SambaShare, SambaCustomConfig,
+                                 User, RockOn, DImage, DContainer, DPort)
+
+
+class QueryCountTests(APITestMixin, APITestCase):
+    """
+    The list views must run the same number of queries whatever the number
+    of rows, ie: not a query, or a few, per row and its nested objects.
+    """
+    fixtures = ['fix1.json']
+    URLS = ('/api/pools', '/api/disks', '/api/shares', '/api/nfs-exports',
+            '/api/samba', '/api/rockons', )
+
+    @classmethod
+    def setUpClass(cls):
+        super(QueryCountTests, cls).setUpClass()
+
+        # model properties that run commands.
+        for target, rv in (
+                ('storageadmin.models.pool.pool_usage', 0),
+                ('storageadmin.models.pool.are_quotas_enabled', True),
+                ('storageadmin.models.pool.mount_status', 'rw'),
+                ('storageadmin.models.share.mount_status', 'rw'),
+                ('storageadmin.models.share.qgroup_exists', True),
+                ('storageadmin.views.rockon.docker_status', False), ):
+            patch(target, return_value=rv).start()
+
+    @staticmethod
+    def _populate(start, end):
+        """
+        Add rows start to end (exclusive) of each resource along with the
+        objects serialized with them.
+        """
+        ids = range(start, end)
+        pools = Pool.objects.bulk_create(
+            [Pool(name='qcpool%d' % i, raid='single') for i in ids])
+        pools = Pool.objects.filter(name__in=[p.name for p in pools])
+        Disk.objects.bulk_create(
+            [Disk(name='qcdisk%d' % p.id, pool=p, parted=False)
+             for p in pools])
+        Share.objects.bulk_create(
+            [Share(name='qcshare%d' % p.id, pool=p, qgroup='0/1',
+                   subvol_name='qcshare%d' % p.id) for p in pools])
+        shares = Share.objects.filter(pool__in=pools)
+        Snapshot.objects.bulk_create(
+            [Snapshot(name='qcsnap%d' % s.id, share=s, qgroup='0/2')
+             for s in shares])
+        group = NFSExportGroup.objects.create(host_str='*')
+        NFSExport.objects.bulk_create(
+            [NFSExport(export_group=group, share=s, mount='/export/%s' %
+                       s.name) for s in shares])
+        for i in ids:
+            # a group per export too, as listed.
+            eg = NFSExportGroup.objects.create(host_str='qchost%d' % i)
+            NFSExport.objects.create(export_group=eg, share=shares[0],
+                                     mount='/export/qc%d' % i)
+        SambaShare.objects.bulk_create(
+            [SambaShare(share=s, path='/mnt2/%s' % s.name) for s in shares])
+        smb_shares = SambaShare.objects.filter(share__in=shares)
+        SambaCustomConfig.objects.bulk_create(
+            [SambaCustomConfig(smb_share=s, custom_config='a = b')
+             for s in smb_shares])
+        user = User.objects.create(username='qcuser%d' % start)
+        user.smb_shares.add(*smb_shares)
+        image = DImage.objects.create(name='qcimage', tag='latest',
+                                      repo='na')
+        for i in ids:
+            ro = RockOn.objects.create(name='qcrockon%d' % i,
+                                       description='', version='1',
+                                       state='available', status='stopped',
+                                       ui=True)
+            co = DContainer.objects.create(rockon=ro, dimage=image,
+                                           name='qccontainer%d' % i)
+            DPort.objects.create(container=co, hostp=20000 + i,
+                                 containerp=80, uiport=True)
+
+    def _query_counts(self):
+        counts = {}
+        for url in self.URLS:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('%s?page_size=5000' % url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK,
+                             msg=response.data)
+            counts[url] = len(ctx.captured_queries)
+        return counts
+
+    def test_constant_queries(self):
+        self._populate(0, 1)
+        expected = self._query_counts()
+        current = 1
+        for size in (100, 1000):
+            self._populate(current, size)
+            current = size
+            self.assertEqual(self._query_counts(), expected,
+                             msg='query counts grew with %d rows' % size)
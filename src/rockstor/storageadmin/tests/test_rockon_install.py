@@ -0,0 +1,91 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+from django.test import TestCase
+from django.test.utils import override_settings
+from mock import patch
+from storageadmin.models import (RockOn, DImage, DContainer, DContainerLink,
+                                 DPort)
+from storageadmin.views.rockon_helpers import (generic_install, launch_waves,
+                                               DOCKER)
+
+
+@override_settings(ROCKONS={'install_workers': 4, })
+class RockOnInstallTests(TestCase):
+
+    def setUp(self):
+        self.rockon = RockOn.objects.create(name='app', description='',
+                                            version='1', state='available',
+                                            status='stopped')
+        self.containers = {}
+        # db and cache first, web linked to both, then a helper linked to
+        # web with the same launch_order as web.
+        for name, image, order in (('db', 'postgres', 1),
+                                   ('cache', 'redis', 1),
+                                   ('web', 'app', 2),
+                                   ('helper', 'app', 2)):
+            dimage = DImage.objects.create(name=image, tag='latest',
+                                           repo='na')
+            self.containers[name] = DContainer.objects.create(
+                rockon=self.rockon, dimage=dimage, name=name,
+                launch_order=order)
+        DPort.objects.create(container=self.containers['web'], hostp=8080,
+                             containerp=80, protocol='tcp')
+        for source, destination in (('db', 'web'), ('cache', 'web'),
+                                    ('web', 'helper')):
+            DContainerLink.objects.create(
+                source=self.containers[source],
+                destination=self.containers[destination], name=source)
+
+    def test_launch_waves(self):
+        containers = list(self.containers.values())
+        links = DContainerLink.objects.values_list('source_id',
+                                                   'destination_id')
+        waves = [sorted([c.name for c in w]) for w in
+                 launch_waves(containers, links)]
+        self.assertEqual(waves, [['cache', 'db'], ['web'], ['helper']])
+
+    @patch('storageadmin.views.rockon_helpers.vol_ops', return_value=[])
+    @patch('storageadmin.views.rockon_helpers.rm_container')
+    @patch('storageadmin.views.rockon_helpers.run_command')
+    def test_generic_install(self, mock_run_command, mock_rm, mock_vol_ops):
+        lock = threading.Lock()
+        calls = []
+
+        def run_command(cmd, **kwargs):
+            with lock:
+                calls.append(cmd)
+            return [''], [''], 0
+
+        mock_run_command.side_effect = run_command
+        timings = generic_install(self.rockon)
+
+        pulls = [c[2] for c in calls if c[:2] == [DOCKER, 'pull']]
+        self.assertEqual(sorted(pulls), ['app', 'postgres', 'redis'])
+        started = [c[c.index('--name') + 1] for c in calls
+                   if c[:2] == [DOCKER, 'run']]
+        self.assertEqual(sorted(started[:2]), ['cache', 'db'])
+        self.assertEqual(started[2:], ['web', 'helper'])
+        # all pulls before any run.
+        self.assertTrue(calls.index([DOCKER, 'pull', 'redis']) < 3)
+        web = [c for c in calls if '--name' in c and 'web' in c][0]
+        self.assertIn('8080:80/tcp', web)
+        self.assertEqual(list(timings.keys()),
+                         ['remove', 'pull', 'start wave 1', 'start wave 2',
+                          'start wave 3'])
@@ -32,6 +32,14 @@ class ShareAclTests(APITestMixin, APITestCase):
                                       'mount_share')
         cls.mock_mount_share = cls.patch_mount_share.start()
 
+        cls.patch_apply_acl = patch('storageadmin.views.share_acl.apply_acl')
+        cls.mock_apply_acl = cls.patch_apply_acl.start()
+        cls.mock_apply_acl.return_value = {'errors': 0, }
+
+        cls.patch_owner_ids = patch('storageadmin.views.share_acl.'
+                                    'owner_ids')
+        cls.mock_owner_ids = cls.patch_owner_ids.start()
+
     @classmethod
     def tearDownClass(cls):
         super(ShareAclTests, cls).tearDownClass()
@@ -43,3 +51,23 @@ class ShareAclTests(APITestMixin, APITestCase):
         response = self.client.post('%s/share1/acl' % self.BASE_URL, data=data)
         self.assertEqual(response.status_code,
                          status.HTTP_200_OK, msg=response.data)
+
+        # permissions must be octal.
+        data = {'owner': 'admin', 'perms': 'u+x'}
+        response = self.client.post('%s/10/acl' % self.BASE_URL, data=data)
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR,
+                         msg=response.data)
+        e_msg = 'Permissions(u+x) are not octal, eg: 755.'
+        self.assertEqual(response.data['detail'], e_msg)
+
+    def test_async(self):
+        # the tree walk is left to the job-runner.
+        self.mock_apply_acl.reset_mock()
+        data = {'owner': 'admin', 'perms': '750'}
+        response = self.client.post('%s/10/acl?async=true' % self.BASE_URL,
+                                    data=data)
+        self.assertEqual(response.status_code,
+                         status.HTTP_202_ACCEPTED, msg=response.data)
+        self.assertEqual(response.data['name'], 'share-acl')
+        self.assertFalse(self.mock_apply_acl.called)
@@ -107,6 +107,69 @@ class ShareTests(APITestMixin, APITestCase):
         self.assertEqual(response1.status_code, status.HTTP_200_OK,
                          msg=response2.data)
 
+    def test_cursor_pagination(self):
+        """
+        Walk the shares sorted by name two at a time with ?cursor= and back.
+        """
+        names = sorted(Share.objects.values_list('name', flat=True))
+        url = '%s?sortby=name&cursor=&page_size=2&count=exact' % self.BASE_URL
+        seen = []
+        pages = []
+        while (url is not None):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK,
+                             msg=response.data)
+            self.assertEqual(response.data['count'], len(names))
+            seen.extend([s['name'] for s in response.data['results']])
+            pages.append(response.data)
+            url = response.data['next']
+        self.assertEqual(seen, names)
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+        self.assertEqual(response.data['results'], pages[-2]['results'])
+
+        response = self.client.get('%s?cursor=invalid' % self.BASE_URL)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND,
+                         msg=response.data)
+
+    def test_etag(self):
+        """
+        Listing again with the ETag is 304 Not Modified until a share changes.
+        """
+        response = self.client.get(self.BASE_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+        etag = response['ETag']
+        response = self.client.get(self.BASE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        share = Share.objects.all()[0]
+        share.rusage += 1
+        share.save()
+        response = self.client.get(self.BASE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_disk_attributes(self):
+        """
+        The nested disks' polled attributes, eg: power state, change the
+        ETag too.
+        """
+        with patch('storageadmin.views.share.attributes_stamp',
+                   return_value='1'):
+            etag = self.client.get(self.BASE_URL)['ETag']
+        with patch('storageadmin.views.share.attributes_stamp',
+                   return_value='2'):
+            response = self.client.get(self.BASE_URL,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK,
+                         msg=response.data)
+
     def test_name_regex(self):
         """Share name must start with a alphanumeric(a-z0-9) ' 'character and can be
         followed by any of the ' 'following characters: letter(a-z),
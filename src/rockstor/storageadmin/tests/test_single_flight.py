@@ -0,0 +1,166 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from django.contrib.auth.models import User as DjangoUser
+from django.db import connection
+from mock import patch
+from rest_framework.test import (APIClient, APITransactionTestCase)
+from storageadmin.models import (Group, Pool)
+from system.single_flight import SingleFlight
+
+
+class SingleFlightTests(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def _refresh(self, delay=0, fail=False):
+        self.calls.append(time.time())
+        time.sleep(delay)
+        if (fail):
+            raise Exception('scan failed')
+        return 'done'
+
+    def test_fresh_outcome_reused(self):
+        sf = SingleFlight('disk-state', self.state_dir, freshness=60)
+        self.assertEqual(sf.run(self._refresh), 'done')
+        # within the freshness window, nothing is run.
+        self.assertIsNone(sf.run(self._refresh))
+        self.assertEqual(len(self.calls), 1)
+        # forced callers always get a run of their own when idle.
+        self.assertEqual(sf.run(self._refresh, max_age=0), 'done')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_failed_run_not_reused(self):
+        sf = SingleFlight('pool-state', self.state_dir, freshness=60)
+        self.assertRaises(Exception, sf.run, self._refresh, fail=True)
+        self.assertEqual(sf.run(self._refresh), 'done')
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_callers_join(self):
+        results = []
+
+        def caller():
+            sf = SingleFlight('share-state', self.state_dir, freshness=60)
+            results.append(sf.run(self._refresh, delay=0.5))
+
+        threads = [threading.Thread(target=caller) for i in range(4)]
+        for t in threads:
+            t.start()
+            time.sleep(0.05)
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(results), [None, None, None, 'done'])
+
+    def test_forced_caller_does_not_share_earlier_run(self):
+        results = []
+
+        def caller(max_age):
+            sf = SingleFlight('snapshot-state', self.state_dir, freshness=60)
+            results.append(sf.run(self._refresh, delay=0.5, max_age=max_age))
+
+        first = threading.Thread(target=caller, args=(60,))
+        first.start()
+        time.sleep(0.1)
+        forced = threading.Thread(target=caller, args=(0,))
+        forced.start()
+        first.join()
+        forced.join()
+        # the forced caller arrived after the first run started so it ran
+        # again once the first run was done.
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(results, ['done', 'done'])
+
+
+class RecordingSingleFlight(SingleFlight):
+    """
+    Records whether the run's writes were committed when its outcome was
+    published, ie when callers waiting on it are let go.
+    """
+    published = []
+
+    def _write_state(self, state):
+        self.published.append(not connection.in_atomic_block)
+        super(RecordingSingleFlight, self)._write_state(state)
+
+
+class SharedRefreshTests(APITransactionTestCase):
+    """
+    A caller sharing a refresh run must read the state it refreshed.
+    """
+
+    def setUp(self):
+        DjangoUser.objects.create_user('admin', password='admin')
+        Pool.objects.create(name='pool1', raid='single')
+        self.state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.state_dir)
+        RecordingSingleFlight.published = []
+        state_refresh = patch(
+            'storageadmin.views.command.state_refresh',
+            side_effect=lambda name: RecordingSingleFlight(
+                name, self.state_dir, freshness=60))
+        state_refresh.start()
+        self.addCleanup(state_refresh.stop)
+        max_age = patch('storageadmin.views.command.refresh_max_age',
+                        return_value=60)
+        max_age.start()
+        self.addCleanup(max_age.stop)
+
+    def test_joiner_reads_refreshed_state(self):
+        def import_shares(pool, request):
+            # stands in for the refresh's writes, made slowly enough for
+            # the second caller to join the run.
+            Group.objects.create(groupname='refreshed', gid=5000)
+            time.sleep(0.5)
+
+        responses = {}
+        clients = {}
+        for name in ('leader', 'joiner'):
+            clients[name] = APIClient()
+            clients[name].login(username='admin', password='admin')
+
+        def caller(name):
+            try:
+                responses[name] = clients[name].post(
+                    '/api/commands/refresh-share-state')
+                responses['%s-sees' % name] = Group.objects.filter(
+                    groupname='refreshed').exists()
+            finally:
+                connection.close()
+
+        with patch('storageadmin.views.command.import_shares',
+                   side_effect=import_shares) as mock_import_shares:
+            leader = threading.Thread(target=caller, args=('leader', ))
+            leader.start()
+            time.sleep(0.2)
+            caller('joiner')
+            leader.join()
+        self.assertEqual(mock_import_shares.call_count, 1)
+        self.assertEqual(RecordingSingleFlight.published, [True])
+        self.assertEqual(responses['joiner'].status_code, 200)
+        self.assertTrue(responses['joiner-sees'])
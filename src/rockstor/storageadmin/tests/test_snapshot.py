@@ -70,6 +70,11 @@ class SnapshotTests(APITestMixin, APITestCase):
         cls.mock_remove_snap = cls.patch_remove_snap.start()
         cls.mock_remove_snap.return_value = True
 
+        cls.patch_remove_snaps = patch('storageadmin.views.snapshot.'
+                                       'remove_snaps')
+        cls.mock_remove_snaps = cls.patch_remove_snaps.start()
+        cls.mock_remove_snaps.return_value = []
+
         cls.patch_create_clone = patch('storageadmin.views.snapshot.'
                                        'create_clone')
         cls.mock_create_clone = cls.patch_create_clone.start()
@@ -191,3 +196,49 @@ class SnapshotTests(APITestMixin, APITestCase):
                                       (self.BASE_URL, share_name, snap_name))
         self.assertEqual(response.status_code,
                          status.HTTP_200_OK, msg=response.data)
+
+    def test_bulk_delete_requests(self):
+        """
+        1. Bulk delete with an invalid keep value
+        2. Bulk delete retaining all matching snapshots
+        3. Bulk delete by prefix and snap_type
+        4. Bulk delete by id that does not exist
+        5. Bulk delete by an id that is not an integer
+        """
+        share_id = 3
+        response = self.client.delete('%s/%d/snapshots?keep=-1' %
+                                      (self.BASE_URL, share_id))
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR,
+                         msg=response.data)
+        e_msg = ('keep must be a non-negative integer, not -1')
+        self.assertEqual(response.data['detail'], e_msg)
+
+        response = self.client.delete('%s/%d/snapshots?prefix=snap&keep=1' %
+                                      (self.BASE_URL, share_id))
+        self.assertEqual(response.status_code,
+                         status.HTTP_200_OK, msg=response.data)
+        self.assertEqual(response.data['deleted'], [])
+
+        response = self.client.delete(
+            '%s/%d/snapshots?prefix=snap&snap_type=admin' %
+            (self.BASE_URL, share_id))
+        self.assertEqual(response.status_code,
+                         status.HTTP_200_OK, msg=response.data)
+        self.assertEqual(response.data['deleted'], ['snap1'])
+
+        response = self.client.delete('%s/%d/snapshots?id=1234567' %
+                                      (self.BASE_URL, share_id))
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR,
+                         msg=response.data)
+        e_msg = ('Snapshot(1234567) does not exist.')
+        self.assertEqual(response.data['detail'], e_msg)
+
+        response = self.client.delete('%s/%d/snapshots?id=1,x' %
+                                      (self.BASE_URL, share_id))
+        self.assertEqual(response.status_code,
+                         status.HTTP_500_INTERNAL_SERVER_ERROR,
+                         msg=response.data)
+        e_msg = ('id must be a comma separated list of integers, not 1,x')
+        self.assertEqual(response.data['detail'], e_msg)
@@ -17,6 +17,8 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 from storageadmin.exceptions import RockStorAPIException
 from system.pkg_mgmt import rpm_build_info
+from system.single_flight import SingleFlight
+from django.conf import settings
 import traceback
 import logging
 logger = logging.getLogger(__name__)
@@ -45,3 +47,22 @@ def handle_exception(e, request, e_msg=None, status_code=500):
     logger.debug('Current Rockstor version: %s' % version)
     raise RockStorAPIException(status_code=status_code, detail=e_msg,
                                trace=traceback.format_exc())
+
+
+def state_refresh(name):
+    """
+    Single-flight coordinator for the named storage state refresh, see
+    system.single_flight.
+    """
+    return SingleFlight(name, settings.STATE_REFRESH['state_dir'],
+                        freshness=settings.STATE_REFRESH['freshness'])
+
+
+def refresh_max_age(request):
+    """
+    A refresh request with ?force=true must not be answered by a run that
+    started before it, eg replication refreshing after adding a snapshot.
+    """
+    if (request.query_params.get('force', 'false').lower() == 'true'):
+        return 0
+    return settings.STATE_REFRESH['freshness']
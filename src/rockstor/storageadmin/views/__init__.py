@@ -42,6 +42,8 @@ from oauth_app import OauthAppView  # noqa F401
 from netatalk import (NetatalkListView, NetatalkDetailView)  # noqa F401
 from group import (GroupListView, GroupDetailView)  # noqa F401
 from pool_balance import PoolBalanceView  # noqa F401
+from job import (JobListView, JobDetailView)  # noqa F401
+from debug import (SubprocessStatsView, CommandCacheView)  # noqa F401
 from tls_certificate import TLSCertificateView  # noqa F401
 from rockon import RockOnView  # noqa F401
 from rockon_id import RockOnIdView  # noqa F401
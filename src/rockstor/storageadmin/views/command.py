@@ -34,20 +34,30 @@ from system.osi import (system_shutdown, system_reboot,
                         system_suspend, set_system_rtc_wake)
 from storageadmin.models import (Share, NFSExport, SFTP, Pool, Snapshot,
                                  UpdateSubscription, AdvancedNFSExport)
-from storageadmin.util import handle_exception
+from storageadmin.util import (handle_exception, state_refresh,
+                               refresh_max_age)
 from datetime import datetime
 from django.utils.timezone import utc
 from django.conf import settings
-from django.db import transaction
+from django.db import (transaction, connection)
 from share_helpers import (sftp_snap_toggle, import_shares, import_snapshots)
 from rest_framework_custom.oauth_wrapper import RockstorOAuth2Authentication
 from system.pkg_mgmt import (auto_update, current_version, update_check,
                              update_run, auto_update_status)
 from nfs_exports import NFSExportMixin
+from system.parallel import run_parallel
+from collections import OrderedDict
+import time
 import logging
 logger = logging.getLogger(__name__)
 
 
+def close_connection():
+    # looked up in the calling thread: connection.close itself would be
+    # bound to the connection of the thread that started run_parallel.
+    connection.close()
+
+
 class CommandView(DiskMixin, NFSExportMixin, APIView):
     authentication_classes = (DigestAuthentication, SessionAuthentication,
                               BasicAuthentication,
@@ -55,77 +65,157 @@ class CommandView(DiskMixin, NFSExportMixin, APIView):
     permission_classes = (IsAuthenticated,)
 
     @staticmethod
-    @transaction.atomic
-    def _refresh_pool_state():
+    def _mount_pool(p):
+        """
+        Mount a pool and refresh its db counterpart.
+        :return: False if the pool was skipped as it has no attached disks.
+        """
+        # Log if no attached members are found, ie all devs are detached.
+        if p.disk_set.attached().count() == 0:
+            logger.error('Skipping Pool (%s) mount as there '
+                         'are no attached devices. Moving on.' %
+                         p.name)
+            return False
+        try:
+            mount_root(p)
+            first_attached_dev = p.disk_set.attached().first()
+            # Observe any redirect role by using target_name.
+            pool_info = get_pool_info(first_attached_dev.target_name)
+            p.name = pool_info['label']
+            p.raid = pool_raid('%s%s' % (settings.MNT_PT, p.name))['data']
+            p.size = p.usage_bound()
+            p.save()
+        except Exception as e:
+            logger.error('Exception while refreshing state for '
+                         'Pool(%s). Moving on: %s' %
+                         (p.name, e.__str__()))
+            logger.exception(e)
+        return True
+
+    @staticmethod
+    def _prune_pools():
+        # If our pool has no disks, detached included, then delete it.
+        # We leave pools with all detached members in place intentionally.
         for p in Pool.objects.all():
-            # If our pool has no disks, detached included, then delete it.
-            # We leave pools with all detached members in place intentionally.
             if (p.disk_set.count() == 0):
                 p.delete()
-                continue
-            # Log if no attached members are found, ie all devs are detached.
-            if p.disk_set.attached().count() == 0:
-                logger.error('Skipping Pool (%s) mount as there '
-                             'are no attached devices. Moving on.' %
-                             p.name)
-                continue
+
+    @classmethod
+    @transaction.atomic
+    def _refresh_pool_state(cls):
+        cls._prune_pools()
+        for p in Pool.objects.all():
+            cls._mount_pool(p)
+
+    @staticmethod
+    @transaction.atomic
+    def _refresh_share_state(request):
+        for p in Pool.objects.all():
+            import_shares(p, request)
+
+    @staticmethod
+    @transaction.atomic
+    def _refresh_snapshot_state():
+        for share in Share.objects.all():
+            import_snapshots(share)
+
+    @staticmethod
+    def _bootstrap_share(share):
+        try:
+            if not share.is_mounted:
+                mnt_pt = ('%s%s' % (settings.MNT_PT, share.name))
+                mount_share(share, mnt_pt)
+        except Exception as e:
+            e_msg = ('Exception while mounting a share(%s) during '
+                     'bootstrap: %s' % (share.name, e.__str__()))
+            logger.error(e_msg)
+            logger.exception(e)
+
+        try:
+            import_snapshots(share)
+        except Exception as e:
+            e_msg = ('Exception while importing Snapshots of '
+                     'Share(%s): %s' % (share.name, e.__str__()))
+            logger.error(e_msg)
+            logger.exception(e)
+
+        for snap in Snapshot.objects.filter(share=share, uvisible=True):
             try:
-                mount_root(p)
-                first_attached_dev = p.disk_set.attached().first()
-                # Observe any redirect role by using target_name.
-                pool_info = get_pool_info(first_attached_dev.target_name)
-                p.name = pool_info['label']
-                p.raid = pool_raid('%s%s' % (settings.MNT_PT, p.name))['data']
-                p.size = p.usage_bound()
-                p.save()
+                mount_snap(share, snap.real_name)
             except Exception as e:
-                logger.error('Exception while refreshing state for '
-                             'Pool(%s). Moving on: %s' %
-                             (p.name, e.__str__()))
+                e_msg = ('Failed to make the Snapshot(%s) visible. '
+                         'Exception: %s' % (snap.real_name, e.__str__()))
+                logger.error(e_msg)
+
+    def _bootstrap_pool(self, p, request, timings):
+        """
+        A pool's bootstrap branch: mount it and import its shares. Returns
+        True if the pool is mounted.
+        """
+        start = time.time()
+        mounted = self._mount_pool(p)
+        if (mounted):
+            # Import / update db shares counterpart for managed pool.
+            import_shares(p, request)
+        timings['pool(%s)' % p.name] = round(time.time() - start, 3)
+        return mounted
+
+    def _bootstrap(self, request):
+        """
+        Bring disks, pools, shares, snapshots and their exports up after
+        boot. Pools are independent of each other so they are mounted in
+        parallel, up to BOOTSTRAP['pool_workers'] at a time, then the shares
+        of all mounted pools and their snapshots up to 'share_workers' at a
+        time. The two phases run one after the other rather than nested, so
+        bootstrap never runs more threads than the larger of the two. A
+        failing pool doesn't hold up the rest. SFTP and NFS exports follow
+        once all shares are mounted. Time spent in each phase is logged and
+        returned.
+        """
+        timings = OrderedDict()
+        failures = {}
+
+        def phase(name, func, *args):
+            start = time.time()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error('Exception during bootstrap phase(%s): %s' %
+                             (name, e.__str__()))
                 logger.exception(e)
+                failures[name] = e.__str__()
+            finally:
+                timings[name] = round(time.time() - start, 3)
 
-    @transaction.atomic
-    def post(self, request, command, rtcepoch=None):
-        if (command == 'bootstrap'):
-            self._update_disk_state()
-            self._refresh_pool_state()
-            for p in Pool.objects.all():
-                if p.disk_set.attached().count() == 0:
-                    continue
-                # Import / update db shares counterpart for managed pool.
-                import_shares(p, request)
-
-            for share in Share.objects.all():
-                if share.pool.disk_set.attached().count() == 0:
-                    continue
-                try:
-                    if not share.is_mounted:
-                        mnt_pt = ('%s%s' % (settings.MNT_PT, share.name))
-                        mount_share(share, mnt_pt)
-                except Exception as e:
-                    e_msg = ('Exception while mounting a share(%s) during '
-                             'bootstrap: %s' % (share.name, e.__str__()))
-                    logger.error(e_msg)
-                    logger.exception(e)
+        phase('disks', self._update_disk_state)
+        phase('prune-pools', self._prune_pools)
 
-                try:
-                    import_snapshots(share)
-                except Exception as e:
-                    e_msg = ('Exception while importing Snapshots of '
-                             'Share(%s): %s' % (share.name, e.__str__()))
-                    logger.error(e_msg)
-                    logger.exception(e)
+        mounted_pools = []
 
-            for snap in Snapshot.objects.all():
-                if (snap.uvisible):
-                    try:
-                        mount_snap(snap.share, snap.real_name)
-                    except Exception as e:
-                        e_msg = ('Failed to make the Snapshot(%s) visible. '
-                                 'Exception: %s' %
-                                 (snap.real_name, e.__str__()))
-                        logger.error(e_msg)
+        def bootstrap_pool(p):
+            if (self._bootstrap_pool(p, request, pool_timings)):
+                mounted_pools.append(p.id)
+
+        def pools():
+            for p, e in run_parallel(
+                    bootstrap_pool, Pool.objects.all(),
+                    workers=settings.BOOTSTRAP['pool_workers'],
+                    finalize=close_connection):
+                failures['pool(%s)' % p.name] = e.__str__()
+
+        pool_timings = {}
+        phase('pools', pools)
+        timings.update(sorted(pool_timings.items()))
 
+        def shares():
+            run_parallel(self._bootstrap_share,
+                         Share.objects.filter(pool__in=mounted_pools),
+                         workers=settings.BOOTSTRAP['share_workers'],
+                         finalize=close_connection)
+
+        phase('shares', shares)
+
+        def sftp():
             mnt_map = sftp_mount_map(settings.SFTP_MNT_ROOT)
             for sftpo in SFTP.objects.all():
                 try:
@@ -137,35 +227,73 @@ class CommandView(DiskMixin, NFSExportMixin, APIView):
                              'bootstrap: %s' % e.__str__())
                     logger.error(e_msg)
 
-            try:
-                adv_entries = [a.export_str for a in
-                               AdvancedNFSExport.objects.all()]
-                exports_d = self.create_adv_nfs_export_input(adv_entries,
-                                                             request)
-                exports = self.create_nfs_export_input(NFSExport.objects.all())
-                exports.update(exports_d)
-                self.refresh_wrapper(exports, request, logger)
-            except Exception as e:
-                e_msg = ('Exception while bootstrapping NFS: %s' % e.__str__())
-                logger.error(e_msg)
+        phase('sftp', sftp)
+
+        def nfs():
+            adv_entries = [a.export_str for a in
+                           AdvancedNFSExport.objects.all()]
+            exports_d = self.create_adv_nfs_export_input(adv_entries,
+                                                         request)
+            exports = self.create_nfs_export_input(NFSExport.objects.all())
+            exports.update(exports_d)
+            self.refresh_wrapper(exports, request, logger)
+
+        phase('nfs', nfs)
+
+        #  bootstrap services
+        try:
+            systemctl('firewalld', 'stop')
+            systemctl('firewalld', 'disable')
+            systemctl('nginx', 'stop')
+            systemctl('nginx', 'disable')
+            systemctl('atd', 'enable')
+            systemctl('atd', 'start')
+        except Exception as e:
+            e_msg = ('Exception while setting service statuses during '
+                     'bootstrap: %s' % e.__str__())
+            logger.error(e_msg)
+            handle_exception(Exception(e_msg), request)
+
+        logger.debug('Bootstrap operations completed. Timings(seconds): %s '
+                     'Failures: %s' % (dict(timings), failures))
+        return Response({'timings': timings, 'failures': failures, })
 
-            #  bootstrap services
-            try:
-                systemctl('firewalld', 'stop')
-                systemctl('firewalld', 'disable')
-                systemctl('nginx', 'stop')
-                systemctl('nginx', 'disable')
-                systemctl('atd', 'enable')
-                systemctl('atd', 'start')
-            except Exception as e:
-                e_msg = ('Exception while setting service statuses during '
-                         'bootstrap: %s' % e.__str__())
-                logger.error(e_msg)
-                handle_exception(Exception(e_msg), request)
+    def post(self, request, command, rtcepoch=None):
+        if (command == 'bootstrap'):
+            # not atomic: the parallel branches each commit their own work
+            # and must see the disks and pools committed before them.
+            return self._bootstrap(request)
+        if (command.startswith('refresh-')):
+            return self._refresh(request, command)
+        return self._command(request, command, rtcepoch=rtcepoch)
+
+    def _refresh(self, request, command):
+        # not atomic: every refresh commits its own transaction before its
+        # single-flight run ends, so callers sharing the run read its result.
+        if (command == 'refresh-disk-state'):
+            state_refresh('disk-state').run(self._update_disk_state,
+                                            max_age=refresh_max_age(request))
+            return Response()
 
-            logger.debug('Bootstrap operations completed')
+        if (command == 'refresh-pool-state'):
+            state_refresh('pool-state').run(self._refresh_pool_state,
+                                            max_age=refresh_max_age(request))
+            return Response()
+
+        if (command == 'refresh-share-state'):
+            state_refresh('share-state').run(self._refresh_share_state,
+                                             request,
+                                             max_age=refresh_max_age(request))
             return Response()
 
+        if (command == 'refresh-snapshot-state'):
+            state_refresh('snapshot-state').run(
+                self._refresh_snapshot_state,
+                max_age=refresh_max_age(request))
+            return Response()
+
+    @transaction.atomic
+    def _command(self, request, command, rtcepoch=None):
         if (command == 'utcnow'):
             return Response(datetime.utcnow().replace(tzinfo=utc))
 
@@ -302,21 +430,3 @@ class CommandView(DiskMixin, NFSExportMixin, APIView):
                 msg = ('Failed to disable auto update due to this exception:  '
                        '%s' % e.__str__())
                 handle_exception(Exception(msg), request)
-
-        if (command == 'refresh-disk-state'):
-            self._update_disk_state()
-            return Response()
-
-        if (command == 'refresh-pool-state'):
-            self._refresh_pool_state()
-            return Response()
-
-        if (command == 'refresh-share-state'):
-            for p in Pool.objects.all():
-                import_shares(p, request)
-            return Response()
-
-        if (command == 'refresh-snapshot-state'):
-            for share in Share.objects.all():
-                import_snapshots(share)
-            return Response()
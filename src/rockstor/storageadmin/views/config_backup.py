@@ -25,11 +25,14 @@ from storageadmin.serializers import ConfigBackupSerializer
 from storageadmin.util import handle_exception
 import rest_framework_custom as rfc
 from system.osi import md5sum
-from system.config_backup import backup_config
+from system.config_backup import (backup_config, load_backup,
+                                  dependent_backups)
+from config_restore import (validate_backup, restore_users_groups,
+                            restore_samba_exports, restore_nfs_exports,
+                            restore_afp_exports)
 from rest_framework.parsers import FileUploadParser, MultiPartParser
 from django_ztask.decorators import task
 from cli.rest_util import api_call
-import gzip
 import json
 import logging
 logger = logging.getLogger(__name__)
@@ -49,93 +52,17 @@ def generic_post(url, payload):
                      (url, payload, e.__str__()))
 
 
-def restore_users_groups(ml):
-    logger.debug('Started restoring users and groups.')
-    users = []
-    groups = []
-    # Dictionary to map group pk to group name. Used to re-establishes user
-    # to group name relationship.
-    groupname_from_pk = {}
-    for m in ml:
-        if (m['model'] == 'storageadmin.user'):
-            users.append(m['fields'])
-        if (m['model'] == 'storageadmin.group'):
-            groupname_from_pk[m['pk']] = m['fields']['groupname']
-            groups.append(m['fields'])
-
-    # order is important, first create all the groups and then users.
-    for g in groups:
-        generic_post('%s/groups' % BASE_URL, g)
-    for u in users:
-        # Replace user record 'group' field pk value with resolved group name.
-        u['group'] = groupname_from_pk[u['group']]
-        # users are created with default(rockstor) password
-        u['password'] = 'rockstor'
-        generic_post('%s/users' % BASE_URL, u)
-    logger.debug('Finished restoring users and groups.')
-
-
-def restore_samba_exports(ml):
-    logger.debug('Started restoring Samba exports.')
-    exports = []
-    for m in ml:
-        if (m['model'] == 'storageadmin.sambashare'):
-            exports.append(m['fields'])
-    for e in exports:
-        e['shares'] = [e['path'].split('/')[-1], ]
-        generic_post('%s/samba' % BASE_URL, e)
-    logger.debug('Finished restoring Samba exports.')
-
-
-def restore_afp_exports(ml):
-    logger.debug('Started restoring AFP exports.')
-    exports = []
-    for m in ml:
-        if (m['model'] == 'storageadmin.netatalkshare'):
-            exports.append(m['fields'])
-    if (len(exports) > 0):
-        logger.debug('Starting Netatalk service')
-        generic_post('%s/sm/services/netatalk/start' % BASE_URL, {})
-    for e in exports:
-        e['shares'] = [e['path'].split('/')[-1], ]
-        generic_post('%s/netatalk' % BASE_URL, e)
-    logger.debug('Finished restoring AFP exports.')
-
-
-def restore_nfs_exports(ml):
-    logger.debug('Started restoring NFS exports.')
-    exports = []
-    export_groups = {}
-    adv_exports = {'entries': [], }
-    for m in ml:
-        if (m['model'] == 'storageadmin.nfsexport'):
-            exports.append(m['fields'])
-        elif (m['model'] == 'storageadmin.nfsexportgroup'):
-            m['fields']['pk'] = m['pk']
-            export_groups[m['pk']] = m['fields']
-        elif (m['model'] == 'storageadmin.advancednfsexport'):
-            adv_exports['entries'].append(m['fields']['export_str'])
-    for e in exports:
-        if (len(e['mount'].split('/')) != 3):
-            logger.debug('skipping nfs export with mount: %s' % e['mount'])
-            continue
-        e['shares'] = [e['mount'].split('/')[2], ]
-        payload = dict(export_groups[e['export_group']], **e)
-        generic_post('%s/nfs-exports' % BASE_URL, payload)
-    generic_post('%s/adv-nfs-exports' % BASE_URL, adv_exports)
-    logger.debug('Finished restoring NFS exports.')
-
-
-def restore_services(ml):
+def restore_services(service_ml):
+    # Services are still configured via the API, one call per service, as
+    # that also (re)writes each service's own config and restarts it.
     logger.debug('Started restoring services.')
     services = {}
-    for m in ml:
-        if (m['model'] == 'smart_manager.service'):
-            name = m['fields']['name']
-            config = m['fields']['config']
-            if (config is not None):
-                config = json.loads(config)
-                services[name] = {'config': config, }
+    for pk, fields in service_ml:
+        name = fields['name']
+        config = fields['config']
+        if (config is not None):
+            config = json.loads(config)
+            services[name] = {'config': config, }
     logger.debug('services = %s' % services)
     for s in services:
         generic_post('%s/sm/services/%s/config' % (BASE_URL, s), services[s])
@@ -146,16 +73,19 @@ def restore_services(ml):
 def restore_config(cbid):
     cbo = ConfigBackup.objects.get(id=cbid)
     fp = os.path.join(settings.MEDIA_ROOT, 'config-backups', cbo.filename)
-    gfo = gzip.open(fp)
-    lines = gfo.readlines()
-    sa_ml = json.loads(lines[0])
-    sm_ml = json.loads(lines[1])
-    gfo.close()
-    restore_users_groups(sa_ml)
-    restore_samba_exports(sa_ml)
-    restore_nfs_exports(sa_ml)
-    restore_afp_exports(sa_ml)
-    restore_services(sm_ml)
+    sa_ml, sm_ml = load_backup(fp)
+    # nothing is restored unless the whole backup is valid.
+    families = validate_backup(sa_ml, sm_ml)
+    restore_users_groups(families['storageadmin.group'],
+                         families['storageadmin.user'])
+    restore_samba_exports(families['storageadmin.sambashare'])
+    restore_nfs_exports(families['storageadmin.nfsexport'],
+                        families['storageadmin.nfsexportgroup'],
+                        families['storageadmin.advancednfsexport'])
+    if (restore_afp_exports(families['storageadmin.netatalkshare'])):
+        logger.debug('Starting Netatalk service')
+        generic_post('%s/sm/services/netatalk/start' % BASE_URL, {})
+    restore_services(families['smart_manager.service'])
     # restore_dashboard(ml)
     # restore_appliances(ml)
     # restore_network(sa_ml)
@@ -186,7 +116,9 @@ class ConfigBackupListView(ConfigBackupMixin, rfc.GenericView):
     def post(self, request):
         logger.debug('backing up config...')
         with self._handle_exception(request):
-            cbo = backup_config()
+            incremental = (request.data.get('incremental', False) in
+                           (True, 'true', ))
+            cbo = backup_config(incremental=incremental)
             return Response(ConfigBackupSerializer(cbo).data)
 
 
@@ -196,6 +128,12 @@ class ConfigBackupDetailView(ConfigBackupMixin, rfc.GenericView):
     def delete(self, request, backup_id):
         with self._handle_exception(request):
             cbo = self._validate_input(backup_id, request)
+            dependents = dependent_backups(cbo.filename)
+            if (len(dependents) > 0):
+                e_msg = ('Config backup(%s) can not be deleted as the '
+                         'incremental backups(%s) are built on it. Delete '
+                         'them first.' % (cbo.filename, ', '.join(dependents)))
+                handle_exception(Exception(e_msg), request)
             fp = os.path.join(ConfigBackup.cb_dir(), cbo.filename)
             if (os.path.isfile(fp)):
                 os.remove(fp)
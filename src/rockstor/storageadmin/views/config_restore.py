@@ -0,0 +1,389 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# In process restore of a config backup. The whole backup is validated
+# first, then each family of objects is created in a single transaction and
+# smb.conf, /etc/exports and afp.conf are regenerated once, after all of
+# their family is in place. Items that the equivalent API call would refuse,
+# eg: a user that already exists, are logged and skipped.
+
+import copy
+import grp
+import pwd
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User as DjangoUser
+from django.db import transaction
+from storageadmin.models import (User, Group, Share, SambaShare, NFSExport,
+                                 NFSExportGroup, AdvancedNFSExport,
+                                 NetatalkShare, bump_version)
+from system.users import (useradd, groupadd, chpasswd, smbpasswds,
+                          add_ssh_key)
+from system.samba import (refresh_smb_config, status as samba_status,
+                          restart_samba)
+from system.services import (refresh_afp_config, systemctl)
+from fs.btrfs import mount_share
+from nfs_exports import NFSExportMixin
+from samba import SambaMixin
+from ug_helpers import (validate_name, validate_shell)
+import logging
+logger = logging.getLogger(__name__)
+
+# Fields each restored model must have.
+REQUIRED_FIELDS = {
+    'storageadmin.group': ('groupname', 'gid', ),
+    'storageadmin.user': ('username', 'group', ),
+    'storageadmin.sambashare': ('path', ),
+    'storageadmin.nfsexportgroup': ('host_str', ),
+    'storageadmin.nfsexport': ('export_group', 'mount', ),
+    'storageadmin.advancednfsexport': ('export_str', ),
+    'storageadmin.netatalkshare': ('path', ),
+    'smart_manager.service': ('name', 'config', ),
+}
+# Password of restored users, as passwords aren't backed up.
+DEFAULT_PASSWORD = 'rockstor'
+BOOL_OPTS = SambaMixin.BOOL_OPTS
+
+
+def validate_backup(sa_ml, sm_ml):
+    """
+    Check the whole backup before anything is restored.
+    :param sa_ml: storageadmin model list of the backup.
+    :param sm_ml: smart_manager model list of the backup.
+    :return: dict of model label -> list of (pk, fields) of the models to
+    restore.
+    """
+    errors = []
+    families = dict([(label, []) for label in REQUIRED_FIELDS])
+    for ml in (sa_ml, sm_ml):
+        if (type(ml) != list):
+            raise Exception('Invalid config backup: model list expected, '
+                            'got %s' % type(ml).__name__)
+        for m in ml:
+            if (type(m) != dict or 'model' not in m or
+                    type(m.get('fields')) != dict):
+                errors.append('malformed entry: %s' % str(m)[:100])
+                continue
+            if (m['model'] not in families):
+                continue
+            missing = [f for f in REQUIRED_FIELDS[m['model']]
+                       if (f not in m['fields'])]
+            if (len(missing) > 0):
+                errors.append('%s(%s) lacks %s' % (m['model'], m.get('pk'),
+                                                   missing))
+                continue
+            families[m['model']].append((m.get('pk'),
+                                         copy.deepcopy(m['fields'])))
+    group_pks = set([pk for pk, f in families['storageadmin.group']])
+    for pk, u in families['storageadmin.user']:
+        if (u['group'] is not None and u['group'] not in group_pks):
+            errors.append('user(%s) of unknown group(%s)' %
+                          (u['username'], u['group']))
+    eg_pks = set([pk for pk, f in families['storageadmin.nfsexportgroup']])
+    for pk, e in families['storageadmin.nfsexport']:
+        if (e['export_group'] not in eg_pks):
+            errors.append('nfs export(%s) of unknown export group(%s)' %
+                          (e['mount'], e['export_group']))
+    if (len(errors) > 0):
+        raise Exception('Invalid config backup: %s' % '; '.join(errors))
+    return families
+
+
+def _valid(validator, *args):
+    # the API's validators, returning False instead of raising.
+    try:
+        validator(*args)
+        return True
+    except Exception:
+        return False
+
+
+def restore_users_groups(groups, users):
+    """
+    Create the groups and then the users of the backup. All restored users
+    get DEFAULT_PASSWORD, set with a single chpasswd call.
+    """
+    logger.debug('Started restoring users and groups.')
+    sys_groups = dict([(g.gr_name, g.gr_gid) for g in grp.getgrall()])
+    db_groups = set(Group.objects.values_list('groupname', flat=True))
+    gids = set(sys_groups.values())
+    groupname_from_pk = {}
+    new_groups = []
+    for pk, g in groups:
+        groupname_from_pk[pk] = g['groupname']
+        if (not _valid(validate_name, g['groupname'], 'Group')):
+            logger.error('Skipping group with invalid name(%s).' %
+                         g['groupname'])
+        elif (g['groupname'] in sys_groups or g['groupname'] in db_groups):
+            logger.debug('Group(%s) already exists.' % g['groupname'])
+        elif (g['gid'] in gids):
+            logger.error('Skipping group(%s) as its gid(%s) is taken.' %
+                         (g['groupname'], g['gid']))
+        else:
+            try:
+                groupadd(g['groupname'], g['gid'])
+                gid = grp.getgrnam(g['groupname']).gr_gid
+                gids.add(gid)
+                sys_groups[g['groupname']] = gid
+                new_groups.append(Group(groupname=g['groupname'], gid=gid,
+                                        admin=g.get('admin', True)))
+            except Exception as e:
+                logger.error('Failed to restore group(%s): %s' %
+                             (g['groupname'], e.__str__()))
+    with transaction.atomic():
+        Group.objects.bulk_create(new_groups)
+
+    pw_entries = pwd.getpwall()
+    taken = set([p.pw_name for p in pw_entries])
+    taken.update(User.objects.values_list('username', flat=True))
+    taken.update(DjangoUser.objects.values_list('username', flat=True))
+    uids = set([p.pw_uid for p in pw_entries])
+    groups_by_name = dict([(g.groupname, g) for g in Group.objects.all()])
+    groups_by_gid = dict([(g.gid, g) for g in groups_by_name.values()])
+    created = []
+    for pk, u in users:
+        username = u['username']
+        shell = u.get('shell') or '/bin/bash'
+        uid = u.get('uid')
+        group = groupname_from_pk.get(u['group'])
+        gid = u.get('gid')
+        if (group is not None and group in sys_groups):
+            # as the API, an existing group's gid takes precedence.
+            gid = sys_groups[group]
+        if (not _valid(validate_name, username) or
+                not _valid(validate_shell, shell)):
+            logger.error('Skipping invalid user(%s).' % username)
+            continue
+        if (username in taken):
+            logger.debug('User(%s) already exists.' % username)
+            continue
+        if (uid in uids):
+            logger.error('Skipping user(%s) as its uid(%s) is taken.' %
+                         (username, uid))
+            continue
+        try:
+            useradd(username, shell, uid=uid, gid=gid)
+        except Exception as e:
+            logger.error('Failed to restore user(%s): %s' %
+                         (username, e.__str__()))
+            continue
+        pw_entry = pwd.getpwnam(username)
+        taken.add(username)
+        uids.add(pw_entry.pw_uid)
+        created.append((u, pw_entry))
+    if (len(created) == 0):
+        logger.debug('Finished restoring users and groups.')
+        return
+
+    chpasswd([(pw.pw_name, DEFAULT_PASSWORD) for u, pw in created])
+    try:
+        smbpasswds([(pw.pw_name, pw.pw_uid, DEFAULT_PASSWORD)
+                    for u, pw in created])
+    except Exception as e:
+        logger.error('Failed to set the samba passwords of the restored '
+                     'users: %s' % e.__str__())
+    for u, pw in created:
+        if (u.get('public_key') is None):
+            continue
+        try:
+            add_ssh_key(pw.pw_name, u['public_key'])
+        except Exception as e:
+            logger.error('Failed to set the ssh key of user(%s): %s' %
+                         (pw.pw_name, e.__str__()))
+    # hashed once as every restored user gets the same password.
+    password_hash = make_password(DEFAULT_PASSWORD)
+    with transaction.atomic():
+        DjangoUser.objects.bulk_create(
+            [DjangoUser(username=pw.pw_name, password=password_hash,
+                        is_active=True) for u, pw in created
+             if (u.get('admin', True))])
+        auth_users = dict(DjangoUser.objects.filter(
+            username__in=[pw.pw_name for u, pw in created]).values_list(
+                'username', 'id'))
+        new_groups = []
+        suser_list = []
+        for u, pw in created:
+            group = groups_by_gid.get(pw.pw_gid)
+            if (group is None):
+                groupname = groupname_from_pk.get(u['group']) or pw.pw_name
+                group = Group(gid=pw.pw_gid, groupname=groupname, admin=True)
+                groups_by_gid[pw.pw_gid] = group
+                new_groups.append(group)
+            suser_list.append((User(
+                username=pw.pw_name, uid=pw.pw_uid, gid=pw.pw_gid,
+                shell=pw.pw_shell, homedir=pw.pw_dir,
+                email=u.get('email'), admin=u.get('admin', True),
+                public_key=u.get('public_key'),
+                user_id=auth_users.get(pw.pw_name)), group))
+        # bulk_create doesn't set ids so groups are saved one by one.
+        for group in new_groups:
+            group.save()
+        susers = []
+        for suser, group in suser_list:
+            suser.group = group
+            susers.append(suser)
+        User.objects.bulk_create(susers)
+    logger.debug('Finished restoring users and groups.')
+
+
+def _shares_by_name(names):
+    return dict([(s.name, s) for s in Share.objects.filter(name__in=names)])
+
+
+def restore_samba_exports(exports):
+    logger.debug('Started restoring Samba exports.')
+    names = [e['path'].split('/')[-1] for pk, e in exports]
+    shares = _shares_by_name(names)
+    exported = set(SambaShare.objects.values_list('share__name', flat=True))
+    smb_shares = []
+    for name, (pk, e) in zip(names, exports):
+        if (name not in shares or name in exported):
+            logger.error('Skipping Samba export of share(%s) as it does not '
+                         'exist or is already exported.' % name)
+            continue
+        options = {'comment': e.get('comment', 'samba export'),
+                   'browsable': e.get('browsable', 'yes'),
+                   'guest_ok': e.get('guest_ok', 'no'),
+                   'read_only': e.get('read_only', 'no'),
+                   'shadow_copy': e.get('shadow_copy', False),
+                   'snapshot_prefix': e.get('snapshot_prefix'), }
+        if (any([options[o] not in BOOL_OPTS for o in
+                 ('browsable', 'guest_ok', 'read_only')])):
+            logger.error('Skipping Samba export of share(%s) with invalid '
+                         'options: %s' % (name, options))
+            continue
+        share = shares[name]
+        mnt_pt = ('%s%s' % (settings.MNT_PT, share.name))
+        if not share.is_mounted:
+            mount_share(share, mnt_pt)
+        exported.add(name)
+        smb_shares.append(SambaShare(share=share, path=mnt_pt, **options))
+    if (len(smb_shares) > 0):
+        with transaction.atomic():
+            SambaShare.objects.bulk_create(smb_shares)
+        refresh_smb_config(list(SambaShare.objects.all()))
+        if (samba_status()[2] == 0):
+            restart_samba(hard=True)
+    logger.debug('Finished restoring Samba exports.')
+
+
+def restore_nfs_exports(exports, export_groups, adv_entries):
+    logger.debug('Started restoring NFS exports.')
+    export_groups = dict(export_groups)
+    names = [e['mount'].split('/')[-1] for pk, e in exports]
+    shares = _shares_by_name(names)
+    exported = set(NFSExport.objects.values_list('share__name',
+                                                 'export_group__host_str'))
+    new_exports = []
+    with transaction.atomic():
+        for pk, e in exports:
+            if (len(e['mount'].split('/')) != 3):
+                logger.debug('skipping nfs export with mount: %s' %
+                             e['mount'])
+                continue
+            name = e['mount'].split('/')[2]
+            eg_fields = export_groups[e['export_group']]
+            if (name not in shares or
+                    (name, eg_fields['host_str']) in exported):
+                logger.error('Skipping NFS export of share(%s) as it does '
+                             'not exist or is already exported to %s.' %
+                             (name, eg_fields['host_str']))
+                continue
+            admin_host = eg_fields.get('admin_host')
+            if (admin_host is not None and len(admin_host.strip()) == 0):
+                admin_host = None
+            options = {'host_str': eg_fields['host_str'],
+                       'editable': eg_fields.get('editable', 'ro'),
+                       'syncable': eg_fields.get('syncable', 'async'),
+                       'mount_security': eg_fields.get('mount_security',
+                                                       'insecure'),
+                       'admin_host': admin_host, }
+            try:
+                NFSExportMixin.validate_options(options)
+            except Exception as e:
+                logger.error('Skipping NFS export of share(%s): %s' %
+                             (name, e.__str__()))
+                continue
+            eg = NFSExportGroup(**options)
+            eg.save()
+            share = shares[name]
+            mount_share(share, '%s%s' % (settings.MNT_PT, share.name))
+            exported.add((name, eg.host_str))
+            new_exports.append(NFSExport(
+                export_group=eg, share=share,
+                mount='%s%s' % (settings.NFS_EXPORT_ROOT, share.name)))
+        NFSExport.objects.bulk_create(new_exports)
+        # bulk_create sends no post_save, so no version bump either.
+        if (len(new_exports) > 0):
+            bump_version('share')
+
+        # as the API, the backup's advanced exports replace the current.
+        valid_entries = []
+        for pk, ae in adv_entries:
+            try:
+                NFSExportMixin.create_adv_nfs_export_input(
+                    [ae['export_str']], None)
+                valid_entries.append(ae['export_str'])
+            except Exception as e:
+                logger.error('Skipping invalid advanced NFS export(%s): %s'
+                             % (ae['export_str'], e.__str__()))
+        AdvancedNFSExport.objects.all().delete()
+        AdvancedNFSExport.objects.bulk_create(
+            [AdvancedNFSExport(export_str=es) for es in valid_entries])
+    exports_d = NFSExportMixin.create_nfs_export_input(
+        list(NFSExport.objects.select_related('share', 'export_group')))
+    exports_d.update(NFSExportMixin.create_adv_nfs_export_input(
+        valid_entries, None))
+    NFSExportMixin.refresh_wrapper(exports_d, None, logger)
+    logger.debug('Finished restoring NFS exports.')
+
+
+def restore_afp_exports(exports):
+    """
+    :return: whether any AFP export was restored. The caller then starts
+    the netatalk service.
+    """
+    logger.debug('Started restoring AFP exports.')
+    names = [e['path'].split('/')[-1] for pk, e in exports]
+    shares = _shares_by_name(names)
+    exported = set(NetatalkShare.objects.values_list('share__name',
+                                                     flat=True))
+    afp_shares = []
+    for name, (pk, e) in zip(names, exports):
+        if (name not in shares or name in exported):
+            logger.error('Skipping AFP export of share(%s) as it does not '
+                         'exist or is already exported.' % name)
+            continue
+        time_machine = e.get('time_machine', 'yes')
+        if (time_machine not in BOOL_OPTS):
+            time_machine = 'yes'
+        share = shares[name]
+        mnt_pt = ('%s%s' % (settings.MNT_PT, share.name))
+        if not share.is_mounted:
+            mount_share(share, mnt_pt)
+        exported.add(name)
+        afp_shares.append(NetatalkShare(
+            share=share, path=mnt_pt, time_machine=time_machine,
+            description=e.get('description', '%s on Rockstor' % name)))
+    if (len(afp_shares) > 0):
+        with transaction.atomic():
+            NetatalkShare.objects.bulk_create(afp_shares)
+        refresh_afp_config(list(NetatalkShare.objects.all()))
+        systemctl('netatalk', 'reload-or-restart')
+    logger.debug('Finished restoring AFP exports.')
+    return (len(afp_shares) > 0)
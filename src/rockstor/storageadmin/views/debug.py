@@ -0,0 +1,69 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from rest_framework.response import Response
+from system.command_stats import command_stats
+from system.command_cache import command_cache
+from system.command_guard import command_guard
+from storageadmin.util import handle_exception
+import rest_framework_custom as rfc
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SubprocessStatsView(rfc.GenericView):
+    """
+    run_command statistics of the process serving the request: per
+    executable counts, latencies and output sizes, the slowest commands,
+    the commands running and the devices/pools commands currently fast fail
+    on as an earlier command on them hung.
+    """
+
+    def get(self, request):
+        with self._handle_exception(request):
+            try:
+                limit = int(request.query_params.get('limit', 20))
+            except ValueError:
+                e_msg = ('limit must be an integer.')
+                handle_exception(Exception(e_msg), request)
+            report = command_stats.report(limit=limit)
+            report['running'] = command_guard.running_commands()
+            report['circuits'] = command_guard.open_circuits()
+            return Response(report)
+
+    def delete(self, request):
+        with self._handle_exception(request):
+            command_stats.reset()
+            return Response(command_stats.report())
+
+
+class CommandCacheView(rfc.GenericView):
+    """
+    Hit/miss statistics of the run_command output cache of the process
+    serving the request. DELETE clears the cache and its statistics.
+    """
+
+    def get(self, request):
+        with self._handle_exception(request):
+            return Response(command_cache.report())
+
+    def delete(self, request):
+        with self._handle_exception(request):
+            command_cache.clear()
+            command_cache.reset_stats()
+            return Response(command_cache.report())
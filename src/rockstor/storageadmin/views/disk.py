@@ -23,7 +23,8 @@ from storageadmin.models import (Disk, Pool, Share)
 from fs.btrfs import (enable_quota, mount_root,
                       get_pool_info, pool_raid)
 from storageadmin.serializers import DiskInfoSerializer
-from storageadmin.util import handle_exception
+from storageadmin.util import (handle_exception, state_refresh,
+                               refresh_max_age)
 from share_helpers import (import_shares, import_snapshots)
 from django.conf import settings
 import rest_framework_custom as rfc
@@ -33,7 +34,8 @@ from system.luks import luks_format_disk, get_unlocked_luks_containers_uuids, \
     establish_keyfile, get_open_luks_volume_status
 from system.osi import set_disk_spindown, enter_standby, get_dev_byid_name, \
     wipe_disk, blink_disk, scan_disks, get_whole_dev_uuid, get_byid_name_map, \
-    trigger_systemd_update, systemd_name_escape
+    trigger_systemd_update, systemd_name_escape, read_hdparm_setting
+from system.disk_attributes import update_attributes, attributes_stamp
 from system.services import systemctl
 from copy import deepcopy
 import uuid
@@ -374,15 +376,27 @@ class DiskMixin(object):
 
 class DiskListView(DiskMixin, rfc.GenericView):
     serializer_class = DiskInfoSerializer
+    etag_families = ('disk', 'pool', )
+
+    def etag_extra(self):
+        # power state, apm level etc are from the disk poller's cache.
+        return attributes_stamp()
 
     def get_queryset(self, *args, **kwargs):
         with self._handle_exception(self.request):
-            return Disk.objects.all().order_by('name')
+            return Disk.objects.select_related('pool').order_by('name')
 
     def post(self, request, command, did=None):
         with self._handle_exception(request):
             if (command == 'scan'):
-                return self._update_disk_state()
+                ret = state_refresh('disk-state').run(
+                    self._update_disk_state, max_age=refresh_max_age(request))
+                if (ret is None):
+                    # outcome shared with another scan, serve current state.
+                    ds = DiskInfoSerializer(
+                        Disk.objects.all().order_by('name'), many=True)
+                    ret = Response(ds.data)
+                return ret
 
         e_msg = ('Unsupported command(%s).' % command)
         handle_exception(Exception(e_msg), request)
@@ -1036,10 +1050,17 @@ class DiskDetailView(rfc.GenericView):
         apm_value = int(request.data.get('apm_value', 0))
         set_disk_spindown(disk.name, spindown_time, apm_value,
                           spindown_message)
+        # have the poller re-read the APM level on its next round.
+        update_attributes(disk.name,
+                          hdparm_setting=read_hdparm_setting(disk.name),
+                          next_poll=0, apm_next=0)
         return Response()
 
     @classmethod
     def _pause(cls, did, request):
         disk = cls._validate_disk(did, request)
         enter_standby(disk.name)
+        # io=None as any I/O count seen so far predates the standby.
+        update_attributes(disk.name, power_state='standby', io=None,
+                          next_poll=0)
         return Response()
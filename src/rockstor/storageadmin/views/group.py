@@ -16,7 +16,6 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-import re
 from rest_framework.response import Response
 from django.db import transaction
 from storageadmin.util import handle_exception
@@ -25,9 +24,8 @@ from storageadmin.models import Group
 import rest_framework_custom as rfc
 from system.users import (groupadd, groupdel)
 import grp
-from ug_helpers import combined_groups
+from ug_helpers import (combined_groups, validate_name)
 import logging
-from django.conf import settings
 logger = logging.getLogger(__name__)
 
 
@@ -46,14 +44,10 @@ class GroupListView(rfc.GenericView):
             if (gid is not None):
                 gid = int(gid)
             admin = request.data.get('admin', True)
-            if (groupname is None or
-                    re.match(settings.USERNAME_REGEX, groupname) is None):
-                e_msg = ('Groupname is invalid. It must confirm to the '
-                         'regex: %s' % (settings.USERNAME_REGEX))
-                handle_exception(Exception(e_msg), request, status_code=400)
-            if (len(groupname) > 30):
-                e_msg = ('Groupname cannot be more than 30 characters long')
-                handle_exception(Exception(e_msg), request, status_code=400)
+            try:
+                validate_name(groupname, kind='Group')
+            except Exception as e:
+                handle_exception(e, request, status_code=400)
 
             for g in combined_groups():
                 if (g.groupname == groupname):
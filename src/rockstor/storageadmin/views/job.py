@@ -0,0 +1,83 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from rest_framework.response import Response
+from django.db import transaction
+from django.utils.timezone import utc
+from storageadmin.models import Job
+from storageadmin.serializers import JobSerializer
+from storageadmin.util import handle_exception
+import rest_framework_custom as rfc
+import logging
+logger = logging.getLogger(__name__)
+
+
+class JobListView(rfc.GenericView):
+    serializer_class = JobSerializer
+
+    def get_queryset(self, *args, **kwargs):
+        """
+        Jobs, most recent first. Optionally filtered by ?status= and
+        ?pool=<pool id>
+        """
+        jobs = Job.objects.all()
+        job_status = self.request.query_params.get('status', None)
+        if (job_status is not None):
+            jobs = jobs.filter(status=job_status)
+        pid = self.request.query_params.get('pool', None)
+        if (pid is not None):
+            jobs = jobs.filter(pool_id=pid)
+        return jobs.order_by('-id')
+
+
+class JobDetailView(rfc.GenericView):
+    serializer_class = JobSerializer
+
+    @staticmethod
+    def _validate_job(jid, request):
+        try:
+            return Job.objects.get(id=jid)
+        except Job.DoesNotExist:
+            e_msg = ('Job(%s) does not exist.' % jid)
+            handle_exception(Exception(e_msg), request)
+
+    def get(self, request, jid):
+        with self._handle_exception(request):
+            job = self._validate_job(jid, request)
+            return Response(JobSerializer(job).data)
+
+    @transaction.atomic
+    def delete(self, request, jid):
+        """
+        Cancel a job. A pending job is cancelled right away, a running one
+        at its next progress checkpoint.
+        """
+        with self._handle_exception(request):
+            job = self._validate_job(jid, request)
+            if (job.status not in ('pending', 'running')):
+                e_msg = ('Job(%s) is %s and cannot be cancelled.' %
+                         (jid, job.status))
+                handle_exception(Exception(e_msg), request)
+            # the runner claims pending jobs conditionally so only one of
+            # this and the runner starting it wins.
+            if (Job.objects.filter(id=job.id, status='pending').update(
+                    status='cancelled', cancel_requested=True,
+                    end_time=datetime.utcnow().replace(tzinfo=utc)) == 0):
+                Job.objects.filter(id=job.id).update(cancel_requested=True)
+            return Response(JobSerializer(Job.objects.get(id=job.id)).data)
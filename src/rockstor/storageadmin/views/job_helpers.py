@@ -0,0 +1,113 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json
+from rest_framework import status
+from rest_framework.response import Response
+from storageadmin.models import Job
+from storageadmin.serializers import JobSerializer
+import logging
+logger = logging.getLogger(__name__)
+
+# job name -> handler(progress, **args), see job_handler()
+JOB_HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job_handler(name):
+    """
+    Register the decorated function as the handler of jobs called name. It
+    is called with a JobProgress and the keyword arguments the job was
+    submitted with, which must be json serializable, eg: model ids.
+    """
+    def register(func):
+        JOB_HANDLERS[name] = func
+        return func
+    return register
+
+
+class JobProgress(object):
+    """
+    Progress reporting and cancellation checkpoint handed to job handlers.
+    Handlers call it between steps, ie before anything that can't be undone,
+    and within long steps, eg: per disk or subvolume, with their percent
+    done. Does nothing for handlers run within a request.
+    """
+
+    def __init__(self, job=None):
+        self.job = job
+
+    def __call__(self, percent_done, message=None, cancellable=True):
+        """
+        :param cancellable: False to only report progress, for steps after
+        work that can't be undone or left half done.
+        """
+        if (self.job is None):
+            return
+        Job.objects.filter(id=self.job.id).update(
+            percent_done=percent_done, message=message)
+        if (cancellable and
+                Job.objects.filter(id=self.job.id,
+                                   cancel_requested=True).exists()):
+            raise JobCancelled('Job(%d) cancelled at %d%%.' %
+                               (self.job.id, percent_done))
+
+
+def async_requested(request):
+    return (request.query_params.get('async', 'false').lower() == 'true')
+
+
+def submit_job(name, pool=None, **kwargs):
+    """
+    Queue a job for the job-runner service. Jobs of a pool run one at a
+    time and jobs of different pools run in parallel.
+    """
+    if (name not in JOB_HANDLERS):
+        raise Exception('Unknown job: %s' % name)
+    serial_key = 'system' if (pool is None) else 'pool-%d' % pool.id
+    return Job.objects.create(name=name, pool=pool, serial_key=serial_key,
+                              args=json.dumps(kwargs))
+
+
+def run_job(request, name, pool=None, **kwargs):
+    """
+    Run the named job's handler now, within the request, or if the request
+    asked for it with ?async=true submit it as a background Job instead.
+    :return: the submitted Job or None if the job was run.
+    """
+    if (async_requested(request)):
+        return submit_job(name, pool=pool, **kwargs)
+    JOB_HANDLERS[name](JobProgress(), **kwargs)
+    return None
+
+
+def job_accepted(job):
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+def execute_job(job):
+    """
+    Run a submitted job, as the job-runner service does.
+    """
+    handler = JOB_HANDLERS.get(job.name)
+    if (handler is None):
+        raise Exception('Unknown job: %s' % job.name)
+    return handler(JobProgress(job), **json.loads(job.args))
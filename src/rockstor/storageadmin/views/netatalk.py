@@ -95,7 +95,7 @@ class NetatalkListView(rfc.GenericView):
     def_description = 'on Rockstor'
 
     def get_queryset(self, *args, **kwargs):
-        return NetatalkShare.objects.all()
+        return NetatalkShare.objects.select_related('share')
 
     @transaction.atomic
     def post(self, request):
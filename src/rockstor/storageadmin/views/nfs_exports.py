@@ -112,8 +112,26 @@ class NFSExportMixin(object):
         if (options['admin_host'] is not None and
                 len(options['admin_host'].strip()) == 0):
             options['admin_host'] = None
+        try:
+            NFSExportMixin.validate_options(options)
+        except Exception as e:
+            handle_exception(e, request, status_code=400)
         return options
 
+    @staticmethod
+    def validate_options(options):
+        """
+        Raise an Exception if the export group options aren't valid.
+        """
+        for name, choices in (
+                ('editable', NFSExportGroup.MODIFY_CHOICES),
+                ('syncable', NFSExportGroup.SYNC_CHOICES),
+                ('mount_security', NFSExportGroup.MSECURITY_CHOICES)):
+            valid = [c[0] for c in choices]
+            if (name in options and options[name] not in valid):
+                raise Exception('Invalid %s choice(%s). Possible options: %s'
+                                % (name, options[name], ', '.join(valid)))
+
     @staticmethod
     def dup_export_check(share, host_str, request, export_id=None):
         for e in NFSExport.objects.filter(share=share):
@@ -146,7 +164,8 @@ class NFSExportGroupListView(NFSExportMixin, rfc.GenericView):
     serializer_class = NFSExportGroupSerializer
 
     def get_queryset(self, *args, **kwargs):
-        return NFSExportGroup.objects.filter(nohide=False)
+        return NFSExportGroup.objects.filter(nohide=False).prefetch_related(
+            'nfsexport_set__share')
 
     @transaction.atomic
     def post(self, request):
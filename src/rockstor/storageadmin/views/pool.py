@@ -27,19 +27,28 @@ from django.db import transaction
 from storageadmin.serializers import PoolInfoSerializer
 from storageadmin.models import (Disk, Pool, Share, PoolBalance)
 from fs.btrfs import (add_pool, pool_usage, resize_pool, umount_root,
-                      btrfs_uuid, mount_root, start_balance, usage_bound,
-                      remove_share)
+                      btrfs_uuid, mount_root, usage_bound, remove_share)
+from fs import btrfs
 from system.osi import remount, trigger_udev_update
 from storageadmin.util import handle_exception
+from job_helpers import (job_handler, run_job, job_accepted)
 from django.conf import settings
 import rest_framework_custom as rfc
 from django_ztask.models import Task
+from django_ztask.decorators import task
 import json
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+@task()
+def start_balance(mnt_pt, force=False, convert=None):
+    # The ztask is defined here rather than in fs.btrfs so importing that
+    # doesn't need django_ztask and zmq.
+    return btrfs.start_balance(mnt_pt, force=force, convert=convert)
+
+
 class PoolMixin(object):
     serializer_class = PoolInfoSerializer
     RAID_LEVELS = ('single', 'raid0', 'raid1', 'raid10', 'raid5', 'raid6')
@@ -210,7 +219,8 @@ class PoolMixin(object):
             handle_exception(Exception(e_msg), request)
         return Response(PoolInfoSerializer(pool).data)
 
-    def _balance_start(self, pool, force=False, convert=None):
+    @staticmethod
+    def _balance_start(pool, force=False, convert=None):
         mnt_pt = mount_root(pool)
         start_balance.async(mnt_pt, force=force, convert=convert)
         tid = 0
@@ -225,8 +235,48 @@ class PoolMixin(object):
         return tid
 
 
+@job_handler('pool-resize')
+def pool_resize_job(progress, pid, dids, dnames, raid, add=True):
+    """
+    Add (add=True) or remove the given disks to/from a pool and start the
+    balance that follows. Disks are added or removed one at a time, each
+    recorded as it's done, so a cancelled resize leaves the db in step with
+    the pool. Validation is done by PoolDetailView.put
+    """
+    pool = Pool.objects.get(id=pid)
+    action = 'Adding' if add else 'Removing'
+    for i, (did, dname) in enumerate(zip(dids, dnames)):
+        progress(10 + 70 * i / len(dids), '%s disk %s (%d of %d).' %
+                 (action, dname, i + 1, len(dids)))
+        resize_pool(pool, [dname], add=add)
+        d_o = Disk.objects.get(id=did)
+        d_o.pool = pool if add else None
+        d_o.save()
+        pool.size = pool.usage_bound()
+        pool.save()
+    progress(80, 'Starting the balance.')
+    tid = PoolMixin._balance_start(pool, convert=(raid if add else None))
+    progress(90, 'Balance started.', cancellable=False)
+    ps = PoolBalance(pool=pool, tid=tid)
+    ps.save()
+
+    if (add):
+        pool.raid = raid
+        # Now we ensure udev info is updated via system wide trigger
+        trigger_udev_update()
+    pool.size = pool.usage_bound()
+    pool.save()
+
+
 class PoolListView(PoolMixin, rfc.GenericView):
+    etag_families = ('pool', 'disk', 'share', )
+    etag_mounts = True
+    # free space is from btrfs, not the db.
+    etag_max_age = 30
+
     def get_queryset(self, *args, **kwargs):
+        # disks, nested by PoolInfoSerializer, in one query.
+        pools = Pool.objects.prefetch_related('disk_set')
         sort_col = self.request.query_params.get('sortby', None)
         if (sort_col is not None and sort_col == 'usage'):
             reverse = self.request.query_params.get('reverse', 'no')
@@ -234,9 +284,9 @@ class PoolListView(PoolMixin, rfc.GenericView):
                 reverse = True
             else:
                 reverse = False
-            return sorted(Pool.objects.all(), key=lambda u: u.cur_usage(),
+            return sorted(pools, key=lambda u: u.cur_usage(),
                           reverse=reverse)
-        return Pool.objects.all()
+        return pools
 
     @transaction.atomic
     def post(self, request):
@@ -402,18 +452,6 @@ class PoolDetailView(PoolMixin, rfc.GenericView):
                              'for this pool(%s). Resize is not supported '
                              'during a balance process.' % pool.name)
                     handle_exception(Exception(e_msg), request)
-
-                resize_pool(pool, dnames)
-                tid = self._balance_start(pool, convert=new_raid)
-                ps = PoolBalance(pool=pool, tid=tid)
-                ps.save()
-
-                pool.raid = new_raid
-                for d_o in disks:
-                    d_o.pool = pool
-                    d_o.save()
-                # Now we ensure udev info is updated via system wide trigger
-                trigger_udev_update()
             elif (command == 'remove'):
                 if (new_raid != pool.raid):
                     e_msg = ('Raid configuration cannot be changed while '
@@ -466,21 +504,18 @@ class PoolDetailView(PoolMixin, rfc.GenericView):
                              ' %dKB. This is not supported.' %
                              (dnames, size_cut, usage))
                     handle_exception(Exception(e_msg), request)
-
-                resize_pool(pool, dnames, add=False)
-                tid = self._balance_start(pool)
-                ps = PoolBalance(pool=pool, tid=tid)
-                ps.save()
-
-                for d in disks:
-                    d.pool = None
-                    d.save()
-
             else:
                 e_msg = ('command(%s) is not supported.' % command)
                 handle_exception(Exception(e_msg), request)
-            pool.size = pool.usage_bound()
-            pool.save()
+
+            # the resize itself can take minutes on a busy or degraded pool
+            # so it may be run as a background job.
+            job = run_job(request, 'pool-resize', pool=pool, pid=pool.id,
+                          dids=[d.id for d in disks], dnames=dnames,
+                          raid=new_raid, add=(command == 'add'))
+            if (job is not None):
+                return job_accepted(job)
+            pool = Pool.objects.get(id=pool.id)
             return Response(PoolInfoSerializer(pool).data)
 
     @transaction.atomic
@@ -17,7 +17,6 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
-import requests
 from rest_framework.response import Response
 from django.db import transaction
 from smart_manager.models import Service
@@ -27,7 +26,8 @@ from storageadmin.models import (RockOn, DImage, DContainer, DPort, DVolume,
 from storageadmin.serializers import RockOnSerializer
 from storageadmin.util import handle_exception
 import rest_framework_custom as rfc
-from rockon_helpers import (docker_status, rockon_status)
+from rockon_helpers import (docker_status, rockon_statuses)
+from system.rockon_metastore import MetastoreCache
 from django_ztask.models import Task
 from django.conf import settings
 import pickle
@@ -65,11 +65,17 @@ class RockOnView(rfc.GenericView):
                         handle_exception(Exception(msg), self.request)
                     failed_rids[rid].delete()
                     del failed_rids[rid]
-            for ro in RockOn.objects.all():
+            rockons = list(RockOn.objects.prefetch_related('dcontainer_set'))
+            # current running status of installed rockons, in one go.
+            statuses = rockon_statuses(
+                [ro for ro in rockons if (ro.state == 'installed' and
+                                          ro.id not in pending_rids)])
+            for ro in rockons:
+                cur_state = (ro.state, ro.status)
                 if (ro.state == 'installed'):
                     # update current running status of installed rockons.
-                    if (ro.id not in pending_rids):
-                        ro.status = rockon_status(ro.name)
+                    if (ro.id in statuses):
+                        ro.status = statuses[ro.id]
                 elif (re.search('pending', ro.state) is not None):
                     if (ro.id in failed_rids):
                         # we update the status on behalf of the task runner
@@ -85,8 +91,11 @@ class RockOnView(rfc.GenericView):
                                      % ro.name)
                 elif (ro.state == 'uninstall_failed'):
                     ro.state = 'installed'
-                ro.save()
-        return RockOn.objects.filter().order_by('name')
+                if ((ro.state, ro.status) != cur_state):
+                    ro.save()
+        # containers and ports for ui_port.
+        return RockOn.objects.prefetch_related(
+            'dcontainer_set__dport_set').order_by('name')
 
     @transaction.atomic
     def put(self, request):
@@ -96,17 +105,26 @@ class RockOnView(rfc.GenericView):
     def post(self, request, command=None):
         with self._handle_exception(request):
             if (command == 'update'):
-                rockons = self._get_available()
+                metastore = MetastoreCache(
+                    settings.ROCKONS.get('cache_file'))
+                rockons = self._get_available(metastore)
                 # Delete metadata for apps no longer in metastores.
                 self._delete_deprecated(rockons)
 
                 error_str = ''
+                existing = set(RockOn.objects.values_list('name', flat=True))
                 for r in rockons:
+                    if (r in existing and not metastore.changed(
+                            r, rockons[r])):
+                        continue
                     try:
                         self._create_update_meta(r, rockons[r])
+                        metastore.set_applied(r, rockons[r])
                     except Exception as e:
                         error_str = ('%s: %s' % (r, e.__str__()))
                         logger.exception(e)
+                metastore.prune_applied(rockons.keys())
+                metastore.save()
                 if (len(error_str) > 0):
                     e_msg = ('Errors occurred while processing updates '
                              'for following Rock-ons. %s' % error_str)
@@ -382,7 +400,7 @@ class RockOnView(rfc.GenericView):
             if (eo.key not in cc_d):
                 eo.delete()
 
-    def _get_available(self):
+    def _get_available(self, metastore):
         if Service.objects.get(name='docker').config is None:
             # don't fetch if service is not configured.
             return {}
@@ -390,23 +408,22 @@ class RockOnView(rfc.GenericView):
         url_root = settings.ROCKONS.get('remote_metastore')
         remote_root = ('%s/%s' %
                        (url_root, settings.ROCKONS.get('remote_root')))
+        timeout = settings.ROCKONS.get('timeout', 10)
         msg = ('Error while processing remote metastore at %s' % remote_root)
         with self._handle_exception(self.request, msg=msg):
-            response = requests.get(remote_root, timeout=10)
-            if (response.status_code != 200):
-                response.raise_for_status()
-            root = response.json()
+            root = metastore.fetch_json(remote_root, timeout=timeout)
 
-        meta_cfg = {}
-        for k, v in root.items():
-            cur_meta_url = '%s/%s' % (url_root, v)
+        meta_urls = ['%s/%s' % (url_root, v) for v in root.values()]
+        profiles, failures = metastore.fetch_all(
+            meta_urls, workers=settings.ROCKONS.get('fetch_workers', 8),
+            timeout=timeout)
+        for cur_meta_url, e in failures:
             msg = ('Error while processing Rock-on profile at %s' %
                    cur_meta_url)
-            with self._handle_exception(self.request, msg=msg):
-                cur_res = requests.get(cur_meta_url, timeout=10)
-                if (cur_res.status_code != 200):
-                    cur_res.raise_for_status()
-                meta_cfg.update(cur_res.json())
+            handle_exception(e, self.request, msg)
+        meta_cfg = {}
+        for cur_meta_url in meta_urls:
+            meta_cfg.update(profiles[cur_meta_url])
 
         local_root = settings.ROCKONS.get('local_metastore')
         if (os.path.isdir(local_root)):
@@ -18,16 +18,17 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 import os
 import time
+from collections import OrderedDict
 from system.osi import run_command
+from system.parallel import run_parallel
 from django.conf import settings
 from django_ztask.decorators import task
 from cli.api_wrapper import APIWrapper
 from system.services import service_status
-from storageadmin.models import (RockOn, DContainer, DVolume, DPort,
-                                 DCustomConfig, DContainerLink,
-                                 ContainerOption, DContainerEnv)
+from storageadmin.models import (RockOn, DContainer, DVolume,
+                                 DCustomConfig, DContainerLink)
 from fs.btrfs import mount_share
-from rockon_utils import container_status
+from rockon_utils import (container_status, container_statuses)
 import logging
 
 DOCKER = '/usr/bin/docker'
@@ -55,6 +56,29 @@ def rockon_status(name):
     return container_status(co.name)
 
 
+def rockon_statuses(rockons):
+    """
+    rockon_status of each of the given RockOns, with their dcontainer_set
+    prefetched, from a single Docker API query.
+    :return: dict of RockOn id -> status.
+    """
+    statuses = {}
+    last_containers = {}
+    for ro in rockons:
+        custom_status = globals().get('%s_status' % ro.name.lower())
+        if (custom_status is not None):
+            statuses[ro.id] = custom_status(ro)
+            continue
+        containers = sorted(ro.dcontainer_set.all(),
+                            key=lambda c: c.launch_order)
+        if (len(containers) > 0):
+            last_containers[ro.id] = containers[-1].name
+    cstatuses = container_statuses(last_containers.values())
+    for rid, name in last_containers.items():
+        statuses[rid] = cstatuses[name]
+    return statuses
+
+
 def rm_container(name):
     o, e, rc = run_command([DOCKER, 'stop', name], throw=False)
     o, e, rc = run_command([DOCKER, 'rm', name], throw=False)
@@ -117,8 +141,16 @@ def install(rid):
     new_state = 'installed'
     try:
         rockon = RockOn.objects.get(id=rid)
-        globals().get('%s_install' % rockon.name.lower(),
-                      generic_install)(rockon)
+        custom_install = globals().get('%s_install' % rockon.name.lower())
+        if (custom_install is not None):
+            custom_install(rockon)
+        else:
+            timings = OrderedDict()
+            try:
+                generic_install(rockon, timings)
+            finally:
+                logger.info('Rock-on(%s) install phase timings(seconds): %s'
+                            % (rockon.name, timings.items()))
     except Exception as e:
         logger.debug('exception while installing the Rockon(%d)' % rid)
         logger.exception(e)
@@ -152,7 +184,7 @@ def generic_uninstall(rockon):
 
 def container_ops(container):
     ops_list = []
-    for o in ContainerOption.objects.filter(container=container):
+    for o in container.containeroption_set.all():
         ops_list.append(o.name)
         if (len(o.val.strip()) > 0):
             ops_list.append(o.val)
@@ -161,7 +193,7 @@ def container_ops(container):
 
 def port_ops(container):
     ops_list = []
-    for po in DPort.objects.filter(container=container):
+    for po in container.dport_set.all():
         pstr = '%s:%s' % (po.hostp, po.containerp)
         if (po.protocol is not None):
             pstr = '%s/%s' % (pstr, po.protocol)
@@ -175,7 +207,7 @@ def port_ops(container):
 
 def vol_ops(container):
     ops_list = []
-    for v in DVolume.objects.filter(container=container):
+    for v in container.dvolume_set.all():
         share_mnt = ('%s%s' % (settings.MNT_PT, v.share.name))
         mount_share(v.share, share_mnt)
         ops_list.extend(['-v', '%s:%s' % (share_mnt, v.dest_dir)])
@@ -186,25 +218,83 @@ def vol_ops(container):
 
 def vol_owner_uid(container):
     # If there are volumes, return the uid of the owner of the first volume.
-    vo = DVolume.objects.filter(container=container).first()
-    if (vo is None):
+    volumes = sorted(container.dvolume_set.all(), key=lambda v: v.id)
+    if (len(volumes) == 0):
         return None
+    vo = volumes[0]
     share_mnt = ('%s%s' % (settings.MNT_PT, vo.share.name))
     return os.stat(share_mnt).st_uid
 
 
 def envars(container):
     var_list = []
-    for e in DContainerEnv.objects.filter(container=container):
+    for e in container.dcontainerenv_set.all():
         var_list.extend(['-e', '%s=%s' % (e.key, e.val)])
     return var_list
 
 
-def generic_install(rockon):
-    for c in DContainer.objects.filter(rockon=rockon).order_by('launch_order'):
-        rm_container(c.name)
-        # pull image explicitly so we get updates on re-installs.
-        run_command([DOCKER, 'pull', c.dimage.name])
+def launch_waves(containers, links):
+    """
+    Group containers into waves that are started one after the other, the
+    containers of a wave concurrently. Containers start after those with a
+    lower launch_order and linked containers after their source.
+    :param links: list of (source id, destination id) of DContainerLinks.
+    :return: list of lists of containers.
+    """
+    orders = sorted(set([c.launch_order for c in containers]))
+    wave = dict([(c.id, orders.index(c.launch_order)) for c in containers])
+    links = [(s, d) for s, d in links if (s in wave and d in wave)]
+    # a pass per container settles any chain of links, more means a cycle.
+    for i in range(len(containers)):
+        moved = False
+        for source, destination in links:
+            if (wave[destination] <= wave[source]):
+                wave[destination] = wave[source] + 1
+                moved = True
+        if (not moved):
+            break
+    waves = []
+    for w in sorted(set(wave.values())):
+        waves.append([c for c in containers if (wave[c.id] == w)])
+    return waves
+
+
+def _raise_failures(failures, what):
+    if (len(failures) > 0):
+        item, e = failures[0]
+        raise Exception('Failed to %s(%s): %s' % (what, item, e.__str__()))
+
+
+def generic_install(rockon, timings=None):
+    """
+    Install rockon's containers: remove any old ones, pull all images
+    concurrently and then start the containers in launch_waves.
+    :param timings: dict to record the seconds each phase took in.
+    """
+    if (timings is None):
+        timings = OrderedDict()
+    workers = settings.ROCKONS.get('install_workers', 4)
+    containers = list(DContainer.objects.filter(rockon=rockon).select_related(
+        'dimage').prefetch_related('containeroption_set', 'dport_set',
+                                   'dvolume_set__share__pool',
+                                   'dcontainerenv_set').order_by(
+                                       'launch_order'))
+    start = time.time()
+    run_parallel(rm_container, [c.name for c in containers],
+                 workers=workers)
+    timings['remove'] = round(time.time() - start, 3)
+
+    # pull images explicitly so we get updates on re-installs.
+    start = time.time()
+    images = list(OrderedDict.fromkeys([c.dimage.name for c in containers]))
+    failures = run_parallel(lambda i: run_command([DOCKER, 'pull', i]),
+                            images, workers=workers)
+    timings['pull'] = round(time.time() - start, 3)
+    _raise_failures(failures, 'pull image')
+
+    # commands are built here as vol_ops mounts shares.
+    cmds = {}
+    for c in containers:
         cmd = list(DCMD2) + ['--name', c.name, ]
         cmd.extend(vol_ops(c))
         if (c.uid is not None):
@@ -218,7 +308,17 @@ def generic_install(rockon):
         cmd.extend(container_ops(c))
         cmd.extend(envars(c))
         cmd.append(c.dimage.name)
-        run_command(cmd)
+        cmds[c.name] = cmd
+
+    links = DContainerLink.objects.filter(
+        destination__in=containers).values_list('source_id', 'destination_id')
+    for i, wave in enumerate(launch_waves(containers, links)):
+        start = time.time()
+        failures = run_parallel(lambda name: run_command(cmds[name]),
+                                [c.name for c in wave], workers=workers)
+        timings['start wave %d' % (i + 1)] = round(time.time() - start, 3)
+        _raise_failures(failures, 'start container')
+    return timings
 
 
 def openvpn_install(rockon):
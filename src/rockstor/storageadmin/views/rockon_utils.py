@@ -17,6 +17,7 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
 from system.osi import run_command
+from system.docker import container_states
 import logging
 logger = logging.getLogger(__name__)
 
@@ -49,3 +50,26 @@ def container_status(name):
         logger.exception(e)
     finally:
         return state
+
+
+def container_statuses(names):
+    """
+    container_status of each of the given containers from a single Docker
+    API query. Only containers that exited with an error, to report it, or
+    all if the API isn't available are inspected individually.
+    :return: dict of container name -> status.
+    """
+    states = container_states()
+    statuses = {}
+    for name in names:
+        if (states is None):
+            statuses[name] = container_status(name)
+        elif (name not in states):
+            statuses[name] = 'unknown_error'
+        elif (states[name][0] in ('running', 'paused', 'restarting')):
+            statuses[name] = 'started'
+        elif (states[name][1] not in (None, 0)):
+            statuses[name] = container_status(name)
+        else:
+            statuses[name] = 'stopped'
+    return statuses
@@ -33,5 +33,5 @@ class RockOnVolumeView(rfc.GenericView):
             handle_exception(Exception(e_msg), self.request)
 
         containers = DContainer.objects.filter(rockon=rockon)
-        return DVolume.objects.filter(
+        return DVolume.objects.select_related('share').filter(
             container__in=containers).order_by('label')
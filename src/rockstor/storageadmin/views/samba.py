@@ -124,7 +124,9 @@ class SambaMixin(object):
 
 
 class SambaListView(SambaMixin, ShareMixin, rfc.GenericView):
-    queryset = SambaShare.objects.all()
+    queryset = SambaShare.objects.select_related('share').prefetch_related(
+        'admin_users__group', 'admin_users__smb_shares',
+        'sambacustomconfig_set')
 
     @transaction.atomic
     def post(self, request):
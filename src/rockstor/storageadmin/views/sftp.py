@@ -39,7 +39,7 @@ class SFTPListView(rfc.GenericView):
     serializer_class = SFTPSerializer
 
     def get_queryset(self, *args, **kwargs):
-        return SFTP.objects.all()
+        return SFTP.objects.select_related('share')
 
     @transaction.atomic
     def post(self, request):
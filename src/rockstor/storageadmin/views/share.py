@@ -27,8 +27,10 @@ from fs.btrfs import (add_share, remove_share, update_quota, volume_usage,
                       set_property, mount_share, qgroup_id, qgroup_create,
                       share_pqgroup_assign)
 from system.services import systemctl
+from system.disk_attributes import attributes_stamp
 from storageadmin.serializers import ShareSerializer, SharePoolSerializer
 from storageadmin.util import handle_exception
+from job_helpers import (job_handler, run_job, job_accepted, JobCancelled)
 from django.conf import settings
 import rest_framework_custom as rfc
 import json
@@ -45,6 +47,15 @@ PQGROUP_DEFAULT = settings.MODEL_DEFS['pqgroup']
 
 class ShareMixin(object):
 
+    @staticmethod
+    def _with_related(queryset):
+        """
+        Fetch what ShareSerializer nests along with the shares, in a fixed
+        number of queries rather than a few per share.
+        """
+        return queryset.select_related('pool').prefetch_related(
+            'snapshot_set', 'nfsexport_set', 'pool__disk_set')
+
     @staticmethod
     def _validate_share_size(request, pool):
         size = request.data.get('size', pool.size)
@@ -88,6 +99,24 @@ class ShareMixin(object):
 
 class ShareListView(ShareMixin, rfc.GenericView):
     serializer_class = ShareSerializer
+    # ?sortby= names that aren't Share columns.
+    SORT_COLUMNS = {'usage': 'rusage', 'size_gb': 'size',
+                    'pool': 'pool__name', }
+    etag_families = ('share', 'pool', 'disk', 'snapshot', )
+    etag_mounts = True
+    # the nested pools' free space and quota state are from btrfs, not the
+    # db.
+    etag_max_age = 30
+
+    def etag_extra(self):
+        # and their disks' power state, apm level etc from the disk poller's
+        # cache.
+        return attributes_stamp()
+
+    @staticmethod
+    def db_columns():
+        return ([f.name for f in Share._meta.concrete_fields] +
+                ['pool__name'])
 
     def get_queryset(self, *args, **kwargs):
         with self._handle_exception(self.request):
@@ -98,11 +127,16 @@ class ShareListView(ShareMixin, rfc.GenericView):
                     reverse = True
                 else:
                     reverse = False
-                if (sort_col == 'usage'):
-                    sort_col = 'rusage'
-                return sorted(Share.objects.all(),
-                              key=lambda u: getattr(u, sort_col),
-                              reverse=reverse)
+                sort_col = self.SORT_COLUMNS.get(sort_col, sort_col)
+                if (sort_col not in self.db_columns()):
+                    # computed properties, eg: mount_status, can only be
+                    # sorted on in python.
+                    return sorted(self._with_related(Share.objects.all()),
+                                  key=lambda u: getattr(u, sort_col),
+                                  reverse=reverse)
+                direction = '-' if reverse else ''
+                return self._with_related(Share.objects.all()).order_by(
+                    '%s%s' % (direction, sort_col), '%sid' % direction)
             # If this box is receiving replication backups, the first full-send
             # is interpreted as a Share(because it does not have a parent
             # subvol/snapshot) It is a transient subvolume that gets rolled
@@ -111,8 +145,9 @@ class ShareListView(ShareMixin, rfc.GenericView):
             # for cosmetic and UX reasons.
             # TODO: This currently fails to work, needs investigating, leaving
             # TODO: for now as good for indicting the initial rep phases.
-            return Share.objects.exclude(
-                name__regex=r'^\.snapshots/.*/.*_replication_').order_by('-id')
+            return self._with_related(Share.objects.exclude(
+                name__regex=r'^\.snapshots/.*/.*_replication_')).order_by(
+                    '-id')
 
     @transaction.atomic
     def post(self, request):
@@ -198,7 +233,7 @@ class PoolShareListView(ShareMixin, rfc.GenericView):
 
     def get_queryset(self, *args, **kwargs):
         pool = Pool.objects.get(id=self.kwargs.get('pid'))
-        return pool.share_set.all()
+        return self._with_related(pool.share_set.all())
 
 
 class ShareDetailView(ShareMixin, rfc.GenericView):
@@ -206,7 +241,8 @@ class ShareDetailView(ShareMixin, rfc.GenericView):
 
     def get(self, *args, **kwargs):
         try:
-            data = Share.objects.get(id=self.kwargs['sid'])
+            data = self._with_related(Share.objects.all()).get(
+                id=self.kwargs['sid'])
             serialized_data = ShareSerializer(data)
             return Response(serialized_data.data)
         except Share.DoesNotExist:
@@ -216,6 +252,7 @@ class ShareDetailView(ShareMixin, rfc.GenericView):
     def put(self, request, sid):
         with self._handle_exception(request):
             share = self._validate_share(request, sid)
+            job = None
             if ('size' in request.data):
                 new_size = self._validate_share_size(request, share.pool)
                 qid = qgroup_id(share.pool, share.subvol_name)
@@ -226,37 +263,25 @@ class ShareDetailView(ShareMixin, rfc.GenericView):
                              'of the share.' %
                              (new_size, cur_rusage))
                     handle_exception(Exception(e_msg), request)
-                # quota maintenance
-                if share.pool.quotas_enabled:
-                    # Only try create / update quotas if they are enabled,
-                    # pqgroup of PQGROUP_DEFAULT (-1/-1) indicates no pqgroup,
-                    # ie quotas were disabled when update was requested.
-                    if share.pqgroup == PQGROUP_DEFAULT or \
-                            not share.pqgroup_exist:
-                        # if quotas were disabled or pqgroup non-existent.
-                        share.pqgroup = qgroup_create(share.pool)
-                        share.save()
-                    if share.pqgroup is not PQGROUP_DEFAULT:
-                        # Only update quota and assign if now non default as
-                        # default can also indicate Read-only fs at this point.
-                        update_quota(share.pool, share.pqgroup,
-                                     new_size * 1024)
-                        share_pqgroup_assign(share.pqgroup, share)
-                else:
-                    # Our pool's quotas are disabled so reset pqgroup to -1/-1.
-                    if share.pqgroup != PQGROUP_DEFAULT:
-                        # Only reset if necessary
-                        share.pqgroup = PQGROUP_DEFAULT
-                        share.save()
-                share.size = new_size
+                job = run_job(request, 'share-resize', pool=share.pool,
+                              sid=share.id, size=new_size)
+                if (job is None):
+                    share = Share.objects.get(id=share.id)
+            compression_changed = False
             if ('compression' in request.data):
                 new_compression = self._validate_compression(request)
                 if (share.compression_algo != new_compression):
                     share.compression_algo = new_compression
+                    compression_changed = True
                     mnt_pt = '%s%s' % (settings.MNT_PT, share.name)
                     if (new_compression == 'no'):
                         new_compression = ''
                     set_property(mnt_pt, 'compression', new_compression)
+            if (job is not None):
+                # the size, and quota, are the job's to save.
+                if (compression_changed):
+                    share.save(update_fields=['compression_algo'])
+                return job_accepted(job)
             share.save()
             return Response(ShareSerializer(share).data)
 
@@ -327,13 +352,71 @@ class ShareDetailView(ShareMixin, rfc.GenericView):
 
             self._rockon_check(request, share.name, force=force)
 
-            try:
-                remove_share(share.pool, share.subvol_name, share.pqgroup,
-                             force=force)
-            except Exception as e:
-                logger.exception(e)
-                e_msg = ('Failed to delete the Share(%s). Error from '
-                         'the OS: %s' % (share.name, e.__str__()))
-                handle_exception(Exception(e_msg), request)
-            share.delete()
+            job = run_job(request, 'share-delete', pool=share.pool,
+                          sid=share.id, force=force)
+            if (job is not None):
+                return job_accepted(job)
             return Response()
+
+
+@job_handler('share-resize')
+def share_resize_job(progress, sid, size):
+    """
+    Set a share's size and hence its quota. Validation is done by
+    ShareDetailView.put
+    """
+    share = Share.objects.get(id=sid)
+    # quota maintenance
+    if share.pool.quotas_enabled:
+        # Only try create / update quotas if they are enabled,
+        # pqgroup of PQGROUP_DEFAULT (-1/-1) indicates no pqgroup,
+        # ie quotas were disabled when update was requested.
+        if share.pqgroup == PQGROUP_DEFAULT or not share.pqgroup_exist:
+            # if quotas were disabled or pqgroup non-existent.
+            progress(10, 'Creating the share quota group.')
+            share.pqgroup = qgroup_create(share.pool)
+            share.save()
+        if share.pqgroup is not PQGROUP_DEFAULT:
+            # Only update quota and assign if now non default as
+            # default can also indicate Read-only fs at this point.
+            progress(40, 'Updating the share quota.')
+            update_quota(share.pool, share.pqgroup, size * 1024)
+            progress(70, 'Assigning the share quota group.')
+            share_pqgroup_assign(share.pqgroup, share)
+    else:
+        # Our pool's quotas are disabled so reset pqgroup to -1/-1.
+        if share.pqgroup != PQGROUP_DEFAULT:
+            # Only reset if necessary
+            share.pqgroup = PQGROUP_DEFAULT
+    progress(90, 'Saving the share size.', cancellable=False)
+    share.size = size
+    share.save()
+
+
+@job_handler('share-delete')
+def share_delete_job(progress, sid, force=False):
+    """
+    Delete a share's subvolume and qgroups, then the share. Validation is
+    done by ShareDetailView.delete
+    """
+    share = Share.objects.get(id=sid)
+
+    def subvol_progress(done, total):
+        if (done < total - 1):
+            progress(10 + 80 * done / total, 'Deleting subvolume %d of %d '
+                     'of the share.' % (done + 1, total - 1))
+        else:
+            progress(10 + 80 * done / total, 'Deleting the share subvolume.')
+
+    progress(10, 'Deleting the share.')
+    try:
+        remove_share(share.pool, share.subvol_name, share.pqgroup,
+                     force=force, progress=subvol_progress)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        e_msg = ('Failed to delete the Share(%s). Error from '
+                 'the OS: %s' % (share.name, e.__str__()))
+        raise Exception(e_msg)
+    share.delete()
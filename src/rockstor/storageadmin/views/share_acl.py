@@ -16,14 +16,19 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import os
 from rest_framework.response import Response
 from django.db import transaction
 from django.conf import settings
 from storageadmin.models import Share
 from storageadmin.serializers import ShareSerializer
+from storageadmin.util import handle_exception
 from fs.btrfs import (mount_share, umount_root)
 from storageadmin.views import ShareListView
-from system.acl import (chown, chmod)
+from job_helpers import (job_handler, run_job, job_accepted)
+from system.acl import (apply_acl, owner_ids)
+import logging
+logger = logging.getLogger(__name__)
 
 
 class ShareACLView(ShareListView):
@@ -46,19 +51,70 @@ class ShareACLView(ShareListView):
                                                      options['orecursive'])
             options['precursive'] = request.data.get('precursive',
                                                      options['precursive'])
+            try:
+                owner_ids(options['owner'], options['group'])
+                int(options['perms'], 8)
+            except ValueError:
+                e_msg = ('Permissions(%s) are not octal, eg: 755.' %
+                         options['perms'])
+                handle_exception(Exception(e_msg), request)
+            except Exception as e:
+                handle_exception(e, request)
             share.owner = options['owner']
             share.group = options['group']
             share.perms = options['perms']
             share.save()
 
-            mnt_pt = ('%s%s' % (settings.MNT_PT, share.name))
-            force_mount = False
-            if not share.is_mounted:
-                mount_share(share, mnt_pt)
-                force_mount = True
-            chown(mnt_pt, options['owner'], options['group'],
-                  options['orecursive'])
-            chmod(mnt_pt, options['perms'], options['precursive'])
-            if (force_mount is True):
-                umount_root(mnt_pt)
+            job = run_job(request, 'share-acl', pool=share.pool, sid=share.id,
+                          orecursive=(options['orecursive'] is True),
+                          precursive=(options['precursive'] is True))
+            if (job is not None):
+                return job_accepted(job)
             return Response(ShareSerializer(share).data)
+
+
+@job_handler('share-acl')
+def share_acl_job(progress, sid, orecursive, precursive):
+    """
+    Apply a share's owner, group and permissions to it and, when recursive,
+    to everything in it. A run with the same changes that was cancelled or
+    interrupted is resumed. Validation is done by ShareACLView.post
+    """
+    share = Share.objects.get(id=sid)
+    config = getattr(settings, 'SHARE_ACL', {})
+    checkpoint = None
+    if (config.get('checkpoint_dir') is not None):
+        if (not os.path.isdir(config['checkpoint_dir'])):
+            os.makedirs(config['checkpoint_dir'])
+        checkpoint = os.path.join(config['checkpoint_dir'],
+                                  'share-%d' % share.id)
+
+    def report(p):
+        # directories left are the only measure of the work left we have.
+        percent = min(99, 100 * p['dirs'] / max(p['dirs'] + p['pending'], 1))
+        progress(percent, '%d entries checked, %d changed and %d failed at '
+                 '%d entries/s.' % (p['entries'], p['changed'], p['errors'],
+                                    p['rate']))
+
+    mnt_pt = ('%s%s' % (settings.MNT_PT, share.name))
+    force_mount = False
+    if not share.is_mounted:
+        mount_share(share, mnt_pt)
+        force_mount = True
+    try:
+        p = apply_acl(mnt_pt, share.owner, share.group, share.perms,
+                      owner_recursive=orecursive, perms_recursive=precursive,
+                      workers=config.get('workers', 4),
+                      max_rate=config.get('max_rate', 0),
+                      checkpoint=checkpoint,
+                      checkpoint_interval=config.get('checkpoint_interval',
+                                                     10),
+                      report=report)
+    finally:
+        if (force_mount is True):
+            umount_root(mnt_pt)
+    logger.debug('Applied the owner and permissions of Share(%s): %s' %
+                 (share.name, p))
+    if (p['errors'] > 0):
+        raise Exception('Failed to change %d entries of Share(%s). See the '
+                        'log for details.' % (p['errors'], share.name))
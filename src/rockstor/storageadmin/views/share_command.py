@@ -22,6 +22,7 @@ from storageadmin.models import (Share, Snapshot, NFSExport, SambaShare)
 from fs.btrfs import (update_quota, rollback_snap)
 from storageadmin.serializers import ShareSerializer
 from storageadmin.util import handle_exception
+from job_helpers import (job_handler, run_job, job_accepted)
 import rest_framework_custom as rfc
 from clone_helpers import create_clone
 from share import ShareMixin
@@ -72,10 +73,26 @@ class ShareCommandView(ShareMixin, rfc.GenericView):
                              ' via Samba. Unshare and try again' % share.name)
                     handle_exception(Exception(e_msg), request)
 
-                rollback_snap(snap.real_name, share.name, share.subvol_name,
-                              share.pool)
-                update_quota(share.pool, snap.qgroup, share.size * 1024)
-                share.qgroup = snap.qgroup
-                share.save()
-                snap.delete()
+                job = run_job(request, 'share-rollback', pool=share.pool,
+                              sid=share.id, snap_id=snap.id)
+                if (job is not None):
+                    return job_accepted(job)
                 return Response()
+
+
+@job_handler('share-rollback')
+def share_rollback_job(progress, sid, snap_id):
+    """
+    Roll a share back to one of its snapshots, which is consumed. Validation
+    is done by ShareCommandView.post
+    """
+    share = Share.objects.get(id=sid)
+    snap = Snapshot.objects.get(id=snap_id)
+    progress(10, 'Rolling back to Snapshot(%s).' % snap.name)
+    rollback_snap(snap.real_name, share.name, share.subvol_name, share.pool)
+    # the share is now the snapshot, what follows must be done.
+    progress(70, 'Updating the share quota.', cancellable=False)
+    update_quota(share.pool, snap.qgroup, share.size * 1024)
+    share.qgroup = snap.qgroup
+    share.save()
+    snap.delete()
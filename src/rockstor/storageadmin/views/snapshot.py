@@ -21,8 +21,10 @@ from django.db import transaction
 from django.conf import settings
 from storageadmin.models import (Snapshot, Share, NFSExport,
                                  NFSExportGroup, AdvancedNFSExport)
+from datetime import (datetime, timedelta)
+from django.utils.timezone import utc
 from fs.btrfs import (add_snap, share_id, volume_usage, remove_snap,
-                      umount_root, mount_snap, qgroup_assign)
+                      remove_snaps, umount_root, mount_snap, qgroup_assign)
 from system.osi import refresh_nfs_exports
 from storageadmin.serializers import SnapshotSerializer
 from storageadmin.util import handle_exception
@@ -37,6 +39,7 @@ logger = logging.getLogger(__name__)
 
 class SnapshotView(NFSExportMixin, rfc.GenericView):
     serializer_class = SnapshotSerializer
+    etag_families = ('snapshot', )
 
     def get_queryset(self, *args, **kwargs):
         with self._handle_exception(self.request):
@@ -68,10 +71,11 @@ class SnapshotView(NFSExportMixin, rfc.GenericView):
     @transaction.atomic
     def _toggle_visibility(self, share, snap_name, on=True):
         cur_exports = list(NFSExport.objects.all())
-        snap_mnt_pt = ('%s%s/.%s' % (settings.MNT_PT, share.name, snap_name))
-        export_pt = snap_mnt_pt.replace(settings.MNT_PT,
-                                        settings.NFS_EXPORT_ROOT)
         if (on):
+            snap_mnt_pt = ('%s%s/.%s' % (settings.MNT_PT, share.name,
+                                         snap_name))
+            export_pt = snap_mnt_pt.replace(settings.MNT_PT,
+                                            settings.NFS_EXPORT_ROOT)
             mount_snap(share, snap_name)
 
             if (NFSExport.objects.filter(share=share).exists()):
@@ -85,6 +89,20 @@ class SnapshotView(NFSExportMixin, rfc.GenericView):
                 export.save()
                 cur_exports.append(export)
         else:
+            self._hide_snapshots(share, [snap_name], cur_exports)
+        self._refresh_exports(cur_exports)
+
+    def _hide_snapshots(self, share, snap_names, cur_exports):
+        """
+        Remove the NFS exports and mounts of the given snapshots. Exports
+        removed are also dropped from cur_exports so the caller can rebuild
+        /etc/exports once for any number of snapshots.
+        """
+        for snap_name in snap_names:
+            snap_mnt_pt = ('%s%s/.%s' % (settings.MNT_PT, share.name,
+                                         snap_name))
+            export_pt = snap_mnt_pt.replace(settings.MNT_PT,
+                                            settings.NFS_EXPORT_ROOT)
             for mnt in (snap_mnt_pt, export_pt):
                 try:
                     export = NFSExport.objects.get(share=share, mount=mnt)
@@ -98,6 +116,8 @@ class SnapshotView(NFSExportMixin, rfc.GenericView):
                 finally:
                     umount_root(export_pt)
                     umount_root(snap_mnt_pt)
+
+    def _refresh_exports(self, cur_exports):
         exports = self.create_nfs_export_input(cur_exports)
         adv_entries = [x.export_str for x in AdvancedNFSExport.objects.all()]
         exports_d = self.create_adv_nfs_export_input(adv_entries, self.request)
@@ -235,16 +255,100 @@ class SnapshotView(NFSExportMixin, rfc.GenericView):
         snapshot.delete()
         return Response()
 
+    @staticmethod
+    def _non_negative_int(request, name, value):
+        try:
+            value = int(value)
+            if (value < 0):
+                raise ValueError()
+            return value
+        except ValueError:
+            e_msg = ('%s must be a non-negative integer, not %s' %
+                     (name, value))
+            handle_exception(Exception(e_msg), request)
+
+    def _select_snapshots(self, request, share):
+        """
+        Resolve the selector query parameters of a bulk delete to the list of
+        Snapshots it matches, newest first. Returns None when no selector is
+        given. Supported selectors, all optional and combined with and:
+        id: comma separated list of snapshot ids.
+        prefix: snapshot name prefix.
+        snap_type: eg admin, task_scheduler or replication.
+        keep: number of newest matching snapshots to retain.
+        older_than: only select snapshots created more than this many
+        seconds ago.
+        """
+        qp = request.query_params
+        ids = qp.get('id', None)
+        prefix = qp.get('prefix', None)
+        snap_type = qp.get('snap_type', None)
+        keep = qp.get('keep', None)
+        older_than = qp.get('older_than', None)
+        if (all(p is None for p in (ids, prefix, snap_type, keep,
+                                    older_than))):
+            return None
+        qs = Snapshot.objects.filter(share=share)
+        if (ids is not None):
+            try:
+                ids = [int(i) for i in ids.split(',')]
+            except ValueError:
+                e_msg = ('id must be a comma separated list of integers, '
+                         'not %s' % ids)
+                handle_exception(Exception(e_msg), request)
+            qs = qs.filter(id__in=ids)
+            if (qs.count() != len(set(ids))):
+                missing = set(ids) - set(qs.values_list('id', flat=True))
+                e_msg = ('Snapshot(%s) does not exist.' %
+                         ','.join(['%d' % i for i in sorted(missing)]))
+                handle_exception(Exception(e_msg), request)
+        if (prefix is not None):
+            qs = qs.filter(name__startswith=prefix)
+        if (snap_type is not None):
+            qs = qs.filter(snap_type=snap_type)
+        qs = qs.order_by('-id')
+        if (keep is not None):
+            qs = qs[self._non_negative_int(request, 'keep', keep):]
+        snapshots = list(qs)
+        if (older_than is not None):
+            age = self._non_negative_int(request, 'older_than', older_than)
+            cutoff = (datetime.utcnow().replace(tzinfo=utc) -
+                      timedelta(seconds=age))
+            snapshots = [s for s in snapshots if (s.toc < cutoff)]
+        return snapshots
+
+    @transaction.atomic
+    def _delete_snapshots(self, share, snapshots):
+        """
+        Delete many snapshots of a share at once: exports are torn down and
+        rebuilt once, the subvolumes are removed by a single btrfs call and
+        the db rows by a single query.
+        """
+        if (len(snapshots) == 0):
+            return []
+        visible = [s.real_name for s in snapshots if (s.uvisible)]
+        if (len(visible) > 0):
+            cur_exports = list(NFSExport.objects.all())
+            self._hide_snapshots(share, visible, cur_exports)
+            self._refresh_exports(cur_exports)
+            for snap_name in visible:
+                toggle_sftp_visibility(share, snap_name, on=False)
+        remove_snaps(share.pool, share.name, [s.name for s in snapshots])
+        Snapshot.objects.filter(id__in=[s.id for s in snapshots]).delete()
+        return [s.name for s in snapshots]
+
     def delete(self, request, sid, snap_name=None):
         """
-        deletes a snapshot
+        deletes a snapshot, or with snap_name omitted, all snapshots of the
+        share matching the selector query parameters. See _select_snapshots.
         """
         with self._handle_exception(request):
             if (snap_name is None):
-                snap_qp = self.request.query_params.get('id', None)
-                if (snap_qp is not None):
-                    for si in snap_qp.split(','):
-                        self._delete_snapshot(request, sid, id=si)
+                share = self._validate_share(sid, request)
+                snapshots = self._select_snapshots(request, share)
+                if (snapshots is not None):
+                    deleted = self._delete_snapshots(share, snapshots)
+                    return Response({'deleted': deleted})
             else:
                 self._delete_snapshot(request, sid, snap_name=snap_name)
             return Response()
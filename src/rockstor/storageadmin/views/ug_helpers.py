@@ -16,6 +16,8 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import re
+from django.conf import settings
 from storageadmin.models import (User, Group, )
 from system.users import (get_users, get_groups)
 from system.pinmanager import (pincard_states)
@@ -23,6 +25,25 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def validate_name(name, kind='User'):
+    """
+    Raise an Exception if name isn't a valid user or group name.
+    :param kind: User or Group, for the error message.
+    """
+    if (name is None or re.match(settings.USERNAME_REGEX, name) is None):
+        raise Exception('%sname is invalid. It must confirm to the regex: '
+                        '%s' % (kind, settings.USERNAME_REGEX))
+    if (len(name) > 30):
+        raise Exception('%sname cannot be more than 30 characters long' %
+                        kind)
+
+
+def validate_shell(shell):
+    if (shell not in settings.VALID_SHELLS):
+        raise Exception('shell(%s) is not valid. Valid shells are %s' %
+                        (shell, settings.VALID_SHELLS))
+
+
 def combined_users():
     users = []
     sys_users = get_users()
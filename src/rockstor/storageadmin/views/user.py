@@ -19,7 +19,6 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
-from django.conf import settings
 from storageadmin.util import handle_exception
 from django.contrib.auth.models import User as DjangoUser
 from storageadmin.serializers import SUserSerializer
@@ -30,9 +29,9 @@ from system.users import (useradd, usermod, userdel,
 import pwd
 from system.pinmanager import (username_to_uid, flush_pincard)
 from system.ssh import is_pub_key
-from ug_helpers import (combined_users, combined_groups)
+from ug_helpers import (combined_users, combined_groups, validate_name,
+                        validate_shell)
 import logging
-import re
 logger = logging.getLogger(__name__)
 
 
@@ -47,14 +46,10 @@ class UserMixin(object):
     def _validate_input(cls, request):
         input_fields = {}
         username = request.data.get('username', None)
-        if (username is None or
-                re.match(settings.USERNAME_REGEX, username) is None):
-            e_msg = ('Username is invalid. It must confirm to the regex: %s' %
-                     (settings.USERNAME_REGEX))
-            handle_exception(Exception(e_msg), request, status_code=400)
-        if (len(username) > 30):
-            e_msg = ('Username cannot be more than 30 characters long')
-            handle_exception(Exception(e_msg), request, status_code=400)
+        try:
+            validate_name(username)
+        except Exception as e:
+            handle_exception(e, request, status_code=400)
         input_fields['username'] = username
         password = request.data.get('password', None)
         if (password is None or password == ''):
@@ -67,10 +62,10 @@ class UserMixin(object):
             handle_exception(Exception(e_msg), request, status_code=400)
         input_fields['admin'] = admin
         shell = request.data.get('shell', '/bin/bash')
-        if (shell not in settings.VALID_SHELLS):
-            e_msg = ('shell(%s) is not valid. Valid shells are %s' %
-                     (shell, settings.VALID_SHELLS))
-            handle_exception(Exception(e_msg), request, status_code=400)
+        try:
+            validate_shell(shell)
+        except Exception as e:
+            handle_exception(e, request, status_code=400)
         input_fields['shell'] = shell
         email = request.data.get('email', None)
         input_fields['email'] = email
@@ -16,10 +16,20 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import grp
+import json
+import os
+import pwd
+import stat
+import threading
+import time
 from osi import run_command
+import logging
+logger = logging.getLogger(__name__)
 
 CHOWN = '/bin/chown'
 CHMOD = '/bin/chmod'
+CHECKPOINT_VERSION = 1
 
 
 def chown(share, owner, group=None, recursive=False):
@@ -38,3 +48,307 @@ def chmod(share, perm_bits, recursive=False):
         cmd.append('-R')
     cmd.extend([perm_bits, share])
     return run_command(cmd)
+
+
+def owner_ids(owner, group=None):
+    """
+    :return: (uid, gid) of the named user and group, or numeric ids as
+    chown accepts them. gid is -1, ie unchanged, without a group.
+    """
+    try:
+        uid = int(owner) if owner.isdigit() else pwd.getpwnam(owner).pw_uid
+    except KeyError:
+        raise Exception('User(%s) does not exist.' % owner)
+    if (group is None):
+        return uid, -1
+    try:
+        gid = int(group) if group.isdigit() else grp.getgrnam(group).gr_gid
+    except KeyError:
+        raise Exception('Group(%s) does not exist.' % group)
+    return uid, gid
+
+
+def set_acl(path, st, uid=-1, gid=-1, mode=None, follow=False,
+            keep_setid=True):
+    """
+    Change the owner, group and mode of the entry at path, whose lstat (or
+    stat to follow symlinks) is st, where they differ from those asked for.
+    :param keep_setid: keep the set-user-ID and set-group-ID bits of
+    directories, as chmod does unless given them explicitly.
+    :return: True if the entry was changed.
+    """
+    changed = False
+    if ((uid != -1 and st.st_uid != uid) or (gid != -1 and st.st_gid != gid)):
+        (os.chown if follow else os.lchown)(path, uid, gid)
+        changed = True
+    if (mode is not None and not stat.S_ISLNK(st.st_mode)):
+        if (keep_setid and stat.S_ISDIR(st.st_mode)):
+            mode |= (st.st_mode & (stat.S_ISUID | stat.S_ISGID))
+        if (stat.S_IMODE(st.st_mode) != mode):
+            os.chmod(path, mode)
+            changed = True
+    return changed
+
+
+class ACLWalk(object):
+    """
+    Recursive chown/chmod of what's below root by a pool of worker threads,
+    each listing and applying a directory at a time. Entries already owned and
+    moded as asked are left alone, so a re-run over a tree that is mostly
+    done is mostly lstat calls. Symlinks are changed themselves, as chown -R
+    does, and never followed or chmoded.
+
+    The directories still to do are checkpointed to a file every
+    checkpoint_interval seconds and when the walk is stopped, and a walk
+    with the same root and changes picks up from there. The checkpoint is a
+    json header line followed by the pending paths, relative to root, each
+    terminated by a NUL as file names may be any bytes but that.
+    """
+
+    def __init__(self, root, uid=-1, gid=-1, mode=None, keep_setid=True,
+                 workers=4, max_rate=0, checkpoint=None,
+                 checkpoint_interval=10):
+        if (isinstance(root, unicode)):
+            root = root.encode('utf-8')
+        self.root = root.rstrip('/') or '/'
+        self.uid = uid
+        self.gid = gid
+        self.mode = mode
+        self.keep_setid = keep_setid
+        self.workers = max(workers, 1)
+        # max entries per second over all workers, 0 for no limit.
+        self.max_rate = max_rate
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.cv = threading.Condition()
+        self.pending = []
+        self.in_flight = set()
+        self.stopping = False
+        self.stats = {'entries': 0, 'changed': 0, 'errors': 0, 'dirs': 0,
+                      'elapsed': 0.0, }
+        self.resumed = False
+        self.start = None
+        self._start_entries = 0
+
+    def _spec(self):
+        return {'version': CHECKPOINT_VERSION, 'root': self.root,
+                'uid': self.uid, 'gid': self.gid, 'mode': self.mode,
+                'keep_setid': self.keep_setid, }
+
+    def _load_checkpoint(self):
+        if (self.checkpoint is None or not os.path.isfile(self.checkpoint)):
+            return False
+        with open(self.checkpoint, 'rb') as cfo:
+            header = json.loads(cfo.readline())
+            if (header.get('spec') != self._spec()):
+                logger.debug('Ignoring the checkpoint(%s) of a different '
+                             'walk.' % self.checkpoint)
+                return False
+            body = cfo.read()
+        self.pending = [os.path.join(self.root, p) if p else self.root
+                        for p in body.split('\0')[:-1]]
+        self.stats.update([(k, v) for k, v in header['stats'].items()
+                           if k in self.stats])
+        return True
+
+    def _save_checkpoint(self):
+        if (self.checkpoint is None):
+            return
+        with self.cv:
+            paths = self.pending + list(self.in_flight)
+            stats = self.progress()
+        prefix = len(os.path.join(self.root, ''))
+        tmp = '%s.tmp' % self.checkpoint
+        with open(tmp, 'wb') as cfo:
+            cfo.write('%s\n' % json.dumps({'spec': self._spec(),
+                                           'stats': stats, }))
+            for p in paths:
+                cfo.write('%s\0' % p[prefix:])
+        os.rename(tmp, self.checkpoint)
+
+    def _clear_checkpoint(self):
+        if (self.checkpoint is not None and
+                os.path.isfile(self.checkpoint)):
+            os.remove(self.checkpoint)
+
+    def _walk_dir(self, path):
+        """
+        Apply the changes to the entries of the directory at path.
+        :return: (subdirectories, entries, changed, errors)
+        """
+        try:
+            names = os.listdir(path)
+        except OSError as e:
+            logger.error('Failed to list %s: %s' % (path, e.__str__()))
+            return [], 0, 0, 1
+        subdirs = []
+        changed = errors = 0
+        for name in names:
+            p = os.path.join(path, name)
+            try:
+                st = os.lstat(p)
+            except OSError as e:
+                logger.error('Failed to stat %s: %s' % (p, e.__str__()))
+                errors += 1
+                continue
+            # what's below a directory that failed to change is still done.
+            if (stat.S_ISDIR(st.st_mode)):
+                subdirs.append(p)
+            try:
+                if (set_acl(p, st, self.uid, self.gid, self.mode,
+                            keep_setid=self.keep_setid)):
+                    changed += 1
+            except OSError as e:
+                logger.error('Failed to change %s: %s' % (p, e.__str__()))
+                errors += 1
+        return subdirs, len(names), changed, errors
+
+    def _throttle(self):
+        # called with cv held. Sleeps, without it, long enough to bring the
+        # rate since the start of this run down to max_rate.
+        if (self.max_rate <= 0):
+            return
+        done = self.stats['entries'] - self._start_entries
+        delay = (self.start + float(done) / self.max_rate) - time.time()
+        if (delay > 0):
+            self.cv.release()
+            try:
+                time.sleep(min(delay, 1))
+            finally:
+                self.cv.acquire()
+
+    def _work(self):
+        with self.cv:
+            while True:
+                while (not self.stopping and len(self.pending) == 0 and
+                       len(self.in_flight) > 0):
+                    self.cv.wait(1)
+                if (self.stopping or len(self.pending) == 0):
+                    self.cv.notify_all()
+                    return
+                self._throttle()
+                if (self.stopping or len(self.pending) == 0):
+                    continue
+                # depth first keeps the pending list short on wide trees.
+                path = self.pending.pop()
+                self.in_flight.add(path)
+                self.cv.release()
+                try:
+                    subdirs, entries, changed, errors = self._walk_dir(path)
+                finally:
+                    self.cv.acquire()
+                self.in_flight.discard(path)
+                self.pending.extend(subdirs)
+                self.stats['entries'] += entries
+                self.stats['changed'] += changed
+                self.stats['errors'] += errors
+                self.stats['dirs'] += 1
+                self.cv.notify_all()
+
+    def progress(self):
+        """
+        :return: dict of the entries checked, changed and failed, the
+        directories done and pending, seconds elapsed and entries per
+        second, over all runs of the walk.
+        """
+        with self.cv:
+            p = dict(self.stats)
+            if (self.start is not None):
+                p['elapsed'] += time.time() - self.start
+            p['pending'] = len(self.pending) + len(self.in_flight)
+        p['rate'] = (p['entries'] / p['elapsed']) if p['elapsed'] else 0
+        return p
+
+    def stop(self):
+        with self.cv:
+            self.stopping = True
+            self.cv.notify_all()
+
+    def _finished(self):
+        with self.cv:
+            return (self.stopping or
+                    (len(self.pending) == 0 and len(self.in_flight) == 0))
+
+    def run(self, report=None, report_interval=5):
+        """
+        Walk the tree, resuming from the checkpoint if there is one.
+        :param report: called with progress() every report_interval
+        seconds. Whatever it raises stops the walk, which can be resumed,
+        and is raised on.
+        :return: progress() of the walk. Its pending count is 0 unless the
+        walk was stopped.
+        """
+        self.resumed = self._load_checkpoint()
+        if (not self.resumed):
+            self._clear_checkpoint()
+            self.pending = [self.root, ]
+        self._start_entries = self.stats['entries']
+        self.start = time.time()
+        threads = [threading.Thread(target=self._work,
+                                    name='acl-walk-%d' % i)
+                   for i in range(self.workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        last_report = last_checkpoint = self.start
+        try:
+            while (not self._finished()):
+                with self.cv:
+                    self.cv.wait(1)
+                now = time.time()
+                if (report is not None and
+                        now - last_report >= report_interval):
+                    report(self.progress())
+                    last_report = now
+                if (now - last_checkpoint >= self.checkpoint_interval):
+                    self._save_checkpoint()
+                    last_checkpoint = now
+        except Exception:
+            self.stop()
+            for t in threads:
+                t.join()
+            self._save_checkpoint()
+            raise
+        for t in threads:
+            t.join()
+        if (self.stopping):
+            self._save_checkpoint()
+        else:
+            self._clear_checkpoint()
+        return self.progress()
+
+
+def apply_acl(root, owner=None, group=None, perms=None, owner_recursive=True,
+              perms_recursive=True, **kwargs):
+    """
+    Set the owner, group and permission bits(octal string, eg: 755) of
+    root, and of everything below it when recursive, with an ACLWalk. As
+    with chmod, directories keep their set-user-ID and set-group-ID bits
+    unless perms has 4 digits, eg: 0755 clears and 2775 sets them.
+    :param kwargs: passed on to ACLWalk, ie: workers, max_rate, checkpoint
+    and checkpoint_interval, and to its run, ie: report and
+    report_interval.
+    :return: progress() of the walk.
+    """
+    uid, gid = owner_ids(owner, group) if (owner is not None) else (-1, -1)
+    try:
+        mode = int(perms, 8) if (perms is not None) else None
+    except ValueError:
+        raise Exception('Permissions(%s) are not octal, eg: 755.' % perms)
+    keep_setid = (perms is None or len(perms.strip()) < 4)
+    run_kwargs = dict([(k, kwargs.pop(k)) for k in
+                       ('report', 'report_interval') if k in kwargs])
+    # root gets every change, the tree below it only the recursive ones.
+    kwargs.update(uid=uid if owner_recursive else -1,
+                  gid=gid if owner_recursive else -1,
+                  mode=mode if perms_recursive else None,
+                  keep_setid=keep_setid)
+    walk = ACLWalk(root, **kwargs)
+    changed = int(set_acl(walk.root, os.stat(walk.root), uid, gid, mode,
+                          follow=True, keep_setid=keep_setid))
+    if (walk.uid == -1 and walk.gid == -1 and walk.mode is None):
+        p = walk.progress()
+    else:
+        p = walk.run(**run_kwargs)
+    p['changed'] += changed
+    return p
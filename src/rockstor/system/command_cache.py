@@ -0,0 +1,239 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import threading
+import time
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds the output of a read only command, called with
+# run_command(cache=True), is reused for. Matched on the leading words of
+# the command, the executable's name first. The cache is per process, so a
+# change made by another process, eg: a snapshot by a scheduled task or a
+# qgroup by replication, is only seen once the entry expires. The btrfs
+# subvolume and qgroup listings, which these daemons change, have the
+# shortest ttls.
+CACHE_TTLS = (
+    (('btrfs', 'qgroup', 'show'), 2),
+    (('btrfs', 'subvolume', 'list'), 2),
+    (('btrfs', 'fi', 'show'), 10),
+    (('btrfs', 'filesystem', 'show'), 10),
+    (('lsblk', ), 2),
+    (('udevadm', 'info'), 10),
+    (('hdparm', '-C'), 10),
+    (('hdparm', '-B'), 10),
+    (('smartctl', ), 30),
+    (('docker', 'ps'), 2),
+    (('nmcli', 'c', 'show'), 5),
+)
+DEFAULT_TTL = 5
+
+# Commands that change what the above report: (leading words, executables
+# whose cached entries they invalidate, scoped). Scoped mutations only
+# invalidate the entries of the filesystem(s) they name, eg: creating a
+# subvolume in one pool leaves the cached listings of other pools alone.
+MUTATIONS = (
+    (('btrfs', 'subvolume', 'create'), ('btrfs', ), True),
+    (('btrfs', 'subvolume', 'delete'), ('btrfs', ), True),
+    (('btrfs', 'subvolume', 'snapshot'), ('btrfs', ), True),
+    (('btrfs', 'qgroup', 'assign'), ('btrfs', ), True),
+    (('btrfs', 'qgroup', 'remove'), ('btrfs', ), True),
+    (('btrfs', 'qgroup', 'limit'), ('btrfs', ), True),
+    (('btrfs', 'qgroup', 'create'), ('btrfs', ), True),
+    (('btrfs', 'qgroup', 'destroy'), ('btrfs', ), True),
+    (('btrfs', 'quota'), ('btrfs', ), True),
+    (('btrfs', 'property', 'set'), ('btrfs', ), True),
+    (('btrfs', 'fi', 'resize'), ('btrfs', ), True),
+    (('btrfs', 'filesystem', 'resize'), ('btrfs', ), True),
+    (('btrfs', 'fi', 'label'), ('btrfs', ), False),
+    (('btrfs', 'device'), ('btrfs', 'lsblk'), False),
+    (('btrfs', 'balance'), ('btrfs', ), False),
+    (('mkfs.btrfs', ), ('btrfs', 'lsblk', 'udevadm'), False),
+    (('mount', ), ('btrfs', 'lsblk'), False),
+    (('umount', ), ('btrfs', 'lsblk'), False),
+    (('wipefs', ), ('btrfs', 'lsblk', 'udevadm'), False),
+    (('parted', ), ('lsblk', 'udevadm'), False),
+    (('cryptsetup', ), ('btrfs', 'lsblk', 'udevadm'), False),
+    (('hdparm', ), ('hdparm', ), False),
+    (('smartctl', '-s'), ('smartctl', ), False),
+    (('docker', 'create'), ('docker', ), False),
+    (('docker', 'run'), ('docker', ), False),
+    (('docker', 'start'), ('docker', ), False),
+    (('docker', 'stop'), ('docker', ), False),
+    (('docker', 'restart'), ('docker', ), False),
+    (('docker', 'rm'), ('docker', ), False),
+    (('nmcli', 'c', 'add'), ('nmcli', ), False),
+    (('nmcli', 'c', 'delete'), ('nmcli', ), False),
+    (('nmcli', 'c', 'mod'), ('nmcli', ), False),
+    (('nmcli', 'c', 'up'), ('nmcli', ), False),
+    (('nmcli', 'c', 'down'), ('nmcli', ), False),
+    (('nmcli', 'c', 'reload'), ('nmcli', ), False),
+)
+# hdparm queries that don't change the drive's state.
+HDPARM_QUERIES = ('-C', '-I', '-B')
+
+
+def _words(cmd):
+    return [os.path.basename(cmd[0])] + list(cmd[1:])
+
+
+def _matches(words, prefix):
+    return (tuple(words[:len(prefix)]) == prefix)
+
+
+def _paths(cmd):
+    return [a.split('=', 1)[-1] for a in cmd[1:] if
+            (a.startswith('/') or '=/' in a)]
+
+
+def _mounts():
+    """
+    :return: list of (mount point, source) of the current mounts, longest
+    mount point first.
+    """
+    mounts = []
+    try:
+        with open('/proc/mounts') as mfo:
+            for l in mfo:
+                fields = l.split()
+                if (len(fields) > 1):
+                    mounts.append((fields[1], fields[0]))
+    except IOError as e:
+        logger.exception(e)
+    return sorted(mounts, key=lambda m: len(m[0]), reverse=True)
+
+
+def _fs_key(path, mounts):
+    """
+    The source of the mount path is on, eg: a pool's device for both the
+    pool's and its shares' mount points, or the path itself if unknown.
+    """
+    for mnt_pt, source in mounts:
+        if (path == mnt_pt or path.startswith(mnt_pt.rstrip('/') + '/')):
+            if (mnt_pt != '/'):
+                return source
+    return path
+
+
+class CommandCache(object):
+    """
+    Per process cache of the output of read only commands, used by
+    run_command(cache=True). Every command run via run_command is checked
+    against MUTATIONS and invalidates the entries it affects. Commands run
+    by other processes are not seen so entries are only reused for their
+    (short) ttl.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # tuple(cmd) -> (expires, out, err, rc)
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0,
+                          'executables': {}, }
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.generation += 1
+
+    @staticmethod
+    def ttl(cmd):
+        words = _words(cmd)
+        for prefix, ttl in CACHE_TTLS:
+            if (_matches(words, prefix)):
+                return ttl
+        return DEFAULT_TTL
+
+    def _count(self, cmd, hit):
+        es = self.stats['executables'].setdefault(
+            os.path.basename(cmd[0]), {'hits': 0, 'misses': 0, })
+        key = 'hits' if hit else 'misses'
+        es[key] += 1
+        self.stats[key] += 1
+
+    def get(self, cmd):
+        """
+        :return: (out, err, rc) of a fresh entry for cmd or None. Also
+        returns the current generation, to be handed back to put().
+        """
+        with self.lock:
+            entry = self.entries.get(tuple(cmd))
+            if (entry is not None and entry[0] > time.time()):
+                self._count(cmd, True)
+                return (list(entry[1]), list(entry[2]), entry[3]), \
+                    self.generation
+            self._count(cmd, False)
+            return None, self.generation
+
+    def put(self, cmd, out, err, rc, generation):
+        """
+        Cache a command's output unless an invalidation happened since
+        get() was called, ie: while the command ran.
+        """
+        with self.lock:
+            if (generation != self.generation):
+                return
+            self.entries[tuple(cmd)] = (time.time() + self.ttl(cmd),
+                                        list(out), list(err), rc)
+
+    def invalidate_for(self, cmd):
+        """
+        Drop the entries made stale by cmd, if it is a mutating command.
+        """
+        words = _words(cmd)
+        if (words[0] == 'hdparm' and
+                any(w in HDPARM_QUERIES for w in words[1:])):
+            return
+        for prefix, executables, scoped in MUTATIONS:
+            if (_matches(words, prefix)):
+                break
+        else:
+            return
+        keys = None
+        if (scoped and len(_paths(cmd)) > 0):
+            mounts = _mounts()
+            keys = set([_fs_key(p, mounts) for p in _paths(cmd)])
+        with self.lock:
+            self.generation += 1
+            for ecmd in self.entries.keys():
+                if (os.path.basename(ecmd[0]) not in executables):
+                    continue
+                epaths = _paths(ecmd)
+                if (keys is not None and len(epaths) > 0 and
+                        not keys.intersection(
+                            [_fs_key(p, mounts) for p in epaths])):
+                    continue
+                del self.entries[ecmd]
+                self.stats['invalidations'] += 1
+
+    def report(self):
+        with self.lock:
+            report = dict(self.stats)
+            report['executables'] = dict(
+                (k, dict(v)) for k, v in self.stats['executables'].items())
+            report['entries'] = len(self.entries)
+            report['pid'] = os.getpid()
+        return report
+
+
+command_cache = CommandCache()
@@ -0,0 +1,268 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import signal
+import threading
+import time
+from django.conf import settings
+from command_stats import command_label
+from exceptions import CircuitOpenException
+import logging
+logger = logging.getLogger(__name__)
+
+# Default deadline, in seconds, of the commands run via run_command. Matched
+# on the leading words of the command, the executable's name first. Commands
+# not listed, eg: btrfs balance start or mount, may legitimately take very
+# long and have no deadline unless one is passed to run_command.
+COMMAND_TIMEOUTS = (
+    (('btrfs', 'subvolume', 'list'), 120),
+    (('btrfs', 'qgroup', 'show'), 120),
+    (('btrfs', 'fi', 'show'), 60),
+    (('btrfs', 'filesystem', 'show'), 60),
+    (('btrfs', 'fi', 'usage'), 60),
+    (('btrfs', 'filesystem', 'usage'), 60),
+    (('btrfs', 'fi', 'df'), 60),
+    (('btrfs', 'filesystem', 'df'), 60),
+    (('btrfs', 'property', 'get'), 60),
+    (('btrfs', 'scrub', 'status'), 60),
+    (('btrfs', 'balance', 'status'), 60),
+    (('btrfs', 'device', 'scan'), 120),
+    (('hdparm', ), 30),
+    (('smartctl', ), 60),
+    (('udevadm', 'info'), 30),
+    (('lsblk', ), 30),
+    (('blkid', ), 30),
+    (('wipefs', ), 60),
+    (('docker', 'ps'), 60),
+    (('nmcli', ), 60),
+    (('passwd', ), 60),
+    (('smbpasswd', ), 60),
+)
+# Seconds a command, once killed, is waited for. Commands stuck in the kernel,
+# eg: on a failing device, can't be killed and are abandoned after this.
+KILL_GRACE = 2
+# Commands with a deadline are exec'ed via setsid to run in their own process
+# group, which is killed on timeout. A preexec_fn (os.setpgrp) can deadlock
+# the fork of a multi threaded process in python 2. setsid only forks when
+# run as a process group leader, which our child is not, so keeps its pid.
+SETSID = '/usr/bin/setsid'
+
+
+def _config(key, default):
+    return getattr(settings, 'COMMAND_GUARD', {}).get(key, default)
+
+
+def command_timeout(cmd):
+    words = [os.path.basename(cmd[0])] + list(cmd[1:])
+    for prefix, timeout in COMMAND_TIMEOUTS:
+        if (tuple(words[:len(prefix)]) == prefix):
+            return timeout
+    return None
+
+
+def command_targets(cmd):
+    """
+    Devices and pools/shares a command is run against: its /dev/ arguments
+    and the mount points (under settings.MNT_PT) of its path arguments.
+    """
+    mnt_pt = getattr(settings, 'MNT_PT', '/mnt2/')
+    targets = set()
+    for arg in cmd[1:]:
+        path = arg.split('=', 1)[-1]
+        if (path.startswith('/dev/')):
+            targets.add(path)
+        elif (path.startswith(mnt_pt)):
+            name = path[len(mnt_pt):].split('/')[0]
+            if (len(name) > 0):
+                targets.add(mnt_pt + name)
+    return targets
+
+
+def guarded_args(cmd, shell=False):
+    """
+    :return: (args, shell) to Popen cmd with, in its own process group when
+    setsid is available. Commands that don't exist are left alone, for Popen
+    to raise OSError as usual.
+    """
+    if (not os.path.exists(SETSID)):
+        return cmd, shell
+    if (shell):
+        return [SETSID, '/bin/sh', '-c'] + cmd, False
+    if (os.path.isabs(cmd[0]) and not os.access(cmd[0], os.X_OK)):
+        return cmd, shell
+    return [SETSID] + cmd, False
+
+
+def _kill(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        # no process group of its own, ie: started without setsid.
+        os.kill(pid, signal.SIGKILL)
+
+
+class CommandGuard(object):
+    """
+    Deadlines for the commands run via run_command: a command running past
+    its deadline has its process group killed and its caller gets a
+    CommandTimeoutException, even if the command can't be killed. The
+    devices and mount points of a timed out command are then fast failed,
+    with CircuitOpenException, for the breaker cooldown, after which a
+    single call is let through to probe them. An optional watchdog thread
+    logs commands running for longer than stuck_after seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}  # id -> {'cmd', 'pid', 'start', 'timeout'}
+        self.circuits = {}  # target -> {'until', 'probing', 'cmd'}
+        self.next_id = 0
+        self.watchdog = None
+
+    def check(self, cmd):
+        """
+        :return: list of targets of cmd this call probes, or raise
+        CircuitOpenException if one of them recently hung.
+        """
+        probes = []
+        now = time.time()
+        with self.lock:
+            for target in command_targets(cmd):
+                circuit = self.circuits.get(target)
+                if (circuit is None):
+                    continue
+                if (circuit['until'] > now or circuit['probing']):
+                    raise CircuitOpenException(cmd, target, circuit['cmd'],
+                                               circuit['until'])
+                probes.append(target)
+            for target in probes:
+                self.circuits[target]['probing'] = True
+        return probes
+
+    def _trip(self, cmd):
+        cooldown = _config('breaker_cooldown', 60)
+        with self.lock:
+            for target in command_targets(cmd):
+                self.circuits[target] = {'until': time.time() + cooldown,
+                                         'probing': False,
+                                         'cmd': command_label(cmd), }
+                logger.error('Fast failing commands on %s for %d seconds '
+                             'as "%s" hung.' % (target, cooldown,
+                                                command_label(cmd)))
+
+    def release(self, probes):
+        """
+        Close the circuits of targets probed by a call that didn't hang.
+        """
+        with self.lock:
+            for target in probes:
+                self.circuits.pop(target, None)
+
+    def communicate(self, p, cmd, timeout, input=None, probes=()):
+        """
+        p.communicate(input) bounded by timeout. p should have been started
+        with guarded_args() for its whole process group to be killed, else
+        only p is. Under gevent's monkey patching, as in the data-collector,
+        the thread and its join(timeout) are greenlets and p.communicate()
+        gevent's cooperative one.
+        :return: (out, err, timed_out). out and err are what was read, if
+        anything, when timed out.
+        """
+        self._start_watchdog()
+        with self.lock:
+            self.next_id += 1
+            cid = self.next_id
+            self.running[cid] = {'cmd': command_label(cmd), 'pid': p.pid,
+                                 'start': time.time(), 'timeout': timeout, }
+        result = {}
+
+        def target():
+            try:
+                result['out'], result['err'] = p.communicate(input=input)
+            except Exception as e:
+                result['exception'] = e
+
+        try:
+            t = threading.Thread(target=target)
+            t.daemon = True
+            t.start()
+            t.join(timeout)
+            if (t.is_alive()):
+                logger.error('Killing "%s" (pid %d) after %d seconds.' %
+                             (command_label(cmd), p.pid, timeout))
+                try:
+                    _kill(p.pid)
+                except OSError as e:
+                    logger.exception(e)
+                t.join(KILL_GRACE)
+                if (t.is_alive()):
+                    logger.error('Abandoning unkillable "%s" (pid %d).' %
+                                 (command_label(cmd), p.pid))
+                self._trip(cmd)
+                return result.get('out', ''), result.get('err', ''), True
+            self.release(probes)
+        finally:
+            with self.lock:
+                del(self.running[cid])
+        if ('exception' in result):
+            raise result['exception']
+        return result['out'], result['err'], False
+
+    def running_commands(self):
+        now = time.time()
+        with self.lock:
+            return [{'command': r['cmd'], 'pid': r['pid'],
+                     'seconds': now - r['start'], 'timeout': r['timeout'], }
+                    for r in self.running.values()]
+
+    def open_circuits(self):
+        with self.lock:
+            return [{'target': target, 'command': c['cmd'],
+                     'until': c['until'], 'probing': c['probing'], }
+                    for target, c in self.circuits.items()]
+
+    def _start_watchdog(self):
+        if (self.watchdog is not None or
+                not _config('watchdog', False)):
+            return
+        with self.lock:
+            if (self.watchdog is not None):
+                return
+            self.watchdog = threading.Thread(target=self._watch)
+            self.watchdog.daemon = True
+            self.watchdog.start()
+
+    def _watch(self):
+        reported = set()
+        while True:
+            time.sleep(_config('watchdog_interval', 10))
+            stuck_after = _config('stuck_after', 30)
+            now = time.time()
+            with self.lock:
+                running = self.running.items()
+            for cid, r in running:
+                if (cid not in reported and now - r['start'] > stuck_after):
+                    reported.add(cid)
+                    logger.warning('"%s" (pid %d) is running for %d '
+                                   'seconds.' % (r['cmd'], r['pid'],
+                                                 now - r['start']))
+            reported.intersection_update([cid for cid, r in running])
+
+
+command_guard = CommandGuard()
@@ -0,0 +1,132 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import heapq
+import os
+import threading
+import time
+
+# upper bounds, in seconds, of the run_command latency histogram buckets.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# number of slowest commands kept.
+SLOWEST_MAX = 50
+
+
+def command_label(cmd):
+    """
+    Short label for a command: the executable's name followed by its leading
+    sub command words, eg: 'btrfs subvolume list'. Option values and other
+    arguments, which may carry credentials, are left out.
+    """
+    words = [os.path.basename('%s' % cmd[0])]
+    for arg in cmd[1:3]:
+        arg = '%s' % arg
+        if (arg.startswith('-') or '/' in arg):
+            break
+        words.append(arg)
+    return ' '.join(words)
+
+
+class CommandStats(object):
+    """
+    In-process statistics of the commands run via system.osi.run_command:
+    per executable call counts, latency histograms, total time and output
+    sizes, the slowest commands seen, and a per thread accumulator used to
+    account the commands run while serving a request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.since = time.time()
+            self.executables = {}
+            self.slowest = []  # min heap of (seconds, ts, label, rc)
+
+    def record(self, cmd, seconds, out_bytes, err_bytes, rc):
+        executable = os.path.basename('%s' % cmd[0])
+        label = command_label(cmd)
+        with self.lock:
+            es = self.executables.get(executable)
+            if (es is None):
+                es = {'count': 0, 'errors': 0, 'total_time': 0.0,
+                      'max_time': 0.0, 'out_bytes': 0, 'err_bytes': 0,
+                      'histogram': [0] * (len(LATENCY_BUCKETS) + 1), }
+                self.executables[executable] = es
+            es['count'] += 1
+            if (rc != 0):
+                es['errors'] += 1
+            es['total_time'] += seconds
+            es['max_time'] = max(es['max_time'], seconds)
+            es['out_bytes'] += out_bytes
+            es['err_bytes'] += err_bytes
+            i = 0
+            while (i < len(LATENCY_BUCKETS) and
+                   seconds > LATENCY_BUCKETS[i]):
+                i += 1
+            es['histogram'][i] += 1
+            entry = (seconds, time.time(), label, rc)
+            if (len(self.slowest) < SLOWEST_MAX):
+                heapq.heappush(self.slowest, entry)
+            elif (seconds > self.slowest[0][0]):
+                heapq.heapreplace(self.slowest, entry)
+        acc = getattr(self.local, 'accumulator', None)
+        if (acc is not None):
+            acc['count'] += 1
+            acc['time'] += seconds
+
+    def start_accounting(self):
+        """
+        Start accounting the commands run by this thread, ie: for the
+        request it is about to serve.
+        """
+        self.local.accumulator = {'count': 0, 'time': 0.0, }
+
+    def stop_accounting(self):
+        """
+        :return: dict with the count and time of the commands run by this
+        thread since start_accounting, or None if it wasn't started.
+        """
+        acc = getattr(self.local, 'accumulator', None)
+        self.local.accumulator = None
+        return acc
+
+    def report(self, limit=20):
+        with self.lock:
+            executables = {}
+            for name, es in self.executables.items():
+                es = dict(es)
+                es['histogram'] = dict(zip(
+                    ['le_%s' % b for b in LATENCY_BUCKETS] + ['inf'],
+                    es['histogram']))
+                es['avg_time'] = es['total_time'] / es['count']
+                executables[name] = es
+            slowest = sorted(self.slowest, reverse=True)[:limit]
+        return {
+            'pid': os.getpid(),
+            'since': self.since,
+            'executables': executables,
+            'slowest': [{'command': label, 'seconds': seconds, 'ts': ts,
+                         'rc': rc} for seconds, ts, label, rc in slowest],
+        }
+
+
+command_stats = CommandStats()
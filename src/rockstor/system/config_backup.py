@@ -16,44 +16,281 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+# Config backups are gzipped json lines, written as the rows are read from
+# the db:
+#  - a header: {"version": 2, "base": <filename or null>, "depth": <n>}
+#  - one line per row: {"model", "pk", "fields"}, or {"model", "pk",
+#    "deleted": true} for rows deleted since the base backup.
+#  - a trailer: {"hashes": {model: hash}}
+# A full backup has no base and holds every row. An incremental one only
+# holds the rows that changed since its base, and is restored by replaying
+# the chain of backups it is built on. The rows of the base are found by
+# replaying its chain too, so no backup holds anything per unchanged row.
+# Backups made before this format are two lines, the storageadmin and then
+# the smart_manager dumpdata output.
+
+import gzip
+import hashlib
+import json
 import logging
 import os
+from collections import OrderedDict
 from datetime import datetime
-from django.core.management import call_command
+from django.apps import apps
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router
 from storageadmin.models import ConfigBackup
-from system.osi import (run_command, md5sum)
 
 logger = logging.getLogger(__name__)
 
+MODELS = {'storageadmin':
+          ['user', 'group', 'sambashare', 'sambacustomconfig',
+           'netatalkshare', 'nfsexport',
+           'nfsexportgroup', 'advancednfsexport', ],
+          'smart_manager':
+          ['service', ], }
+FORMAT_VERSION = 2
+# A full backup is taken instead of an incremental one once the chain has
+# this many incremental backups.
+MAX_CHAIN_DEPTH = 14
+
+
+class HashingWriter(object):
+    """
+    File object wrapper keeping the md5sum and size of what's written, so
+    neither needs another read of the backup.
+    """
+
+    def __init__(self, fo):
+        self.fo = fo
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def write(self, data):
+        self.md5.update(data)
+        self.size += len(data)
+        self.fo.write(data)
+
+    def flush(self):
+        self.fo.flush()
+
+
+def _dumps(obj, **kwargs):
+    return json.dumps(obj, cls=DjangoJSONEncoder, **kwargs)
 
-def backup_config():
-    models = {'storageadmin':
-              ['user', 'group', 'sambashare', 'sambacustomconfig',
-               'netatalkshare', 'nfsexport',
-               'nfsexportgroup', 'advancednfsexport', ],
-              'smart_manager':
-              ['service', ], }
+
+def row_hash(fields):
+    return hashlib.sha1(_dumps(fields, sort_keys=True)).hexdigest()
+
+
+def model_hash(rows):
+    """
+    :param rows: dict of pk -> row_hash of a model.
+    """
+    sha = hashlib.sha1()
+    for pk in sorted(rows):
+        sha.update('%s:%s\n' % (pk, rows[pk]))
+    return sha.hexdigest()
+
+
+def _model_list():
     model_list = []
-    for a in models:
-        for m in models[a]:
+    for a in MODELS:
+        for m in MODELS[a]:
             model_list.append('%s.%s' % (a, m))
+    return model_list
+
+
+def _read_lines(fp):
+    with gzip.open(fp) as gfo:
+        for line in gfo:
+            if (len(line.strip()) > 0):
+                yield json.loads(line)
+
+
+def read_header(fp):
+    """
+    :return: the header of the backup at fp or None if it's of the old
+    format.
+    """
+    with gzip.open(fp) as gfo:
+        line = gfo.readline()
+    if (line.startswith('[')):
+        return None
+    header = json.loads(line)
+    if (header.get('version') != FORMAT_VERSION):
+        raise Exception('Unsupported config backup(%s) version: %s' %
+                        (fp, header.get('version')))
+    return header
+
+
+def _fields(o):
+    """
+    :return: the serialized row of o, with its many to many values sorted
+    as the db returns them in no particular order.
+    """
+    row = serializers.serialize('python', [o, ])[0]
+    for f in o._meta.many_to_many:
+        if (f.name in row['fields']):
+            row['fields'][f.name] = sorted(row['fields'][f.name])
+    return row
+
+
+def _base_backup(cb_dir):
+    """
+    :return: (filename, header, rows) of the latest backup to build an
+    incremental backup on, where rows is a dict of model -> {pk: row_hash}
+    of its content, or None if a full backup is due.
+    """
+    for cbo in ConfigBackup.objects.order_by('-id'):
+        fp = os.path.join(cb_dir, cbo.filename)
+        if (not os.path.isfile(fp)):
+            continue
+        try:
+            header = read_header(fp)
+            if (header is None or header['depth'] >= MAX_CHAIN_DEPTH):
+                return None
+            base_rows = {}
+            for (label, pk), row in _replay(fp, cb_dir, set())[0].items():
+                base_rows.setdefault(label, {})[pk] = row_hash(row['fields'])
+            return cbo.filename, header, base_rows
+        except Exception as e:
+            logger.error('Not building on config backup(%s): %s' %
+                         (cbo.filename, e.__str__()))
+            return None
+    return None
+
+
+def backup_config(incremental=False):
+    model_list = _model_list()
     logger.debug('model list = %s' % model_list)
 
-    filename = ('backup-%s.json' % datetime.now().strftime('%Y-%m-%d-%H%M%S'))
     cb_dir = ConfigBackup.cb_dir()
-
     if (not os.path.isdir(cb_dir)):
         os.mkdir(cb_dir)
-    fp = os.path.join(cb_dir, filename)
-    with open(fp, 'w') as dfo:
-        call_command('dumpdata', *model_list, stdout=dfo)
-        dfo.write('\n')
-        call_command('dumpdata', database='smart_manager', *model_list,
-                     stdout=dfo)
-    run_command(['/usr/bin/gzip', fp])
-    gz_name = ('%s.gz' % filename)
+    base = _base_backup(cb_dir) if incremental else None
+    header = {'version': FORMAT_VERSION, 'base': None, 'depth': 0, }
+    base_rows = {}
+    if (base is not None):
+        header['base'] = base[0]
+        header['depth'] = base[1]['depth'] + 1
+        base_rows = base[2]
+
+    gz_name = ('backup-%s.json.gz' %
+               datetime.now().strftime('%Y-%m-%d-%H%M%S'))
     fp = os.path.join(cb_dir, gz_name)
-    size = os.stat(fp).st_size
-    cbo = ConfigBackup(filename=gz_name, md5sum=md5sum(fp), size=size)
+    tmp_fp = '%s.tmp' % fp
+    trailer = {'hashes': {}, }
+    with open(tmp_fp, 'wb') as dfo:
+        hwo = HashingWriter(dfo)
+        gfo = gzip.GzipFile(filename=gz_name[:-3], mode='wb', fileobj=hwo)
+        gfo.write('%s\n' % _dumps(header))
+        for label in model_list:
+            model = apps.get_model(label)
+            qs = model._default_manager.using(
+                router.db_for_read(model)).order_by('pk')
+            prev_rows = base_rows.get(label, {})
+            rows = {}
+            for o in qs.iterator():
+                row = _fields(o)
+                pk = str(row['pk'])
+                rows[pk] = row_hash(row['fields'])
+                if (prev_rows.get(pk) != rows[pk]):
+                    gfo.write('%s\n' % _dumps(row))
+            for pk in sorted(set(prev_rows) - set(rows)):
+                gfo.write('%s\n' % _dumps({'model': label, 'pk': pk,
+                                           'deleted': True, }))
+            trailer['hashes'][label] = model_hash(rows)
+        gfo.write('%s\n' % _dumps(trailer))
+        gfo.close()
+    os.rename(tmp_fp, fp)
+    cbo = ConfigBackup(filename=gz_name, md5sum=hwo.md5.hexdigest(),
+                       size=hwo.size)
     cbo.save()
     return cbo
+
+
+def _replay(fp, cb_dir, seen):
+    """
+    :return: (OrderedDict of (model, pk) -> row, trailer) of the backup at
+    fp, applied on top of its base if it's incremental.
+    """
+    header = read_header(fp)
+    if (header is None):
+        raise Exception('Config backup(%s) of the old format can only be '
+                        'restored on its own.' % fp)
+    rows = OrderedDict()
+    if (header['base'] is not None):
+        if (header['base'] in seen):
+            raise Exception('Config backup chain loops at %s' %
+                            header['base'])
+        seen.add(header['base'])
+        base_fp = os.path.join(cb_dir, header['base'])
+        if (not os.path.isfile(base_fp)):
+            raise Exception('Config backup(%s) needs its base backup(%s) '
+                            'which is missing.' % (os.path.basename(fp),
+                                                   header['base']))
+        rows = _replay(base_fp, cb_dir, seen)[0]
+    trailer = None
+    lines = _read_lines(fp)
+    next(lines)
+    for line in lines:
+        if ('model' not in line):
+            trailer = line
+            continue
+        key = (line['model'], str(line['pk']))
+        if (line.get('deleted')):
+            rows.pop(key, None)
+        else:
+            rows[key] = line
+    if (trailer is None):
+        raise Exception('Config backup(%s) is truncated.' % fp)
+    return rows, trailer
+
+
+def load_backup(fp):
+    """
+    Read the backup at fp, replaying the chain of backups it's built on.
+    :return: (storageadmin model list, smart_manager model list) in the
+    dumpdata format.
+    """
+    header = read_header(fp)
+    if (header is None):
+        with gzip.open(fp) as gfo:
+            lines = gfo.readlines()
+        return json.loads(lines[0]), json.loads(lines[1])
+    rows, trailer = _replay(fp, os.path.dirname(fp), set())
+    # the result of the replay must be what was backed up.
+    for label, expected in trailer['hashes'].items():
+        restored = dict([(pk, row_hash(r['fields'])) for (m, pk), r in
+                         rows.items() if m == label])
+        if (model_hash(restored) != expected):
+            raise Exception('Config backup(%s) content of %s does not match '
+                            'its hash. Its backup chain is inconsistent.' %
+                            (os.path.basename(fp), label))
+    sa_ml = []
+    sm_ml = []
+    for (label, pk), row in rows.items():
+        if (label.startswith('smart_manager.')):
+            sm_ml.append(row)
+        else:
+            sa_ml.append(row)
+    return sa_ml, sm_ml
+
+
+def dependent_backups(filename):
+    """
+    :return: filenames of the backups built on the backup filename.
+    """
+    cb_dir = ConfigBackup.cb_dir()
+    dependents = []
+    for cbo in ConfigBackup.objects.exclude(filename=filename):
+        fp = os.path.join(cb_dir, cbo.filename)
+        try:
+            header = read_header(fp)
+        except Exception:
+            continue
+        if (header is not None and header['base'] == filename):
+            dependents.append(cbo.filename)
+    return dependents
@@ -0,0 +1,185 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Cache of the per disk attributes that take an hdparm call, or a file parse,
+# to read: power state, APM level, hdparm (spindown) setting and the current
+# canonical (sda type) name. poll_disks() is called periodically by the
+# data-collector and the Disk model properties are served from its cache file.
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from osi import (get_disk_power_status, get_disk_APM_level,
+                 read_hdparm_setting, get_dev_temp_name)
+import logging
+logger = logging.getLogger(__name__)
+
+# power states in which a drive's motor is off. Only hdparm -C, which
+# doesn't spin drives up, is used on drives last seen in these and only
+# after they've done I/O since.
+ASLEEP_STATES = ('standby', 'sleeping')
+
+# (mtime, size, inode) of the cache file and its content as last loaded.
+_loaded = {'stamp': None, 'attributes': {}, }
+
+
+def _config(key):
+    return settings.DISK_POLLER[key]
+
+
+@contextmanager
+def _locked():
+    with open('%s.lock' % _config('cache_file'), 'w') as lfo:
+        fcntl.flock(lfo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lfo, fcntl.LOCK_UN)
+
+
+def load_attributes():
+    """
+    :return: dict of disk name -> attributes dict as in the cache file, only
+    parsed again once the file changes. Empty if there is no cache file.
+    """
+    cache_file = _config('cache_file')
+    try:
+        st = os.stat(cache_file)
+        stamp = (st.st_mtime, st.st_size, st.st_ino)
+        if (stamp != _loaded['stamp']):
+            with open(cache_file) as cfo:
+                _loaded['attributes'] = json.load(cfo)
+            _loaded['stamp'] = stamp
+    except (OSError, IOError, ValueError):
+        return {}
+    return _loaded['attributes']
+
+
+def attributes_stamp():
+    """
+    :return: (mtime, size, inode) of the cache file, changing whenever the
+    cached attributes do, or None if there is no cache file.
+    """
+    try:
+        st = os.stat(_config('cache_file'))
+        return (st.st_mtime, st.st_size, st.st_ino)
+    except OSError:
+        return None
+
+
+def disk_attributes(name):
+    """
+    :param name: Disk.name ie by-id type without path
+    :return: cached attributes of the disk, empty if not polled yet.
+    """
+    return load_attributes().get(name, {})
+
+
+def _save(attributes):
+    cache_file = _config('cache_file')
+    tmp_file = '%s.tmp' % cache_file
+    with open(tmp_file, 'w') as tfo:
+        json.dump(attributes, tfo)
+    os.rename(tmp_file, cache_file)
+
+
+def update_attributes(name, **kwargs):
+    """
+    Update the cached attributes of a disk, eg: after changing its hdparm
+    settings. next_poll=0 has the poller refresh the disk on its next round.
+    """
+    with _locked():
+        attributes = dict(load_attributes())
+        entry = dict(attributes.get(name, {}))
+        entry.update(kwargs)
+        attributes[name] = entry
+        _save(attributes)
+
+
+def io_count(temp_name):
+    """
+    :return: number of reads and writes completed by a block device, from
+    its /sys/class/block/<temp_name>/stat, or None if not available.
+    """
+    try:
+        with open('/sys/class/block/%s/stat' % temp_name) as sfo:
+            fields = sfo.read().split()
+        return int(fields[0]) + int(fields[4])
+    except (IOError, IndexError, ValueError):
+        return None
+
+
+def poll_disk(name, entry, now):
+    """
+    Refresh a disk's attributes.
+    :param entry: the disk's previous attributes, updated in place.
+    """
+    temp_name = get_dev_temp_name(name)
+    io = io_count(temp_name)
+    entry['temp_name'] = temp_name
+    entry['hdparm_setting'] = read_hdparm_setting(name)
+    if (entry.get('power_state') in ASLEEP_STATES and io is not None and
+            io == entry.get('io')):
+        # no I/O since we saw it asleep so it still is, don't touch it.
+        pass
+    else:
+        entry['power_state'] = get_disk_power_status(name)
+        # hdparm -B identifies the drive which may spin it up.
+        if (entry['power_state'] not in ASLEEP_STATES and
+                entry.get('apm_next', 0) <= now):
+            entry['apm_level'] = get_disk_APM_level(name)
+            entry['apm_next'] = now + _config('apm_interval')
+    # back off from drives that don't report a power state, eg: virtual and
+    # most USB ones.
+    interval = _config('interval')
+    if (entry['power_state'] == 'unknown'):
+        interval = min(entry.get('interval', interval) * 2,
+                       _config('max_interval'))
+    entry['interval'] = interval
+    entry['io'] = io
+    entry['polled'] = now
+    entry['next_poll'] = now + interval
+
+
+def poll_disks(names, now=None):
+    """
+    Refresh the attributes of the given disks that are due and drop those of
+    other disks.
+    :param names: Disk.name of the attached disks.
+    """
+    if (now is None):
+        now = time.time()
+    with _locked():
+        previous = load_attributes()
+        attributes = {}
+        for name in names:
+            entry = dict(previous.get(name, {}))
+            if (entry.get('next_poll', 0) <= now):
+                try:
+                    poll_disk(name, entry, now)
+                except Exception as e:
+                    logger.error('Failed to poll disk(%s) attributes: %s' %
+                                 (name, e.__str__()))
+                    entry['next_poll'] = now + _config('max_interval')
+            attributes[name] = entry
+        if (attributes != previous):
+            _save(attributes)
+    return attributes
@@ -18,12 +18,26 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 from osi import run_command
 import collections
+import httplib
+import json
+import re
+import socket
+import threading
+import time
+import logging
+logger = logging.getLogger(__name__)
 Image = collections.namedtuple('Image', 'repository tag image_id created '
                                'virt_size')
 Container = collections.namedtuple('Container', 'container_id image command '
                                    'created status ports name')
 
 DOCKER = '/usr/bin/docker'
+DOCKER_SOCKET = '/var/run/docker.sock'
+# Seconds container states fetched from the Docker API are reused for.
+STATES_TTL = 2
+
+_states = {'expires': 0, 'states': None, }
+_states_lock = threading.Lock()
 
 
 def image_list():
@@ -39,7 +53,7 @@ def image_list():
 
 def container_list():
     containers = []
-    o, e, rc = run_command([DOCKER, 'ps', '-a', ])
+    o, e, rc = run_command([DOCKER, 'ps', '-a', ], cache=True)
     for l in o[1:-1]:
         cur_con = Container(l[0:20].strip(), l[20:40].strip(),
                             l[40:60].strip(), l[60:80].strip(),
@@ -47,3 +61,79 @@ def container_list():
                             l[120:].strip())
         containers.append(cur_con)
     return containers
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """
+    HTTPConnection to a server, eg: the Docker Engine, on a unix socket.
+    """
+
+    def __init__(self, path, timeout=10):
+        httplib.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def api_get(path, socket_path=DOCKER_SOCKET, timeout=10):
+    """
+    GET path from the Docker Engine API.
+    :return: the decoded json response.
+    """
+    conn = UnixHTTPConnection(socket_path, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        body = response.read()
+        if (response.status != 200):
+            raise Exception('Docker API request(%s) failed: %d %s' %
+                            (path, response.status, body))
+        return json.loads(body)
+    finally:
+        conn.close()
+
+
+def container_states(socket_path=DOCKER_SOCKET):
+    """
+    State of all containers with a single Docker API query, reused for
+    STATES_TTL seconds.
+    :return: dict of container name -> (state, exit code), eg:
+    ('running', None) or ('exited', 137), or None if the API is unavailable.
+    """
+    with _states_lock:
+        if (_states['expires'] > time.time() and
+                _states['socket'] == socket_path):
+            return _states['states']
+        try:
+            containers = api_get('/containers/json?all=1',
+                                 socket_path=socket_path)
+        except Exception as e:
+            logger.error('Failed to list containers via the Docker API: %s'
+                         % e.__str__())
+            return None
+        states = {}
+        for c in containers:
+            status = c.get('Status', '')
+            # State is only reported by API 1.23+, derive it from Status,
+            # eg: 'Up 2 hours' or 'Exited (0) 2 hours ago', otherwise.
+            state = c.get('State')
+            if (state is None):
+                state = 'running' if status.startswith('Up') else 'exited'
+            exit_code = None
+            m = re.match(r'Exited \((-?\d+)\)', status)
+            if (m is not None):
+                exit_code = int(m.group(1))
+            for name in c.get('Names') or []:
+                states[name.lstrip('/')] = (state, exit_code)
+        _states.update({'expires': time.time() + STATES_TTL,
+                        'socket': socket_path, 'states': states, })
+        return states
+
+
+def clear_container_states():
+    with _states_lock:
+        _states['expires'] = 0
@@ -31,6 +31,31 @@ class CommandException(Exception):
                                  self.err))
 
 
+class CommandTimeoutException(CommandException):
+
+    def __init__(self, cmd, out, err, timeout):
+        super(CommandTimeoutException, self).__init__(cmd, out, err, -9)
+        self.timeout = timeout
+
+    def __str__(self):
+        return ('Command timed out after %d seconds and was killed. cmd = '
+                '%s.' % (self.timeout, ' '.join(self.cmd)))
+
+
+class CircuitOpenException(CommandException):
+
+    def __init__(self, cmd, target, hung_cmd, until):
+        super(CircuitOpenException, self).__init__(cmd, [''], [''], -1)
+        self.target = target
+        self.hung_cmd = hung_cmd
+        self.until = until
+
+    def __str__(self):
+        return ('Not running a command against %s as an earlier command '
+                '(%s) on it hung. Retry in a minute. cmd = %s.' %
+                (self.target, self.hung_cmd, ' '.join(self.cmd)))
+
+
 class NonBTRFSRootException(Exception):
 
     def __init__(self, err):
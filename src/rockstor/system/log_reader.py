@@ -0,0 +1,184 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import re
+
+# Size of the blocks read from disk, so memory used to page through a log is
+# bounded by this and the page (window) size, not by the log size.
+BLOCK_SIZE = 64 * 1024
+
+
+def line_filter(pattern, regex=False):
+    """
+    Return a predicate for lines containing pattern, or matching it as a
+    regular expression when regex is True. None when there is no pattern.
+    """
+    if (not pattern):
+        return None
+    if (regex):
+        try:
+            return re.compile(pattern).search
+        except re.error as e:
+            raise Exception('Invalid log filter regex (%s): %s' %
+                            (pattern, e.__str__()))
+    return lambda line: pattern in line
+
+
+def iter_forward(fo, offset=0):
+    """
+    Generate (offset, line) for each line from byte offset onwards, reading
+    fo in BLOCK_SIZE blocks. offset is the byte position the line starts at.
+    """
+    fo.seek(offset)
+    pending = ''
+    while True:
+        block = fo.read(BLOCK_SIZE)
+        if (not block):
+            break
+        pending += block
+        start = 0
+        while True:
+            end = pending.find('\n', start)
+            if (end == -1):
+                break
+            yield offset, pending[start:end + 1]
+            offset += end + 1 - start
+            start = end + 1
+        pending = pending[start:]
+    if (len(pending) > 0):
+        yield offset, pending
+
+
+def iter_backward(fo, end=None):
+    """
+    Generate (offset, line) for each line ending before byte offset end
+    (default EOF), last line first, reading fo backwards in BLOCK_SIZE
+    blocks.
+    """
+    if (end is None):
+        fo.seek(0, 2)
+        end = fo.tell()
+    pos = end
+    pending = ''
+    while (pos > 0):
+        size = min(BLOCK_SIZE, pos)
+        pos -= size
+        fo.seek(pos)
+        pending = fo.read(size) + pending
+        # the last char of pending terminates the line it ends so search
+        # for the previous newline before it.
+        while True:
+            nl = pending.rfind('\n', 0, len(pending) - 1)
+            if (nl == -1):
+                break
+            yield pos + nl + 1, pending[nl + 1:]
+            pending = pending[:nl + 1]
+    if (len(pending) > 0):
+        yield 0, pending
+
+
+def seek_line(fo, line):
+    """
+    Return the byte offset of 1-based line number line, or of EOF if the log
+    has fewer lines. Only newlines are counted, lines are never built.
+    """
+    fo.seek(0)
+    offset = 0
+    remaining = line - 1
+    while (remaining > 0):
+        block = fo.read(BLOCK_SIZE)
+        if (not block):
+            break
+        count = block.count('\n')
+        if (count < remaining):
+            remaining -= count
+            offset += len(block)
+            continue
+        idx = -1
+        for i in range(remaining):
+            idx = block.find('\n', idx + 1)
+        offset += idx + 1
+        remaining = 0
+    return offset
+
+
+def read_page(log_path, offset=None, line=None, lines=200, reverse=False,
+              pattern=None, regex=False, lineno=None):
+    """
+    Read one page (window) of up to lines lines of log_path.
+
+    Forward pages start at byte offset (default 0) or at line number line
+    and are numbered when the first line number is known, lineno gives it
+    for a page starting at offset, see 'next_line'. Reverse pages end
+    at byte offset (default EOF) and are what tail gives, in file order.
+    Lines not matching pattern are skipped but still count towards the
+    offsets so paging continues where the page ended.
+
+    :return: dict with 'lines', a list of (line number or None, line),
+    'offset', the byte offset the page starts at, 'next_offset', where the
+    next page in the same direction continues from, 'next_line', the line
+    number there if known, and 'eof', True when there is nothing further to
+    read in that direction.
+    """
+    match = line_filter(pattern, regex)
+    page = []
+    with open(log_path) as fo:
+        if (reverse):
+            next_offset = offset
+            if (next_offset is None):
+                fo.seek(0, 2)
+                next_offset = fo.tell()
+            eof = True
+            for start, l in iter_backward(fo, next_offset):
+                if (len(page) == lines):
+                    eof = False
+                    break
+                next_offset = start
+                if (match is None or match(l)):
+                    page.append((None, l))
+            page.reverse()
+            return {'lines': page, 'offset': next_offset,
+                    'next_offset': next_offset, 'next_line': None,
+                    'eof': eof, }
+        if (line is not None):
+            offset = seek_line(fo, line)
+            lineno = line
+        elif (offset is None or offset == 0):
+            offset = 0
+            lineno = 1
+        next_offset = offset
+        eof = True
+        for start, l in iter_forward(fo, offset):
+            if (len(page) == lines):
+                eof = False
+                break
+            next_offset = start + len(l)
+            if (match is None or match(l)):
+                page.append((lineno, l))
+            if (lineno is not None):
+                lineno += 1
+    return {'lines': page, 'offset': offset, 'next_offset': next_offset,
+            'next_line': lineno, 'eof': eof, }
+
+
+def format_page(page):
+    """
+    Render a page as text, numbered lines formatted as cat -n does.
+    """
+    return ''.join(l if n is None else '%6d\t%s' % (n, l)
+                   for n, l in page['lines'])
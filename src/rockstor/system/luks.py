@@ -17,6 +17,8 @@ along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 import os
 import re
+import threading
+from glob import glob
 from tempfile import mkstemp
 import shutil
 from system.exceptions import CommandException
@@ -29,13 +31,135 @@ CRYPTSETUP = '/usr/sbin/cryptsetup'
 DMSETUP = '/usr/sbin/dmsetup'
 CRYPTTABFILE = '/etc/crypttab'
 DD = '/usr/bin/dd'
+SYS_BLOCK = '/sys/block'
+SYS_FS_BTRFS = '/sys/fs/btrfs'
+DEV_MAPPER = '/dev/mapper'
+DEV_BY_UUID = '/dev/disk/by-uuid'
+
+# dm_crypt_index() cache, rebuilt when a mapping is added or removed.
+_index = {'signature': None, 'volumes': {}, }
+# cryptsetup status output of open volumes by (name, dm, dev, device), as
+# it doesn't change while the same mapping exists.
+_status_cache = {}
+_index_lock = threading.Lock()
+
+
+def _read_sysfs(path):
+    try:
+        with open(path) as sfo:
+            return sfo.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def _container_uuid(dm_uuid):
+    """
+    Extract the LUKS container uuid from a dm uuid as set by cryptsetup, eg:
+    CRYPT-LUKS1-a47f495032964504b9a42dc75681a6ad-luks-a47f4950-3296-...
+    :return: a47f4950-3296-4504-b9a4-2dc75681a6ad or None if not a LUKS one.
+    """
+    fields = dm_uuid.split('-', 3)
+    if (len(fields) < 3 or fields[0] != 'CRYPT' or
+            not fields[1].startswith('LUKS') or len(fields[2]) != 32):
+        return None
+    h = fields[2]
+    return '%s-%s-%s-%s-%s' % (h[:8], h[8:12], h[12:16], h[16:20], h[20:])
+
+
+def _by_uuid_map():
+    """
+    :return: dict of device name, eg: sda3, to its filesystem or container
+    uuid from the /dev/disk/by-uuid links.
+    """
+    uuid_map = {}
+    for uuid in _listdir(DEV_BY_UUID):
+        try:
+            dev = os.path.basename(os.readlink(os.path.join(DEV_BY_UUID,
+                                                            uuid)))
+        except OSError:
+            continue
+        uuid_map.setdefault(dev, uuid)
+    return uuid_map
+
+
+def _index_signature():
+    # /dev/mapper's mtime changes with every mapping added or removed.
+    try:
+        mapper_mtime = os.stat(DEV_MAPPER).st_mtime
+    except OSError:
+        mapper_mtime = None
+    return (tuple(_listdir(SYS_BLOCK)), mapper_mtime)
+
+
+def dm_crypt_index():
+    """
+    Index of the open dm-crypt volumes built from sysfs, without running any
+    command. Rebuilt only when device-mapper devices come or go.
+    :return: dict indexed by mapped name, eg: luks-<uuid>, of dicts with:
+    'dm': the volume's kernel name eg: dm-0, 'dev': its major:minor,
+    'uuid': the uuid of the LUKS container backing it (or None if unknown),
+    'device': the container's kernel name eg: sda3, 'type': eg: LUKS1.
+    Not to be modified by callers.
+    """
+    signature = _index_signature()
+    with _index_lock:
+        if (_index['signature'] == signature):
+            return _index['volumes']
+    volumes = {}
+    uuid_map = None
+    for dm_dir in glob('%s/dm-*' % SYS_BLOCK):
+        dm_uuid = _read_sysfs('%s/dm/uuid' % dm_dir)
+        name = _read_sysfs('%s/dm/name' % dm_dir)
+        if (dm_uuid is None or name is None or
+                not dm_uuid.startswith('CRYPT-')):
+            continue
+        slaves = _listdir('%s/slaves' % dm_dir)
+        device = slaves[0] if len(slaves) > 0 else None
+        uuid = _container_uuid(dm_uuid)
+        if (uuid is None and device is not None):
+            # not named by cryptsetup's convention, eg: a plain mapping.
+            if (uuid_map is None):
+                uuid_map = _by_uuid_map()
+            uuid = uuid_map.get(device)
+        volumes[name] = {'dm': os.path.basename(dm_dir),
+                         'dev': _read_sysfs('%s/dev' % dm_dir),
+                         'uuid': uuid,
+                         'device': device,
+                         'type': dm_uuid.split('-')[1], }
+    with _index_lock:
+        _index['signature'] = signature
+        _index['volumes'] = volumes
+        keys = set([(n, v['dm'], v['dev'], v['device']) for n, v in
+                    volumes.items()])
+        for key in _status_cache.keys():
+            if (key not in keys):
+                del _status_cache[key]
+    return volumes
+
+
+def _in_use(dm):
+    """
+    Whether the dm volume is held by another device or is a btrfs member,
+    ie: as cryptsetup's 'is in use'.
+    """
+    return (len(_listdir('%s/%s/holders' % (SYS_BLOCK, dm))) > 0 or
+            len(glob('%s/*/devices/%s' % (SYS_FS_BTRFS, dm))) > 0)
 
 
 def get_open_luks_volume_status(mapped_device_name, byid_name_map):
     """
-    Wrapper around 'cryptsetup status mapped_device_name' that returns a
-    dictionary of this commands output, with the device value substituted for
-    it's by-id equivalent.
+    Returns a dictionary of the output of 'cryptsetup status
+    mapped_device_name', with the device value substituted for it's by-id
+    equivalent. For volumes in dm_crypt_index() cryptsetup is only run the
+    first time a mapping is seen, the status and device are then taken from
+    sysfs.
     Example command output:
     /dev/disk/by-id/dm-name-
     luks-a47f4950-3296-4504-b9a4-2dc75681a6ad is active.
@@ -57,6 +181,33 @@ def get_open_luks_volume_status(mapped_device_name, byid_name_map):
     :return: dictionary of the stated commands output or {} upon a non zero
     return code from command execution.
     """
+    name = mapped_device_name.split('/')[-1]
+    volume = dm_crypt_index().get(name)
+    if volume is None:
+        return cryptsetup_status(mapped_device_name, byid_name_map)
+    key = (name, volume['dm'], volume['dev'], volume['device'])
+    with _index_lock:
+        status = _status_cache.get(key)
+    if status is None:
+        status = cryptsetup_status(mapped_device_name, byid_name_map)
+        if len(status) == 0:
+            return status
+        with _index_lock:
+            _status_cache[key] = status
+    status = dict(status)
+    status['status'] = ('active and is in use.' if _in_use(volume['dm'])
+                        else 'active.')
+    if volume['device'] is not None:
+        status['device'] = byid_name_map.get(volume['device'],
+                                             volume['device'])
+    return status
+
+
+def cryptsetup_status(mapped_device_name, byid_name_map):
+    """
+    Runs 'cryptsetup status mapped_device_name' for
+    get_open_luks_volume_status(), see there.
+    """
     status = {}
     status_found = False
     device_found = False
@@ -172,56 +323,17 @@ def luks_format_disk(disk_byid, passphrase):
 
 def get_unlocked_luks_containers_uuids():
     """
-    Returns a list of LUKS container uuids backing open LUKS volumes. 
-    The method used is to first run:
-    'dmsetup info --columns --noheadings -o name --target crypt' eg output:
-    luks-82fd9db1-e1c1-488d-9b42-536d0a82caeb
-    luks-3efb3830-fee1-4a9e-a5c6-ea456bfc269e
-    luks-a47f4950-3296-4504-b9a4-2dc75681a6ad
-    to get a list of open LUKS containers (--target crypt). If the usual naming 
-    convention is followed we have a name format of luks-<uuid> with len = 41
-    and we can extract the uuid of the LUKS container from it syntactically.
-    If this naming convention is not matched then we fail over to calling:
-    get_open_luks_container_dev() and then looking up that devices uuid via
-    our uuid_name_map dictionary.
+    Returns a list of LUKS container uuids backing open LUKS volumes, as
+    found by dm_crypt_index(). If the usual naming convention is followed
+    the container's uuid is part of the volume's dm uuid, eg:
+    CRYPT-LUKS1-82fd9db1e1c1488d9b42536d0a82caeb-luks-82fd9db1-e1c1-...
+    otherwise it's that of the volume's backing device in
+    /dev/disk/by-uuid.
     :return: list containing the uuids of LUKS containers that have currently
-    open volumes, or empty list if none open or an error occurred. 
+    open volumes, or empty list if none open.
     """
-    open_luks_container_uuids = []
-    # flag to minimise calls to get_uuid_name_map()
-    uuid_name_map_retrieved = False
-    uuid_name_map = {}
-    out, err, rc = run_command([DMSETUP, 'info', '--columns', '--noheadings',
-                                '--options', 'name', '--target', 'crypt'])
-    if len(out) > 0 and rc == 0:
-        # The output has at least one line and our dmsetup executed OK.
-        for each_line in out:
-            if each_line == '':
-                continue
-            backing_container_uuid = None
-            if len(each_line) == 41 and re.match('luks-', each_line):
-                # good chance on "luks-a47f4950-3296-4504-b9a4-2dc75681a6ad"
-                # naming convention so strip uuid from this (cheap and quick)
-                backing_container_uuid = each_line[5:]
-            else:
-                # More expensive two step process to retrieve uuid of LUKS
-                # container backing this open LUKS volume.
-                # Initial call to gain backing device name for our container
-                container_dev = get_open_luks_container_dev(each_line)
-                # strip leading /dev/ from device name if any returned.
-                if container_dev is not '':
-                    container_dev = container_dev.split('/')[-1]
-                    # should now have name without path ie 'vdd' ready to
-                    # index our uuid_name_map.
-                    if not uuid_name_map_retrieved:
-                        uuid_name_map = get_uuid_name_map()
-                        uuid_name_map_retrieved = True
-                    # second stage where we look up this devices uuid
-                    backing_container_uuid = uuid_name_map[container_dev]
-            # if a backing container uuid was found add it to our list
-            if backing_container_uuid is not None:
-                open_luks_container_uuids.append(backing_container_uuid)
-    return open_luks_container_uuids
+    return [v['uuid'] for n, v in sorted(dm_crypt_index().items())
+            if v['uuid'] is not None]
 
 
 def get_crypttab_entries():
@@ -16,16 +16,30 @@ You should have received a copy of the GNU General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import copy
 import json
 import logging
-import re
-
+import os
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+from .command_cache import command_cache
+from .command_guard import KILL_GRACE
 from .exceptions import CommandException
 from .osi import run_command
 
 
 NMCLI = '/usr/bin/nmcli'
 DEFAULT_MTU = 1500
+# Seconds an inventory is reused for, at most, if NetworkManager reports no
+# change. Without the monitor, ie: the data-collector is not running or nmcli
+# monitor failed, a short ttl is used.
+INVENTORY_MAX_AGE = 60
+INVENTORY_TTL = 5
+# Seconds before nmcli monitor is restarted, once it exited or failed to start.
+MONITOR_RESTART_DELAY = 10
 logger = logging.getLogger(__name__)
 
 
@@ -39,48 +53,153 @@ def val(s):
     return v
 
 
+def terse_records(lines, first_key):
+    """
+    Split the terse (-t) multiline output of nmcli, about several objects,
+    into one list of (key, value) per object. Each object starts with
+    first_key. Indexes of multi value keys are dropped, eg: IP4.ADDRESS[2]
+    is returned as IP4.ADDRESS.
+    """
+    records = []
+    for l in lines:
+        if (len(l.strip()) == 0 or ':' not in l):
+            continue
+        key, value = l.split(':', 1)
+        key = key.split('[')[0]
+        value = value.replace('\\:', ':').replace('\\\\', '\\').strip()
+        if (key == first_key):
+            records.append([])
+        if (len(records) > 0):
+            records[-1].append((key, value))
+    return records
+
+
+def tval(v):
+    if (len(v) == 0 or v == '--'):
+        return None
+    return v
+
+
+def nmcli_show(cmd, first_key):
+    """
+    Run a multi object nmcli show command. Objects that vanish meanwhile
+    make nmcli exit with rc 10, they are simply missing from the output.
+    """
+    o, e, rc = run_command(cmd, throw=False)
+    if (rc == 10):
+        logger.debug('Some objects vanished during: %s. %s' %
+                     (' '.join(cmd), e))
+    elif (rc != 0):
+        raise CommandException(cmd, o, e, rc)
+    return terse_records(o, first_key)
+
+
+# device show key -> devices() map key.
+DEVICE_FIELDS = {
+    'GENERAL.TYPE': 'dtype',
+    'GENERAL.HWADDR': 'mac',
+    'GENERAL.MTU': 'mtu',
+    'GENERAL.STATE': 'state',
+}
+
+
 def devices():
     dmap = {}
-    o, e, rc = run_command([NMCLI, '-t', '-f', 'device', 'device'])
-    for dev in o:
-        if (len(dev.strip()) == 0):
-            continue
+    for record in nmcli_show([NMCLI, '-t', 'd', 'show', ], 'GENERAL.DEVICE'):
         tmap = {
             'dtype': None,
             'mac': None,
             'mtu': None,
             'state': None,
         }
-        try:
-            o2, e2, r2 = run_command([NMCLI, 'd', 'show', dev])
-        except CommandException as e:
-            # especially veth devices can vanish abruptly sometimes.
-            if e.rc == 10:
-                logger.exception(e)
-                logger.debug('device: {} vanished. Discarding it'.format(dev))
-                continue
-            raise
-
-        for l in o2:
-            if (re.match('GENERAL.TYPE:', l) is not None):
-                tmap['dtype'] = val(l)
-            elif (re.match('GENERAL.HWADDR:', l) is not None):
-                tmap['mac'] = val(l)
-            elif (re.match('GENERAL.MTU:', l) is not None):
-                tmap['mtu'] = val(l)
-            elif (re.match('GENERAL.STATE:', l) is not None):
-                tmap['state'] = val(l)
-            elif (re.match('GENERAL.CONNECTION:', l) is not None):
-                connection = val(l)
-                if (connection is not None):
-                    tmap['connection'] = connection
-        dmap[dev] = tmap
+        for key, value in record:
+            if (key in DEVICE_FIELDS):
+                tmap[DEVICE_FIELDS[key]] = tval(value)
+            elif (key == 'GENERAL.CONNECTION' and tval(value) is not None):
+                tmap['connection'] = value
+        dmap[record[0][1]] = tmap
     return dmap
 
 
-def connections():
+def _set(field):
+    def setter(tmap, value):
+        tmap[field] = tval(value)
+    return setter
+
+
+def _append_unique(field, split=False):
+    def appender(tmap, value):
+        value = tval(value)
+        if (value is None):
+            return
+        for v in (value.split(',') if split else [value, ]):
+            if (v not in tmap[field]):
+                tmap[field].append(v)
+    return appender
+
+
+def _ctype(tmap, value):
+    tmap['ctype'] = tval(value)
+    if (tmap['ctype'] == '802-3-ethernet'):
+        tmap[tmap['ctype']] = {
+            'mac': None,
+            'cloned_mac': None,
+            'mtu': None,
+        }
+    elif (tmap['ctype'] in ('team', 'bond')):
+        tmap[tmap['ctype']] = {
+            'config': None
+        }
+    else:
+        tmap[tmap['ctype']] = {}
+
+
+def _master(tmap, value):
+    # for team, bond and bridge type connections.
+    if (tval(value) is not None):
+        tmap['master'] = value
+
+
+def _ctype_set(ctype, field, parse=tval):
+    def setter(tmap, value):
+        if (tmap.get('ctype') == ctype):
+            tmap[ctype][field] = parse(value)
+    return setter
+
+
+def _bond_mode(options):
+    # @todo: there may be more options. for now, we just care about mode.
+    options_l = options.split(',')[0].split('=')
+    return json.dumps({options_l[0]: options_l[1]})
+
+
+# connection show key -> handler(tmap, value) setting connections() map keys.
+CONNECTION_FIELDS = {
+    'connection.id': _set('name'),
+    'GENERAL.STATE': _set('state'),
+    'ipv4.method': _set('ipv4_method'),
+    'IP4.ADDRESS': _append_unique('ipv4_addresses'),
+    'IP4.GATEWAY': _set('ipv4_gw'),
+    'IP4.DNS': _append_unique('ipv4_dns'),
+    'ipv4.dns': _append_unique('ipv4_dns', split=True),
+    'ipv4.dns-search': _set('ipv4_dns_search'),
+    'connection.type': _ctype,
+    'connection.master': _master,
+    '802-3-ethernet.mac-address': _ctype_set('802-3-ethernet', 'mac'),
+    '802-3-ethernet.cloned-mac-address': _ctype_set('802-3-ethernet',
+                                                    'cloned_mac'),
+    '802-3-ethernet.mtu': _ctype_set('802-3-ethernet', 'mtu'),
+    'team.config': _ctype_set('team', 'config', parse=lambda v: v),
+    'bond.options': _ctype_set('bond', 'config', parse=_bond_mode),
+}
+
+
+def _connections():
     cmap = {}
     o, e, rc = run_command([NMCLI, '-t', '-f', 'uuid', 'c', 'show', ])
+    uuids = [u.strip() for u in o if (len(u.strip()) > 0)]
+    if (len(uuids) == 0):
+        return cmap
 
     def flatten(l):
         s = ','.join(l)
@@ -88,9 +207,9 @@ def connections():
             return None
         return s
 
-    for uuid in o:
-        if (len(uuid.strip()) == 0):
-            continue
+    # every connection's details with one nmcli call.
+    for record in nmcli_show([NMCLI, '-t', 'c', 'show', ] + uuids,
+                             'connection.id'):
         tmap = {
             'name': None,
             'state': None,
@@ -105,90 +224,142 @@ def connections():
             'ipv6_dns': None,
             'ipv6_dns_search': None,
         }
-        try:
-            o2, e2, rc2 = run_command([NMCLI, 'c', 'show', uuid, ])
-        except CommandException as e:
-            # in case the connection disappears
-            if e.rc == 10:
-                logger.exception(e)
-                logger.debug('connection: {} vanished. Discarding it'.format(
-                    uuid))
-                continue
-            raise e
-        for l in o2:
-            if (re.match('ipv4.method:', l) is not None):
-                tmap['ipv4_method'] = val(l)
-            elif (re.match('connection.id:', l) is not None):
-                tmap['name'] = val(l)
-            elif (re.match('GENERAL.STATE:', l) is not None):
-                tmap['state'] = val(l)
-            elif (re.match('IP4.ADDRESS', l) is not None):
-                tmap['ipv4_addresses'].append(val(l))
-            elif (re.match('IP4.GATEWAY:', l) is not None):
-                tmap['ipv4_gw'] = val(l)
-            elif (re.match('IP4.DNS', l) is not None):
-                v = val(l)
-                if (v is not None):
-                    if (v not in tmap['ipv4_dns']):
-                        tmap['ipv4_dns'].append(v)
-            elif (re.match('ipv4.dns:', l) is not None):
-                v = val(l)
-                if (v is not None):
-                    for ip in v.split(','):
-                        if (ip not in tmap['ipv4_dns']):
-                            tmap['ipv4_dns'].append(ip)
-            elif (re.match('ipv4.dns-search:', l) is not None):
-                tmap['ipv4_dns_search'] = val(l)
-            elif (re.match('connection.type:', l) is not None):
-                tmap['ctype'] = val(l)
-                if (tmap['ctype'] == '802-3-ethernet'):
-                    tmap[tmap['ctype']] = {
-                        'mac': None,
-                        'cloned_mac': None,
-                        'mtu': None,
-                    }
-                elif (tmap['ctype'] in ('team', 'bond')):
-                    tmap[tmap['ctype']] = {
-                        'config': None
-                    }
-                else:
-                    tmap[tmap['ctype']] = {}
-
-            elif (re.match('connection.master:', l) is not None):
-                # for team, bond and bridge type connections.
-                master = val(l)
-                if (master is not None):
-                    tmap['master'] = master
-            elif (re.match('802-3-ethernet.mac-address:', l) is not None and
-                  tmap['ctype'] == '802-3-ethernet'):
-                tmap[tmap['ctype']]['mac'] = val(l)
-            elif (re.match('802-3-ethernet.cloned-mac-address:', l) is not
-                  None and tmap['ctype'] == '802-3-ethernet'):
-                tmap[tmap['ctype']]['cloned_mac'] = val(l)
-            elif (re.match('802-3-ethernet.mtu:', l) is not None and
-                  tmap['ctype'] == '802-3-ethernet'):
-                tmap[tmap['ctype']]['mtu'] = val(l)
-
-            elif (re.match('team.config:', l) is not None and
-                  tmap['ctype'] == 'team'):
-                tmap[tmap['ctype']]['config'] = l.split(
-                    'team.config:')[1].strip()
-            elif (re.match('bond.options:', l) is not None and
-                  tmap['ctype'] == 'bond'):
-                options = l.split('bond.options:')[1].strip()
-                options_l = options.split('=')
-                # @todo: there may be more options. for now, we just care about
-                # mode.
-                tmap[tmap['ctype']]['config'] = json.dumps(
-                    {options_l[0]: options_l[1]})
+        uuid = None
+        for key, value in record:
+            if (key == 'connection.uuid'):
+                uuid = value
+            elif (key in CONNECTION_FIELDS):
+                CONNECTION_FIELDS[key](tmap, value)
+        if (uuid is None):
+            continue
         tmap['ipv4_addresses'] = flatten(tmap['ipv4_addresses'])
         tmap['ipv4_dns'] = flatten(tmap['ipv4_dns'])
         cmap[uuid] = tmap
     return cmap
 
 
+class NMMonitor(object):
+    """
+    Follows `nmcli monitor` and counts the changes NetworkManager reports,
+    eg: connections added, modified or changing state. Only the
+    data-collector runs it, publishing the count in
+    settings.NM_MONITOR['state_file'] for connections() in every process.
+    nmcli monitor runs for as long as the data-collector does, so it is not
+    run via run_command and its deadlines, but stop() kills and reaps it
+    much as system.command_guard does a timed out command.
+    """
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.changes = 0
+        self.proc = None
+        self.stopped = False
+
+    def run(self):
+        """
+        Follow nmcli monitor, restarting it should it exit, until stop().
+        """
+        self.stopped = False
+        while (not self.stopped):
+            try:
+                with open(os.devnull, 'w') as dfo:
+                    self.proc = subprocess.Popen([NMCLI, 'monitor'],
+                                                 stdout=subprocess.PIPE,
+                                                 stderr=dfo)
+            except OSError as e:
+                logger.error('Failed to start nmcli monitor: %s' %
+                             e.__str__())
+            else:
+                # changes missed while the monitor was down.
+                self.changes += 1
+                self._publish()
+                for l in iter(self.proc.stdout.readline, ''):
+                    self.changes += 1
+                    self._publish()
+                self.proc.stdout.close()
+                rc = self.proc.wait()
+                self._unpublish()
+                if (self.stopped):
+                    break
+                logger.error('nmcli monitor exited with rc %s.' % rc)
+            time.sleep(MONITOR_RESTART_DELAY)
+
+    def stop(self):
+        self.stopped = True
+        proc = self.proc
+        if (proc is None or proc.poll() is not None):
+            return
+        proc.terminate()
+        deadline = time.time() + KILL_GRACE
+        while (proc.poll() is None and time.time() < deadline):
+            time.sleep(0.1)
+        if (proc.poll() is None):
+            proc.kill()
+            proc.wait()
+        self._unpublish()
+
+    def _publish(self):
+        # replaced with a rename so that readers never see a partial file.
+        tmp = '%s.%d' % (self.state_file, os.getpid())
+        try:
+            with open(tmp, 'w') as sfo:
+                json.dump({'pid': self.proc.pid,
+                           'changes': self.changes, }, sfo)
+            os.rename(tmp, self.state_file)
+        except (IOError, OSError) as e:
+            logger.error('Failed to publish nmcli monitor changes: %s' %
+                         e.__str__())
+
+    def _unpublish(self):
+        try:
+            os.remove(self.state_file)
+        except OSError:
+            pass
+
+
+def published_changes():
+    """
+    :return: (pid, changes) of the data-collector's nmcli monitor, or None
+    if it is not running.
+    """
+    try:
+        with open(settings.NM_MONITOR['state_file']) as sfo:
+            state = json.load(sfo)
+        # a monitor left behind by a dead data-collector exits on the next
+        # change it reports, with no reader for its output.
+        os.kill(state['pid'], 0)
+        return (state['pid'], state['changes'])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+# connections() inventory: (key, expires, cmap)
+_inventory = [None, 0, None]
+_inventory_lock = threading.Lock()
+
+
+def connections():
+    """
+    :return: dict of connection uuid -> its details. The inventory is
+    reused until NetworkManager reports a change or a connection is changed
+    via run_command in this process. Without the data-collector's monitor,
+    it is only reused for INVENTORY_TTL seconds.
+    """
+    published = published_changes()
+    key = (published, command_cache.generation)
+    with _inventory_lock:
+        if (_inventory[0] == key and _inventory[1] > time.time()):
+            return copy.deepcopy(_inventory[2])
+    cmap = _connections()
+    max_age = INVENTORY_TTL if published is None else INVENTORY_MAX_AGE
+    with _inventory_lock:
+        _inventory[:] = [key, time.time() + max_age, cmap]
+    return copy.deepcopy(cmap)
+
+
 def valid_connection(uuid):
-    o, e, rc = run_command([NMCLI, 'c', 'show', uuid], throw=False)
+    o, e, rc = run_command([NMCLI, 'c', 'show', uuid], throw=False,
+                           cache=True)
     if (rc != 0):
         return False
     return True
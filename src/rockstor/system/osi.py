@@ -33,7 +33,11 @@ import uuid
 
 from django.conf import settings
 
-from exceptions import CommandException, NonBTRFSRootException
+from exceptions import (CommandException, CommandTimeoutException,
+                        CircuitOpenException, NonBTRFSRootException)
+from command_stats import command_stats
+from command_cache import command_cache
+from command_guard import (command_guard, command_timeout, guarded_args)
 
 
 logger = logging.getLogger(__name__)
@@ -92,7 +96,15 @@ def inplace_replace(of, nf, regex, nl):
 
 def run_command(cmd, shell=False, stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE, stdin=subprocess.PIPE, throw=True,
-                log=False, input=None):
+                log=False, input=None, cache=False, timeout=None):
+    """
+    :param cache: reuse the output of an identical and successful earlier
+    run, if still fresh. Only for read only commands, see
+    system.command_cache for their ttls and the commands invalidating them.
+    :param timeout: seconds after which the command is killed and
+    CommandTimeoutException raised, or rc -9 returned if not throw. Defaults
+    to the command's deadline in system.command_guard, 0 for none.
+    """
     try:
         # We force run_command to always use en_US
         # to avoid issues on date and number formats
@@ -100,18 +112,54 @@ def run_command(cmd, shell=False, stdout=subprocess.PIPE,
         fake_env = dict(os.environ)
         fake_env['LANG'] = 'en_US.UTF-8'
         cmd = map(str, cmd)
+        cache = (cache and input is None and not shell)
+        if cache:
+            cached, generation = command_cache.get(cmd)
+            if cached is not None:
+                return cached
+        if timeout is None:
+            timeout = command_timeout(cmd)
+        try:
+            probes = command_guard.check(cmd) if timeout else []
+        except CircuitOpenException as e:
+            logger.error(e.__str__())
+            if throw:
+                raise
+            return (e.out, e.err, e.rc)
         if log:
             logger.debug('Running command: {}'.format(' '.join(cmd)))
-        p = subprocess.Popen(cmd, shell=shell, stdout=stdout, stderr=stderr,
-                             stdin=stdin, env=fake_env)
-        out, err = p.communicate(input=input)
-        out = out.split('\n')
-        err = err.split('\n')
-        rc = p.returncode
+        start = time.time()
+        timed_out = False
+        args, popen_shell = (guarded_args(cmd, shell) if timeout else
+                             (cmd, shell))
+        try:
+            p = subprocess.Popen(args, shell=popen_shell, stdout=stdout,
+                                 stderr=stderr, stdin=stdin, env=fake_env)
+        except Exception:
+            command_guard.release(probes)
+            raise
+        if timeout:
+            out, err, timed_out = command_guard.communicate(
+                p, cmd, timeout, input=input, probes=probes)
+        else:
+            out, err = p.communicate(input=input)
+        rc = -signal.SIGKILL if timed_out else p.returncode
+        command_stats.record(cmd, time.time() - start, len(out or ''),
+                             len(err or ''), rc)
+        out = (out or '').split('\n')
+        err = (err or '').split('\n')
+        if cache and rc == 0 and not timed_out:
+            command_cache.put(cmd, out, err, rc, generation)
+        elif not cache:
+            command_cache.invalidate_for(cmd)
+    except CommandException:
+        raise
     except Exception as e:
         raise Exception(
             'Exception while running command({}): {}'.format(cmd, e))
 
+    if timed_out and throw:
+        raise CommandTimeoutException(cmd, out, err, timeout)
     if rc != 0:
         if log:
             e_msg = ('non-zero code({0}) returned by command: {1}. output: '
@@ -970,7 +1018,7 @@ def get_md_members(device_name, test=None):
     members_string = ''
     if test is None:
         out, err, rc = run_command([UDEVADM, 'info', '--name=' + device_name],
-                                   throw=False)
+                                   throw=False, cache=True)
     else:
         # test mode so process test instead of udevadmin output
         out = test
@@ -1053,7 +1101,7 @@ def get_disk_serial(device_name, device_type=None, test=None):
         uuid_search_string = 'MD_UUID'
     if test is None:
         out, err, rc = run_command([UDEVADM, 'info', '--name=' + device_name],
-                                   throw=False)
+                                   throw=False, cache=True)
     else:
         # test mode so process test instead of udevadmin output
         out = test
@@ -1276,7 +1324,7 @@ def get_base_device(device, test_mode=False):
     """
     base_dev = ['', ]
     if not test_mode:
-        out, e, rc = run_command([LSBLK])
+        out, e, rc = run_command([LSBLK], cache=True)
     else:
         out, e, rc = run_command([CAT, '/root/smartdumps/lsblk.out'])
     # now examine the output from lsblk line by line
@@ -1320,7 +1368,7 @@ def is_rotational(device_name, test=None):
     if test is None:
         out, err, rc = run_command([UDEVADM, 'info', '--query=property',
                                     '--name=' + '%s' % device_name],
-                                   throw=False)
+                                   throw=False, cache=True)
     else:
         # test mode so process test instead of udevadmin output
         out = test
@@ -1375,7 +1423,8 @@ def get_disk_power_status(dev_byid):
     # hdparm -C -q /dev/sda
     # drive state is:  active/idle
     out, err, rc = run_command(
-        [HDPARM, '-C', '-q', get_device_path(dev_byid)], throw=False)
+        [HDPARM, '-C', '-q', get_device_path(dev_byid)], throw=False,
+        cache=True)
     if len(err) != 1:
         # In some instances an error can be returned even with rc=0.
         # ie SG_IO: bad/missing sense data, sb[]:  70 00 05 00 00 00 00 0a ...
@@ -1410,7 +1459,8 @@ def get_disk_APM_level(dev_byid):
     #  APM_level<tab>= off
     #  APM_level<tab>= not supported
     out, err, rc = run_command(
-        [HDPARM, '-B', '-q', get_device_path(dev_byid)], throw=False)
+        [HDPARM, '-B', '-q', get_device_path(dev_byid)], throw=False,
+        cache=True)
     if len(err) != 1:
         # In some instances an error can be returned even with rc=0.
         # ie SG_IO: bad/missing sense data, sb[]:  70 00 05 00 00 00 00 0a ...
@@ -1675,7 +1725,7 @@ def get_whole_dev_uuid(dev_byid):
     dev_uuid = ''
     dev_byid_withpath = get_device_path(dev_byid)
     out, err, rc = run_command([LSBLK, '-n', '-o', 'uuid', dev_byid_withpath],
-                               throw=False)
+                               throw=False, cache=True)
     if rc != 0:
         return dev_uuid
     if len(out) > 0:
@@ -0,0 +1,78 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import threading
+from Queue import (Queue, Empty)
+import logging
+logger = logging.getLogger(__name__)
+
+
+def run_parallel(func, items, workers=4, finalize=None):
+    """
+    Call func(item) for every item using up to workers threads. A failing
+    call doesn't affect the others, its exception is returned instead.
+    With workers <= 1 the calls are made serially in the calling thread.
+    func should not call run_parallel itself: nested pools multiply the
+    number of threads, run the phases one after the other instead.
+    :param finalize: called by each worker thread before it exits, eg: a
+    function calling django.db.connection.close() to not leak the thread's
+    DB connection. Not connection.close itself, that is bound to the
+    connection of the calling thread.
+    :return: list of (item, exception) for the calls that raised, in the
+    order of items.
+    """
+    items = list(items)
+    failures = []
+    if (workers <= 1 or len(items) <= 1):
+        for item in items:
+            try:
+                func(item)
+            except Exception as e:
+                logger.exception(e)
+                failures.append((item, e))
+        return failures
+
+    queue = Queue()
+    for i, item in enumerate(items):
+        queue.put((i, item))
+    lock = threading.Lock()
+
+    def work():
+        try:
+            while True:
+                try:
+                    i, item = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    func(item)
+                except Exception as e:
+                    logger.exception(e)
+                    with lock:
+                        failures.append((i, item, e))
+        finally:
+            if (finalize is not None):
+                finalize()
+
+    threads = [threading.Thread(target=work) for i in
+               range(min(workers, len(items)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return [f[1:] for f in sorted(failures, key=lambda f: f[0])]
@@ -0,0 +1,141 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Fetching of the Rock-on profiles (app.json files) of the remote metastore.
+# Profiles are fetched concurrently and kept in a cache file along with their
+# ETag/Last-Modified so unchanged ones are only revalidated (304). The cache
+# also records a hash of each Rock-on's profile as last applied to the db so
+# unchanged Rock-ons can be skipped on update.
+
+import hashlib
+import json
+import os
+import threading
+import requests
+from parallel import run_parallel
+import logging
+logger = logging.getLogger(__name__)
+
+
+def profile_hash(profile):
+    return hashlib.sha1(json.dumps(profile, sort_keys=True)).hexdigest()
+
+
+class MetastoreCache(object):
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        # url -> {'etag', 'last_modified', 'body'}
+        self.responses = {}
+        # Rock-on name -> profile_hash as last applied.
+        self.applied = {}
+        # urls fetched by this instance.
+        self.fetched = set()
+        if (cache_file is not None and os.path.isfile(cache_file)):
+            try:
+                with open(cache_file) as cfo:
+                    content = json.load(cfo)
+                self.responses = content['responses']
+                self.applied = content['applied']
+            except Exception as e:
+                logger.error('Ignoring unreadable Rock-on metastore cache '
+                             '(%s): %s' % (cache_file, e.__str__()))
+
+    def save(self):
+        """
+        Write the cache file, dropping the responses of urls no longer
+        fetched, eg: of Rock-ons removed from the metastore.
+        """
+        if (self.cache_file is None):
+            return
+        with self.lock:
+            responses = dict((u, r) for u, r in self.responses.items()
+                             if u in self.fetched)
+            tmp_file = '%s.tmp' % self.cache_file
+            try:
+                with open(tmp_file, 'w') as tfo:
+                    json.dump({'responses': responses,
+                               'applied': self.applied, }, tfo)
+                os.rename(tmp_file, self.cache_file)
+            except (IOError, OSError) as e:
+                logger.error('Failed to save the Rock-on metastore cache '
+                             '(%s): %s' % (self.cache_file, e.__str__()))
+
+    def fetch_json(self, url, timeout=10):
+        """
+        GET url revalidating a cached copy, if any.
+        :return: the decoded json body.
+        """
+        with self.lock:
+            cached = self.responses.get(url)
+            self.fetched.add(url)
+        headers = {}
+        if (cached is not None):
+            if (cached.get('etag') is not None):
+                headers['If-None-Match'] = cached['etag']
+            if (cached.get('last_modified') is not None):
+                headers['If-Modified-Since'] = cached['last_modified']
+        response = requests.get(url, headers=headers, timeout=timeout)
+        if (response.status_code == 304 and cached is not None):
+            return json.loads(cached['body'])
+        if (response.status_code != 200):
+            response.raise_for_status()
+            raise Exception('Unexpected response(%d) from %s' %
+                            (response.status_code, url))
+        body = response.text
+        data = json.loads(body)
+        with self.lock:
+            self.responses[url] = {
+                'etag': response.headers.get('etag'),
+                'last_modified': response.headers.get('last-modified'),
+                'body': body, }
+        return data
+
+    def fetch_all(self, urls, workers=8, timeout=10):
+        """
+        fetch_json every url with up to workers at a time.
+        :return: (dict of url -> json, list of (url, exception) of those that
+        failed).
+        """
+        results = {}
+
+        def fetch(url):
+            results[url] = self.fetch_json(url, timeout=timeout)
+
+        failures = run_parallel(fetch, urls, workers=workers)
+        return results, failures
+
+    def changed(self, name, profile):
+        """
+        Whether profile differs from the one last applied for Rock-on name.
+        """
+        with self.lock:
+            return (self.applied.get(name) != profile_hash(profile))
+
+    def set_applied(self, name, profile):
+        with self.lock:
+            self.applied[name] = profile_hash(profile)
+
+    def prune_applied(self, names):
+        """
+        Forget the applied profiles of Rock-ons other than names.
+        """
+        with self.lock:
+            self.applied = dict((n, h) for n, h in self.applied.items()
+                                if n in names)
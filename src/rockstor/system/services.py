@@ -23,6 +23,11 @@ import shutil
 from tempfile import mkstemp
 import os
 from shutil import move
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 CHKCONFIG_BIN = '/sbin/chkconfig'
@@ -34,6 +39,24 @@ SUPERVISORD_CONF = ('%s/etc/supervisord.conf' % settings.ROOT_DIR)
 NET = '/usr/bin/net'
 WBINFO = '/usr/bin/wbinfo'
 AFP_CONFIG = '/etc/netatalk/afp.conf'
+SUPPORTED_SERVICES = ('nfs', 'smb', 'sshd', 'ypbind', 'rpcbind', 'ntpd',
+                      'nslcd', 'netatalk', 'snmpd', 'docker', 'smartd',
+                      'shellinaboxd', 'nut-server', 'rockstor-bootstrap',
+                      'rockstor', 'systemd-shutdownd')
+SUPERVISORD_SERVICES = ('replication', 'data-collector', 'ztask-daemon',
+                        'task-scheduler')
+# systemd units that must all be active for a Service to be running, any
+# other supported service is its own unit. See service_status()
+SERVICE_UNITS = {
+    'nis': ('rpcbind', 'ypbind'),
+    'nfs': ('rpcbind', 'nfs'),
+    'ldap': ('nslcd',),
+    'sftp': ('sshd',),
+    'smb': ('smb', 'nmb'),
+    'nut': ('nut-monitor',),
+}
+# seconds batched service statuses are reused for, see ServiceStatusCache
+SERVICE_STATUS_TTL = 5
 
 
 def init_service_op(service_name, command, throw=True):
@@ -46,13 +69,11 @@ def init_service_op(service_name, command, throw=True):
     :param throw:
     :return: out err rc
     """
-    supported_services = ('nfs', 'smb', 'sshd', 'ypbind', 'rpcbind', 'ntpd',
-                          'nslcd', 'netatalk', 'snmpd', 'docker', 'smartd',
-                          'shellinaboxd', 'nut-server', 'rockstor-bootstrap',
-                          'rockstor', 'systemd-shutdownd')
-    if (service_name not in supported_services):
+    if (service_name not in SUPPORTED_SERVICES):
         raise Exception('unknown service: %s' % service_name)
 
+    if (command != 'status'):
+        status_cache.invalidate()
     return run_command([SYSTEMCTL_BIN, command, service_name], throw=throw)
 
 
@@ -61,6 +82,8 @@ def chkconfig(service_name, switch):
 
 
 def systemctl(service_name, switch):
+    if (switch != 'status'):
+        status_cache.invalidate()
     return run_command([SYSTEMCTL_BIN, switch, service_name])
 
 
@@ -101,14 +124,175 @@ def set_autostart(service, switch):
 
 def superctl(service, switch):
     out, err, rc = run_command([SUPERCTL_BIN, switch, service])
-    set_autostart(service, switch)
     if (switch == 'status'):
         status = out[0].split()[1]
         if (status != 'RUNNING'):
             rc = 1
+        return out, err, rc
+    status_cache.invalidate()
+    set_autostart(service, switch)
     return out, err, rc
 
 
+def systemd_active_states(units):
+    """
+    ActiveState of each of the given systemd units with a single systemctl
+    show call.
+    :param units: list of unit names
+    :return: dict of unit: ActiveState eg active, inactive, failed
+    """
+    units = list(units)
+    if (len(units) == 0):
+        return {}
+    out, err, rc = run_command([SYSTEMCTL_BIN, 'show',
+                                '--property=ActiveState'] + units,
+                               throw=False)
+    # one property block per unit, in the order asked. Units are matched by
+    # position as show reports the resolved unit for aliases, eg nfs.
+    states = [l.split('=', 1)[1] for l in out if
+              l.startswith('ActiveState=')]
+    if (len(states) != len(units)):
+        raise Exception('Unexpected systemctl show output for units(%s): '
+                        '%s %s' % (units, out, err))
+    return dict(zip(units, states))
+
+
+def supervisord_states():
+    """
+    State of every supervisord program with a single supervisorctl status
+    call.
+    :return: dict of program: state eg RUNNING, STOPPED, FATAL
+    """
+    # rc is non zero when any program isn't running, so not an error here.
+    out, err, rc = run_command([SUPERCTL_BIN, 'status'], throw=False)
+    states = {}
+    for l in out:
+        fields = l.split()
+        if (len(fields) > 1):
+            states[fields[0]] = fields[1]
+    return states
+
+
+def sftp_configured():
+    # sshd has sftp subsystem so we check for it's config line which is
+    # inserted or deleted to enable or disable the sftp service.
+    with open(SSHD_CONFIG) as sfo:
+        for line in sfo.readlines():
+            if (re.match("Subsystem\s+sftp", line) is not None):
+                return True
+    return False
+
+
+def active_directory_status(config):
+    """
+    2 steps Active Directory status check
+    First checks secret via rpc callable
+    Second checks via auth for admin username
+    If both give us 0 rc Active Directory is running
+    :return: 0 if running, 1 otherwise
+    """
+    if (config is None):
+        # bootstrap switch subsystem interprets -1 as ON so returning 1
+        # instead
+        return 1
+    wbinfo_trust_cmd = [WBINFO, '-t', '--domain', config.get('domain')]
+    wbinfo_auth_credentials = '{}@{}%{}'.format(
+        config.get('username'), config.get('domain'),
+        config.get('password'))
+    wbinfo_auth_cmd = [WBINFO, '-a', wbinfo_auth_credentials,
+                       '--domain', config.get('domain')]
+    wbinfo_trust = run_command(wbinfo_trust_cmd, throw=False)
+    wbinfo_auth = run_command(wbinfo_auth_cmd, throw=False)
+    if (wbinfo_trust[2] == 0 and wbinfo_auth[2] == 0):
+        return 0
+    return 1
+
+
+class ServiceStatusCache(object):
+    """
+    Batched, short lived cache of Service statuses for polling readers such
+    as the services websocket and the sm/services views. All systemd units
+    are queried with one systemctl show and all supervisord programs with
+    one supervisorctl status, at most once per ttl seconds unless
+    invalidated by a service start/stop. Nothing is written on this path.
+    """
+
+    def __init__(self, ttl=SERVICE_STATUS_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        self.expires = 0
+        self.unit_states = {}
+        self.program_states = None
+        self.ad_rc = None
+
+    @staticmethod
+    def _units(service_name):
+        if (service_name in SERVICE_UNITS):
+            return SERVICE_UNITS[service_name]
+        if (service_name in SUPPORTED_SERVICES):
+            return (service_name,)
+        return ()
+
+    def statuses(self, services):
+        """
+        :param services: list of (service name, config or None)
+        :return: dict of service name: rc, 0 if running, as service_status
+        """
+        with self.lock:
+            if (time.time() > self.expires):
+                self.invalidate()
+                self.expires = time.time() + self.ttl
+            units = set()
+            for name, config in services:
+                units.update(self._units(name))
+            missing = units - set(self.unit_states.keys())
+            if (len(missing) > 0):
+                self.unit_states.update(systemd_active_states(missing))
+            if (self.program_states is None and
+                    any(n in SUPERVISORD_SERVICES for n, c in services)):
+                self.program_states = supervisord_states()
+            ret = {}
+            for name, config in services:
+                ret[name] = self._status(name, config)
+            return ret
+
+    def _status(self, name, config):
+        if (name in SUPERVISORD_SERVICES):
+            return 0 if (self.program_states.get(name) == 'RUNNING') else 1
+        if (name == 'active-directory'):
+            if (self.ad_rc is None):
+                self.ad_rc = active_directory_status(config)
+            return self.ad_rc
+        units = self._units(name)
+        if (len(units) == 0):
+            logger.debug('No status available for unknown service(%s).' %
+                         name)
+            return 1
+        for u in units:
+            if (self.unit_states[u] != 'active'):
+                # as systemctl status does for inactive units.
+                return 3
+        if (name == 'sftp' and not sftp_configured()):
+            return 1
+        return 0
+
+
+status_cache = ServiceStatusCache()
+
+
+def service_statuses(services):
+    """
+    Batched and cached alternative to service_status() for many services at
+    once, see ServiceStatusCache.
+    :param services: list of (service name, config or None)
+    :return: dict of service name: rc, 0 if running
+    """
+    return status_cache.statuses(services)
+
+
 def service_status(service_name, config=None):
     """
     Service status of either systemd or supervisord managed services.
@@ -133,18 +317,13 @@ def service_status(service_name, config=None):
         # initial check on sshd status: 0 = OK 3 = stopped
         if (rc != 0):
             return out, err, rc
-        # sshd has sftp subsystem so we check for it's config line which is
-        # inserted or deleted to enable or disable the sftp service.
-        with open(SSHD_CONFIG) as sfo:
-            for line in sfo.readlines():
-                if (re.match("Subsystem\s+sftp", line) is not
-                        None):
-                    return out, err, rc
-            # -1 not appropriate as inconsistent with bash return codes
-            # Returning 1 as Catchall for general errors.  the calling system
-            # interprets -1 as enabled, 1 works for disabled.
-            return out, err, 1
-    elif (service_name in ('replication', 'data-collector', 'ztask-daemon')):
+        if (sftp_configured()):
+            return out, err, rc
+        # -1 not appropriate as inconsistent with bash return codes
+        # Returning 1 as Catchall for general errors.  the calling system
+        # interprets -1 as enabled, 1 works for disabled.
+        return out, err, 1
+    elif (service_name in SUPERVISORD_SERVICES):
         return superctl(service_name, 'status')
     elif (service_name == 'smb'):
         out, err, rc = run_command([SYSTEMCTL_BIN, 'status', 'smb'],
@@ -159,26 +338,7 @@ def service_status(service_name, config=None):
         return run_command([SYSTEMCTL_BIN, 'status', 'nut-monitor'],
                            throw=False)
     elif (service_name == 'active-directory'):
-        if (config is not None):
-            # 2 steps Active Directory status check
-            # First checks secret via rpc callable
-            # Second checks via auth for admin username
-            # If both give us 0 rc Active Directory is running
-            wbinfo_trust_cmd = [WBINFO, '-t', '--domain', config.get('domain')]
-            wbinfo_auth_credentials = '{}@{}%{}'.format(
-                config.get('username'), config.get('domain'),
-                config.get('password'))
-            wbinfo_auth_cmd = [WBINFO, '-a', wbinfo_auth_credentials,
-                               '--domain', config.get('domain')]
-            wbinfo_trust = run_command(wbinfo_trust_cmd, throw=False)
-            wbinfo_auth = run_command(wbinfo_auth_cmd, throw=False)
-            active_directory_rc = 1
-            if (wbinfo_trust[2] == 0 and wbinfo_auth[2] == 0):
-                active_directory_rc = 0
-
-            return '', '', active_directory_rc
-        # bootstrap switch subsystem interprets -1 as ON so returning 1 instead
-        return '', '', 1
+        return '', '', active_directory_status(config)
 
     return init_service_op(service_name, 'status', throw=False)
 
@@ -0,0 +1,113 @@
+"""
+Copyright (c) 2012-2017 RockStor, Inc. <http://rockstor.com>
+This file is part of RockStor.
+
+RockStor is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published
+by the Free Software Foundation; either version 2 of the License,
+or (at your option) any later version.
+
+RockStor is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import fcntl
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cross process single-flight execution for expensive, idempotent refresh
+# operations such as disk, pool, share and snapshot state rescans. gunicorn
+# runs several worker processes so coordination is via flock() on a per
+# operation lock file, with the outcome of the last run kept alongside it:
+# - a caller arriving while a run is in progress waits for it and shares its
+# outcome rather than starting another run.
+# - a caller arriving within freshness seconds of a successful run, ie:
+# settings.STATE_REFRESH['freshness'] for the callers in storageadmin, gets
+# that outcome without a new run. run(max_age=0) forces a new run.
+
+
+class SingleFlight(object):
+
+    def __init__(self, name, state_dir, freshness=0):
+        self.name = name
+        self.freshness = freshness
+        self.lock_path = os.path.join(state_dir, '%s.lock' % name)
+        self.state_path = os.path.join(state_dir, '%s.json' % name)
+        if (not os.path.isdir(state_dir)):
+            os.makedirs(state_dir, 0o700)
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as sfo:
+                return json.load(sfo)
+        except (IOError, ValueError):
+            return None
+
+    def _write_state(self, state):
+        tmp_path = '%s.%d' % (self.state_path, os.getpid())
+        with open(tmp_path, 'w') as tfo:
+            json.dump(state, tfo)
+        os.rename(tmp_path, self.state_path)
+
+    @staticmethod
+    def _shared_outcome(state):
+        if (not state['ok']):
+            raise Exception(state['error'])
+
+    def run(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) unless an equivalent run can be shared.
+        Keyword argument max_age overrides the freshness window for this
+        call, max_age=0 (forced) only shares a run that started after this
+        call arrived so its outcome reflects any change made before it.
+        :return: func's return value when run by this caller, None when the
+        outcome of another run is shared. A shared failed run raises.
+        """
+        max_age = kwargs.pop('max_age', self.freshness)
+        arrival = time.time()
+        state = self._read_state()
+        if (max_age > 0 and state is not None and state['ok'] and
+                (arrival - state['end']) < max_age):
+            logger.debug('%s refreshed %.1f seconds ago. Not running again.'
+                         % (self.name, arrival - state['end']))
+            return None
+
+        with open(self.lock_path, 'a') as lfo:
+            joined = False
+            try:
+                fcntl.flock(lfo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                joined = True
+                fcntl.flock(lfo, fcntl.LOCK_EX)
+            try:
+                state = self._read_state()
+                if (state is not None):
+                    if (joined and state['end'] >= arrival and
+                            (max_age > 0 or state['start'] >= arrival)):
+                        logger.debug('Joined in progress %s run.' %
+                                     self.name)
+                        return self._shared_outcome(state)
+                    if (max_age > 0 and state['ok'] and
+                            (time.time() - state['end']) < max_age):
+                        return None
+                state = {'start': time.time(), 'ok': True, 'error': None, }
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    state['ok'] = False
+                    state['error'] = e.__str__()
+                    raise
+                finally:
+                    state['end'] = time.time()
+                    self._write_state(state)
+            finally:
+                fcntl.flock(lfo, fcntl.LOCK_UN)
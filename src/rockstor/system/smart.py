@@ -45,7 +45,7 @@ def info(device, custom_options='', test_mode=TESTMODE):
     if not test_mode:
         o, e, rc = run_command(
             [SMART, '-H', '--info'] + get_dev_options(device, custom_options),
-            throw=False)
+            throw=False, cache=True)
     else:  # we are testing so use a smartctl -H --info file dump instead
         o, e, rc = run_command([CAT, '/root/smartdumps/smart-H--info.out'])
     # List of string matches to look for in smartctrl -H --info output.
@@ -317,7 +317,8 @@ def available(device, custom_options='', test_mode=TESTMODE):
     """
     if not test_mode:
         o, e, rc = run_command(
-            [SMART, '--info'] + get_dev_options(device, custom_options))
+            [SMART, '--info'] + get_dev_options(device, custom_options),
+            cache=True)
     else:  # we are testing so use a smartctl --info file dump instead
         o, e, rc = run_command([CAT, '/root/smartdumps/smart--info.out'])
     a = False
@@ -20,6 +20,7 @@ from exceptions import CommandException
 from osi import run_command
 import subprocess
 import fcntl
+import hashlib
 import time
 import re
 import os
@@ -39,6 +40,8 @@ GROUPDEL = '/usr/sbin/groupdel'
 PASSWD = '/usr/bin/passwd'
 USERMOD = '/usr/sbin/usermod'
 SMBPASSWD = '/usr/bin/smbpasswd'
+PDBEDIT = '/usr/bin/pdbedit'
+CHPASSWD = '/usr/sbin/chpasswd'
 CHOWN = '/usr/bin/chown'
 
 
@@ -129,25 +132,53 @@ def get_epasswd(username):
 
 def usermod(username, passwd):
     cmd = [PASSWD, '--stdin', username]
-    p = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    out, err = p.communicate(input=passwd.encode('utf8'))
-    rc = p.returncode
-    if (rc != 0):
-        raise CommandException(cmd, out, err, rc)
-    return (out, err, rc)
+    return run_command(cmd, input=passwd.encode('utf8'))
+
+
+def chpasswd(passwords):
+    """
+    Set the passwords of several users with a single chpasswd call.
+    :param passwords: list of (username, password)
+    """
+    pstr = ''.join(['%s:%s\n' % (u, p) for u, p in passwords])
+    return run_command([CHPASSWD], input=pstr.encode('utf8'))
 
 
 def smbpasswd(username, passwd):
     cmd = [SMBPASSWD, '-s', '-a', username]
-    p = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE,
-                         stderr=subprocess.PIPE, stdin=subprocess.PIPE)
     pstr = ('%s\n%s\n' % (passwd, passwd))
-    out, err = p.communicate(input=pstr.encode('utf8'))
-    rc = p.returncode
-    if (rc != 0):
-        raise CommandException(cmd, out, err, rc)
-    return (out, err, rc)
+    return run_command(cmd, input=pstr.encode('utf8'))
+
+
+def _nt_hash(passwd):
+    if (isinstance(passwd, str)):
+        passwd = passwd.decode('utf8')
+    return hashlib.new('md4', passwd.encode('utf-16le')).hexdigest().upper()
+
+
+def smbpasswds(passwords):
+    """
+    Set the samba passwords of several users with one pdbedit import of
+    their NT hashes instead of an smbpasswd call per user. Falls back to
+    smbpasswd if md4 isn't available to hash them.
+    :param passwords: list of (username, uid, password)
+    """
+    lct = int(time.time())
+    try:
+        entries = ['%s:%d:%s:%s:[U          ]:LCT-%08X:\n' %
+                   (u, uid, 'X' * 32, _nt_hash(p), lct)
+                   for u, uid, p in passwords]
+    except ValueError:
+        for u, uid, p in passwords:
+            smbpasswd(u, p)
+        return
+    fd, npath = mkstemp()
+    try:
+        with os.fdopen(fd, 'w') as tfo:
+            tfo.write(''.join(entries))
+        return run_command([PDBEDIT, '-i', 'smbpasswd:%s' % npath])
+    finally:
+        os.remove(npath)
 
 
 def update_shell(username, shell):
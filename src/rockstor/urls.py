@@ -25,7 +25,9 @@ from storageadmin.views import (SetupUserView, LoginView, DashboardConfigView,
                                 NetatalkListView, NetatalkDetailView,
                                 TLSCertificateView, SnapshotView,
                                 ConfigBackupListView, ConfigBackupDetailView,
-                                ConfigBackupUpload, EmailClientView)
+                                ConfigBackupUpload, EmailClientView,
+                                JobListView, JobDetailView,
+                                SubprocessStatsView, CommandCacheView)
 import os.path
 # Uncomment the next two lines to enable the admin:
 from django.contrib import admin
@@ -119,6 +121,12 @@ urlpatterns = patterns(
         ConfigBackupUpload.as_view()),
     url(r'^api/email$', EmailClientView.as_view()),
     url(r'^api/email/(?P<command>.*)$', EmailClientView.as_view()),
+    # Background jobs
+    url(r'^api/jobs$', JobListView.as_view()),
+    url(r'^api/jobs/(?P<jid>\d+)$', JobDetailView.as_view()),
+    # run_command statistics of the serving process
+    url(r'^api/debug/subprocess-stats$', SubprocessStatsView.as_view()),
+    url(r'^api/debug/command-cache$', CommandCacheView.as_view()),
     # Pincard
     url(r'^api/pincardmanager',
         include('storageadmin.urls.pincard')),